@@ -0,0 +1,229 @@
+# scripts/bench_pipeline.py
+"""Offline end-to-end benchmark: issue events in, draft PRs out, no network.
+
+Usage:
+    python scripts/bench_pipeline.py --issues 40 --concurrency 8 --llm-latency-ms 300 \
+        --min-eps 5 --max-p95-ms 2000 --max-calls-per-issue 20
+
+Starts a fake GitHub REST/GraphQL server serving a synthetic repo and a fake
+OpenAI-compatible chat endpoint (see fake_services.py), then drives
+``handle_issue_event`` at the given concurrency. Reports per-stage p50/p95
+latency from the pipeline's own spans, GitHub API calls and bytes per route,
+LLM token counts and events per second; thresholds turn it into a
+regression gate.
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeGitHub, FakeOpenAI, SyntheticRepo  # noqa: E402
+
+REPO = "bench/synthetic"
+
+
+@dataclass
+class BenchResult:
+    issues: int
+    prs: int
+    wall: float
+    spans: List[Dict[str, Any]] = field(default_factory=list)
+    api_routes: Dict[str, List[int]] = field(default_factory=dict)
+    llm_calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+    @property
+    def events_per_second(self) -> float:
+        return self.issues / self.wall if self.wall else 0.0
+
+    @property
+    def api_calls(self) -> int:
+        return sum(row[0] for row in self.api_routes.values())
+
+    def latencies(self) -> Dict[str, List[float]]:
+        """Span durations (ms) keyed by "pipeline", "stage:<kind>", "llm.call", "http", ..."""
+        by_name: Dict[str, List[float]] = {}
+        for data in self.spans:
+            name = data["name"]
+            if name == "stage":
+                name = f"stage:{data['attrs'].get('stage')}"
+            by_name.setdefault(name, []).append(data["duration_ms"])
+        return by_name
+
+    def p95(self, name: str) -> float:
+        return _quantile(sorted(self.latencies().get(name, [0.0])), 0.95)
+
+    def format(self) -> str:
+        lines = [
+            f"Processed {self.issues} issue(s), {self.prs} PR(s) in {self.wall:.2f}s"
+            f"  ({self.events_per_second:.1f} events/s)",
+            "",
+            f"{'span':<28} {'count':>6} {'p50 ms':>9} {'p95 ms':>9}",
+        ]
+        for name, values in sorted(self.latencies().items()):
+            values.sort()
+            lines.append(f"{name:<28} {len(values):6d} {_quantile(values, 0.5):9.1f} {_quantile(values, 0.95):9.1f}")
+        calls = self.api_calls
+        sent = sum(row[1] for row in self.api_routes.values())
+        received = sum(row[2] for row in self.api_routes.values())
+        lines += [
+            "",
+            f"GitHub API: {calls} calls ({calls / max(1, self.issues):.1f}/issue),"
+            f" {sent / 1024:.1f} KiB sent, {received / 1024:.1f} KiB received",
+        ]
+        for route, (n, up, down) in sorted(self.api_routes.items(), key=lambda item: -item[1][0]):
+            lines.append(f"  {route:<52} {n:6d} {up / 1024:9.1f} KiB {down / 1024:9.1f} KiB")
+        lines.append(
+            f"LLM: {self.llm_calls} calls, {self.prompt_tokens:,} prompt / {self.completion_tokens:,} completion tokens"
+        )
+        return "\n".join(lines)
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def run_bench(
+    *,
+    issues: int = 20,
+    concurrency: int = 4,
+    files: int = 50,
+    lines: int = 200,
+    llm_latency: float = 0.0,
+    github_latency: float = 0.0,
+    context_rounds: int = 0,
+    warm: bool = True,
+    dedupe: bool = False,
+) -> BenchResult:
+    """Run ``issues`` events through the real handlers against the fake servers.
+
+    Synthetic tickets for the same module are duplicates of each other, so
+    duplicate matching is off unless ``dedupe`` is set.
+    """
+    from ticketwatcher import github_api, handlers, telemetry
+    from ticketwatcher.state import RunStore
+
+    repo = SyntheticRepo(files=files, lines=lines)
+    spans: List[Dict[str, Any]] = []
+    saved: List[Tuple[Any, str, Any]] = []
+
+    def patch(obj: Any, name: str, value: Any) -> None:
+        saved.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    with FakeGitHub(repo, latency=github_latency) as gh, FakeOpenAI(
+        repo, latency=llm_latency, context_rounds=context_rounds
+    ) as llm:
+        owner, name = REPO.split("/")
+        patch(github_api, "GITHUB_API", gh.url)
+        patch(github_api, "TOKEN", github_api.TOKEN or "bench-token")
+        patch(github_api, "OWNER", owner)
+        patch(github_api, "NAME", name)
+        patch(handlers, "VERIFY_PATCHES", False)
+        patch(handlers, "DEDUPE", handlers.DEDUPE if dedupe else "off")
+        patch(handlers, "_RUN_STORE", RunStore(":memory:"))
+        patch(handlers, "_AGENT_CLIENT", None)
+        env = {"OPENAI_BASE_URL": f"{llm.url}/v1", "OPENAI_API_KEY": "bench-key", "TICKETWATCHER_BASE_BRANCH": ""}
+        old_env = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        telemetry.configure(exporters=(spans.append,))
+        try:
+            if warm:
+                handlers.warm_clients()
+                github_api.enable_content_cache()
+            label = sorted(handlers.TRIGGER_LABELS)[0]
+            events = [
+                {
+                    "action": "labeled",
+                    "label": {"name": label},
+                    "issue": repo.issue(n + 1, n % files, label),
+                    "repository": {"full_name": REPO},
+                }
+                for n in range(issues)
+            ]
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+                results = list(pool.map(handlers.handle_issue_event, events))
+            wall = time.perf_counter() - started
+        finally:
+            telemetry.configure()
+            github_api.enable_session_reuse(False)
+            github_api.enable_content_cache(0)
+            for obj, attr, value in reversed(saved):
+                setattr(obj, attr, value)
+            for key, value in old_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+        llm_calls = llm.stats.get("POST /v1/chat/completions", [0])[0]
+        return BenchResult(
+            issues=issues,
+            prs=sum(1 for url in results if url),
+            wall=wall,
+            spans=spans,
+            api_routes={route: list(row) for route, row in gh.stats.items()},
+            llm_calls=llm_calls,
+            prompt_tokens=llm.prompt_tokens,
+            completion_tokens=llm.completion_tokens,
+        )
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--issues", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--files", type=int, default=50, help="modules in the synthetic repo")
+    parser.add_argument("--lines", type=int, default=200, help="approximate lines per module")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0)
+    parser.add_argument("--github-latency-ms", type=float, default=20.0)
+    parser.add_argument("--context-rounds", type=int, default=0, help="LLM asks for more context this many times per ticket")
+    parser.add_argument("--dedupe", action="store_true", help="link repeat reports for a module to its first PR")
+    parser.add_argument("--cold", action="store_true", help="no shared LLM client, keep-alive sessions or file cache")
+    parser.add_argument("--min-eps", type=float, default=0.0, help="fail below this many events per second")
+    parser.add_argument("--max-p95-ms", type=float, default=0.0, help="fail if the pipeline p95 exceeds this")
+    parser.add_argument("--max-calls-per-issue", type=float, default=0.0, help="fail above this many GitHub calls per issue")
+    args = parser.parse_args(argv)
+
+    result = run_bench(
+        issues=args.issues,
+        concurrency=args.concurrency,
+        files=args.files,
+        lines=args.lines,
+        llm_latency=args.llm_latency_ms / 1000,
+        github_latency=args.github_latency_ms / 1000,
+        context_rounds=args.context_rounds,
+        warm=not args.cold,
+        dedupe=args.dedupe,
+    )
+    print(result.format())
+
+    failures = []
+    if result.prs != result.issues:
+        failures.append(f"only {result.prs}/{result.issues} issues produced a PR")
+    if args.min_eps and result.events_per_second < args.min_eps:
+        failures.append(f"{result.events_per_second:.2f} events/s < {args.min_eps}")
+    if args.max_p95_ms and result.p95("pipeline") > args.max_p95_ms:
+        failures.append(f"pipeline p95 {result.p95('pipeline'):.0f} ms > {args.max_p95_ms} ms")
+    per_issue = result.api_calls / max(1, result.issues)
+    if args.max_calls_per_issue and per_issue > args.max_calls_per_issue:
+        failures.append(f"{per_issue:.1f} GitHub calls/issue > {args.max_calls_per_issue}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,115 @@
+# scripts/bench_stackparse.py
+"""Throughput benchmark for the stack trace scanner on large CI-style logs.
+
+Usage:
+    python scripts/bench_stackparse.py --size-mb 8 --repeat 3
+
+Reports MB/s for a full scan (frames buried at the end of the log) and for
+the early-exit case (frames near the top), both as one string and as a
+stream of 64 KiB chunks.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from ticketwatcher.stackparse import StackScanner  # noqa: E402
+
+REPO_ROOT = "/home/runner/work/repo/repo"
+
+_NOISE = [
+    "2024-05-01T10:00:{sec:02d}Z [info] step {n}: compiling module_{n}.c",
+    "2024-05-01T10:00:{sec:02d}Z [debug] GET https://registry.example.com:443/pkg/{n} 200",
+    "    collected {n} items / 3 skipped",
+    "npm WARN deprecated package-{n}@1.{sec}.0: use something else",
+    "  -> downloading artifact {n} of 400 (version 1.2:{sec})",
+]
+
+_TRACE = (
+    "Traceback (most recent call last):\n"
+    f'  File "{REPO_ROOT}/src/app/auth.py", line 22, in get_user_profile\n'
+    f'  File "{REPO_ROOT}/src/app/user_repo.py", line 7, in load_user\n'
+    "KeyError: 'name'\n"
+    f"    at getUser ({REPO_ROOT}/web/src/user.js:10:5)\n"
+    "    at com.acme.billing.Invoice.total(Invoice.java:37)\n"
+    "main.handler(0xc000010000)\n"
+    f"\t{REPO_ROOT}/cmd/server/main.go:41 +0x1d\n"
+    "src/app/payments.py:4: in calculate_total\n"
+)
+
+
+def make_log(size_bytes: int, trace_at_end: bool, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    parts = [] if trace_at_end else [_TRACE]
+    total = sum(len(p) for p in parts)
+    n = 0
+    while total < size_bytes:
+        line = rng.choice(_NOISE).format(n=n, sec=n % 60) + "\n"
+        parts.append(line)
+        total += len(line)
+        n += 1
+    if trace_at_end:
+        parts.append(_TRACE)
+    return "".join(parts)
+
+
+def _scan(text: str, limit: int, chunked: bool) -> int:
+    scanner = StackScanner(repo_root=REPO_ROOT, repo_name="repo", allowed_prefixes=[""], limit=limit)
+    if chunked:
+        step = 64 * 1024
+        for start in range(0, len(text), step):
+            if scanner.feed(text[start : start + step]):
+                break
+    else:
+        scanner.feed(text)
+    return len(scanner.close())
+
+
+def bench(text: str, limit: int, chunked: bool, repeat: int) -> tuple[float, int]:
+    best = float("inf")
+    frames = 0
+    for _ in range(repeat):
+        started = time.perf_counter()
+        frames = _scan(text, limit, chunked)
+        best = min(best, time.perf_counter() - started)
+    return best, frames
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--limit", type=int, default=5)
+    parser.add_argument("--min-mbps", type=float, default=0.0, help="fail if full-scan throughput drops below this")
+    args = parser.parse_args(argv)
+
+    size = int(args.size_mb * 1024 * 1024)
+    cases = [
+        ("full scan (frames at end)", make_log(size, trace_at_end=True)),
+        ("early exit (frames at top)", make_log(size, trace_at_end=False)),
+    ]
+    worst_full = float("inf")
+    print(f"{'case':<30} {'mode':<8} {'MB':>6} {'sec':>8} {'MB/s':>9} {'frames':>6}")
+    for label, text in cases:
+        mb = len(text) / (1024 * 1024)
+        for chunked in (False, True):
+            elapsed, frames = bench(text, args.limit, chunked, args.repeat)
+            mbps = mb / elapsed if elapsed else float("inf")
+            if label.startswith("full"):
+                worst_full = min(worst_full, mbps)
+            mode = "chunks" if chunked else "string"
+            print(f"{label:<30} {mode:<8} {mb:6.1f} {elapsed:8.4f} {mbps:9.1f} {frames:6d}")
+
+    if args.min_mbps and worst_full < args.min_mbps:
+        print(f"FAIL: full-scan throughput {worst_full:.1f} MB/s < {args.min_mbps} MB/s")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,69 @@
+# scripts/bench_startup.py
+"""Cold-start benchmark for the CLI entry point.
+
+Usage:
+    python scripts/bench_startup.py --repeat 10 --max-reject-ms 250
+
+Times fresh `python -m ticketwatcher` processes for events the pre-filter
+rejects (the common case in Actions) and compares them with a bare
+interpreter and with importing the full handler stack.
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+
+_REJECTED = {
+    "comment without command": ("issue_comment", {"action": "created", "issue": {"number": 1}, "comment": {"body": "+1, same here"}}),
+    "non-trigger label": ("issues", {"action": "labeled", "label": {"name": "bug"}, "issue": {"number": 1, "labels": [{"name": "bug"}]}}),
+    "unhandled event": ("push", {"ref": "refs/heads/main"}),
+}
+
+
+def _time_process(args, env, repeat: int) -> float:
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        subprocess.run(args, env=env, check=False, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--max-reject-ms", type=float, default=0.0, help="fail if a rejected event takes longer than this")
+    args = parser.parse_args(argv)
+
+    env = dict(os.environ, PYTHONPATH=ROOT + os.pathsep + os.environ.get("PYTHONPATH", ""))
+    baseline = _time_process([sys.executable, "-c", "pass"], env, args.repeat)
+    full = _time_process([sys.executable, "-c", "import ticketwatcher.handlers, openai"], env, args.repeat)
+    print(f"{'case':<34} {'median ms':>10} {'over bare':>10}")
+    print(f"{'bare interpreter':<34} {baseline:10.1f} {0.0:10.1f}")
+    print(f"{'import handlers + openai':<34} {full:10.1f} {full - baseline:10.1f}")
+
+    worst = 0.0
+    with tempfile.TemporaryDirectory() as tmp:
+        for label, (name, payload) in _REJECTED.items():
+            path = os.path.join(tmp, "event.json")
+            with open(path, "w", encoding="utf-8") as fh:
+                json.dump(payload, fh)
+            case_env = dict(env, GITHUB_EVENT_NAME=name)
+            took = _time_process([sys.executable, "-m", "ticketwatcher", "--event-file", path], case_env, args.repeat)
+            worst = max(worst, took)
+            print(f"{'reject: ' + label:<34} {took:10.1f} {took - baseline:10.1f}")
+
+    if args.max_reject_ms and worst > args.max_reject_ms:
+        print(f"FAIL: rejected events take {worst:.1f} ms > {args.max_reject_ms} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
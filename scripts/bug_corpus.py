@@ -0,0 +1,805 @@
+# scripts/bug_corpus.py
+"""Mutation-based bug corpus: seeded bugs as issue events, fixed and scored end to end.
+
+Usage:
+    python scripts/bug_corpus.py generate --package src/app --out corpus.jsonl
+    python scripts/bug_corpus.py run corpus.jsonl --concurrency 8 --save report.json --baseline last.json
+    python scripts/bug_corpus.py run corpus.jsonl --llm-url https://api.openai.com/v1 --model gpt-4o-mini
+
+``generate`` applies one mutation at a time to every module of
+``--package`` (a misspelled package-internal import, a dropped None/missing
+key guard, a flipped comparison or a constant off by one, a wrong default
+argument or ``dict.get`` default), runs the tests that import the package
+and keeps each mutant that makes a passing test fail. Every kept mutant is
+one JSONL record holding the diff that introduced it, the reverting diff,
+the tests it breaks and a ``labeled`` issue event whose body is the
+captured traceback.
+
+``run`` serves every mutant as its own repository on the fake GitHub from
+fake_services.py and drives the events through ``handle_issue_event``. The
+LLM is an oracle answering with the reverting diff, which measures the
+pipeline alone, unless ``--llm-url`` points at a real OpenAI-compatible
+endpoint. Each PR branch is then tested again: a ticket counts as fixed when
+every test that passes on the unmutated package passes on the branch. The
+report gives success rate, fixes per hour and tokens per fix per operator;
+``--save`` and ``--baseline`` compare them across versions.
+"""
+import argparse
+import ast
+import difflib
+import hashlib
+import json
+import os
+import queue
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fake_services import FakeGitHub, FakeOpenAI, SyntheticRepo  # noqa: E402
+from ticketwatcher.diff_utils import apply_file_patch, parse_patch  # noqa: E402
+
+OPERATORS = ("import", "none_guard", "off_by_one", "default")
+CORPUS_OWNER = "corpus"
+# The exception line of a traceback ("KeyError: 'name'", pytest's "E   ImportError: ...").
+_RE_RAISED = re.compile(r"^(?:E\s+)?((?:[A-Za-z_]\w*\.)*[A-Za-z_]\w*(?:Error|Exception)\b.*)$")
+_SKIP_DIRS = (".git", "__pycache__", ".venv", "venv", "node_modules", ".pytest_cache", "*.egg-info")
+
+
+@dataclass
+class Mutation:
+    operator: str
+    path: str
+    line: int
+    description: str
+    text: str  # the whole mutated module
+
+
+# --- mutation operators ----------------------------------------------------------
+
+
+def _replace(lines: List[str], start: Tuple[int, int], end: Tuple[int, int], text: str) -> str:
+    """Module source with the span ``start``..``end`` replaced; positions are (line, UTF-8 byte column) as in ``ast``."""
+    head = lines[start[0] - 1].encode("utf-8")[: start[1]].decode("utf-8")
+    tail = lines[end[0] - 1].encode("utf-8")[end[1]:].decode("utf-8")
+    return "".join(lines[: start[0] - 1] + [head + text + tail] + lines[end[0]:])
+
+
+def _span(node: ast.AST) -> Tuple[Tuple[int, int], Tuple[int, int]]:
+    return (node.lineno, node.col_offset), (node.end_lineno, node.end_col_offset)
+
+
+def _broken_imports(tree: ast.AST, lines: List[str], path: str, package: str) -> Iterator[Mutation]:
+    for node in ast.walk(tree):
+        if not isinstance(node, ast.ImportFrom):
+            continue
+        if not node.level and (node.module or "").split(".")[0] != package:
+            continue  # only imports from the package itself fail inside it
+        source = "." * node.level + (node.module or "")
+        for alias in node.names:
+            if alias.name == "*":
+                continue
+            wrong = alias.name[:-1] if alias.name.endswith("s") else alias.name + "s"
+            start = (alias.lineno, alias.col_offset)
+            yield Mutation(
+                "import",
+                path,
+                alias.lineno,
+                f"`{alias.name}` imported from {source} as `{wrong}`",
+                _replace(lines, start, (alias.lineno, alias.col_offset + len(alias.name.encode("utf-8"))), wrong),
+            )
+
+
+def _is_guard(test: ast.expr) -> bool:
+    if isinstance(test, ast.Compare) and len(test.ops) == 1:
+        op, right = test.ops[0], test.comparators[0]
+        if isinstance(op, (ast.Is, ast.Eq)) and isinstance(right, ast.Constant) and right.value is None:
+            return True
+        return isinstance(op, ast.NotIn)
+    return isinstance(test, ast.UnaryOp) and isinstance(test.op, ast.Not) and isinstance(test.operand, (ast.Name, ast.Attribute))
+
+
+def _dropped_guards(tree: ast.AST, lines: List[str], path: str, package: str) -> Iterator[Mutation]:
+    for node in ast.walk(tree):
+        if (
+            isinstance(node, ast.If)
+            and not node.orelse
+            and len(node.body) == 1
+            and isinstance(node.body[0], (ast.Return, ast.Raise, ast.Continue))
+            and _is_guard(node.test)
+        ):
+            text = "".join(lines[: node.lineno - 1] + lines[node.end_lineno:])
+            yield Mutation("none_guard", path, node.lineno, f"guard `if {ast.unparse(node.test)}:` removed", text)
+
+
+_FLIPPED = {ast.Lt: "<=", ast.LtE: "<", ast.Gt: ">=", ast.GtE: ">"}
+_OP_TEXT = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">="}
+
+
+def _off_by_one(tree: ast.AST, lines: List[str], path: str, package: str) -> Iterator[Mutation]:
+    defaults = {id(d) for fn in ast.walk(tree) if isinstance(fn, (ast.FunctionDef, ast.AsyncFunctionDef)) for d in _defaults(fn)}
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Compare) and len(node.ops) == 1 and type(node.ops[0]) in _FLIPPED:
+            left, right = node.left, node.comparators[0]
+            if left.end_lineno != right.lineno:
+                continue
+            line = lines[right.lineno - 1].encode("utf-8")
+            gap = line[left.end_col_offset : right.col_offset].decode("utf-8")
+            op = _OP_TEXT[type(node.ops[0])]
+            if gap.strip() != op:
+                continue  # parenthesised operand; the operator is not where we expect it
+            col = left.end_col_offset + len(gap[: gap.index(op)].encode("utf-8"))
+            flipped = _FLIPPED[type(node.ops[0])]
+            text = _replace(lines, (right.lineno, col), (right.lineno, col + len(op)), flipped)
+            yield Mutation("off_by_one", path, node.lineno, f"`{op}` changed to `{flipped}`", text)
+        elif (
+            isinstance(node, ast.Constant)
+            and type(node.value) is int
+            and node.lineno == node.end_lineno
+            and id(node) not in defaults
+        ):
+            start, end = _span(node)
+            text = _replace(lines, start, end, str(node.value + 1))
+            yield Mutation("off_by_one", path, node.lineno, f"{node.value} changed to {node.value + 1}", text)
+
+
+def _defaults(fn: ast.AST) -> List[ast.expr]:
+    return list(fn.args.defaults) + [d for d in fn.args.kw_defaults if d is not None]
+
+
+def _wrong_default(value: Any) -> Optional[str]:
+    if isinstance(value, bool):
+        return repr(not value)
+    if value is None:
+        return "0"
+    if isinstance(value, (int, float)):
+        return "1" if value == 0 else "0"
+    if isinstance(value, str):
+        return "None" if value == "" else '""'
+    return None
+
+
+def _wrong_defaults(tree: ast.AST, lines: List[str], path: str, package: str) -> Iterator[Mutation]:
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+            for default in _defaults(node):
+                wrong = _wrong_default(default.value) if isinstance(default, ast.Constant) else None
+                if wrong is None:
+                    continue
+                start, end = _span(default)
+                text = _replace(lines, start, end, wrong)
+                yield Mutation(
+                    "default", path, default.lineno, f"default `{ast.unparse(default)}` of {node.name}() changed to `{wrong}`", text
+                )
+        elif (
+            isinstance(node, ast.Call)
+            and isinstance(node.func, ast.Attribute)
+            and node.func.attr == "get"
+            and len(node.args) == 2
+            and not node.keywords
+        ):
+            key, fallback = node.args
+            text = _replace(lines, (key.end_lineno, key.end_col_offset), (fallback.end_lineno, fallback.end_col_offset), "")
+            yield Mutation("default", path, node.lineno, f"default `{ast.unparse(fallback)}` dropped from .get()", text)
+
+
+_OPERATOR_FUNCS: Dict[str, Callable[..., Iterator[Mutation]]] = {
+    "import": _broken_imports,
+    "none_guard": _dropped_guards,
+    "off_by_one": _off_by_one,
+    "default": _wrong_defaults,
+}
+
+
+def package_modules(root: str, package: str) -> List[str]:
+    """Repo-relative paths of the package's Python modules."""
+    found = []
+    for dirpath, dirnames, filenames in os.walk(os.path.join(root, package)):
+        dirnames[:] = sorted(d for d in dirnames if d != "__pycache__")
+        found += [os.path.relpath(os.path.join(dirpath, f), root).replace(os.sep, "/") for f in sorted(filenames) if f.endswith(".py")]
+    return found
+
+
+def mutations(root: str, package: str, operators: Sequence[str] = OPERATORS) -> Iterator[Mutation]:
+    """Every distinct mutant of every module that still compiles, module by module."""
+    name = os.path.basename(package.rstrip("/"))
+    for path in package_modules(root, package):
+        source = _read(root, path)
+        try:
+            tree = ast.parse(source)
+        except SyntaxError:
+            continue
+        lines = source.splitlines(keepends=True)
+        seen = {source}
+        for operator in operators:
+            for mutation in _OPERATOR_FUNCS[operator](tree, lines, path, name):
+                if mutation.text in seen:
+                    continue
+                seen.add(mutation.text)
+                try:
+                    compile(mutation.text, path, "exec")
+                except SyntaxError:
+                    continue
+                yield mutation
+
+
+# --- running the package's tests ---------------------------------------------------
+
+
+@dataclass
+class TestRun:
+    passed: Set[str] = field(default_factory=set)
+    # test id -> (short message, traceback)
+    failures: Dict[str, Tuple[str, str]] = field(default_factory=dict)
+    timed_out: bool = False
+
+
+class Workspace:
+    """A scratch copy of the checkout; files are overridden for one test run and then restored."""
+
+    def __init__(self, root: str, package: str, tests: Sequence[str], timeout: float = 60.0) -> None:
+        self.root = root
+        self.tests = list(tests)
+        self.timeout = timeout
+        self.dir = tempfile.mkdtemp(prefix="bug-corpus-")
+        shutil.copytree(root, self.dir, dirs_exist_ok=True, ignore=shutil.ignore_patterns(*_SKIP_DIRS))
+        self._pythonpath = os.pathsep.join([os.path.join(self.dir, os.path.dirname(package.rstrip("/"))), self.dir])
+
+    def run(self, files: Optional[Dict[str, str]] = None) -> TestRun:
+        originals = {}
+        for path, text in (files or {}).items():
+            originals[path] = _read(self.dir, path)
+            _write(self.dir, path, text)
+        try:
+            return self._pytest()
+        finally:
+            for path, text in originals.items():
+                _write(self.dir, path, text)
+
+    def _pytest(self) -> TestRun:
+        report = os.path.join(self.dir, ".bug-corpus-junit.xml")
+        # No bytecode: a mutant written within the same second and with the same
+        # size as the last one would otherwise be served from a stale .pyc.
+        env = dict(os.environ, PYTHONPATH=self._pythonpath, PYTHONDONTWRITEBYTECODE="1")
+        cmd = [sys.executable, "-m", "pytest", "-q", "-p", "no:cacheprovider", "--tb=native", f"--junitxml={report}", *self.tests]
+        try:
+            subprocess.run(cmd, cwd=self.dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, timeout=self.timeout)
+        except subprocess.TimeoutExpired:
+            return TestRun(timed_out=True)
+        result = TestRun()
+        if not os.path.exists(report):
+            return result
+        for case in ET.parse(report).iter("testcase"):
+            if case.find("skipped") is not None:
+                continue
+            test_id = f"{case.get('classname', '')}::{case.get('name', '')}"
+            problem = case.find("failure")
+            if problem is None:
+                problem = case.find("error")
+            if problem is None:
+                result.passed.add(test_id)
+            else:
+                result.failures[test_id] = (problem.get("message") or "", self._relative(problem.text or ""))
+        os.remove(report)
+        return result
+
+    def _relative(self, text: str) -> str:
+        return text.replace(self.dir + os.sep, "").replace(self.dir, ".")
+
+    def close(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+
+def find_tests(root: str, package: str) -> List[str]:
+    """Test files under ``root`` that import the package."""
+    name = os.path.basename(package.rstrip("/"))
+    imports = re.compile(rf"^\s*(?:from|import)\s+{re.escape(name)}\b", re.MULTILINE)
+    found = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith(".") and d not in {"__pycache__", "node_modules", "venv"})
+        for filename in sorted(filenames):
+            if filename.startswith("test_") and filename.endswith(".py"):
+                path = os.path.relpath(os.path.join(dirpath, filename), root).replace(os.sep, "/")
+                if imports.search(_read(root, path)):
+                    found.append(path)
+    return found
+
+
+def _workspaces(root: str, package: str, tests: Sequence[str], jobs: int, timeout: float) -> "queue.Queue[Workspace]":
+    pool: "queue.Queue[Workspace]" = queue.Queue()
+    for _ in range(max(1, jobs)):
+        pool.put(Workspace(root, package, tests, timeout))
+    return pool
+
+
+def _in_workspace(pool: "queue.Queue[Workspace]", files: Optional[Dict[str, str]]) -> TestRun:
+    workspace = pool.get()
+    try:
+        return workspace.run(files)
+    finally:
+        pool.put(workspace)
+
+
+def _close_all(pool: "queue.Queue[Workspace]") -> None:
+    while not pool.empty():
+        pool.get().close()
+
+
+# --- generate ----------------------------------------------------------------------
+
+
+@dataclass
+class GenerateStats:
+    tried: Dict[str, int] = field(default_factory=dict)
+    kept: Dict[str, int] = field(default_factory=dict)
+    timed_out: int = 0
+
+    def format(self) -> str:
+        lines = [f"{'operator':<12} {'mutants':>8} {'kept':>6} {'survived':>9}"]
+        for operator in OPERATORS:
+            if operator in self.tried:
+                tried, kept = self.tried[operator], self.kept.get(operator, 0)
+                lines.append(f"{operator:<12} {tried:8d} {kept:6d} {tried - kept:9d}")
+        lines.append(f"{sum(self.kept.values())} record(s); {self.timed_out} mutant(s) timed out")
+        return "\n".join(lines)
+
+
+def _diff(path: str, before: str, after: str) -> str:
+    lines = difflib.unified_diff(before.splitlines(), after.splitlines(), f"a/{path}", f"b/{path}", lineterm="")
+    return "\n".join(lines) + "\n"
+
+
+def _test_file(test_id: str, tests: Sequence[str]) -> str:
+    """Test file of a JUnit id (``classname::name``; collection errors name the module instead)."""
+    classname, _, name = test_id.partition("::")
+    for path in tests:
+        module = path[: -len(".py")].replace("/", ".")
+        if (classname or name) == module or (classname or name).startswith(module + "."):
+            return path
+    return classname or name
+
+
+def _sha(text: str) -> str:
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+def _issue_event(record_id: str, number: int, label: str, message: str, traceback: str, tests: Sequence[str]) -> Dict[str, Any]:
+    raised = [m.group(1) for m in map(_RE_RAISED.match, reversed(traceback.strip().splitlines())) if m]
+    summary = (raised or message.strip().splitlines() or ["tests fail"])[0]
+    body = (
+        f"These tests started failing: {', '.join(tests)}\n\n"
+        + "\n".join(traceback.strip().splitlines()[-60:])
+        + "\n"
+    )
+    return {
+        "action": "labeled",
+        "label": {"name": label},
+        "issue": {
+            "number": number,
+            "title": f"[{record_id}] {summary[:100]}",
+            "body": body,
+            "labels": [{"name": label}],
+        },
+        "repository": {"full_name": f"{CORPUS_OWNER}/{record_id}"},
+    }
+
+
+def generate(
+    root: str,
+    package: str,
+    *,
+    tests: Optional[Sequence[str]] = None,
+    operators: Sequence[str] = OPERATORS,
+    sample: int = 0,
+    seed: int = 1,
+    jobs: int = 4,
+    timeout: float = 60.0,
+    label: str = "agent-fix",
+) -> Tuple[List[Dict[str, Any]], GenerateStats]:
+    """Mutants of ``package`` that break at least one passing test, as corpus records."""
+    tests = list(tests) if tests is not None else find_tests(root, package)
+    if not tests:
+        raise ValueError(f"no tests under {root} import {package}")
+    candidates = list(mutations(root, package, operators))
+    if sample and sample < len(candidates):
+        picked = sorted(random.Random(seed).sample(range(len(candidates)), sample))
+        candidates = [candidates[i] for i in picked]
+    stats = GenerateStats()
+    pool = _workspaces(root, package, tests, jobs, timeout)
+    try:
+        baseline = _in_workspace(pool, None)
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            runs = list(executor.map(lambda m: _in_workspace(pool, {m.path: m.text}), candidates))
+    finally:
+        _close_all(pool)
+
+    records: List[Dict[str, Any]] = []
+    for mutation, run in zip(candidates, runs):
+        stats.tried[mutation.operator] = stats.tried.get(mutation.operator, 0) + 1
+        if run.timed_out:
+            stats.timed_out += 1
+            continue
+        broken = sorted(baseline.passed - run.passed)
+        new_failures = [(tid, failure) for tid, failure in run.failures.items() if tid not in baseline.failures]
+        if not broken or not new_failures:
+            continue
+        stats.kept[mutation.operator] = stats.kept.get(mutation.operator, 0) + 1
+        message, traceback = new_failures[0][1]
+        record_id = f"m{len(records) + 1:04d}"
+        original = _read(root, mutation.path)
+        failing_files = sorted({_test_file(tid, tests) for tid in broken})
+        records.append(
+            {
+                "id": record_id,
+                "operator": mutation.operator,
+                "package": package.rstrip("/"),
+                "path": mutation.path,
+                "line": mutation.line,
+                "description": mutation.description,
+                "source_sha": _sha(original),
+                "mutant_sha": _sha(mutation.text),
+                "diff": _diff(mutation.path, original, mutation.text),
+                "fix": _diff(mutation.path, mutation.text, original),
+                "tests": tests,
+                "failing_tests": broken,
+                "event": _issue_event(record_id, len(records) + 1, label, message, traceback, failing_files),
+            }
+        )
+    return records, stats
+
+
+# --- run -------------------------------------------------------------------------
+
+
+@dataclass
+class CorpusResult:
+    version: str
+    tickets: int
+    prs: int
+    fixed: int
+    wall: float
+    llm_calls: int = 0
+    tokens: int = 0
+    # operator -> [tickets, fixed]
+    by_operator: Dict[str, List[int]] = field(default_factory=dict)
+    unfixed: List[str] = field(default_factory=list)
+
+    @property
+    def success_rate(self) -> float:
+        return self.fixed / self.tickets if self.tickets else 0.0
+
+    @property
+    def fixes_per_hour(self) -> float:
+        return self.fixed * 3600 / self.wall if self.wall else 0.0
+
+    @property
+    def tokens_per_fix(self) -> float:
+        return self.tokens / self.fixed if self.fixed else 0.0
+
+    def metrics(self) -> Dict[str, float]:
+        return {
+            "success_rate": self.success_rate,
+            "fixes_per_hour": self.fixes_per_hour,
+            "tokens_per_fix": self.tokens_per_fix,
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "version": self.version,
+            "tickets": self.tickets,
+            "prs": self.prs,
+            "fixed": self.fixed,
+            "wall": self.wall,
+            "llm_calls": self.llm_calls,
+            "tokens": self.tokens,
+            "by_operator": self.by_operator,
+            "unfixed": self.unfixed,
+            **self.metrics(),
+        }
+
+    def format(self, baseline: Optional[Dict[str, Any]] = None) -> str:
+        lines = [
+            f"{self.version}: {self.tickets} ticket(s), {self.prs} PR(s), {self.fixed} fixed in {self.wall:.1f}s",
+            f"success rate {self.success_rate:.1%}, {self.fixes_per_hour:,.0f} fixes/hour,"
+            f" {self.tokens_per_fix:,.0f} tokens/fix over {self.llm_calls} LLM call(s)",
+            "",
+            f"{'operator':<12} {'tickets':>8} {'fixed':>6} {'rate':>7}",
+        ]
+        for operator, (tickets, fixed) in sorted(self.by_operator.items()):
+            lines.append(f"{operator:<12} {tickets:8d} {fixed:6d} {fixed / max(1, tickets):7.1%}")
+        if self.unfixed:
+            lines.append(f"unfixed: {', '.join(self.unfixed)}")
+        if baseline:
+            lines += ["", f"against {baseline.get('version', 'baseline')}:"]
+            for name, value in self.metrics().items():
+                before = baseline.get(name, 0.0)
+                change = f"{value / before - 1:+.1%}" if before else "n/a"
+                lines.append(f"  {name:<15} {before:12,.2f} -> {value:12,.2f}  ({change})")
+        return "\n".join(lines)
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as fh:
+        return [json.loads(line) for line in fh if line.strip()]
+
+
+def mutant_files(root: str, record: Dict[str, Any]) -> Dict[str, str]:
+    """The package (and its failing tests) as the mutant's repository serves it."""
+    original = _read(root, record["path"])
+    if _sha(original) != record["source_sha"]:
+        raise ValueError(f"{record['id']}: {record['path']} changed since the corpus was generated; regenerate it")
+    (file_patch,) = parse_patch(record["diff"]).files
+    mutant = apply_file_patch(original, file_patch)
+    if _sha(mutant) != record["mutant_sha"]:
+        raise ValueError(f"{record['id']}: the stored diff no longer reproduces the mutant")
+    files = {path: _read(root, path) for path in package_modules(root, record["package"]) + list(record["tests"])}
+    files[record["path"]] = mutant
+    return files
+
+
+def oracle(records: Sequence[Dict[str, Any]]) -> Callable[[str], Dict[str, Any]]:
+    """Fake LLM responder that proposes each ticket's reverting diff."""
+    by_id = {record["id"]: record for record in records}
+
+    def respond(prompt: str) -> Dict[str, Any]:
+        match = re.search(r"^Title: \[(m\d+)\]", prompt, re.MULTILINE)
+        record = by_id.get(match.group(1)) if match else None
+        if record is None:
+            return {"action": "request_context", "needs": [], "reason": "not a corpus ticket"}
+        changed = sum(1 for line in record["fix"].splitlines() if line[:1] in "+-" and line[:3] not in {"+++", "---"})
+        return {
+            "action": "propose_patch",
+            "format": "unified_diff",
+            "diff": record["fix"],
+            "files_touched": [record["path"]],
+            "estimated_changed_lines": changed,
+            "notes": f"Restore the original code: {record['description']}.",
+        }
+
+    return respond
+
+
+def _version(root: str) -> str:
+    try:
+        out = subprocess.run(
+            ["git", "-C", root, "describe", "--always", "--dirty"], capture_output=True, text=True, timeout=10, check=True
+        )
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    return out.stdout.strip() or "unknown"
+
+
+def run_corpus(
+    records: Sequence[Dict[str, Any]],
+    *,
+    root: str = ".",
+    concurrency: int = 4,
+    jobs: int = 4,
+    llm_url: str = "",
+    model: str = "",
+    llm_latency: float = 0.0,
+    timeout: float = 60.0,
+) -> CorpusResult:
+    """Drive every record through the real handlers against local stand-ins and test the PRs."""
+    from ticketwatcher import github_api, handlers, usage
+    from ticketwatcher.paths import parse_allowed_paths_env
+    from ticketwatcher.repos import RepoContext, RepoRegistry
+    from ticketwatcher.state import RunStore
+
+    served = {record["id"]: mutant_files(root, record) for record in records}
+    saved: List[Tuple[Any, str, Any]] = []
+
+    def patch(obj: Any, name: str, value: Any) -> None:
+        saved.append((obj, name, getattr(obj, name)))
+        setattr(obj, name, value)
+
+    with ExitStack() as stack:
+        gh = stack.enter_context(FakeGitHub(SyntheticRepo(files=0)))
+        contexts = {}
+        for record in records:
+            full_name = f"{CORPUS_OWNER}/{record['id']}"
+            gh.add_repo(full_name, served[record["id"]])
+            contexts[full_name] = RepoContext(
+                full_name=full_name,
+                token="corpus-token",
+                api_url=gh.url,
+                settings={"allowed_paths": parse_allowed_paths_env(record["package"] + "/"), "repo_name": record["id"]},
+            )
+        env = {"OPENAI_BASE_URL": llm_url, "TICKETWATCHER_BASE_BRANCH": ""}
+        llm = None
+        if not llm_url:
+            llm = stack.enter_context(FakeOpenAI(SyntheticRepo(files=0), latency=llm_latency, respond=oracle(records)))
+            env.update(OPENAI_BASE_URL=f"{llm.url}/v1", OPENAI_API_KEY="corpus-key")
+        if model:
+            env["TICKETWATCHER_MODEL"] = model
+        old_env = {key: os.environ.get(key) for key in env}
+        os.environ.update(env)
+        patch(handlers, "_REPOS", RepoRegistry(contexts))
+        patch(handlers, "VERIFY_PATCHES", False)
+        patch(handlers, "DEDUPE", "off")
+        patch(handlers, "_RUN_STORE", RunStore(":memory:"))
+        patch(handlers, "_AGENT_CLIENT", None)
+        label = sorted(handlers.TRIGGER_LABELS)[0]
+        events = []
+        for record in records:
+            event = json.loads(json.dumps(record["event"]))
+            event["label"] = {"name": label}
+            event["issue"]["labels"] = [{"name": label}]
+            events.append(event)
+        calls, tokens = usage.TOTAL.calls, usage.TOTAL.total_tokens
+        try:
+            handlers.warm_clients()
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+                urls = list(executor.map(handlers.handle_issue_event, events))
+            wall = time.perf_counter() - started
+        finally:
+            github_api.enable_session_reuse(False)
+            for obj, attr, value in reversed(saved):
+                setattr(obj, attr, value)
+            for key, value in old_env.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+        heads = {pull["repo"]: pull.get("head") for pull in gh.pulls}
+        branches = {name: files.get(heads.get(name) or "", {}) for name, files in gh.repos.items()}
+
+    fixed = _score(records, branches, urls, root, jobs, timeout)
+    result = CorpusResult(
+        version=_version(root),
+        tickets=len(records),
+        prs=sum(1 for url in urls if url),
+        fixed=sum(fixed),
+        wall=wall,
+        llm_calls=usage.TOTAL.calls - calls,
+        tokens=usage.TOTAL.total_tokens - tokens,
+    )
+    for record, ok in zip(records, fixed):
+        row = result.by_operator.setdefault(record["operator"], [0, 0])
+        row[0] += 1
+        row[1] += int(ok)
+        if not ok:
+            result.unfixed.append(record["id"])
+    return result
+
+
+def _score(
+    records: Sequence[Dict[str, Any]],
+    branches: Dict[str, Dict[str, str]],
+    urls: Sequence[Optional[str]],
+    root: str,
+    jobs: int,
+    timeout: float,
+) -> List[bool]:
+    """Whether each PR branch passes every test the unmutated package passes."""
+    if not records:
+        return []
+    tests = sorted({test for record in records for test in record["tests"]})
+    pool = _workspaces(root, records[0]["package"], tests, jobs, timeout)
+    try:
+        baseline = _in_workspace(pool, None)
+
+        def check(item: Tuple[Dict[str, Any], Optional[str]]) -> bool:
+            record, url = item
+            branch = branches.get(f"{CORPUS_OWNER}/{record['id']}") or {}
+            if not url or not branch:
+                return False
+            changed = {path: text for path, text in branch.items() if text != _read(root, path)}
+            run = _in_workspace(pool, changed)
+            return not run.timed_out and baseline.passed <= run.passed
+
+        with ThreadPoolExecutor(max_workers=max(1, jobs)) as executor:
+            return list(executor.map(check, zip(records, urls)))
+    finally:
+        _close_all(pool)
+
+
+# --- helpers and CLI ---------------------------------------------------------------
+
+
+def _read(root: str, path: str) -> str:
+    try:
+        with open(os.path.join(root, path), "r", encoding="utf-8") as fh:
+            return fh.read()
+    except FileNotFoundError:
+        return ""
+
+
+def _write(root: str, path: str, text: str) -> None:
+    with open(os.path.join(root, path), "w", encoding="utf-8") as fh:
+        fh.write(text)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    gen = sub.add_parser("generate", help="mutate a package and write issue-event fixtures")
+    gen.add_argument("--root", default=".", help="checkout holding the package and its tests")
+    gen.add_argument("--package", default="src/app", help="package directory to mutate, relative to --root")
+    gen.add_argument("--tests", default="", help="comma-separated test files (default: those importing the package)")
+    gen.add_argument("--operators", default=",".join(OPERATORS))
+    gen.add_argument("--sample", type=int, default=0, help="test only this many randomly chosen mutants")
+    gen.add_argument("--seed", type=int, default=1)
+    gen.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="test runs in parallel")
+    gen.add_argument("--timeout", type=float, default=60.0, help="seconds per test run")
+    gen.add_argument("--label", default="agent-fix")
+    gen.add_argument("--out", required=True, help="JSONL file to write")
+
+    run = sub.add_parser("run", help="drive a corpus through the pipeline and score the PRs")
+    run.add_argument("corpus")
+    run.add_argument("--root", default=".")
+    run.add_argument("--concurrency", type=int, default=4, help="issue events handled in parallel")
+    run.add_argument("--jobs", type=int, default=os.cpu_count() or 2, help="test runs in parallel while scoring")
+    run.add_argument("--timeout", type=float, default=60.0, help="seconds per test run")
+    run.add_argument("--llm-url", default="", help="real OpenAI-compatible base URL (default: the oracle)")
+    run.add_argument("--model", default="", help="model name for --llm-url")
+    run.add_argument("--llm-latency-ms", type=float, default=0.0, help="oracle response delay")
+    run.add_argument("--save", default="", help="write the report as JSON")
+    run.add_argument("--baseline", default="", help="earlier --save output to compare against")
+    run.add_argument("--min-success", type=float, default=0.0, help="fail below this success rate (0-1)")
+    args = parser.parse_args(argv)
+
+    if args.command == "generate":
+        operators = [op.strip() for op in args.operators.split(",") if op.strip()]
+        unknown = sorted(set(operators) - set(OPERATORS))
+        if unknown:
+            parser.error(f"unknown operator(s): {', '.join(unknown)}")
+        tests = [t.strip() for t in args.tests.split(",") if t.strip()] or None
+        records, stats = generate(
+            args.root,
+            args.package,
+            tests=tests,
+            operators=operators,
+            sample=args.sample,
+            seed=args.seed,
+            jobs=args.jobs,
+            timeout=args.timeout,
+            label=args.label,
+        )
+        with open(args.out, "w", encoding="utf-8") as fh:
+            for record in records:
+                fh.write(json.dumps(record) + "\n")
+        print(stats.format())
+        return 0 if records else 1
+
+    result = run_corpus(
+        load_corpus(args.corpus),
+        root=args.root,
+        concurrency=args.concurrency,
+        jobs=args.jobs,
+        llm_url=args.llm_url,
+        model=args.model,
+        llm_latency=args.llm_latency_ms / 1000,
+        timeout=args.timeout,
+    )
+    baseline = None
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as fh:
+            baseline = json.load(fh)
+    print(result.format(baseline))
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as fh:
+            json.dump(result.to_dict(), fh, indent=2)
+    if args.min_success and result.success_rate < args.min_success:
+        print(f"FAIL: success rate {result.success_rate:.1%} < {args.min_success:.1%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
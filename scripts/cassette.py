@@ -0,0 +1,339 @@
+# scripts/cassette.py
+"""Record real GitHub/OpenAI traffic of a run into a cassette and replay it offline.
+
+Usage:
+    python scripts/cassette.py record -o slow-run.cassette.gz -- python scripts/live_test.py
+    python scripts/cassette.py replay slow-run.cassette.gz --latency zero -- python scripts/live_test.py
+    python scripts/cassette.py show slow-run.cassette.gz
+
+``record`` starts a local proxy, points the command at it through
+``GITHUB_API`` and ``OPENAI_BASE_URL`` and forwards every request upstream,
+storing method, route, status, the response body and the upstream time. Request
+headers are never stored, only an allowlist of response headers is kept, and
+token-shaped strings plus the values of known secret variables are redacted
+before anything is written. The cassette is gzip-compressed JSON lines.
+
+``replay`` serves the recorded responses from a local server, either at the
+recorded latency or with none, runs the command against it and compares call
+counts, bytes, misses and child CPU time with the recording. ``--max-extra-calls``
+and ``--max-cpu-ratio`` make it a regression gate. Downloads that bypass the
+API base URL (attached logs, gist raw files) are not captured.
+"""
+import argparse
+import base64
+import gzip
+import hashlib
+import json
+import os
+import re
+import resource
+import subprocess
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from ticketwatcher.telemetry import route_template  # noqa: E402
+
+UPSTREAMS = {
+    "github": os.getenv("GITHUB_API", "https://api.github.com"),
+    "openai": (os.getenv("OPENAI_BASE_URL") or "https://api.openai.com/v1").rstrip("/"),
+}
+SECRET_VARS = ("GITHUB_TOKEN", "GH_TOKEN", "OPENAI_API_KEY", "TICKETWATCHER_WEBHOOK_SECRET")
+_TOKEN_RE = re.compile(r"gh[pousr]_[A-Za-z0-9]{20,}|github_pat_[A-Za-z0-9_]{20,}|sk-[A-Za-z0-9_-]{20,}")
+_KEEP_HEADERS = ("content-type", "etag", "link", "retry-after", "x-ratelimit-remaining")
+# Link headers point at the upstream; stored relative to this placeholder.
+_BASE = "{base}"
+FORMAT_VERSION = 1
+
+
+def redact(text: str, secrets: Tuple[str, ...] = ()) -> str:
+    for secret in secrets:
+        if secret:
+            text = text.replace(secret, "<redacted>")
+    return _TOKEN_RE.sub("<redacted>", text)
+
+
+def _env_secrets() -> Tuple[str, ...]:
+    # Longest first so a secret containing another is not half-replaced.
+    return tuple(sorted({os.environ.get(name, "") for name in SECRET_VARS} - {""}, key=len, reverse=True))
+
+
+def _route(upstream: str, path: str) -> str:
+    if upstream == "github":
+        return route_template(path.split("?", 1)[0])
+    return path.split("?", 1)[0]
+
+
+class Cassette:
+    """An ordered list of interactions plus run metadata, stored as gzip JSON lines."""
+
+    def __init__(self, interactions: Optional[List[Dict[str, Any]]] = None, meta: Optional[Dict[str, Any]] = None) -> None:
+        self.interactions = interactions or []
+        self.meta = meta or {}
+
+    @classmethod
+    def load(cls, path: str) -> "Cassette":
+        with gzip.open(path, "rt", encoding="utf-8") as fh:
+            header = json.loads(fh.readline())
+            if header.get("version") != FORMAT_VERSION:
+                raise ValueError(f"unsupported cassette version {header.get('version')!r}")
+            return cls([json.loads(line) for line in fh if line.strip()], header.get("meta") or {})
+
+    def save(self, path: str) -> None:
+        with gzip.open(path, "wt", encoding="utf-8", compresslevel=9) as fh:
+            fh.write(json.dumps({"version": FORMAT_VERSION, "meta": self.meta}) + "\n")
+            for interaction in self.interactions:
+                fh.write(json.dumps(interaction, separators=(",", ":")) + "\n")
+
+    def summary(self) -> Dict[str, List[float]]:
+        """``"upstream METHOD route" -> [calls, bytes sent, bytes received, upstream seconds]``."""
+        rows: Dict[str, List[float]] = {}
+        for item in self.interactions:
+            row = rows.setdefault(f"{item['upstream']} {item['method']} {item['route']}", [0, 0, 0, 0.0])
+            row[0] += 1
+            row[1] += item["request_bytes"]
+            row[2] += item["response_bytes"]
+            row[3] += item["elapsed"]
+        return rows
+
+
+def _body_fields(data: bytes, secrets: Tuple[str, ...]) -> Dict[str, Any]:
+    try:
+        return {"body": redact(data.decode("utf-8"), secrets)}
+    except UnicodeDecodeError:
+        return {"body": base64.b64encode(data).decode("ascii"), "b64": True}
+
+
+def _body_bytes(item: Dict[str, Any]) -> bytes:
+    if item.get("b64"):
+        return base64.b64decode(item["body"])
+    return item["body"].encode("utf-8")
+
+
+class _ProxyServer:
+    """Threaded local HTTP server routing ``/<upstream>/...`` to :meth:`handle`."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _handle(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                upstream, _, rest = self.path.lstrip("/").partition("/")
+                status, headers, data = server.handle(upstream, self.command, "/" + rest, dict(self.headers), body)
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _handle
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def env(self) -> Dict[str, str]:
+        """Environment pointing TicketWatcher (and the OpenAI SDK) at this server."""
+        return {"GITHUB_API": f"{self.url}/github", "OPENAI_BASE_URL": f"{self.url}/openai"}
+
+    def handle(self, upstream: str, method: str, path: str, headers: Dict[str, str], body: bytes):
+        raise NotImplementedError
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc: Any) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class RecordingProxy(_ProxyServer):
+    """Forward to the real upstreams and append every exchange to ``self.cassette``."""
+
+    def __init__(self, upstreams: Optional[Dict[str, str]] = None, secrets: Optional[Tuple[str, ...]] = None) -> None:
+        super().__init__()
+        self.upstreams = dict(upstreams or UPSTREAMS)
+        self.secrets = _env_secrets() if secrets is None else secrets
+        self.cassette = Cassette(meta={"recorded": time.time(), "upstreams": sorted(self.upstreams)})
+        self._local = threading.local()
+
+    def _session(self):
+        session = getattr(self._local, "session", None)
+        if session is None:
+            session = self._local.session = requests.Session()
+        return session
+
+    def handle(self, upstream: str, method: str, path: str, headers: Dict[str, str], body: bytes):
+        base = self.upstreams.get(upstream)
+        if base is None:
+            return 404, {"Content-Type": "application/json"}, b'{"message": "unknown upstream"}'
+        forward = {k: v for k, v in headers.items() if k.lower() not in ("host", "content-length", "accept-encoding", "connection")}
+        started = time.perf_counter()
+        r = self._session().request(method, base + path, headers=forward, data=body or None, timeout=120)
+        elapsed = time.perf_counter() - started
+        data = r.content
+        kept = {k: v for k, v in r.headers.items() if k.lower() in _KEEP_HEADERS}
+        if "Link" in kept:
+            kept["Link"] = kept["Link"].replace(base, _BASE)
+        item = {
+            "upstream": upstream,
+            "method": method,
+            "path": redact(path, self.secrets),
+            "route": _route(upstream, path),
+            "status": r.status_code,
+            "headers": {k: redact(v, self.secrets) for k, v in kept.items()},
+            "elapsed": round(elapsed, 4),
+            "request_bytes": len(body),
+            "request_sha": hashlib.sha256(body).hexdigest()[:16] if body else None,
+            "response_bytes": len(data),
+            **_body_fields(data, self.secrets),
+        }
+        with self.lock:
+            self.cassette.interactions.append(item)
+        if "Link" in kept:
+            kept["Link"] = kept["Link"].replace(_BASE, f"{self.url}/{upstream}")
+        return r.status_code, kept, data
+
+
+class ReplayServer(_ProxyServer):
+    """Serve recorded responses in order per ``(upstream, method, path)``.
+
+    When a key's recordings are used up the last one is repeated; requests
+    that were never recorded get a 404 and are counted as misses.
+    """
+
+    def __init__(self, cassette: Cassette, latency: str = "zero") -> None:
+        super().__init__()
+        self.latency = latency
+        self.queues: Dict[Tuple[str, str, str], List[Dict[str, Any]]] = {}
+        for item in cassette.interactions:
+            self.queues.setdefault((item["upstream"], item["method"], item["path"]), []).append(item)
+        self.served = Cassette()
+        self.misses: List[str] = []
+
+    def handle(self, upstream: str, method: str, path: str, headers: Dict[str, str], body: bytes):
+        with self.lock:
+            queue = self.queues.get((upstream, method, path))
+            if not queue:
+                self.misses.append(f"{upstream} {method} {path}")
+                return 404, {"Content-Type": "application/json"}, b'{"message": "not in cassette"}'
+            item = queue.pop(0) if len(queue) > 1 else queue[0]
+        if self.latency == "recorded":
+            time.sleep(item["elapsed"])
+        data = _body_bytes(item)
+        replayed = dict(item, request_bytes=len(body), response_bytes=len(data))
+        with self.lock:
+            self.served.interactions.append(replayed)
+        out = dict(item["headers"])
+        if "Link" in out:
+            out["Link"] = out["Link"].replace(_BASE, f"{self.url}/{upstream}")
+        return item["status"], out, data
+
+
+def _run(command: List[str], env: Dict[str, str]) -> Tuple[int, float, float]:
+    """Run ``command``; return (exit code, wall seconds, child CPU seconds)."""
+    before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    code = subprocess.call(command, env=dict(os.environ, **env))
+    wall = time.perf_counter() - started
+    after = resource.getrusage(resource.RUSAGE_CHILDREN)
+    cpu = (after.ru_utime - before.ru_utime) + (after.ru_stime - before.ru_stime)
+    return code, wall, cpu
+
+
+def compare(recorded: Cassette, replayed: Cassette) -> str:
+    old, new = recorded.summary(), replayed.summary()
+    lines = [f"{'call':<64} {'recorded':>9} {'replayed':>9} {'KiB rec':>9} {'KiB now':>9}"]
+    for key in sorted(set(old) | set(new)):
+        a, b = old.get(key, [0, 0, 0, 0.0]), new.get(key, [0, 0, 0, 0.0])
+        lines.append(f"{key:<64} {a[0]:9d} {b[0]:9d} {(a[1] + a[2]) / 1024:9.1f} {(b[1] + b[2]) / 1024:9.1f}")
+    return "\n".join(lines)
+
+
+def _show(cassette: Cassette) -> None:
+    meta = cassette.meta
+    print(f"{len(cassette.interactions)} interaction(s), wall {meta.get('wall', 0):.2f}s, cpu {meta.get('cpu', 0):.2f}s")
+    print(f"{'call':<64} {'count':>6} {'KiB out':>9} {'KiB in':>9} {'upstream s':>11}")
+    for key, (n, sent, received, elapsed) in sorted(cassette.summary().items()):
+        print(f"{key:<64} {n:6d} {sent / 1024:9.1f} {received / 1024:9.1f} {elapsed:11.2f}")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest="mode", required=True)
+    rec = sub.add_parser("record", help="run a command against the live services and record its traffic")
+    rec.add_argument("-o", "--output", required=True)
+    rep = sub.add_parser("replay", help="run a command against a recorded cassette")
+    rep.add_argument("cassette")
+    rep.add_argument("--latency", choices=("zero", "recorded"), default="zero")
+    rep.add_argument("--max-extra-calls", type=int, default=-1, help="fail if the run makes more calls than recorded + N")
+    rep.add_argument("--max-cpu-ratio", type=float, default=0.0, help="fail if child CPU time exceeds recorded x R")
+    show = sub.add_parser("show", help="summarize a cassette")
+    show.add_argument("cassette")
+    argv = list(sys.argv[1:] if argv is None else argv)
+    # Everything after "--" is the command under test.
+    command = argv[argv.index("--") + 1:] if "--" in argv else []
+    args = parser.parse_args(argv[: argv.index("--")] if "--" in argv else argv)
+
+    if args.mode == "show":
+        _show(Cassette.load(args.cassette))
+        return 0
+
+    if not command:
+        parser.error("a command to run is required after --")
+
+    if args.mode == "record":
+        with RecordingProxy() as proxy:
+            code, wall, cpu = _run(command, proxy.env())
+        proxy.cassette.meta.update(command=command, exit_code=code, wall=round(wall, 3), cpu=round(cpu, 3))
+        proxy.cassette.save(args.output)
+        print(f"Recorded {len(proxy.cassette.interactions)} interaction(s) to {args.output}"
+              f" ({os.path.getsize(args.output) / 1024:.1f} KiB)")
+        return code
+
+    recorded = Cassette.load(args.cassette)
+    with ReplayServer(recorded, latency=args.latency) as server:
+        code, wall, cpu = _run(command, dict(server.env(), GITHUB_TOKEN="replay", OPENAI_API_KEY="replay"))
+    print(compare(recorded, server.served))
+    rec_cpu = recorded.meta.get("cpu") or 0.0
+    print(f"\nwall {wall:.2f}s (recorded {recorded.meta.get('wall', 0):.2f}s)  cpu {cpu:.2f}s (recorded {rec_cpu:.2f}s)"
+          f"  misses {len(server.misses)}")
+    for miss in server.misses[:20]:
+        print(f"  miss: {miss}")
+
+    failures = []
+    extra = len(server.served.interactions) + len(server.misses) - len(recorded.interactions)
+    if args.max_extra_calls >= 0 and extra > args.max_extra_calls:
+        failures.append(f"{extra} more call(s) than recorded")
+    if args.max_cpu_ratio and rec_cpu and cpu > rec_cpu * args.max_cpu_ratio:
+        failures.append(f"cpu {cpu:.2f}s > {args.max_cpu_ratio} x recorded {rec_cpu:.2f}s")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures or code else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
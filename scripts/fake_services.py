@@ -0,0 +1,340 @@
+# scripts/fake_services.py
+"""Local stand-ins for the GitHub REST/GraphQL API and an OpenAI-compatible chat endpoint.
+
+Used by ``scripts/bench_pipeline.py`` (and its tests) to run the whole
+pipeline offline. Both servers are plain ``ThreadingHTTPServer`` instances
+with keep-alive, an optional per-request delay and per-route counters of
+calls and bytes, so a benchmark measures TicketWatcher rather than the
+network.
+"""
+import base64
+import hashlib
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
+from urllib.parse import parse_qs, unquote, urlparse
+
+BUGGY_LINE = '    return data["name"]'
+FIXED_LINE = '    return data.get("name", "")'
+
+
+def _route(method: str, path: str) -> str:
+    path = re.sub(r"^/repos/[^/]+/[^/]+", "/repos/{owner}/{repo}", path)
+    path = re.sub(r"/contents/.*$", "/contents/{path}", path)
+    path = re.sub(r"/git/ref/heads/.*$", "/git/ref/heads/{branch}", path)
+    path = re.sub(r"/(issues|pulls)/\d+", r"/\1/{number}", path)
+    return f"{method} {path}"
+
+
+class SyntheticRepo:
+    """A generated Python repo: ``files`` modules of ~``lines`` lines, each with one known bug."""
+
+    def __init__(self, files: int = 50, lines: int = 200) -> None:
+        self.files: Dict[str, str] = {}
+        self.bug_lines: Dict[int, int] = {}
+        helpers = max(1, (lines - 8) // 3)
+        for i in range(files):
+            out = [f'"""Synthetic module {i}."""', ""]
+            for k in range(helpers):
+                out += [f"def helper_{i}_{k}(value):", f"    return value + {k}", ""]
+            out += [f"def load_record_{i}(data):", BUGGY_LINE, ""]
+            self.bug_lines[i] = len(out) - 1
+            self.files[self.path(i)] = "\n".join(out) + "\n"
+
+    @staticmethod
+    def path(i: int) -> str:
+        return f"src/app/mod_{i}.py"
+
+    def issue(self, number: int, module: int, label: str = "agent-fix") -> Dict[str, Any]:
+        body = (
+            f"Loading a record without a name crashes.\n\n"
+            "Traceback (most recent call last):\n"
+            f'  File "{self.path(module)}", line {self.bug_lines[module]}, in load_record_{module}\n'
+            f"{BUGGY_LINE}\n"
+            "KeyError: 'name'\n"
+        )
+        return {
+            "number": number,
+            "title": f"KeyError in load_record_{module} (report {number})",
+            "body": body,
+            "labels": [{"name": label}],
+        }
+
+    def fix_diff(self, module: int) -> str:
+        line = self.bug_lines[module]
+        path = self.path(module)
+        return (
+            f"--- a/{path}\n+++ b/{path}\n"
+            f"@@ -{line},1 +{line},1 @@\n"
+            f"-{BUGGY_LINE}\n+{FIXED_LINE}\n"
+        )
+
+
+class _Server:
+    """Shared plumbing: threaded server, latency, per-route stats.
+
+    ``latency`` is seconds per request, or a callable returning them (called
+    once per request, e.g. to inject a slow tail).
+    """
+
+    def __init__(self, latency: Union[float, Callable[[], float]] = 0.0) -> None:
+        self.latency = latency
+        self.lock = threading.Lock()
+        # route -> [calls, bytes received by the server, bytes sent back]
+        self.stats: Dict[str, List[int]] = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, delayed
+            # ACKs add ~40 ms to every keep-alive request.
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args: Any) -> None:
+                pass
+
+            def _handle(self) -> None:
+                length = int(self.headers.get("Content-Length") or 0)
+                body = self.rfile.read(length) if length else b""
+                delay = server.latency() if callable(server.latency) else server.latency
+                if delay:
+                    time.sleep(delay)
+                parsed = urlparse(self.path)
+                status, payload, *extra = server.dispatch(self.command, parsed.path, parse_qs(parsed.query), body)
+                data = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                for name, value in (extra[0] if extra else {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(data)
+                server.count(_route(self.command, parsed.path), len(body), len(data))
+
+            do_GET = do_POST = do_PUT = do_DELETE = do_PATCH = _handle
+
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.httpd.daemon_threads = True
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def dispatch(self, method: str, path: str, query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+        """``(status, payload)``, or ``(status, payload, headers)`` to send extra response headers."""
+        raise NotImplementedError
+
+    def count(self, route: str, received: int, sent: int) -> None:
+        with self.lock:
+            row = self.stats.setdefault(route, [0, 0, 0])
+            row[0] += 1
+            row[1] += received
+            row[2] += sent
+
+    def start(self) -> "_Server":
+        self._thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def __enter__(self) -> "_Server":
+        return self.start()
+
+    def __exit__(self, *exc: Any) -> None:
+        self.stop()
+
+
+def _blob_sha(text: str) -> str:
+    data = text.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+class FakeGitHub(_Server):
+    """Enough of the REST API (and a GraphQL stub) for one TicketWatcher run per issue."""
+
+    def __init__(self, repo: SyntheticRepo, latency: float = 0.0, default_branch: str = "main") -> None:
+        super().__init__(latency)
+        self.default_branch = default_branch
+        self.branches: Dict[str, Dict[str, str]] = {default_branch: dict(repo.files)}
+        # Further repositories by "owner/name"; any other name is served ``branches``.
+        self.repos: Dict[str, Dict[str, Dict[str, str]]] = {}
+        self.comments: Dict[int, List[Dict[str, Any]]] = {}
+        self.pulls: List[Dict[str, Any]] = []
+        # Head SHA -> the files at that commit, so branches can be created from an older head.
+        self.commits: Dict[str, Dict[str, str]] = {}
+
+    def add_repo(self, full_name: str, files: Dict[str, str]) -> None:
+        with self.lock:
+            self.repos[full_name] = {self.default_branch: dict(files)}
+
+    def dispatch(self, method: str, path: str, query: Dict[str, List[str]], body: bytes) -> Tuple[int, Any]:
+        if path == "/graphql" and method == "POST":
+            return self._graphql(json.loads(body or b"{}"))
+        m = re.match(r"^/repos/([^/]+)/([^/]+)(/.*)?$", path)
+        if not m:
+            return 404, {"message": "Not Found"}
+        rest = m.group(3) or ""
+        full_name = f"{m.group(1)}/{m.group(2)}"
+        payload = json.loads(body) if body else {}
+        with self.lock:
+            branches = self.repos.get(full_name, self.branches)
+            if rest == "" and method == "GET":
+                return 200, {"full_name": full_name, "default_branch": self.default_branch}
+            ref = re.match(r"^/git/ref/heads/(.+)$", rest)
+            if ref and method == "GET":
+                return self._head(branches, unquote(ref.group(1)))
+            if rest == "/git/refs" and method == "POST":
+                return self._create_ref(branches, payload)
+            contents = re.match(r"^/contents/(.+)$", rest)
+            if contents:
+                return self._contents(branches, method, unquote(contents.group(1)), query, payload)
+            if rest == "/pulls" and method == "POST":
+                number = 1000 + len(self.pulls)
+                self.pulls.append(dict(payload, number=number, repo=full_name))
+                return 201, {"number": number, "html_url": f"https://github.test/pull/{number}"}
+            comments = re.match(r"^/issues/(\d+)/comments$", rest)
+            if comments:
+                thread = self.comments.setdefault(int(comments.group(1)), [])
+                if method == "POST":
+                    thread.append({"id": len(thread) + 1, "body": payload.get("body", "")})
+                    return 201, thread[-1]
+                return 200, list(thread)
+        return 404, {"message": "Not Found"}
+
+    def _head(self, branches: Dict[str, Dict[str, str]], branch: str) -> Tuple[int, Any]:
+        files = branches.get(branch)
+        if files is None:
+            return 404, {"message": "Not Found"}
+        digest = hashlib.sha1(json.dumps(sorted(files.items())).encode("utf-8")).hexdigest()
+        self.commits[digest] = dict(files)
+        return 200, {"ref": f"refs/heads/{branch}", "object": {"sha": digest, "type": "commit"}}
+
+    def _create_ref(self, branches: Dict[str, Dict[str, str]], payload: Dict[str, Any]) -> Tuple[int, Any]:
+        branch = payload["ref"].rsplit("refs/heads/", 1)[-1]
+        if branch in branches:
+            return 422, {"message": "Reference already exists"}
+        branches[branch] = dict(self.commits.get(payload.get("sha"), branches[self.default_branch]))
+        return 201, {"ref": payload["ref"]}
+
+    def _contents(
+        self, branches: Dict[str, Dict[str, str]], method: str, path: str, query: Dict[str, List[str]], payload: Dict[str, Any]
+    ) -> Tuple[int, Any]:
+        branch = payload.get("branch") or (query.get("ref") or [self.default_branch])[0]
+        files = branches.get(branch)
+        if files is None and method == "GET":
+            files = self.commits.get(branch)  # reads at a commit SHA
+        if files is None:
+            return 404, {"message": "No commit found for the ref"}
+        if method == "GET":
+            text = files.get(path)
+            if text is None:
+                return 404, {"message": "Not Found"}
+            encoded = base64.b64encode(text.encode("utf-8")).decode("ascii")
+            return 200, {"path": path, "sha": _blob_sha(text), "encoding": "base64", "content": encoded}
+        if method == "PUT":
+            files[path] = base64.b64decode(payload["content"]).decode("utf-8")
+            return 200, {"content": {"path": path, "sha": _blob_sha(files[path])}}
+        if method == "DELETE":
+            files.pop(path, None)
+            return 200, {"commit": {}}
+        return 405, {"message": "Method Not Allowed"}
+
+    def _graphql(self, payload: Dict[str, Any]) -> Tuple[int, Any]:
+        query = payload.get("query") or ""
+        if "defaultBranchRef" in query:
+            return 200, {"data": {"repository": {"defaultBranchRef": {"name": self.default_branch}}}}
+        return 200, {"data": None, "errors": [{"message": "query not supported by the fake server"}]}
+
+
+class FakeOpenAI(_Server):
+    """OpenAI-compatible ``/v1/chat/completions`` returning canned fixes for a :class:`SyntheticRepo`.
+
+    ``context_rounds`` > 0 makes the first call for each ticket ask for more
+    context (a symbol slice), like a cautious model would. ``fault(n)``
+    returns an HTTP status to answer the ``n``-th completion request with
+    instead (``0`` for a normal answer), to simulate a provider outage.
+    ``headers(n, status)`` returns extra response headers for that request,
+    e.g. ``x-ratelimit-*`` or ``retry-after``.
+    """
+
+    def __init__(
+        self,
+        repo: SyntheticRepo,
+        latency: Union[float, Callable[[], float]] = 0.0,
+        context_rounds: int = 0,
+        respond: Optional[Callable[[str], Dict[str, Any]]] = None,
+        fault: Optional[Callable[[int], int]] = None,
+        headers: Optional[Callable[[int, int], Dict[str, str]]] = None,
+    ) -> None:
+        super().__init__(latency)
+        self.repo = repo
+        self.context_rounds = context_rounds
+        self.respond = respond or self._canned
+        self.fault = fault
+        self.headers = headers or (lambda n, status: {})
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._rounds: Dict[str, int] = {}
+
+    def dispatch(self, method: str, path: str, query: Dict[str, List[str]], body: bytes) -> Tuple[Any, ...]:
+        if method != "POST" or not path.endswith("/chat/completions"):
+            return 404, {"error": {"message": "Not Found"}}
+        with self.lock:
+            n = self.requests
+            self.requests += 1
+        status = self.fault(n) if self.fault else 0
+        if status:
+            return status, {"error": {"message": "injected failure", "type": "server_error"}}, self.headers(n, status)
+        request = json.loads(body)
+        prompt = "\n".join(message.get("content") or "" for message in request.get("messages", []))
+        content = json.dumps(self.respond(prompt))
+        # Roughly four characters per token is close enough for accounting.
+        prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+        with self.lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+        return 200, {
+            "id": "chatcmpl-fake",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "fake"),
+            "choices": [
+                {"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}
+            ],
+            "usage": {
+                "prompt_tokens": prompt_tokens,
+                "completion_tokens": completion_tokens,
+                "total_tokens": prompt_tokens + completion_tokens,
+            },
+        }, self.headers(n, 200)
+
+    def _canned(self, prompt: str) -> Dict[str, Any]:
+        match = re.search(r"load_record_(\d+)", prompt)
+        if not match:
+            return {"action": "request_context", "needs": [], "reason": "no traceback in the ticket"}
+        module = int(match.group(1))
+        title = re.search(r"^Title: (.*)$", prompt, re.MULTILINE)
+        ticket = title.group(1) if title else str(module)
+        with self.lock:
+            round_ = self._rounds.get(ticket, 0)
+            self._rounds[ticket] = round_ + 1
+        if round_ < self.context_rounds:
+            need = {"path": self.repo.path(module), "symbol": f"load_record_{module}", "line": None, "around_lines": 20}
+            return {"action": "request_context", "needs": [need], "reason": "need the failing function"}
+        return {
+            "action": "propose_patch",
+            "format": "unified_diff",
+            "diff": self.repo.fix_diff(module),
+            "files_touched": [self.repo.path(module)],
+            "estimated_changed_lines": 2,
+            "notes": "Use dict.get so records without a name load.",
+        }
@@ -0,0 +1,123 @@
+# scripts/snippet_tokens.py
+"""Measure prompt tokens per snippet encoding on real code from a checkout.
+
+Usage:
+    python scripts/snippet_tokens.py --root . --allowed src/ --samples 200
+    python scripts/snippet_tokens.py --root ../service --around 30 --modes plain,elide
+
+Cuts ``--samples`` slices the way the pipeline does (``--around`` lines either
+side of a random center line) from allowed source files, encodes them in each
+mode (see ``ticketwatcher/encoding.py``) and reports tokens, savings against
+``plain`` and the share of source lines still shown. Every compact encoding is
+decoded again and checked line by line against the file, so a mode that loses
+line numbers shows up as a failure. Tokens are counted with ``tiktoken`` when
+it is installed and estimated at four characters per token otherwise.
+"""
+import argparse
+import os
+import random
+import sys
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Sequence
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "src"))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+from ticketwatcher.budget import estimate_tokens  # noqa: E402
+from ticketwatcher.encoding import MODES, decode, encode_snippets  # noqa: E402
+from ticketwatcher.paths import compile_allowlist  # noqa: E402
+from ticketwatcher.retrieval import iter_source_files  # noqa: E402
+from ticketwatcher.snippets import _slice  # noqa: E402
+
+
+@dataclass
+class ModeStats:
+    mode: str
+    tokens: int
+    lines_shown: int
+    lines_total: int
+    mismatches: int
+
+
+def token_counter(encoding_name: str = "o200k_base") -> Callable[[str], int]:
+    try:
+        import tiktoken
+    except ImportError:
+        return estimate_tokens
+    enc = tiktoken.get_encoding(encoding_name)
+    return lambda text: len(enc.encode(text))
+
+
+def sample_snippets(files: Sequence[tuple], samples: int, around: int, seed: int = 1) -> List[Dict[str, Any]]:
+    rng = random.Random(seed)
+    usable = [(path, text.splitlines()) for path, text in files if text.strip()]
+    snippets = []
+    for _ in range(samples if usable else 0):
+        path, lines = rng.choice(usable)
+        snippets.append(_slice(path, lines, rng.randint(1, len(lines)), around))
+    return snippets
+
+
+def measure(
+    snippets: Sequence[Dict[str, Any]], sources: Dict[str, List[str]], modes: Sequence[str], count: Callable[[str], int]
+) -> List[ModeStats]:
+    results = []
+    total = sum(s["end_line"] - s["start_line"] + 1 for s in snippets)
+    for mode in modes:
+        tokens = shown = mismatches = 0
+        for snippet in snippets:
+            text = encode_snippets([snippet], mode)
+            tokens += count(text)
+            if mode == "plain":
+                shown += snippet["end_line"] - snippet["start_line"] + 1
+                continue
+            lines = decode(text).get(snippet["path"], {})
+            shown += len(lines)
+            source = sources[snippet["path"]]
+            mismatches += sum(1 for n, line in lines.items() if source[n - 1].rstrip() != line.rstrip())
+        results.append(ModeStats(mode, tokens, shown, total, mismatches))
+    return results
+
+
+def format_report(results: Sequence[ModeStats], samples: int) -> str:
+    base = next((r.tokens for r in results if r.mode == "plain"), 0)
+    lines = [
+        f"{samples} snippet(s)",
+        f"{'mode':<10} {'tokens':>9} {'per snippet':>12} {'saved':>7} {'lines shown':>12} {'mismatches':>11}",
+    ]
+    for r in results:
+        saved = f"{1 - r.tokens / base:.1%}" if base else "-"
+        shown = f"{r.lines_shown / r.lines_total:.1%}" if r.lines_total else "-"
+        lines.append(
+            f"{r.mode:<10} {r.tokens:9d} {r.tokens / max(1, samples):12.1f} {saved:>7} {shown:>12} {r.mismatches:11d}"
+        )
+    return "\n".join(lines)
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--root", default=".", help="checkout to sample from")
+    parser.add_argument("--allowed", default="", help="comma-separated allowlist (default: everything)")
+    parser.add_argument("--samples", type=int, default=200)
+    parser.add_argument("--around", type=int, default=60, help="lines either side of the center line")
+    parser.add_argument("--modes", default=",".join(MODES))
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args(argv)
+
+    files = list(iter_source_files(args.root, compile_allowlist(args.allowed.split(","))))
+    if not files:
+        print(f"No source files under {args.root}", file=sys.stderr)
+        return 1
+    modes = [mode.strip() for mode in args.modes.split(",") if mode.strip()]
+    if "plain" not in modes:
+        modes.insert(0, "plain")
+    snippets = sample_snippets(files, args.samples, args.around, args.seed)
+    sources = {path: text.splitlines() for path, text in files}
+    results = measure(snippets, sources, modes, token_counter())
+    print(format_report(results, len(snippets)))
+    return 1 if any(r.mismatches for r in results) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,11 +1,75 @@
 import os
 import json
 import re
+import threading
 from string import Template
 from typing import List, Dict, Any, Optional, Tuple
-from openai import OpenAI
 
-from .paths import allows_all_paths, is_path_allowed, parse_allowed_paths_env
+from . import budget, encoding, telemetry, usage
+from .paths import compile_allowlist, parse_allowed_paths_env
+from .ratelimit import Grant, RateLimiter, RateLimitTimeout
+from .resilience import CircuitBreaker, Hedger
+
+
+# The OpenAI SDK (with pydantic and httpx) takes most of a second to import, so
+# it is only loaded when a client is actually built. Tests replace this name.
+OpenAI: Any = None
+
+# Shared by every agent in the process: hedge delays follow the provider's
+# recent latency and the breaker sees the outcome of every call.
+HEDGER = Hedger(quantile=float(os.getenv("TICKETWATCHER_LLM_HEDGE_QUANTILE", "0.95")))
+BREAKER = CircuitBreaker(
+    "llm",
+    failure_rate=float(os.getenv("TICKETWATCHER_LLM_BREAKER_RATE", "0.5")),
+    cooldown=float(os.getenv("TICKETWATCHER_LLM_BREAKER_COOLDOWN", "30")),
+)
+
+
+# How often one call is re-queued after the provider answers 429.
+RATE_LIMIT_RETRIES = 5
+# Shared request/token buckets, built on first use so importing the agent never
+# touches the filesystem. TICKETWATCHER_LLM_RATE_DB shares them between processes.
+LIMITER: Optional[RateLimiter] = None
+_LIMITER_LOCK = threading.Lock()
+
+
+def rate_limiter() -> RateLimiter:
+    global LIMITER
+    with _LIMITER_LOCK:
+        if LIMITER is None:
+            LIMITER = RateLimiter(
+                os.getenv("TICKETWATCHER_LLM_RATE_DB") or ":memory:",
+                rpm=float(os.getenv("TICKETWATCHER_LLM_RPM", "0")),
+                tpm=float(os.getenv("TICKETWATCHER_LLM_TPM", "0")),
+            )
+        return LIMITER
+
+
+def _wait_for_capacity(limiter: RateLimiter, tokens: int) -> Grant:
+    """Queue for the provider's rate limits, for at most the run's remaining time."""
+    try:
+        grant = limiter.acquire(tokens, timeout=budget.timeout(None))
+    except RateLimitTimeout as exc:
+        budget.raise_if_expired(exc)
+        raise
+    telemetry.record("llm.queue", grant.waited, tokens=tokens)
+    return grant
+
+
+def _rate_limit_headers(exc: Exception) -> Optional[Dict[str, str]]:
+    """Response headers of a 429 from the provider, or None for any other error."""
+    if getattr(exc, "status_code", None) != 429:
+        return None
+    return dict(getattr(getattr(exc, "response", None), "headers", None) or {})
+
+
+def make_client(api_key: Optional[str] = None) -> Any:
+    global OpenAI
+    if OpenAI is None:
+        from openai import OpenAI as _OpenAI
+
+        OpenAI = _OpenAI
+    return OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
 
 
 class TicketWatcherAgent:
@@ -40,24 +104,38 @@ class TicketWatcherAgent:
         route_hint: str = "llm",
         system_prompt: Optional[str] = None,
         user_prompt_template: Optional[str] = None,
+        client: Any = None,
+        request_timeout: Optional[float] = None,
+        snippet_encoding: Optional[str] = None,
     ):
         self.model = model or os.getenv("TICKETWATCHER_MODEL", "gpt-4o-mini")
-        self.client = OpenAI(api_key=api_key or os.getenv("OPENAI_API_KEY"))
+        # A long-running service passes one warm client shared across events;
+        # otherwise it is built on the first LLM call.
+        self._client = client
+        self._api_key = api_key
         if allowed_paths is None:
             # Honor explicit []/ [""] inputs from callers by only falling back to
             # environment parsing when the argument is None.
             self.allowed_paths = parse_allowed_paths_env(os.getenv("ALLOWED_PATHS"))
 
         else:
-            # Copy to avoid accidental mutation and preserve an explicit [] which
-            # now signifies "allow everything".
-            self.allowed_paths = list(allowed_paths)
+            # Compile once (callers usually pass the shared config matcher); an
+            # explicit [] still signifies "allow everything".
+            self.allowed_paths = compile_allowlist(allowed_paths)
         self.max_files = int(os.getenv("MAX_FILES", str(max_files)))
         self.max_total_lines = int(os.getenv("MAX_LINES", str(max_total_lines)))
         self.default_around_lines = int(
             os.getenv("DEFAULT_AROUND_LINES", str(default_around_lines))
         )
         self.route_hint = os.getenv("ROUTE", route_hint)
+        # How snippets are laid out in the prompt (see encoding.py).
+        self.snippet_encoding = encoding.check_mode(
+            snippet_encoding or os.getenv("TICKETWATCHER_SNIPPET_ENCODING", "plain").strip().lower()
+        )
+        # Seconds per LLM request; a run's deadline (see budget.py) can only shorten it.
+        self.request_timeout = (
+            request_timeout if request_timeout is not None else float(os.getenv("TICKETWATCHER_LLM_TIMEOUT", "60"))
+        )
 
         # Prompts
         self.sysprompt = system_prompt or (
@@ -103,12 +181,7 @@ route: $route_hint
 
 CURRENT SNIPPETS
 $snippets_block
-# Each snippet uses this format, repeated 0..N times:
-# --- path: <repo-relative-path>
-# --- start_line: <int>
-# --- end_line: <int>
-# --- code:
-# <code lines…>
+$snippet_format
 
 YOUR TASK
 Return ONE of:
@@ -122,6 +195,16 @@ OUTPUT MUST BE A SINGLE JSON OBJECT ONLY.
 """  
         
 
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            self._client = make_client(self._api_key)
+        return self._client
+
+    @client.setter
+    def client(self, value: Any) -> None:
+        self._client = value
+
     # ---------- public entry points ----------
 
     def run(
@@ -130,17 +213,37 @@ OUTPUT MUST BE A SINGLE JSON OBJECT ONLY.
         ticket_body: str,
         snippets: List[Dict[str, Any]],
         trim_body_chars: int = 3000,
+        feedback: Optional[str] = None,
     ) -> Dict[str, Any]:
         """
         Single round call. Provide any snippets you already have (can be []),
         returns either request_context or propose_patch dict.
+        `feedback` (e.g. local verification errors for a previous patch) is
+        appended to the prompt so the model can correct itself.
         """
-        user = self._build_user_prompt(
-            ticket_title=ticket_title,
-            ticket_body=ticket_body,
-            snippets=snippets,
-            trim_body_chars=trim_body_chars,
-        )
+        limits = budget.current()
+        allowance = limits.remaining_input() if limits is not None else None
+        with telemetry.span("prompt.build", snippets=len(snippets)) as sp:
+            while True:
+                user = self._build_user_prompt(
+                    ticket_title=ticket_title,
+                    ticket_body=ticket_body,
+                    snippets=snippets,
+                    trim_body_chars=trim_body_chars,
+                )
+                if feedback:
+                    user += (
+                        "\nPREVIOUS PATCH REJECTED\n"
+                        "Your last patch failed local verification with:\n"
+                        f"{feedback}\n"
+                        "Return a corrected patch (or request_context).\n"
+                    )
+                # Drop the least relevant (last) snippets until the prompt fits the run's token budget.
+                if allowance is None or not snippets or budget.estimate_tokens(self.sysprompt + user) <= allowance:
+                    break
+                snippets = snippets[:-1]
+                limits.note("snippets")
+            sp.set(chars=len(user), kept=len(snippets))
         return self._call_llm(self.sysprompt, user)
 
     def run_two_rounds(
@@ -179,7 +282,7 @@ OUTPUT MUST BE A SINGLE JSON OBJECT ONLY.
         trim_body_chars: int = 3000,
     ) -> str:
         ticket_body_trimmed = (ticket_body or "")[:trim_body_chars]
-        snippets_block = self._format_snippets_block(snippets)
+        snippets_block = encoding.encode_snippets(snippets, self.snippet_encoding)
 
         return Template(self.user_template).safe_substitute(
             ticket_title=ticket_title or "",
@@ -190,32 +293,126 @@ OUTPUT MUST BE A SINGLE JSON OBJECT ONLY.
             around_lines=self.default_around_lines,
             route_hint=self.route_hint,
             snippets_block=snippets_block,
+            snippet_format=encoding.legend(self.snippet_encoding),
         )
 
     @staticmethod
     def _format_snippets_block(snippets: List[Dict[str, Any]]) -> str:
-        parts = []
-        for s in snippets:
-            path = s.get("path", "")
-            start = int(s.get("start_line", 1))
-            end = int(s.get("end_line", max(start, start)))
-            code = s.get("code", "")
-            parts.append(
-                f"--- path: {path}\n--- start_line: {start}\n--- end_line: {end}\n--- code:\n{code}\n"
-            )
-        return "\n".join(parts) if parts else ""
+        return encoding.encode_snippets(snippets, "plain")
 
     # ---------- LLM call & parsing ----------
 
     def _call_llm(self, system_prompt: str, user_prompt: str) -> Dict[str, Any]:
-        resp = self.client.chat.completions.create(
-            model=self.model,
-            temperature=0,
-            messages=[
-                {"role": "system", "content": system_prompt},
-                {"role": "user", "content": user_prompt},
-            ],
+        model = self.model
+        extra: Dict[str, Any] = {}
+        limits = budget.current()
+        if limits is not None:
+            limits.reserve_prompt(budget.estimate_tokens(system_prompt + user_prompt))
+            limits.charge_call()
+            model = limits.model_for(self.model)
+            if limits.remaining_output() is not None:
+                extra["max_tokens"] = limits.remaining_output()
+        client = self.client
+        limiter = rate_limiter()
+        # Providers count max_tokens against the token limit up front; settle() refunds the unused part.
+        cost = budget.estimate_tokens(system_prompt + user_prompt) + int(
+            extra.get("max_tokens") or limiter.completion_reserve
         )
+        grants: List[Grant] = []
+        timeout = None
+
+        def send() -> Tuple[Any, Dict[str, str]]:
+            completions = client.chat.completions
+            kwargs = dict(
+                model=model,
+                temperature=0,
+                messages=[
+                    {"role": "system", "content": system_prompt},
+                    {"role": "user", "content": user_prompt},
+                ],
+                timeout=timeout,
+                **extra,
+            )
+            # The raw response carries the provider's x-ratelimit-* headers.
+            raw_api = getattr(completions, "with_raw_response", None)
+            if raw_api is None:
+                return completions.create(**kwargs), {}
+            raw = raw_api.create(**kwargs)
+            return raw.parse(), dict(raw.headers)
+
+        def may_hedge() -> bool:
+            # The duplicate request counts against the run's call budget and the rate limits,
+            # and is only sent if the limits have room for it right now.
+            hedge = limiter.try_acquire(cost)
+            if hedge is None:
+                return False
+            try:
+                budget.charge_call()
+            except budget.BudgetExceeded:
+                limiter.settle(hedge, used_tokens=0)
+                return False
+            grants.append(hedge)
+            return True
+
+        def discard(late: Tuple[Any, Dict[str, str]]) -> None:
+            # The losing request still costs tokens; count them in the process total.
+            lost = getattr(late[0], "usage", None)
+            usage.TOTAL.add(
+                model, int(getattr(lost, "prompt_tokens", 0) or 0), int(getattr(lost, "completion_tokens", 0) or 0)
+            )
+
+        with telemetry.span("llm.call", model=model, prompt_chars=len(system_prompt) + len(user_prompt)) as sp:
+            probe = BREAKER.allow()
+            queued = 0.0
+            outcome: Optional[bool] = None
+            try:
+                for attempt in range(RATE_LIMIT_RETRIES + 1):
+                    grants[:] = [_wait_for_capacity(limiter, cost)]
+                    queued += grants[0].waited
+                    timeout = budget.timeout(self.request_timeout)
+                    try:
+                        (resp, headers), hedged = HEDGER.call(send, may_hedge=may_hedge, on_discard=discard)
+                    except Exception as exc:
+                        limited = _rate_limit_headers(exc)
+                        if limited is not None:
+                            delay = limiter.rejected(grants.pop(0), limited)
+                            if attempt < RATE_LIMIT_RETRIES:
+                                # Not a provider failure: wait out Retry-After in the queue and try again.
+                                print(f"[info] LLM provider rate limit hit; requeueing for {delay:.1f}s")
+                                continue
+                        outcome = False
+                        budget.raise_if_expired(exc)
+                        raise
+                    else:
+                        used = getattr(resp, "usage", None)
+                        spent = getattr(used, "total_tokens", None)
+                        while grants:
+                            limiter.settle(grants.pop(), used_tokens=int(spent) if spent is not None else None, headers=headers)
+                        break
+                    finally:
+                        # Grants this attempt still holds (all of them after a failure, a hedge's after
+                        # a 429) go back to the shared buckets instead of leaking until they refill.
+                        while grants:
+                            limiter.settle(grants.pop(), used_tokens=0)
+                outcome = True
+            finally:
+                if outcome is not None:
+                    BREAKER.record(outcome)
+                elif probe:
+                    # Stopped in the queue or by the run budget before reaching the provider.
+                    BREAKER.release()
+            sp.set(
+                prompt_tokens=getattr(used, "prompt_tokens", None),
+                completion_tokens=getattr(used, "completion_tokens", None),
+                hedged=hedged,
+                queue_ms=round(queued * 1000, 1),
+                attempts=attempt + 1,
+            )
+        usage.record(model, used)
+        if limits is not None:
+            limits.charge_tokens(
+                int(getattr(used, "prompt_tokens", 0) or 0), int(getattr(used, "completion_tokens", 0) or 0)
+            )
         raw = (resp.choices[0].message.content or "").strip()
 
         # Be defensive: strip code fences if the model added them
@@ -274,15 +471,11 @@ OUTPUT MUST BE A SINGLE JSON OBJECT ONLY.
 
     def _path_allowed(self, path: str) -> bool:
         """Return True if the repo-relative path satisfies the allowlist."""
-        if not path:
-            return False
-        if self._allows_all_paths():
-            return True
-        return is_path_allowed(path, self.allowed_paths)
+        return self.allowed_paths.allows(path)
 
     def _allows_all_paths(self) -> bool:
         """True when the agent is configured without path restrictions."""
-        return allows_all_paths(self.allowed_paths)
+        return self.allowed_paths.allows_all
 
     def _format_allowed_paths_for_prompt(self) -> str:
         if self._allows_all_paths():
@@ -0,0 +1,208 @@
+"""Batch mode: work through every open issue carrying a trigger label."""
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set, Tuple
+
+from . import telemetry, usage
+from .coalesce import ticket_fingerprint
+from .resilience import CircuitOpen
+from .state import RunStore
+
+# Outcomes that a resumed backlog does not retry; "failed" and "budget" items are
+# retried (and their pipeline resumes from its last checkpoint).
+_FINAL = frozenset({"pr", "no-pr"})
+# Times one item waits out an open LLM circuit breaker before it counts as failed.
+_MAX_DEFERRALS = 3
+
+
+@dataclass
+class BacklogItem:
+    number: int
+    outcome: str
+    elapsed: float = 0.0
+    pr_url: str | None = None
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    cost: float = 0.0
+    error: str | None = None
+
+
+@dataclass
+class BacklogReport:
+    items: List[BacklogItem] = field(default_factory=list)
+    skipped: int = 0
+    wall: float = 0.0
+
+    def count(self, outcome: str) -> int:
+        return sum(1 for item in self.items if item.outcome == outcome)
+
+    def format(self) -> str:
+        done = self.items
+        busy = sum(item.elapsed for item in done)
+        per_min = len(done) / (self.wall / 60) if self.wall else 0.0
+        durations = sorted(item.elapsed for item in done)
+        prompt = sum(item.prompt_tokens for item in done)
+        completion = sum(item.completion_tokens for item in done)
+        lines = [
+            f"Backlog: {len(done)} issue(s) processed, {self.skipped} skipped as already handled",
+            f"  PRs opened: {self.count('pr')}  no PR: {self.count('no-pr')}  out of budget: {self.count('budget')}"
+            f"  failed: {self.count('failed')}",
+            f"  Wall time: {self.wall:.1f}s  throughput: {per_min:.1f} issues/min"
+            f"  concurrency gain: {busy / self.wall if self.wall else 0.0:.1f}x",
+        ]
+        if durations:
+            lines.append(f"  Per issue: p50 {_quantile(durations, 0.5):.1f}s  p95 {_quantile(durations, 0.95):.1f}s")
+        lines.append(
+            f"  Tokens: {prompt + completion:,} (prompt {prompt:,} / completion {completion:,})"
+            f"  est. cost: ${sum(item.cost for item in done):.2f}"
+        )
+        return "\n".join(lines)
+
+
+def _quantile(sorted_values: List[float], q: float) -> float:
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def collect_issues(labels: Iterable[str], *, list_issues: Callable[..., List[Dict[str, Any]]], cache: Any) -> List[Dict[str, Any]]:
+    """Open issues carrying any of ``labels`` (the API ANDs labels, so query each), oldest first."""
+    by_number: Dict[int, Dict[str, Any]] = {}
+    for label in sorted(labels):
+        for issue in list_issues(label, cache=cache):
+            by_number.setdefault(issue["number"], issue)
+    return [by_number[number] for number in sorted(by_number)]
+
+
+def run_backlog(
+    issues: List[Dict[str, Any]],
+    *,
+    repo: str,
+    handler: Callable[[Dict[str, Any]], Optional[str]],
+    store: RunStore,
+    trigger_labels: Set[str],
+    workers: int = 4,
+    restart: bool = False,
+    prices: Optional[Dict[str, Tuple[float, float]]] = None,
+    progress: Callable[[str], None] = print,
+) -> BacklogReport:
+    """Run ``handler`` over ``issues`` with at most ``workers`` in flight.
+
+    Each finished issue is recorded in ``store`` together with its ticket
+    fingerprint, so an interrupted backlog picks up where it stopped and an
+    edited ticket is processed again.
+    """
+    report = BacklogReport()
+    finished = {} if restart else store.backlog_outcomes(repo)
+    todo: List[Tuple[Dict[str, Any], str]] = []
+    for issue in issues:
+        fingerprint = ticket_fingerprint(issue)
+        if finished.get((issue["number"], fingerprint)) in _FINAL or store.completed(repo, issue["number"], fingerprint):
+            report.skipped += 1
+            continue
+        todo.append((issue, fingerprint))
+
+    def process(issue: Dict[str, Any], fingerprint: str) -> BacklogItem:
+        labels = [label["name"] for label in issue.get("labels", []) if label["name"] in trigger_labels]
+        event = {
+            "action": "labeled",
+            "label": {"name": labels[0] if labels else ""},
+            "issue": issue,
+            "repository": {"full_name": repo},
+        }
+        item = BacklogItem(number=issue["number"], outcome="failed")
+        started = time.perf_counter()
+        with usage.track() as used:
+            for deferrals in range(_MAX_DEFERRALS + 1):
+                try:
+                    item.pr_url = handler(event)
+                    item.outcome, item.error = ("pr" if item.pr_url else "no-pr"), None
+                    if item.pr_url is None:
+                        # A run stopped by its budget returns no PR too, but it is meant to be resumed.
+                        last = store.last_status(repo, item.number, fingerprint)
+                        if last is not None and last[0] == "budget":
+                            item.outcome, item.error = last
+                except CircuitOpen as exc:
+                    item.error = str(exc)
+                    if deferrals < _MAX_DEFERRALS:
+                        time.sleep(exc.retry_after)
+                        continue
+                except Exception as exc:  # pylint: disable=broad-except
+                    item.error = repr(exc)
+                break
+        item.elapsed = time.perf_counter() - started
+        item.prompt_tokens, item.completion_tokens = used.prompt_tokens, used.completion_tokens
+        item.cost = used.cost(prices)
+        store.record_backlog_item(
+            repo,
+            item.number,
+            fingerprint,
+            outcome=item.outcome,
+            pr_url=item.pr_url,
+            elapsed=item.elapsed,
+            prompt_tokens=item.prompt_tokens,
+            completion_tokens=item.completion_tokens,
+            cost=item.cost,
+        )
+        return item
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="backlog") as pool:
+        futures = [pool.submit(process, issue, fingerprint) for issue, fingerprint in todo]
+        for n, future in enumerate(as_completed(futures), 1):
+            item = future.result()
+            report.items.append(item)
+            detail = item.pr_url or item.error or ""
+            progress(f"[{n}/{len(todo)}] #{item.number} {item.outcome} in {item.elapsed:.1f}s {detail}".rstrip())
+    report.wall = time.perf_counter() - started
+    return report
+
+
+def main(argv=None) -> int:
+    from . import github_api, handlers
+
+    config = handlers.CONFIG
+    parser = argparse.ArgumentParser(prog="ticketwatcher backlog", description="Process all open trigger-labelled issues.")
+    parser.add_argument("--labels", default=",".join(sorted(config.trigger_labels)))
+    parser.add_argument("--workers", type=int, default=config.service_workers)
+    parser.add_argument("--limit", type=int, default=0, help="process at most this many issues (0 = all)")
+    parser.add_argument("--restart", action="store_true", help="ignore recorded backlog progress")
+    parser.add_argument("--dry-run", action="store_true", help="list the issues that would be processed")
+    args = parser.parse_args(argv)
+
+    labels = {label.strip() for label in args.labels.split(",") if label.strip()}
+    store = handlers._run_store()
+    issues = collect_issues(labels, list_issues=github_api.list_issues, cache=store.http_cache)
+    if args.limit:
+        issues = issues[: args.limit]
+    if args.dry_run:
+        for issue in issues:
+            print(f"#{issue['number']} {issue.get('title', '')}")
+        return 0
+
+    # One warm OpenAI client, keep-alive sessions and a shared file cache for the whole batch.
+    telemetry.configure(jsonl_path=config.trace_file, summary=config.trace_summary)
+    handlers.warm_clients()
+    github_api.enable_content_cache()
+    report = run_backlog(
+        issues,
+        repo=f"{github_api.OWNER}/{github_api.NAME}",
+        handler=handlers.handle_issue_event,
+        store=store,
+        trigger_labels=labels,
+        workers=args.workers,
+        restart=args.restart,
+        prices=config.token_prices,
+    )
+    print(report.format())
+    if config.trace_summary:
+        telemetry.write_summary(os.getenv("GITHUB_STEP_SUMMARY"))
+    return 1 if report.count("failed") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
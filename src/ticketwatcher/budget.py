@@ -0,0 +1,198 @@
+"""Per-run budgets: a wall-clock deadline plus caps on LLM tokens and API calls."""
+from __future__ import annotations
+
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, List, Optional
+
+# Rough prompt-size estimate used before a call, when the real count is unknown.
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class BudgetExceeded(Exception):
+    """Raised when a run has used up one of its budgets; ``reason`` names which."""
+
+    def __init__(self, reason: str, detail: str) -> None:
+        super().__init__(f"{reason} budget exhausted ({detail})")
+        self.reason = reason
+
+
+@dataclass
+class Budget:
+    """Limits for one pipeline run; a limit of ``0`` means unlimited.
+
+    Work is cancelled with :class:`BudgetExceeded` once a limit is reached.
+    Before that, once any budget is ``downgrade_at`` used, callers scale down
+    (fewer snippets, ``fallback_model``) and note it with :meth:`note`.
+    """
+
+    deadline: float = 0.0
+    max_input_tokens: int = 0
+    max_output_tokens: int = 0
+    max_calls: int = 0
+    downgrade_at: float = 0.75
+    fallback_model: str = ""
+    input_tokens: int = 0
+    output_tokens: int = 0
+    calls: int = 0
+    # Which budget ended the run ("" while it is within all of them).
+    exhausted: str = ""
+    downgrades: List[str] = field(default_factory=list)
+    started: float = field(default_factory=time.monotonic, repr=False)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self.started
+
+    def remaining_seconds(self) -> Optional[float]:
+        return max(0.0, self.deadline - self.elapsed) if self.deadline else None
+
+    def remaining_input(self) -> Optional[int]:
+        return max(0, self.max_input_tokens - self.input_tokens) if self.max_input_tokens else None
+
+    def remaining_output(self) -> Optional[int]:
+        return max(0, self.max_output_tokens - self.output_tokens) if self.max_output_tokens else None
+
+    def usage(self) -> Dict[str, float]:
+        """Fraction of each limited budget used so far."""
+        used: Dict[str, float] = {}
+        if self.deadline:
+            used["deadline"] = self.elapsed / self.deadline
+        if self.max_input_tokens:
+            used["input_tokens"] = self.input_tokens / self.max_input_tokens
+        if self.max_output_tokens:
+            used["output_tokens"] = self.output_tokens / self.max_output_tokens
+        if self.max_calls:
+            used["calls"] = self.calls / self.max_calls
+        return used
+
+    @property
+    def pressure(self) -> float:
+        return max(self.usage().values(), default=0.0)
+
+    @property
+    def tight(self) -> bool:
+        return self.pressure >= self.downgrade_at
+
+    def note(self, downgrade: str) -> None:
+        with self._lock:
+            if downgrade not in self.downgrades:
+                self.downgrades.append(downgrade)
+
+    def check(self) -> None:
+        """Raise :class:`BudgetExceeded` if any budget is used up."""
+        for reason, used in self.usage().items():
+            if used >= 1.0:
+                self._exceed(reason)
+
+    def _exceed(self, reason: str) -> None:
+        detail = {
+            "deadline": f"{self.elapsed:.1f}s of {self.deadline:g}s",
+            "input_tokens": f"{self.input_tokens} of {self.max_input_tokens} prompt tokens",
+            "output_tokens": f"{self.output_tokens} of {self.max_output_tokens} completion tokens",
+            "calls": f"{self.calls} of {self.max_calls} API calls",
+        }[reason]
+        self.exhausted = self.exhausted or reason
+        raise BudgetExceeded(reason, detail)
+
+    def timeout(self, default: Optional[float]) -> Optional[float]:
+        """``default`` capped at the time left; raises once the deadline has passed."""
+        self.check()
+        remaining = self.remaining_seconds()
+        if remaining is None:
+            return default
+        return remaining if default is None else min(default, remaining)
+
+    def charge_call(self) -> None:
+        """Count one GitHub or LLM request, refusing it when the call budget is spent."""
+        with self._lock:
+            if self.max_calls and self.calls >= self.max_calls:
+                self._exceed("calls")
+            self.calls += 1
+
+    def reserve_prompt(self, tokens: int) -> None:
+        """Refuse a prompt of ``tokens`` that would not fit in the input budget."""
+        remaining = self.remaining_input()
+        if remaining is not None and tokens > remaining:
+            self._exceed("input_tokens")
+        if self.remaining_output() == 0:
+            self._exceed("output_tokens")
+
+    def charge_tokens(self, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.input_tokens += prompt_tokens
+            self.output_tokens += completion_tokens
+
+    def model_for(self, model: str) -> str:
+        """``fallback_model`` instead of ``model`` once the run is short on budget."""
+        if self.fallback_model and self.fallback_model != model and self.tight:
+            self.note("model")
+            return self.fallback_model
+        return model
+
+    def expired(self) -> bool:
+        remaining = self.remaining_seconds()
+        return remaining is not None and remaining <= 0
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "budget": self.exhausted,
+            "budget_elapsed": round(self.elapsed, 3),
+            "budget_calls": self.calls,
+            "budget_input_tokens": self.input_tokens,
+            "budget_output_tokens": self.output_tokens,
+            "downgrades": ",".join(self.downgrades),
+        }
+
+
+_CURRENT: ContextVar[Optional[Budget]] = ContextVar("ticketwatcher_budget", default=None)
+
+
+def current() -> Optional[Budget]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def govern(budget: Optional[Budget]) -> Iterator[Optional[Budget]]:
+    """Apply ``budget`` to every GitHub and LLM call made inside the block (on this thread/task)."""
+    token = _CURRENT.set(budget)
+    try:
+        yield budget
+    finally:
+        _CURRENT.reset(token)
+
+
+def timeout(default: Optional[float]) -> Optional[float]:
+    """Request timeout for the current run: ``default`` capped at its remaining time."""
+    budget = _CURRENT.get()
+    return default if budget is None else budget.timeout(default)
+
+
+def charge_call() -> None:
+    budget = _CURRENT.get()
+    if budget is not None:
+        budget.charge_call()
+
+
+def check() -> None:
+    budget = _CURRENT.get()
+    if budget is not None:
+        budget.check()
+
+
+def raise_if_expired(exc: BaseException) -> None:
+    """Turn a request timeout caused by the run's deadline into :class:`BudgetExceeded`."""
+    budget = _CURRENT.get()
+    if budget is not None and budget.expired():
+        try:
+            budget.check()
+        except BudgetExceeded as exceeded:
+            raise exceeded from exc
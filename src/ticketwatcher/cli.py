@@ -1,15 +1,45 @@
+import contextlib
 import os
 import json
 import sys
-from .handlers import handle_issue_event, handle_issue_comment_event
+
+# Only lightweight modules at import time: most events are rejected by the
+# pre-filter, and those should not pay for loading handlers / the OpenAI SDK.
+from .config import load_trigger_labels
+from .prefilter import needs_work
+
+# Where `--profile` without a directory writes its output.
+DEFAULT_PROFILE_DIR = "ticketwatcher-profile"
 
 def main(argv=None):
     argv = argv or sys.argv[1:]
+    if argv and argv[0] == "serve":
+        from .service import main as serve_main
+
+        sys.exit(serve_main(argv[1:]))
+    if argv and argv[0] == "backlog":
+        from .backlog import main as backlog_main
+
+        sys.exit(backlog_main(argv[1:]))
+    if argv and argv[0] == "runs":
+        from .state import main as runs_main
+
+        sys.exit(runs_main(argv[1:]))
+    if argv and argv[0] == "impact":
+        from .impact import main as impact_main
+
+        sys.exit(impact_main(argv[1:]))
     event_file = None
+    profile_dir = None
     # Allow passing `--event-file` manually; otherwise use Actions env
     for i, a in enumerate(argv):
         if a == "--event-file" and i + 1 < len(argv):
             event_file = argv[i + 1]
+        elif a.startswith("--profile="):
+            profile_dir = a.split("=", 1)[1]
+        elif a == "--profile":
+            following = argv[i + 1] if i + 1 < len(argv) else ""
+            profile_dir = following if following and not following.startswith("-") else DEFAULT_PROFILE_DIR
     if not event_file:
         event_file = os.getenv("GITHUB_EVENT_PATH")  # set by GitHub Actions
 
@@ -21,16 +51,36 @@ def main(argv=None):
         event = json.load(f)
 
     name = os.getenv("GITHUB_EVENT_NAME")  # e.g., issues, issue_comment
-    pr_url = None
-
-    if name == "issues":
-        pr_url = handle_issue_event(event)
-    elif name == "issue_comment":
-        pr_url = handle_issue_comment_event(event)
-    else:
-        print(f"Event {name} not handled; exiting.")
+    if name == "repository_dispatch":
+        # Relayed by the Cloudflare worker: {"event_name": ..., "event": <compact payload>}
+        payload = event.get("client_payload") or {}
+        name, event = payload.get("event_name"), payload.get("event") or {}
+    wanted, reason = needs_work(name, event, load_trigger_labels())
+    if not wanted:
+        print(f"No action taken ({reason}).")
         sys.exit(0)
 
+    from . import telemetry
+    from .handlers import CONFIG, EVENT_HANDLERS
+
+    profiler = None
+    profile_dir = profile_dir or CONFIG.profile_dir
+    if profile_dir:
+        from .profiling import Profiler
+
+        profiler = Profiler(profile_dir)
+    telemetry.configure(
+        jsonl_path=CONFIG.trace_file, summary=CONFIG.trace_summary, exporters=(profiler,) if profiler else ()
+    )
+    try:
+        with profiler or contextlib.nullcontext():
+            pr_url = EVENT_HANDLERS[name](event)
+    finally:
+        if CONFIG.trace_summary:
+            telemetry.write_summary(os.getenv("GITHUB_STEP_SUMMARY"))
+        if profiler:
+            print(f"[info] profile written to {profile_dir}")
+
     if pr_url:
         print(f"PR_URL={pr_url}")
     else:
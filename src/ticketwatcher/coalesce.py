@@ -0,0 +1,195 @@
+"""Coalescing, per-issue serialization and idempotency for issue events."""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import re
+from collections import OrderedDict, deque
+from typing import Any, Callable, Deque, Dict, Generic, Hashable, Iterable, Set, TypeVar
+
+T = TypeVar("T")
+
+_MARKER_PREFIX = "<!-- ticketwatcher:fingerprint="
+_RE_MARKER = re.compile(r"<!-- ticketwatcher:fingerprint=([0-9a-f]{16,64}) -->")
+
+
+def issue_key(event: Dict[str, Any]) -> tuple[str, int] | None:
+    """``(owner/repo, issue number)`` for an issues / issue_comment payload."""
+    number = (event.get("issue") or {}).get("number")
+    if number is None:
+        return None
+    repo = (event.get("repository") or {}).get("full_name") or ""
+    return repo, int(number)
+
+
+def ticket_fingerprint(issue: Dict[str, Any]) -> str:
+    """Hash of everything the pipeline reads from the ticket itself."""
+    digest = hashlib.sha256()
+    for part in (issue.get("title") or "", issue.get("body") or ""):
+        digest.update(part.replace("\r\n", "\n").strip().encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()[:32]
+
+
+def fingerprint_marker(fingerprint: str) -> str:
+    """Hidden comment recording which ticket content a run was made for."""
+    return f"{_MARKER_PREFIX}{fingerprint} -->"
+
+
+def find_fingerprints(comment_bodies: Iterable[str]) -> Set[str]:
+    found: Set[str] = set()
+    for body in comment_bodies:
+        if body and _MARKER_PREFIX in body:
+            found.update(_RE_MARKER.findall(body))
+    return found
+
+
+class Coalescer(Generic[T]):
+    """Collapse bursts of events per key and run at most one job per key at a time.
+
+    ``submit`` starts a debounce window for a key; further items for the same
+    key that arrive before the window closes (or while the key's previous job
+    is still running) are folded into one pending item with ``merge``.
+    When the window closes, ``dispatch(key, item)`` is called, and the key
+    stays *active* until :meth:`done` is called for it. Different keys are
+    independent. Must be used from the event loop thread.
+    """
+
+    def __init__(
+        self,
+        dispatch: Callable[[Hashable, T], None],
+        *,
+        debounce: float,
+        merge: Callable[[T, T], T] = lambda old, new: new,
+    ) -> None:
+        self.dispatch = dispatch
+        self.debounce = max(0.0, debounce)
+        self.merge = merge
+        self.coalesced = 0
+        self._pending: Dict[Hashable, T] = {}
+        self._timers: Dict[Hashable, asyncio.TimerHandle] = {}
+        self._active: Set[Hashable] = set()
+
+    @property
+    def pending(self) -> int:
+        return len(self._pending)
+
+    def is_pending(self, key: Hashable) -> bool:
+        return key in self._pending
+
+    def submit(self, key: Hashable, item: T) -> bool:
+        """Queue ``item``; returns False when it was folded into a pending one."""
+        if key in self._pending:
+            self._pending[key] = self.merge(self._pending[key], item)
+            self.coalesced += 1
+            return False
+        self._pending[key] = item
+        if key not in self._active:
+            self._schedule(key, self.debounce)
+        return True
+
+    def done(self, key: Hashable) -> None:
+        """Mark the key's running job finished, releasing anything that queued up behind it."""
+        self._active.discard(key)
+        if key in self._pending and key not in self._timers:
+            self._schedule(key, 0.0)
+
+    def cancel(self) -> None:
+        for timer in self._timers.values():
+            timer.cancel()
+        self._timers.clear()
+
+    def _schedule(self, key: Hashable, delay: float) -> None:
+        loop = asyncio.get_running_loop()
+        self._timers[key] = loop.call_later(delay, self._fire, key)
+
+    def _fire(self, key: Hashable) -> None:
+        self._timers.pop(key, None)
+        if key in self._active or key not in self._pending:
+            return
+        item = self._pending.pop(key)
+        self._active.add(key)
+        self.dispatch(key, item)
+
+
+class FairQueue(Generic[T]):
+    """Unbounded asyncio queue that serves groups (repositories) in weighted round-robin.
+
+    Each group keeps its own FIFO; ``get`` takes up to ``weight(group)`` items
+    from the group at the front before moving it to the back, so one group's
+    backlog cannot starve the others. Supports the subset of
+    :class:`asyncio.Queue` the service uses. Must be used from the event loop
+    thread.
+    """
+
+    def __init__(self, weight: Callable[[Hashable], int] = lambda group: 1) -> None:
+        self.weight = weight
+        self._groups: "OrderedDict[Hashable, Deque[T]]" = OrderedDict()
+        self._credit: Dict[Hashable, int] = {}
+        self._size = 0
+        self._unfinished = 0
+        self._getters: Deque[asyncio.Future] = deque()
+        self._finished = asyncio.Event()
+        self._finished.set()
+
+    def qsize(self) -> int:
+        return self._size
+
+    def group_size(self, group: Hashable) -> int:
+        return len(self._groups.get(group, ()))
+
+    def group_sizes(self) -> Dict[Hashable, int]:
+        return {group: len(items) for group, items in self._groups.items()}
+
+    def put_nowait(self, group: Hashable, item: T) -> None:
+        self._groups.setdefault(group, deque()).append(item)
+        self._size += 1
+        self._unfinished += 1
+        self._finished.clear()
+        self._wake_next()
+
+    async def get(self) -> T:
+        while not self._size:
+            getter = asyncio.get_running_loop().create_future()
+            self._getters.append(getter)
+            try:
+                await getter
+            except asyncio.CancelledError:
+                getter.cancel()
+                if self._size and not getter.cancelled():
+                    # We were woken for an item we will not take; pass the wake-up on.
+                    self._wake_next()
+                raise
+        return self._pop()
+
+    def task_done(self) -> None:
+        if self._unfinished <= 0:
+            raise ValueError("task_done() called too many times")
+        self._unfinished -= 1
+        if not self._unfinished:
+            self._finished.set()
+
+    async def join(self) -> None:
+        await self._finished.wait()
+
+    def _wake_next(self) -> None:
+        while self._getters:
+            getter = self._getters.popleft()
+            if not getter.done():
+                getter.set_result(None)
+                return
+
+    def _pop(self) -> T:
+        group, items = next(iter(self._groups.items()))
+        item = items.popleft()
+        self._size -= 1
+        credit = self._credit.get(group, max(1, self.weight(group))) - 1
+        if not items:
+            del self._groups[group]
+            self._credit.pop(group, None)
+        elif credit <= 0:
+            self._groups.move_to_end(group)
+            self._credit.pop(group, None)
+        else:
+            self._credit[group] = credit
+        return item
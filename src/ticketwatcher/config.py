@@ -2,10 +2,11 @@
 from __future__ import annotations
 
 import os
-from dataclasses import dataclass
-from typing import List, Set
+from dataclasses import dataclass, field
+from typing import Dict, List, Set, Tuple
 
-from .paths import parse_allowed_paths_env
+from .paths import AllowList, parse_allowed_paths_env
+from .usage import DEFAULT_PRICES, parse_prices
 
 
 @dataclass(frozen=True)
@@ -13,13 +14,45 @@ class TicketWatcherConfig:
     trigger_labels: Set[str]
     branch_prefix: str
     pr_title_prefix: str
-    allowed_paths: List[str]
+    allowed_paths: AllowList
     max_files: int
     max_lines: int
     around_lines: int
     repo_root: str
     repo_name: str
-
+    seed_files: int = 3
+    scan_limit: int = 40
+    ingest_artifacts: bool = True
+    artifact_max_bytes: int = 8 * 1024 * 1024
+    artifact_max_links: int = 5
+    verify_patches: bool = True
+    verify_timeout: float = 20.0
+    verify_tests: List[str] = field(default_factory=list)
+    verify_feedback_rounds: int = 1
+    retrieval_top_k: int = 4
+    verify_impact: bool = False
+    verify_test_workers: int = 4
+    webhook_secret: str = ""
+    service_workers: int = 4
+    service_queue_size: int = 64
+    debounce_seconds: float = 5.0
+    skip_unchanged: bool = True
+    dedupe: str = "link"
+    dedupe_threshold: float = 0.8
+    run_deadline: float = 600.0
+    run_max_input_tokens: int = 60000
+    run_max_output_tokens: int = 8000
+    run_max_api_calls: int = 200
+    budget_downgrade_at: float = 0.75
+    fallback_model: str = "gpt-4o-mini"
+    state_db: str = ".ticketwatcher/state.db"
+    repos_file: str = ""
+    service_repo_queue_size: int = 16
+    trace_file: str = ""
+    trace_summary: bool = False
+    # Directory for --profile output; empty disables profiling.
+    profile_dir: str = ""
+    token_prices: Dict[str, Tuple[float, float]] = field(default_factory=lambda: dict(DEFAULT_PRICES))
 
 
 def _resolve_repo_root() -> str:
@@ -33,13 +66,36 @@ def _resolve_repo_name(repo_root: str) -> str:
     return os.path.basename(repo_root)
 
 
-def load_config() -> TicketWatcherConfig:
-    repo_root = _resolve_repo_root()
+def _env_flag(name: str, default: bool) -> bool:
+    raw = os.getenv(name)
+    if raw is None or raw.strip() == "":
+        return default
+    return raw.strip().lower() not in {"0", "false", "no", "off"}
+
+
+def _env_list(name: str) -> List[str]:
+    return [part.strip() for part in (os.getenv(name) or "").split(",") if part.strip()]
+
+
+def _dedupe_mode(raw: str) -> str:
+    """``link`` (comment with the earlier PR), ``reuse`` (open a PR from its diff) or ``off``."""
+    mode = raw.strip().lower()
+    if mode in {"0", "false", "no", "off", ""}:
+        return "off"
+    return mode if mode in {"link", "reuse"} else "link"
+
+
+def load_trigger_labels() -> Set[str]:
     raw_labels = os.getenv("TICKETWATCHER_TRIGGER_LABELS", "agent-fix,auto-pr")
     labels = {label.strip() for label in raw_labels.split(",") if label.strip()}
+    return labels or {"agent-fix", "auto-pr"}
+
+
+def load_config() -> TicketWatcherConfig:
+    repo_root = _resolve_repo_root()
 
     return TicketWatcherConfig(
-        trigger_labels=labels or {"agent-fix", "auto-pr"},
+        trigger_labels=load_trigger_labels(),
         branch_prefix=os.getenv("TICKETWATCHER_BRANCH_PREFIX", "agent-fix/"),
         pr_title_prefix=os.getenv("TICKETWATCHER_PR_TITLE_PREFIX", "agent: auto-fix for issue"),
         allowed_paths=parse_allowed_paths_env(os.getenv("ALLOWED_PATHS")),
@@ -48,5 +104,37 @@ def load_config() -> TicketWatcherConfig:
         around_lines=int(os.getenv("DEFAULT_AROUND_LINES", "60")),
         repo_root=repo_root,
         repo_name=_resolve_repo_name(repo_root),
+        seed_files=int(os.getenv("TICKETWATCHER_SEED_FILES", "3")),
+        scan_limit=int(os.getenv("TICKETWATCHER_SCAN_LIMIT", "40")),
+        ingest_artifacts=_env_flag("TICKETWATCHER_INGEST_ARTIFACTS", True),
+        artifact_max_bytes=int(os.getenv("TICKETWATCHER_ARTIFACT_MAX_BYTES", str(8 * 1024 * 1024))),
+        artifact_max_links=int(os.getenv("TICKETWATCHER_ARTIFACT_MAX_LINKS", "5")),
+        verify_patches=_env_flag("TICKETWATCHER_VERIFY", True),
+        verify_timeout=float(os.getenv("TICKETWATCHER_VERIFY_TIMEOUT", "20")),
+        verify_tests=_env_list("TICKETWATCHER_VERIFY_TESTS"),
+        verify_feedback_rounds=int(os.getenv("TICKETWATCHER_VERIFY_ROUNDS", "1")),
+        retrieval_top_k=int(os.getenv("TICKETWATCHER_RETRIEVAL_TOP_K", "4")),
+        verify_impact=_env_flag("TICKETWATCHER_VERIFY_IMPACT", False),
+        verify_test_workers=int(os.getenv("TICKETWATCHER_VERIFY_WORKERS", "4")),
+        webhook_secret=os.getenv("TICKETWATCHER_WEBHOOK_SECRET", ""),
+        service_workers=int(os.getenv("TICKETWATCHER_SERVICE_WORKERS", "4")),
+        service_queue_size=int(os.getenv("TICKETWATCHER_QUEUE_SIZE", "64")),
+        debounce_seconds=float(os.getenv("TICKETWATCHER_DEBOUNCE_SECONDS", "5")),
+        skip_unchanged=_env_flag("TICKETWATCHER_SKIP_UNCHANGED", True),
+        dedupe=_dedupe_mode(os.getenv("TICKETWATCHER_DEDUPE", "link")),
+        dedupe_threshold=float(os.getenv("TICKETWATCHER_DEDUPE_THRESHOLD", "0.8")),
+        run_deadline=float(os.getenv("TICKETWATCHER_RUN_DEADLINE", "600")),
+        run_max_input_tokens=int(os.getenv("TICKETWATCHER_RUN_MAX_INPUT_TOKENS", "60000")),
+        run_max_output_tokens=int(os.getenv("TICKETWATCHER_RUN_MAX_OUTPUT_TOKENS", "8000")),
+        run_max_api_calls=int(os.getenv("TICKETWATCHER_RUN_MAX_API_CALLS", "200")),
+        budget_downgrade_at=float(os.getenv("TICKETWATCHER_BUDGET_DOWNGRADE_AT", "0.75")),
+        fallback_model=os.getenv("TICKETWATCHER_FALLBACK_MODEL", "gpt-4o-mini"),
+        state_db=os.getenv("TICKETWATCHER_STATE_DB", ".ticketwatcher/state.db"),
+        repos_file=os.getenv("TICKETWATCHER_REPOS_FILE", ""),
+        service_repo_queue_size=int(os.getenv("TICKETWATCHER_REPO_QUEUE_SIZE", "16")),
+        trace_file=os.getenv("TICKETWATCHER_TRACE_FILE", ""),
+        trace_summary=_env_flag("TICKETWATCHER_TRACE_SUMMARY", False),
+        profile_dir=os.getenv("TICKETWATCHER_PROFILE", ""),
+        token_prices=parse_prices(os.getenv("TICKETWATCHER_TOKEN_PRICES")),
     )
 
@@ -0,0 +1,120 @@
+"""Duplicate-ticket detection: exact crash signatures and MinHash/LSH over ticket text."""
+from __future__ import annotations
+
+import hashlib
+import re
+import struct
+from typing import Any, Dict, Iterable, List, Sequence
+
+from .ranking import _block_depths, is_test_path
+from .retrieval import tokenize
+from .stackparse import StackFrame
+
+NUM_PERM = 64
+BANDS = 16  # 16 bands x 4 rows: pairs above ~0.5 Jaccard usually share a bucket
+SHINGLE_SIZE = 3
+SIGNATURE_DEPTH = 3
+_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 64) - 1
+
+# Volatile noise that differs between reports of the same crash.
+_RE_VOLATILE = re.compile(
+    r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b|\b\d+\b"
+)
+
+
+def _permutations(count: int) -> List[tuple]:
+    """Deterministic ``(a, b)`` pairs, so sketches stay comparable across processes."""
+    perms = []
+    for i in range(count):
+        digest = hashlib.blake2b(f"ticketwatcher-minhash-{i}".encode("ascii"), digest_size=16).digest()
+        a, b = struct.unpack("<QQ", digest)
+        perms.append((a % (_PRIME - 1) + 1, b % _PRIME))
+    return perms
+
+
+_PERMS = _permutations(NUM_PERM)
+
+
+def stack_signature(frames: Sequence[StackFrame], depth: int = SIGNATURE_DEPTH) -> str | None:
+    """Hash of the exception type and the innermost allowed frames of the first trace.
+
+    Line numbers are left out so the same crash still matches after unrelated
+    edits shift the file; ``None`` when the ticket has no real trace.
+    """
+    depths = _block_depths(frames)
+    traced = [f for f in frames if id(f) in depths and not is_test_path(f.path)]
+    if not traced:
+        return None
+    block = min(f.block for f in traced)
+    innermost = sorted((f for f in traced if f.block == block), key=lambda f: depths[id(f)])[:depth]
+    exception = next((f.exception for f in innermost if f.exception), "")
+    parts = [exception] + [f"{f.path}:{f.func or ''}" for f in innermost]
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()[:32]
+
+
+def shingles(text: str, size: int = SHINGLE_SIZE) -> List[str]:
+    """Word n-grams of the normalized ticket text."""
+    terms = tokenize(_RE_VOLATILE.sub(" ", text))
+    if len(terms) <= size:
+        return [" ".join(terms)] if terms else []
+    return [" ".join(terms[i : i + size]) for i in range(len(terms) - size + 1)]
+
+
+def minhash(items: Iterable[str]) -> List[int]:
+    """``NUM_PERM``-value MinHash sketch; all-max for empty input."""
+    hashes = {
+        int.from_bytes(hashlib.blake2b(item.encode("utf-8"), digest_size=8).digest(), "little")
+        for item in items
+    }
+    if not hashes:
+        return [_MAX_HASH] * NUM_PERM
+    return [min((a * h + b) % _PRIME for h in hashes) for a, b in _PERMS]
+
+
+def lsh_buckets(sketch: Sequence[int]) -> List[str]:
+    """One bucket key per band; sketches sharing any key are candidate duplicates."""
+    rows = len(sketch) // BANDS
+    keys = []
+    for band in range(BANDS):
+        chunk = struct.pack(f"<{rows}Q", *sketch[band * rows : (band + 1) * rows])
+        keys.append(f"{band}:{hashlib.blake2b(chunk, digest_size=8).hexdigest()}")
+    return keys
+
+
+def similarity(a: Sequence[int], b: Sequence[int]) -> float:
+    """Estimated Jaccard similarity of the shingle sets behind two sketches."""
+    if not a or len(a) != len(b) or a[0] == _MAX_HASH or b[0] == _MAX_HASH:
+        return 0.0
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+def sketch_ticket(title: str, body: str) -> List[int]:
+    return minhash(shingles(f"{title}\n{body}"))
+
+
+def find_duplicate(
+    fixes: Any,
+    repo: str,
+    issue: int,
+    *,
+    signature: str | None,
+    sketch: Sequence[int],
+    threshold: float,
+) -> Dict[str, Any] | None:
+    """Best earlier fix for the same crash or a near-identical ticket, or ``None``.
+
+    ``fixes`` is a :class:`~ticketwatcher.state.FixIndex`. An exact stack
+    signature wins over text similarity; the ticket's own earlier runs never
+    count as duplicates.
+    """
+    if signature:
+        row = fixes.by_signature(repo, signature, exclude_issue=issue)
+        if row is not None:
+            return dict(row, match="signature", similarity=1.0)
+    best: Dict[str, Any] | None = None
+    for row in fixes.candidates(repo, lsh_buckets(sketch), exclude_issue=issue):
+        score = similarity(sketch, row.pop("sketch"))
+        if score >= threshold and (best is None or score > best["similarity"]):
+            best = dict(row, match="text", similarity=round(score, 3))
+    return best
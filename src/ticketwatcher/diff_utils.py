@@ -2,66 +2,324 @@
 from __future__ import annotations
 
 import re
-from typing import Any, Dict, Iterable, List, Tuple
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
 
 from .github_api import get_file_text
-from .paths import is_path_allowed
+from .paths import compile_allowlist
 
 _HUNK_RE = re.compile(r'^@@ -(\d+),?(\d+)? \+(\d+),?(\d+)? @@')
+_DEV_NULL = "/dev/null"
 
 
-def parse_unified_diff(diff_text: str) -> Dict[str, List[Dict[str, Any]]]:
-    files: Dict[str, List[Dict[str, Any]]] = {}
-    lines = diff_text.splitlines()
-    index = 0
-    current_file: str | None = None
-
-    while index < len(lines):
-        line = lines[index]
-        if line.startswith('--- a/'):
-            if index + 1 < len(lines) and lines[index + 1].startswith('+++ b/'):
-                current_file = lines[index + 1][6:]
-                files.setdefault(current_file, [])
-                index += 2
+@dataclass
+class Hunk:
+    old_start: int
+    old_len: int
+    new_start: int
+    new_len: int
+    lines: List[str] = field(default_factory=list)
+    # Set by "\ No newline at end of file" markers on the old/new side.
+    old_missing_newline: bool = False
+    new_missing_newline: bool = False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "old_start": self.old_start,
+            "old_len": self.old_len,
+            "new_start": self.new_start,
+            "new_len": self.new_len,
+            "lines": list(self.lines),
+        }
+
+
+@dataclass
+class FilePatch:
+    """All hunks and metadata for one file in a unified diff.
+
+    ``old_path`` is ``None`` for newly created files and ``new_path`` is
+    ``None`` for deletions; both are set (and differ) for renames.
+    """
+
+    old_path: str | None
+    new_path: str | None
+    hunks: List[Hunk] = field(default_factory=list)
+    added: int = 0
+    removed: int = 0
+    old_mode: str | None = None
+    new_mode: str | None = None
+    is_binary: bool = False
+
+    @property
+    def path(self) -> str:
+        return self.new_path or self.old_path or ""
+
+    @property
+    def is_new(self) -> bool:
+        return self.old_path is None
+
+    @property
+    def is_deleted(self) -> bool:
+        return self.new_path is None
+
+    @property
+    def is_rename(self) -> bool:
+        return bool(self.old_path and self.new_path and self.old_path != self.new_path)
+
+    @property
+    def mode_changed(self) -> bool:
+        return bool(self.old_mode and self.new_mode and self.old_mode != self.new_mode)
+
+    def touched_paths(self) -> List[str]:
+        paths = [p for p in (self.old_path, self.new_path) if p]
+        return list(dict.fromkeys(paths))
+
+
+@dataclass
+class PatchSet:
+    """A fully parsed unified diff, shared by stats, allowlist checks and apply."""
+
+    files: List[FilePatch] = field(default_factory=list)
+
+    def __iter__(self) -> Iterator[FilePatch]:
+        return iter(self.files)
+
+    def __len__(self) -> int:
+        return len(self.files)
+
+    @property
+    def added(self) -> int:
+        return sum(fp.added for fp in self.files)
+
+    @property
+    def removed(self) -> int:
+        return sum(fp.removed for fp in self.files)
+
+    @property
+    def changed_lines(self) -> int:
+        return self.added + self.removed
+
+    @property
+    def paths(self) -> List[str]:
+        seen: Dict[str, None] = {}
+        for fp in self.files:
+            for path in fp.touched_paths():
+                seen.setdefault(path, None)
+        return list(seen)
+
+    def stats(self) -> Tuple[int, int]:
+        """Return ``(files_touched, changed_lines)`` like :func:`diff_stats`."""
+        return len(self.files), self.changed_lines
+
+    def disallowed_paths(self, allowed_prefixes: Iterable[str] | None) -> List[str]:
+        allowed = compile_allowlist(allowed_prefixes)
+        return [path for path in self.paths if not allowed.allows(path)]
+
+
+def _iter_lines(text: str) -> Iterator[str]:
+    """Yield lines of ``text`` lazily instead of materializing ``splitlines()``."""
+    start = 0
+    length = len(text)
+    while start < length:
+        end = text.find("\n", start)
+        if end == -1:
+            end = length
+        line = text[start:end]
+        if line.endswith("\r"):
+            line = line[:-1]
+        yield line
+        start = end + 1
+
+
+def _header_path(raw: str) -> str | None:
+    """Turn a ``---``/``+++`` header value into a repo-relative path (or None)."""
+    value = raw.split("\t", 1)[0].strip()
+    if value.startswith('"') and value.endswith('"') and len(value) > 1:
+        value = value[1:-1]
+    if value == _DEV_NULL:
+        return None
+    if value.startswith(("a/", "b/")):
+        value = value[2:]
+    return value or None
+
+
+def _git_header_paths(line: str) -> Tuple[str | None, str | None]:
+    # "diff --git a/x b/y" -- paths with spaces are ambiguous, so only trust
+    # the simple form and let ---/+++ or rename headers refine it.
+    rest = line[len("diff --git "):]
+    parts = rest.split(" b/", 1)
+    if len(parts) != 2 or not parts[0].startswith("a/"):
+        return None, None
+    return parts[0][2:] or None, parts[1] or None
+
+
+def iter_file_patches(diff: str | Iterable[str]) -> Iterator[FilePatch]:
+    """Incrementally parse a unified diff, yielding one :class:`FilePatch` per file.
+
+    Understands plain ``--- a/``/``+++ b/`` diffs as well as git extended
+    headers (new/deleted files, renames, mode changes, binary markers) and
+    ``\\ No newline at end of file``. Hunk bodies are read leniently so that
+    LLM-produced diffs with slightly wrong hunk counts still parse.
+    """
+    lines = _iter_lines(diff) if isinstance(diff, str) else iter(diff)
+
+    current: FilePatch | None = None
+    git_header = False  # current file came from "diff --git" and awaits ---/+++
+    hunk: Hunk | None = None
+    old_seen = new_seen = 0
+    last_kind = ""
+    pending_minus: str | None = None
+
+    def _hunk_full() -> bool:
+        return hunk is None or (old_seen >= hunk.old_len and new_seen >= hunk.new_len)
+
+    def _hunk_line(body: str) -> None:
+        nonlocal old_seen, new_seen, last_kind
+        assert current is not None and hunk is not None
+        kind = body[:1] or " "
+        if kind == "+":
+            current.added += 1
+            new_seen += 1
+        elif kind == "-":
+            current.removed += 1
+            old_seen += 1
+        else:
+            if kind != " ":
+                # Unprefixed text inside a hunk is treated as context, matching
+                # the historical behaviour of apply_hunks_to_text.
+                body = " " + body
+            elif not body:
+                body = " "
+            old_seen += 1
+            new_seen += 1
+            kind = " "
+        hunk.lines.append(body)
+        last_kind = kind
+
+    for line in lines:
+        if pending_minus is not None:
+            minus, pending_minus = pending_minus, None
+            if line.startswith("+++ "):
+                old_path = _header_path(minus[4:])
+                new_path = _header_path(line[4:])
+                if current is not None and (current.hunks or not git_header):
+                    yield current
+                    current = None
+                if current is None:
+                    current = FilePatch(old_path=old_path, new_path=new_path)
+                else:
+                    current.old_path, current.new_path = old_path, new_path
+                git_header = False
+                hunk = None
                 continue
+            if hunk is not None:
+                _hunk_line(minus)
+
+        if line.startswith("diff --git "):
+            if current is not None:
+                yield current
+            old_path, new_path = _git_header_paths(line)
+            current = FilePatch(old_path=old_path, new_path=new_path)
+            git_header = True
+            hunk = None
+            continue
+
+        if line.startswith("--- ") and (hunk is None or _hunk_full() or line.startswith("--- a/")):
+            pending_minus = line
+            continue
 
         match = _HUNK_RE.match(line)
-        if match and current_file:
-            old_start = int(match.group(1))
-            old_len = int(match.group(2) or "1")
-            new_start = int(match.group(3))
-            new_len = int(match.group(4) or "1")
-            hunk: Dict[str, Any] = {
-                "old_start": old_start,
-                "old_len": old_len,
-                "new_start": new_start,
-                "new_len": new_len,
-                "lines": [],
-            }
-            files[current_file].append(hunk)
-            index += 1
-            while index < len(lines) and not lines[index].startswith('@@') and not lines[index].startswith('--- a/'):
-                hunk["lines"].append(lines[index])
-                index += 1
+        if match:
+            if current is None:
+                hunk = None
+                continue
+            hunk = Hunk(
+                old_start=int(match.group(1)),
+                old_len=int(match.group(2) or "1"),
+                new_start=int(match.group(3)),
+                new_len=int(match.group(4) or "1"),
+            )
+            current.hunks.append(hunk)
+            git_header = False
+            old_seen = new_seen = 0
+            last_kind = ""
+            continue
+
+        if hunk is not None:
+            if line.startswith("\\"):
+                if last_kind in ("-", " "):
+                    hunk.old_missing_newline = True
+                if last_kind in ("+", " "):
+                    hunk.new_missing_newline = True
+                continue
+            if line[:1] in ("+", "-", " ") or not line or not _hunk_full():
+                _hunk_line(line)
+                continue
+            # Trailing prose after a complete hunk: leave the hunk.
+            hunk = None
             continue
 
-        index += 1
+        if current is not None and git_header:
+            if line.startswith("new file mode "):
+                current.old_path = None
+                current.new_mode = line[len("new file mode "):].strip()
+            elif line.startswith("deleted file mode "):
+                current.new_path = None
+                current.old_mode = line[len("deleted file mode "):].strip()
+            elif line.startswith("old mode "):
+                current.old_mode = line[len("old mode "):].strip()
+            elif line.startswith("new mode "):
+                current.new_mode = line[len("new mode "):].strip()
+            elif line.startswith(("rename from ", "copy from ")):
+                current.old_path = line.split(" from ", 1)[1].strip()
+            elif line.startswith(("rename to ", "copy to ")):
+                current.new_path = line.split(" to ", 1)[1].strip()
+            elif line.startswith("Binary files ") or line == "GIT binary patch":
+                current.is_binary = True
 
+    if pending_minus is not None and hunk is not None:
+        _hunk_line(pending_minus)
+    if current is not None:
+        yield current
+
+
+def parse_patch(diff: str | Iterable[str]) -> PatchSet:
+    """Parse ``diff`` once into a :class:`PatchSet`."""
+    return PatchSet(files=list(iter_file_patches(diff)))
+
+
+def parse_unified_diff(diff_text: str) -> Dict[str, List[Dict[str, Any]]]:
+    """Back-compat view of :func:`parse_patch`: ``{path: [hunk dicts]}``."""
+    files: Dict[str, List[Dict[str, Any]]] = {}
+    for fp in iter_file_patches(diff_text):
+        files.setdefault(fp.path, []).extend(h.as_dict() for h in fp.hunks)
     return files
 
 
-def apply_hunks_to_text(original: str, hunks: List[Dict[str, Any]]) -> str:
+def _hunk_value(hunk: Hunk | Dict[str, Any], key: str) -> Any:
+    return getattr(hunk, key) if isinstance(hunk, Hunk) else hunk[key]
+
+
+def apply_hunks_to_text(original: str, hunks: List[Hunk] | List[Dict[str, Any]], strict: bool = False) -> str:
+    """Apply hunks by position; ``strict`` also requires context and removed lines to match."""
     source = original.splitlines()
     output: List[str] = []
     cursor = 1
 
     for hunk in hunks:
-        old_start = hunk["old_start"]
+        old_start = _hunk_value(hunk, "old_start")
+        if old_start - 1 > len(source):
+            raise ValueError(f"Hunk starts at line {old_start} but file has {len(source)} lines")
         while cursor < old_start:
             output.append(source[cursor - 1])
             cursor += 1
 
-        for line in hunk["lines"]:
+        for line in _hunk_value(hunk, "lines"):
+            if strict and not line.startswith('+'):
+                expected = line[1:] if line[:1] in (' ', '-') else line
+                actual = source[cursor - 1] if cursor <= len(source) else None
+                if actual is None or actual.rstrip() != expected.rstrip():
+                    raise ValueError(f"Hunk does not match line {cursor}: expected {expected!r}, found {actual!r}")
             if line.startswith(' '):
                 output.append(line[1:])
                 cursor += 1
@@ -80,33 +338,61 @@ def apply_hunks_to_text(original: str, hunks: List[Dict[str, Any]]) -> str:
     return "\n".join(output)
 
 
+def apply_file_patch(original: str, file_patch: FilePatch, strict: bool = False) -> str:
+    """Apply one file's hunks, preserving (or updating) the trailing newline."""
+    if file_patch.is_binary:
+        raise ValueError(f"Binary patches are not supported: {file_patch.path}")
+    text = apply_hunks_to_text(original, file_patch.hunks, strict=strict)
+    if not text:
+        return text
+
+    ends_with_newline = original.endswith("\n") or file_patch.is_new
+    if file_patch.hunks:
+        last = file_patch.hunks[-1]
+        reaches_eof = last.old_start + max(last.old_len, 1) - 1 >= len(original.splitlines())
+        if reaches_eof:
+            if last.new_missing_newline:
+                ends_with_newline = False
+            elif last.old_missing_newline:
+                ends_with_newline = True
+    return text + "\n" if ends_with_newline else text
+
+
 def apply_unified_diff(
     *,
     base_ref: str,
-    diff_text: str,
+    diff_text: str | None = None,
     allowed_prefixes: Iterable[str] | None,
-) -> Dict[str, str]:
-    parsed = parse_unified_diff(diff_text)
-    updated: Dict[str, str] = {}
+    patch: PatchSet | None = None,
+    strict: bool = False,
+) -> Dict[str, str | None]:
+    """Apply a diff against ``base_ref`` and return the new file contents.
 
-    for path, hunks in parsed.items():
-        if not is_path_allowed(path, allowed_prefixes):
-            raise ValueError(f"Path not allowed: {path}")
-        current = get_file_text(path, base_ref)
-        updated[path] = apply_hunks_to_text(current, hunks)
+    Pass an already parsed ``patch`` to avoid re-parsing ``diff_text``. Deleted
+    files (including the old side of a rename) map to ``None``. With
+    ``strict`` a hunk whose context no longer matches the file raises
+    ``ValueError`` instead of being applied by position.
+    """
+    if patch is None:
+        patch = parse_patch(diff_text or "")
 
-    return updated
+    blocked = patch.disallowed_paths(allowed_prefixes)
+    if blocked:
+        raise ValueError(f"Path not allowed: {blocked[0]}")
 
+    updated: Dict[str, str | None] = {}
+    for file_patch in patch:
+        if file_patch.is_deleted:
+            updated[file_patch.old_path or ""] = None
+            continue
+        current = "" if file_patch.is_new else get_file_text(file_patch.old_path or "", base_ref)
+        updated[file_patch.path] = apply_file_patch(current, file_patch, strict=strict)
+        if file_patch.is_rename:
+            updated.setdefault(file_patch.old_path or "", None)
+
+    return updated
 
-def diff_stats(diff_text: str) -> Tuple[int, int]:
-    files: set[str] = set()
-    changes = 0
-    for line in diff_text.splitlines():
-        if line.startswith('+++ b/'):
-            files.add(line[6:])
-        elif line.startswith('+') and not line.startswith('+++'):
-            changes += 1
-        elif line.startswith('-') and not line.startswith('---'):
-            changes += 1
-    return len(files), changes
 
+def diff_stats(diff: str | PatchSet) -> Tuple[int, int]:
+    patch = diff if isinstance(diff, PatchSet) else parse_patch(diff)
+    return patch.stats()
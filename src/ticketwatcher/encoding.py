@@ -0,0 +1,172 @@
+"""Prompt encodings for code snippets that spend fewer tokens than the raw slice.
+
+``plain`` is the original four-line header plus the code verbatim. The
+others use a one-line header and ``N|`` line anchors instead:
+
+* ``anchored``: code verbatim, with an anchor on the first line and every
+  ``ANCHOR_EVERY`` lines.
+* ``dedent``: the common indentation is removed (the header says how much)
+  and runs of blank lines are collapsed to one.
+* ``elide``: comment lines and docstrings are dropped, except within
+  ``FOCUS_MARGIN`` lines of the snippet's ``center_line``.
+
+Every line that follows dropped lines is anchored, so the exact line number
+of every shown line stays recoverable (see :func:`decode`) and a diff written
+against the encoded snippet still applies to the file.
+"""
+from __future__ import annotations
+
+import os
+import re
+from typing import Any, Dict, Iterable, List, Tuple
+
+MODES = ("plain", "anchored", "dedent", "elide")
+ANCHOR_EVERY = 10
+FOCUS_MARGIN = 8
+
+_RE_HEADER = re.compile(r"^## (?P<path>\S+) L(?P<start>\d+)-(?P<end>\d+)(?: indent=(?P<indent>\d+))?$")
+_RE_ANCHOR = re.compile(r"^(\d+)\|")
+_RE_DOCSTRING = re.compile(r"""^\s*[rRuUbB]{0,2}("{3}|'{3})""")
+_RE_BLOCK_COMMENT = re.compile(r"^\s*(/\*)")
+# Languages whose line comments start with "#"; everything else uses "//" and /* */.
+_HASH_COMMENTS = frozenset({".py", ".pyi", ".rb", ".sh", ".bash", ".pl", ".r", ".yaml", ".yml", ".toml", ".cfg", ".ini"})
+
+_PLAIN_LEGEND = """# Each snippet uses this format, repeated 0..N times:
+# --- path: <repo-relative-path>
+# --- start_line: <int>
+# --- end_line: <int>
+# --- code:
+# <code lines…>"""
+_ANCHORED_LEGEND = """# Each snippet uses this format, repeated 0..N times:
+# ## <repo-relative-path> L<start_line>-<end_line>
+# <code lines…>, where a line starting with `N|` is line N of the file and the lines after it follow on"""
+_LEGENDS = {
+    "plain": _PLAIN_LEGEND,
+    "anchored": _ANCHORED_LEGEND,
+    "dedent": _ANCHORED_LEGEND
+    + "\n# `indent=K` after the header: K leading spaces were removed from every line; restore them in diffs."
+    + "\n# Runs of blank lines are collapsed to one, so line numbers can jump.",
+    "elide": _ANCHORED_LEGEND
+    + "\n# Comments and docstrings away from the point of interest are left out where line numbers jump;"
+    + "\n# never let one hunk span such a jump.",
+}
+
+
+def check_mode(mode: str) -> str:
+    if mode not in MODES:
+        raise ValueError(f"unknown snippet encoding {mode!r}; expected one of {', '.join(MODES)}")
+    return mode
+
+
+def legend(mode: str) -> str:
+    """Prompt comment describing how snippets are laid out in ``mode``."""
+    return _LEGENDS[check_mode(mode)]
+
+
+def encode_snippets(snippets: Iterable[Dict[str, Any]], mode: str = "plain") -> str:
+    return "\n".join(encode_snippet(s, mode) for s in snippets)
+
+
+def encode_snippet(snippet: Dict[str, Any], mode: str = "plain") -> str:
+    path = snippet.get("path", "")
+    start = int(snippet.get("start_line", 1))
+    end = int(snippet.get("end_line", max(start, start)))
+    code = snippet.get("code", "")
+    if check_mode(mode) == "plain":
+        return f"--- path: {path}\n--- start_line: {start}\n--- end_line: {end}\n--- code:\n{code}\n"
+
+    numbered = list(enumerate(code.split("\n"), start=start))
+    indent = 0
+    if mode == "dedent":
+        numbered, indent = _dedent(_collapse_blank_runs(numbered))
+    elif mode == "elide":
+        center = snippet.get("center_line")
+        numbered = _elide(numbered, int(center) if center else None, path)
+
+    header = f"## {path} L{start}-{end}" + (f" indent={indent}" if indent else "")
+    body: List[str] = []
+    expected = None
+    for number, line in numbered:
+        # A code line that itself looks like an anchor gets a real one in front.
+        if number != expected or (number - start) % ANCHOR_EVERY == 0 or _RE_ANCHOR.match(line):
+            body.append(f"{number}|{line}")
+        else:
+            body.append(line)
+        expected = number + 1
+    return "\n".join([header] + body)
+
+
+def _collapse_blank_runs(numbered: List[Tuple[int, str]]) -> List[Tuple[int, str]]:
+    kept: List[Tuple[int, str]] = []
+    for number, line in numbered:
+        if not line.strip() and kept and not kept[-1][1].strip():
+            continue
+        kept.append((number, line))
+    return kept
+
+
+def _dedent(numbered: List[Tuple[int, str]]) -> Tuple[List[Tuple[int, str]], int]:
+    """Strip the spaces every non-blank line starts with (tabs are left alone)."""
+    widths = [len(line) - len(line.lstrip(" ")) for _, line in numbered if line.strip()]
+    indent = min(widths, default=0)
+    if not indent:
+        return numbered, 0
+    return [(n, line[indent:] if line.strip() else "") for n, line in numbered], indent
+
+
+def _elide(numbered: List[Tuple[int, str]], center: int | None, path: str) -> List[Tuple[int, str]]:
+    hash_comments = os.path.splitext(path)[1].lower() in _HASH_COMMENTS
+    line_comment = "#" if hash_comments else "//"
+    # Python docstrings, or /* ... */ blocks in the "//" languages.
+    block, closers = (_RE_DOCSTRING, None) if hash_comments else (_RE_BLOCK_COMMENT, "*/")
+
+    def in_focus(number: int) -> bool:
+        return center is not None and abs(number - center) <= FOCUS_MARGIN
+
+    kept: List[Tuple[int, str]] = []
+    closing = ""  # closer of the docstring / block comment being skipped
+    for number, line in numbered:
+        if closing:
+            if closing in line:
+                closing = ""
+            if not in_focus(number):
+                continue
+        else:
+            match = block.match(line)
+            if match:
+                closer = closers or match.group(1)
+                # A one-line docstring or comment closes on the same line.
+                if closer not in line[match.end():]:
+                    closing = closer
+                if not in_focus(number):
+                    continue
+            elif line.lstrip().startswith(line_comment) and not in_focus(number):
+                continue
+        kept.append((number, line))
+    return kept
+
+
+def decode(text: str) -> Dict[str, Dict[int, str]]:
+    """``{path: {line number: original line}}`` for every line an encoded block shows.
+
+    Accepts the output of :func:`encode_snippets` in any mode but ``plain``.
+    """
+    files: Dict[str, Dict[int, str]] = {}
+    lines: Dict[int, str] | None = None
+    number = indent = 0
+    for raw in text.split("\n"):
+        header = _RE_HEADER.match(raw)
+        if header:
+            lines = files.setdefault(header["path"], {})
+            number = int(header["start"])
+            indent = int(header["indent"] or 0)
+            continue
+        if lines is None:
+            continue
+        anchor = _RE_ANCHOR.match(raw)
+        if anchor:
+            number = int(anchor.group(1))
+            raw = raw[anchor.end():]
+        lines[number] = (" " * indent + raw) if raw.strip() else raw
+        number += 1
+    return files
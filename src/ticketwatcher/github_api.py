@@ -1,12 +1,22 @@
 import os
 import base64
 import json
+import re
+import threading
 import requests
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Iterator, List
+from urllib.parse import quote, urlparse
+
+from . import budget, telemetry
+from .repos import current_repo
 
 GITHUB_API = os.getenv("GITHUB_API", "https://api.github.com")
 # In GitHub Actions, this token is auto-injected with repo-scoped perms.
 TOKEN = os.getenv("GITHUB_TOKEN") or os.getenv("GH_TOKEN")
+# Per-request timeout in seconds; a run's deadline (see budget.py) can only shorten it.
+HTTP_TIMEOUT = float(os.getenv("TICKETWATCHER_HTTP_TIMEOUT", "30"))
 
 
 def _resolve_repo() -> tuple[str, str]:
@@ -24,12 +34,124 @@ def _resolve_repo() -> tuple[str, str]:
 
 OWNER, NAME = _resolve_repo()
 
+
+def _api_url() -> str:
+    repo = current_repo()
+    return (repo.api_url if repo is not None else "") or GITHUB_API
+
+
+def _repo_url() -> str:
+    """``.../repos/{owner}/{name}`` for the active repository (see ``repos.use_repo``)."""
+    repo = current_repo()
+    if repo is not None:
+        return f"{_api_url()}/repos/{repo.owner}/{repo.name}"
+    return f"{GITHUB_API}/repos/{OWNER}/{NAME}"
+
+
+def _token() -> Optional[str]:
+    repo = current_repo()
+    return repo.token if repo is not None and repo.token else TOKEN
+
+# Long-running processes (``ticketwatcher serve``) keep one keep-alive session per
+# worker thread instead of paying a TCP/TLS handshake on every API call. Each
+# repository gets its own session (connection pool) per thread; the least
+# recently used ones are closed beyond _MAX_SESSIONS_PER_THREAD.
+_REUSE_SESSIONS = False
+_MAX_SESSIONS_PER_THREAD = 16
+_LOCAL = threading.local()
+
+
+class _BudgetedSession(requests.Session):
+    """Charges every request to the current run's budget and bounds its timeout."""
+
+    def request(self, method, url, **kwargs):
+        budget.charge_call()
+        kwargs["timeout"] = budget.timeout(kwargs.get("timeout") or HTTP_TIMEOUT)
+        try:
+            return super().request(method, url, **kwargs)
+        except requests.Timeout as exc:
+            budget.raise_if_expired(exc)
+            raise
+
+
+class _ReusableSession(_BudgetedSession):
+    def __exit__(self, *args) -> None:
+        pass  # left open for the next call on this thread
+
+
+def enable_session_reuse(enabled: bool = True) -> None:
+    global _REUSE_SESSIONS
+    _REUSE_SESSIONS = enabled
+
+
+# Batch runs share file contents across issues instead of refetching them. Only reads at a
+# commit SHA are cached: a branch name moves as fixes merge, and a stale copy committed back
+# over it would revert them.
+_RE_COMMIT_SHA = re.compile(r"^[0-9a-f]{40}(?:[0-9a-f]{24})?$")
+_CONTENT_CACHE: "OrderedDict[tuple[str, str], str] | None" = None
+_CONTENT_CACHE_MAX = 0
+_CONTENT_LOCK = threading.Lock()
+
+
+def enable_content_cache(max_entries: int = 2048) -> None:
+    """Cache get_file_text results per (path, commit SHA) for the life of the process."""
+    global _CONTENT_CACHE, _CONTENT_CACHE_MAX
+    with _CONTENT_LOCK:
+        _CONTENT_CACHE = OrderedDict() if max_entries > 0 else None
+        _CONTENT_CACHE_MAX = max_entries
+
+
+def _cache_partition() -> tuple:
+    """``(cache, lock, max_entries)`` for the active repository, or the process-wide cache."""
+    repo = current_repo()
+    if repo is not None:
+        return (repo.content_cache if repo.content_cache_size else None), repo.cache_lock, repo.content_cache_size
+    return _CONTENT_CACHE, _CONTENT_LOCK, _CONTENT_CACHE_MAX
+
+
+def _cached_text(path: str, ref: str) -> Optional[str]:
+    cache, lock, _ = _cache_partition()
+    if cache is None or not _RE_COMMIT_SHA.match(ref):
+        return None
+    with lock:
+        text = cache.get((path, ref))
+        if text is not None:
+            cache.move_to_end((path, ref))
+        return text
+
+
+def _remember_text(path: str, ref: str, text: str) -> None:
+    cache, lock, max_entries = _cache_partition()
+    if cache is None or not _RE_COMMIT_SHA.match(ref):
+        return
+    with lock:
+        cache[(path, ref)] = text
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+
+
 def _session() -> requests.Session:
-    if not TOKEN:
+    token = _token()
+    if not token:
         raise RuntimeError("GITHUB_TOKEN/GH_TOKEN not set")
-    s = requests.Session()
+    if _REUSE_SESSIONS:
+        repo = current_repo()
+        key = (repo.full_name if repo is not None else "", token)
+        sessions = getattr(_LOCAL, "sessions", None)
+        if sessions is None:
+            sessions = _LOCAL.sessions = OrderedDict()
+        s = sessions.get(key)
+        if s is not None:
+            sessions.move_to_end(key)
+            return s
+        s = sessions[key] = _ReusableSession()
+        while len(sessions) > _MAX_SESSIONS_PER_THREAD:
+            requests.Session.close(sessions.popitem(last=False)[1])
+    else:
+        s = _BudgetedSession()
+    s.hooks["response"].append(telemetry.record_http)
     s.headers.update({
-        "Authorization": f"Bearer {TOKEN}",
+        "Authorization": f"Bearer {token}",
         "Accept": "application/vnd.github+json",
         "X-GitHub-Api-Version": "2022-11-28",
         "User-Agent": "ticketwatcher/0.1",
@@ -38,7 +160,7 @@ def _session() -> requests.Session:
 
 def get_repo() -> Dict[str, Any]:
     with _session() as s:
-        r = s.get(f"{GITHUB_API}/repos/{OWNER}/{NAME}")
+        r = s.get(f"{_repo_url()}")
         r.raise_for_status()
         return r.json()
 
@@ -47,7 +169,7 @@ def get_default_branch() -> str:
 
 def get_head_sha(branch: str) -> str:
     with _session() as s:
-        r = s.get(f"{GITHUB_API}/repos/{OWNER}/{NAME}/git/ref/heads/{branch}")
+        r = s.get(f"{_repo_url()}/git/ref/heads/{branch}")
         r.raise_for_status()
         return r.json()["object"]["sha"]
 
@@ -68,7 +190,7 @@ def create_branch(branch: str, base: Optional[str] = None, from_sha: Optional[st
             from_sha = get_head_sha(get_default_branch())
 
     with _session() as s:
-        r = s.post(f"{GITHUB_API}/repos/{OWNER}/{NAME}/git/refs", json={
+        r = s.post(f"{_repo_url()}/git/refs", json={
             "ref": f"refs/heads/{branch}",
             "sha": from_sha
         })
@@ -80,7 +202,7 @@ def create_or_update_file(path: str, content_text: str, message: str, branch: st
     content_b64 = base64.b64encode(content_text.encode("utf-8")).decode("utf-8")
     with _session() as s:
         # check if file exists to include sha
-        get = s.get(f"{GITHUB_API}/repos/{OWNER}/{NAME}/contents/{path}", params={"ref": branch})
+        get = s.get(f"{_repo_url()}/contents/{path}", params={"ref": branch})
         sha = get.json().get("sha") if get.status_code == 200 else None
 
         payload = {
@@ -91,14 +213,27 @@ def create_or_update_file(path: str, content_text: str, message: str, branch: st
         if sha:
             payload["sha"] = sha
 
-        put = s.put(f"{GITHUB_API}/repos/{OWNER}/{NAME}/contents/{path}", json=payload)
+        put = s.put(f"{_repo_url()}/contents/{path}", json=payload)
         put.raise_for_status()
 
+def delete_file(path: str, message: str, branch: str) -> None:
+    with _session() as s:
+        get = s.get(f"{_repo_url()}/contents/{path}", params={"ref": branch})
+        if get.status_code == 404:
+            return
+        get.raise_for_status()
+        r = s.delete(f"{_repo_url()}/contents/{path}", json={
+            "message": message,
+            "sha": get.json()["sha"],
+            "branch": branch,
+        })
+        r.raise_for_status()
+
 def create_pr(title: str, head: str, base: Optional[str] = None, body: str = "", draft: bool = True) -> str:
     if base is None:
         base = get_default_branch()
     with _session() as s:
-        r = s.post(f"{GITHUB_API}/repos/{OWNER}/{NAME}/pulls", json={
+        r = s.post(f"{_repo_url()}/pulls", json={
             "title": title,
             "head": head,
             "base": base,
@@ -111,18 +246,87 @@ def create_pr(title: str, head: str, base: Optional[str] = None, body: str = "",
 
 def add_issue_comment(issue_number: int, body: str) -> None:
     with _session() as s:
-        r = s.post(f"{GITHUB_API}/repos/{OWNER}/{NAME}/issues/{issue_number}/comments", json={"body": body})
+        r = s.post(f"{_repo_url()}/issues/{issue_number}/comments", json={"body": body})
         r.raise_for_status()
 
+def list_issues(labels: str, state: str = "open", cache: Any = None) -> List[Dict[str, Any]]:
+    """All issues (not PRs) carrying every label in the comma-separated ``labels``.
+
+    With a ``cache`` (``get(url) -> (etag, text) | None`` and ``put(url, etag,
+    text)``) each page is fetched conditionally; unchanged pages come back as
+    ``304 Not Modified``, which does not count against the rate limit.
+    """
+    issues: List[Dict[str, Any]] = []
+    url: Optional[str] = (
+        f"{_repo_url()}/issues?labels={quote(labels, safe=',')}&state={state}&per_page=100&sort=created&direction=asc"
+    )
+    with _session() as s:
+        while url:
+            cached = cache.get(url) if cache is not None else None
+            headers = {"If-None-Match": cached[0]} if cached else {}
+            r = s.get(url, headers=headers)
+            if r.status_code == 304 and cached:
+                page = json.loads(cached[1])
+            else:
+                r.raise_for_status()
+                page = {"items": r.json(), "next": r.links.get("next", {}).get("url")}
+                if cache is not None and r.headers.get("ETag"):
+                    cache.put(url, r.headers["ETag"], json.dumps(page))
+            issues.extend(item for item in page["items"] if "pull_request" not in item)
+            url = page["next"]
+    return issues
+
+def list_issue_comments(issue_number: int) -> List[Dict[str, Any]]:
+    comments: List[Dict[str, Any]] = []
+    url: Optional[str] = f"{_repo_url()}/issues/{issue_number}/comments"
+    params: Optional[Dict[str, Any]] = {"per_page": 100}
+    with _session() as s:
+        while url:
+            r = s.get(url, params=params)
+            r.raise_for_status()
+            comments.extend(r.json())
+            url = r.links.get("next", {}).get("url")
+            params = None  # the next link already carries the query string
+    return comments
+
 def add_labels(issue_number: int, labels: list[str]) -> None:
     with _session() as s:
-        r = s.post(f"{GITHUB_API}/repos/{OWNER}/{NAME}/issues/{issue_number}/labels", json={"labels": labels})
+        r = s.post(f"{_repo_url()}/issues/{issue_number}/labels", json={"labels": labels})
+        r.raise_for_status()
+
+# --- NEW: streaming downloads for attached logs and gists (see ingest.py) ---
+_GITHUB_HOSTS = ("github.com", "api.github.com", "gist.githubusercontent.com", "objects.githubusercontent.com")
+
+@contextmanager
+def open_stream(url: str, timeout: float = 30.0) -> Iterator[requests.Response]:
+    """Yield a streaming response; the token is only sent to GitHub hosts."""
+    host = urlparse(url).hostname or ""
+    if _token() and host in _GITHUB_HOSTS:
+        session = _session()
+    else:
+        session = _BudgetedSession()
+        session.hooks["response"].append(telemetry.record_http)
+    with session as s:
+        r = s.get(url, stream=True, timeout=timeout)
+        try:
+            r.raise_for_status()
+            yield r
+        finally:
+            r.close()
+
+def get_gist_raw_urls(gist_id: str) -> List[str]:
+    with _session() as s:
+        r = s.get(f"{_api_url()}/gists/{gist_id}")
         r.raise_for_status()
+        files = r.json().get("files") or {}
+        return [f["raw_url"] for f in files.values() if f.get("raw_url")]
 
 # --- NEW: used by handlers to validate a target file on a given ref ---
 def file_exists(path: str, ref: str) -> bool:
+    if _cached_text(path, ref) is not None:
+        return True
     with _session() as s:
-        r = s.get(f"{GITHUB_API}/repos/{OWNER}/{NAME}/contents/{path}", params={"ref": ref})
+        r = s.get(f"{_repo_url()}/contents/{path}", params={"ref": ref})
         if r.status_code == 200:
             return True
         if r.status_code == 404:
@@ -132,8 +336,11 @@ def file_exists(path: str, ref: str) -> bool:
 
 # (optional hardening) returns "" for empty files, handles missing 'content'
 def get_file_text(path: str, ref: str) -> str:
+    cached = _cached_text(path, ref)
+    if cached is not None:
+        return cached
     with _session() as s:
-        r = s.get(f"{GITHUB_API}/repos/{OWNER}/{NAME}/contents/{path}", params={"ref": ref})
+        r = s.get(f"{_repo_url()}/contents/{path}", params={"ref": ref})
         if r.status_code == 404:
             return ""
         r.raise_for_status()
@@ -141,4 +348,6 @@ def get_file_text(path: str, ref: str) -> str:
         content = data.get("content")
         if content is None:
             return ""
-        return base64.b64decode(content).decode("utf-8")
+        text = base64.b64decode(content).decode("utf-8")
+        _remember_text(path, ref, text)
+        return text
@@ -1,21 +1,38 @@
 """Event handlers orchestrating the TicketWatcher workflow."""
 from __future__ import annotations
 
+import functools
 import os
-from typing import Any, Dict, List
+from typing import Any, Callable, Dict, List
 
+from . import agent_llm, budget, github_api, telemetry
 from .agent_llm import TicketWatcherAgent
+from .budget import Budget, BudgetExceeded
+from .coalesce import find_fingerprints, fingerprint_marker, issue_key, ticket_fingerprint
 from .config import load_config
-from .diff_utils import apply_unified_diff, diff_stats
+from .dedupe import find_duplicate, lsh_buckets, sketch_ticket, stack_signature
+from .diff_utils import apply_unified_diff, parse_patch
+from .impact import TestImpactIndex, default_cache_path
 from .github_api import (
     add_issue_comment,
     create_branch,
     create_or_update_file,
     create_pr,
+    delete_file,
     get_default_branch,
+    get_head_sha,
+    list_issue_comments,
 )
-from .snippets import fetch_slice, fetch_symbol_slice
-from .stackparse import parse_stack_text
+from .ingest import default_source, find_artifact_links, ingest_artifacts
+from .prefilter import is_agent_command, is_trigger_event, may_run_command
+from .ranking import SeedTarget, select_seed_targets
+from .repos import RepoRegistry, current_repo, use_repo
+from .resilience import CircuitOpen
+from .retrieval import CHUNK_LINES, RetrievalIndex, load_or_build
+from .snippets import fetch_slice, fetch_slices, fetch_symbol_slice
+from .stackparse import StackFrame, StackScanner
+from .state import Run, RunStore
+from .verify import VerificationResult, verify_patch
 
 
 CONFIG = load_config()
@@ -28,171 +45,632 @@ MAX_LINES = CONFIG.max_lines
 AROUND_LINES = CONFIG.around_lines
 REPO_ROOT = CONFIG.repo_root
 REPO_NAME = CONFIG.repo_name
+SEED_FILES = CONFIG.seed_files
+SCAN_LIMIT = CONFIG.scan_limit
+INGEST_ARTIFACTS = CONFIG.ingest_artifacts
+ARTIFACT_MAX_BYTES = CONFIG.artifact_max_bytes
+ARTIFACT_MAX_LINKS = CONFIG.artifact_max_links
+VERIFY_PATCHES = CONFIG.verify_patches
+VERIFY_TIMEOUT = CONFIG.verify_timeout
+VERIFY_TESTS = CONFIG.verify_tests
+VERIFY_ROUNDS = CONFIG.verify_feedback_rounds
+RETRIEVAL_TOP_K = CONFIG.retrieval_top_k
+VERIFY_IMPACT = CONFIG.verify_impact
+VERIFY_WORKERS = CONFIG.verify_test_workers
+SKIP_UNCHANGED = CONFIG.skip_unchanged
+DEDUPE = CONFIG.dedupe
+DEDUPE_THRESHOLD = CONFIG.dedupe_threshold
+RUN_DEADLINE = CONFIG.run_deadline
+RUN_MAX_INPUT_TOKENS = CONFIG.run_max_input_tokens
+RUN_MAX_OUTPUT_TOKENS = CONFIG.run_max_output_tokens
+RUN_MAX_API_CALLS = CONFIG.run_max_api_calls
+STATE_DB = CONFIG.state_db
+
+# Module settings a repository can override (see repos.REPO_FIELDS), by config field.
+_REPO_SETTINGS = {
+    "TRIGGER_LABELS": "trigger_labels",
+    "BRANCH_PREFIX": "branch_prefix",
+    "PR_TITLE_PREF": "pr_title_prefix",
+    "ALLOWED_PATHS": "allowed_paths",
+    "MAX_FILES": "max_files",
+    "MAX_LINES": "max_lines",
+    "AROUND_LINES": "around_lines",
+    "REPO_ROOT": "repo_root",
+    "REPO_NAME": "repo_name",
+    "SEED_FILES": "seed_files",
+    "VERIFY_PATCHES": "verify_patches",
+    "VERIFY_TESTS": "verify_tests",
+    "VERIFY_IMPACT": "verify_impact",
+    "RETRIEVAL_TOP_K": "retrieval_top_k",
+    "DEDUPE": "dedupe",
+}
+
+
+class _RepoSettings:
+    """The active repository's overrides for the settings above, else the module defaults."""
+
+    def __getattr__(self, name: str) -> Any:
+        repo = current_repo()
+        if repo is not None and _REPO_SETTINGS[name] in repo.settings:
+            return repo.settings[_REPO_SETTINGS[name]]
+        return globals()[name]
+
+
+_cfg = _RepoSettings()
+
+# Set by warm_clients() in long-running processes; None means "build per event".
+_AGENT_CLIENT: Any = None
+# Opened lazily so importing handlers never touches the filesystem.
+_RUN_STORE: RunStore | None = None
+_IMPACT_INDEX: TestImpactIndex | None = None
+_RETRIEVAL_INDEX: RetrievalIndex | None = None
+# Set from TICKETWATCHER_REPOS_FILE; None serves only the repository in the environment.
+_REPOS: RepoRegistry | None = None
+
+
+def _run_store() -> RunStore:
+    global _RUN_STORE
+    if _RUN_STORE is None:
+        _RUN_STORE = RunStore(STATE_DB or ":memory:")
+    return _RUN_STORE
+
+
+def _repo_registry() -> RepoRegistry | None:
+    global _REPOS
+    if _REPOS is None and CONFIG.repos_file:
+        _REPOS = RepoRegistry.load(CONFIG.repos_file, default_token=github_api.TOKEN or "")
+    return _REPOS
+
+
+def _has_checkout() -> bool:
+    """Whether the active repository is checked out locally.
+
+    REPO_ROOT is the process's own checkout; a registered repository without a
+    ``repo_root`` of its own has none, so retrieval, test impact and local
+    verification are skipped for it rather than run against the wrong tree.
+    """
+    repo = current_repo()
+    return repo is None or "repo_root" in repo.settings
+
+
+def _repo_local_index(kind: str) -> Any:
+    """Indexes over a repository's own checkout live on its context, not in the module globals."""
+    repo = current_repo()
+    return repo.indexes.get(kind) if repo is not None else globals()[kind]
+
+
+def _store_index(kind: str, index: Any) -> None:
+    repo = current_repo()
+    if repo is not None:
+        repo.indexes[kind] = index
+    else:
+        globals()[kind] = index
+
+
+def _verifies() -> bool:
+    return bool(_cfg.VERIFY_PATCHES) and _has_checkout()
+
+
+def _impact_index() -> TestImpactIndex:
+    index = _repo_local_index("_IMPACT_INDEX")
+    if index is None:
+        index = TestImpactIndex(_cfg.REPO_ROOT, cache_path=default_cache_path(_cfg.REPO_ROOT)).refresh()
+        _store_index("_IMPACT_INDEX", index)
+    return index
+
+
+def _retrieval_index() -> RetrievalIndex:
+    index = _repo_local_index("_RETRIEVAL_INDEX")
+    if index is None:
+        with telemetry.span("retrieval.build") as sp:
+            index = load_or_build(_cfg.REPO_ROOT, _cfg.ALLOWED_PATHS)
+            sp.set(chunks=len(index.chunks), terms=len(index.terms))
+        _store_index("_RETRIEVAL_INDEX", index)
+    return index
+
+
+def warm_clients() -> None:
+    """Create the LLM client once and keep GitHub connections alive between events."""
+    global _AGENT_CLIENT
+    github_api.enable_session_reuse()
+    if _AGENT_CLIENT is None:
+        _AGENT_CLIENT = agent_llm.make_client()
+
+
+def _new_budget() -> Budget:
+    return Budget(
+        deadline=RUN_DEADLINE,
+        max_input_tokens=RUN_MAX_INPUT_TOKENS,
+        max_output_tokens=RUN_MAX_OUTPUT_TOKENS,
+        max_calls=RUN_MAX_API_CALLS,
+        downgrade_at=CONFIG.budget_downgrade_at,
+        fallback_model=CONFIG.fallback_model,
+    )
+
+
+def _snippet_limits(files: int, around: int) -> tuple[int, int]:
+    """Seed/fetch sizes, halved once the run is short on budget."""
+    limits = budget.current()
+    if limits is None or not limits.tight:
+        return files, around
+    limits.note("snippets")
+    return max(1, files // 2), max(10, around // 2)
 
 
 def _mk_branch(issue_number: int) -> str:
-    return f"{BRANCH_PREFIX}{issue_number}"
+    return f"{_cfg.BRANCH_PREFIX}{issue_number}"
 
 
-def _gather_seed_snippets(ticket_body: str, base_ref: str) -> List[Dict[str, Any]]:
-    seeds: List[Dict[str, Any]] = []
-    specs = parse_stack_text(
-        ticket_body,
-        repo_root=REPO_ROOT,
-        repo_name=REPO_NAME,
-        allowed_prefixes=ALLOWED_PATHS,
-        limit=5,
+def _scan_ticket(ticket_body: str) -> List[StackFrame]:
+    """Scan the ticket text, then any attached logs or gists it links to."""
+    scanner = StackScanner(
+        repo_root=_cfg.REPO_ROOT,
+        repo_name=_cfg.REPO_NAME,
+        allowed_prefixes=_cfg.ALLOWED_PATHS,
+        limit=SCAN_LIMIT,
     )
-    for path, line in specs:
-        snippet = fetch_slice(
-            path,
-            base_ref=base_ref,
-            center_line=line,
-            around_lines=AROUND_LINES,
-            allowed_prefixes=ALLOWED_PATHS,
-        )
-        if snippet:
-            seeds.append(snippet)
+    with telemetry.span("stackparse", chars=len(ticket_body)) as sp:
+        scanner.feed(ticket_body)
+        scanner.feed("\n")
+        links = find_artifact_links(ticket_body, limit=ARTIFACT_MAX_LINKS) if INGEST_ARTIFACTS else []
+        if links and not scanner.done:
+            with telemetry.span("ingest", links=len(links)) as ingest_span:
+                report = ingest_artifacts(
+                    links,
+                    scanner,
+                    source=default_source(),
+                    max_bytes=ARTIFACT_MAX_BYTES,
+                )
+                ingest_span.set(bytes=report.bytes_read, truncated=report.truncated)
+            for url, error in report.errors.items():
+                print(f"[warn] could not read attachment {url}: {error}")
+        frames = scanner.close()
+        sp.set(frames=len(frames), lines=scanner.lines_scanned)
+    return frames
+
+
+def _retrieval_targets(query: str) -> List[SeedTarget]:
+    """Files (and chunk centers) most similar to the ticket text, best first."""
+    if _cfg.RETRIEVAL_TOP_K <= 0 or not _has_checkout():
+        return []
+    with telemetry.span("retrieval.search") as sp:
+        hits = _retrieval_index().search(query, k=_cfg.RETRIEVAL_TOP_K)
+        sp.set(hits=len(hits))
+    by_path: Dict[str, SeedTarget] = {}
+    for hit in hits:
+        target = by_path.get(hit.path)
+        if target is None:
+            if len(by_path) >= _cfg.SEED_FILES:
+                continue
+            target = by_path[hit.path] = SeedTarget(hit.path, score=hit.score)
+        target.lines.append(hit.center)
+    return list(by_path.values())
+
+
+def _gather_seed_snippets(
+    ticket_body: str, base_ref: str, title: str = "", frames: List[StackFrame] | None = None
+) -> List[Dict[str, Any]]:
+    seeds: List[Dict[str, Any]] = []
+    if frames is None:
+        frames = _scan_ticket(ticket_body)
+    max_files, around = _snippet_limits(_cfg.SEED_FILES, _cfg.AROUND_LINES)
+    targets = select_seed_targets(frames, max_files=max_files, around_lines=around)
+    if not targets:
+        # No usable frames or Target: line; fall back to lexical search of the checkout.
+        targets = _retrieval_targets(f"{title}\n{ticket_body}")[:max_files]
+        around = CHUNK_LINES // 2
+    for target in targets:
+        budget.check()
+        with telemetry.span("seeds.fetch", path=target.path, slices=len(target.lines)):
+            seeds.extend(
+                fetch_slices(
+                    target.path,
+                    base_ref=base_ref,
+                    center_lines=target.lines,
+                    around_lines=around,
+                    allowed_prefixes=_cfg.ALLOWED_PATHS,
+                )
+            )
     return seeds
 
 
 def _build_fetch_callback(base_ref: str):
     def _fetch(needs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         snippets: List[Dict[str, Any]] = []
-        for need in needs:
-            path = need.get("path", "")
-            around = int(need.get("around_lines") or AROUND_LINES)
-            if need.get("symbol"):
-                snippet = fetch_symbol_slice(
-                    path,
-                    base_ref=base_ref,
-                    symbol=need["symbol"],
-                    around_lines=around,
-                    allowed_prefixes=ALLOWED_PATHS,
-                )
-            else:
-                snippet = fetch_slice(
-                    path,
-                    base_ref=base_ref,
-                    center_line=need.get("line"),
-                    around_lines=around,
-                    allowed_prefixes=ALLOWED_PATHS,
-                )
-            if snippet:
-                snippets.append(snippet)
+        max_needs, max_around = _snippet_limits(len(needs), _cfg.AROUND_LINES)
+        with telemetry.span("context.fetch", needs=len(needs)):
+            for need in needs[:max_needs]:
+                budget.check()
+                path = need.get("path", "")
+                around = min(int(need.get("around_lines") or max_around), max_around)
+                if need.get("symbol"):
+                    snippet = fetch_symbol_slice(
+                        path,
+                        base_ref=base_ref,
+                        symbol=need["symbol"],
+                        around_lines=around,
+                        allowed_prefixes=_cfg.ALLOWED_PATHS,
+                    )
+                else:
+                    snippet = fetch_slice(
+                        path,
+                        base_ref=base_ref,
+                        center_line=need.get("line"),
+                        around_lines=around,
+                        allowed_prefixes=_cfg.ALLOWED_PATHS,
+                    )
+                if snippet:
+                    snippets.append(snippet)
         return snippets
 
     return _fetch
 
 
-def handle_issue_event(event: Dict[str, Any]) -> str | None:
-    action = event.get("action")
-    issue = event.get("issue") or {}
-    number = issue.get("number")
-    labels = {label["name"] for label in issue.get("labels", [])}
+def _is_trigger(event: Dict[str, Any]) -> bool:
+    return is_trigger_event(event, _cfg.TRIGGER_LABELS)
 
-    if not (action in {"opened", "reopened"} or action == "labeled" or (labels & TRIGGER_LABELS)):
-        return None
 
-    if action == "labeled":
-        label_name = (event.get("label") or {}).get("name")
-        if label_name and label_name not in TRIGGER_LABELS:
+def _already_handled(event: Dict[str, Any], fingerprint: str) -> bool:
+    """True when a PR was already opened for exactly this ticket content."""
+    key = issue_key(event)
+    if key is not None and _run_store().completed(key[0], key[1], fingerprint):
+        return True
+    number = (event.get("issue") or {}).get("number")
+    try:
+        comments = list_issue_comments(number)
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"[warn] could not read comments on issue #{number}: {exc}")
+        return False
+    return fingerprint in find_fingerprints(c.get("body") or "" for c in comments)
+
+
+def _repo_scoped(handler: Callable[[Dict[str, Any]], str | None]) -> Callable[[Dict[str, Any]], str | None]:
+    """Run ``handler`` against the event's repository when several are configured."""
+
+    @functools.wraps(handler)
+    def wrapper(event: Dict[str, Any]) -> str | None:
+        registry = _repo_registry()
+        if registry is None:
+            return handler(event)
+        full_name = (event.get("repository") or {}).get("full_name") or ""
+        repo = registry.get(full_name)
+        if repo is None:
+            print(f"[info] repository {full_name or '(none)'} is not in TICKETWATCHER_REPOS_FILE; ignoring")
             return None
+        with use_repo(repo):
+            return handler(event)
 
-    title = issue.get("title", "")
-    body = issue.get("body", "") or ""
-    base = os.getenv("TICKETWATCHER_BASE_BRANCH") or get_default_branch()
-
-    seed_snippets = _gather_seed_snippets(body, base)
-
-    agent = TicketWatcherAgent(
-        allowed_paths=ALLOWED_PATHS,
-        max_files=MAX_FILES,
-        max_total_lines=MAX_LINES,
-        default_around_lines=AROUND_LINES,
-    )
+    return wrapper
 
-    fetch_callback = _build_fetch_callback(base)
-    result = agent.run_two_rounds(title, body, seed_snippets, fetch_callback=fetch_callback)
 
-    if result.get("action") == "request_context":
-        add_issue_comment(
-            number,
-            "⚠️ I need more context to propose a safe fix. "
-            "Please include a traceback (`File \"src/...\", line N`) or add `Target: <path.py>`.",
-        )
+@_repo_scoped
+def handle_issue_event(event: Dict[str, Any]) -> str | None:
+    if not _is_trigger(event):
         return None
-
-    diff = result.get("diff", "")
-    files_touched, changed_lines = diff_stats(diff)
-    if files_touched > MAX_FILES or changed_lines > MAX_LINES:
-        add_issue_comment(
-            number,
-            f"⚠️ Proposed change exceeds budgets (files={files_touched}, lines={changed_lines}). "
-            "Escalating to human review or try narrowing the scope.",
-        )
+    issue = event.get("issue") or {}
+    fingerprint = ticket_fingerprint(issue)
+    if SKIP_UNCHANGED and _already_handled(event, fingerprint):
+        print(f"[info] issue #{issue.get('number')} unchanged since its last PR; skipping")
         return None
-
+    return _run_pipeline(event, issue, fingerprint)
+
+
+def _run_pipeline(
+    event: Dict[str, Any], issue: Dict[str, Any], fingerprint: str, check_duplicates: bool = True
+) -> str | None:
+    """Run (or resume) the checkpointed pipeline for one issue."""
+    key = issue_key(event) or ("", int(issue.get("number") or 0))
+    run = _run_store().begin(key[0], key[1], fingerprint)
+    if run.resumed:
+        print(f"[info] resuming run {run.run_id} for issue #{key[1]} (attempt {run.attempts})")
+    limits = _new_budget()
     try:
-        updated_files = apply_unified_diff(
-            base_ref=base,
-            diff_text=diff,
-            allowed_prefixes=ALLOWED_PATHS,
-        )
-    except Exception as exc:  # pylint: disable=broad-except
-        add_issue_comment(number, f"❌ Could not apply patch: {exc}")
+        with telemetry.span("pipeline", issue=key[1], run_id=run.run_id, attempt=run.attempts) as sp:
+            try:
+                with budget.govern(limits):
+                    pr_url = _run_stages(run, key[0], issue, fingerprint, check_duplicates and _cfg.DEDUPE != "off")
+            finally:
+                sp.set(**limits.summary())
+    except BudgetExceeded as exc:
+        # Checkpoints are kept, so the next trigger resumes where this run stopped.
+        run.finish("budget", error=f"{exc.reason}: {exc}")
+        print(f"[warn] run {run.run_id} for issue #{key[1]} stopped: {exc}")
+        try:
+            add_issue_comment(
+                key[1], f"⏱️ Stopped before opening a PR: {exc}. Re-trigger to continue from where it stopped."
+            )
+        except Exception as comment_exc:  # pylint: disable=broad-except
+            print(f"[warn] could not comment on issue #{key[1]}: {comment_exc}")
         return None
+    except CircuitOpen as exc:
+        # The provider is failing; the caller retries later from these checkpoints.
+        run.finish("deferred", error=str(exc))
+        raise
+    except Exception as exc:
+        run.finish("failed", error=repr(exc))
+        raise
+    if limits.downgrades:
+        print(f"[info] run {run.run_id} for issue #{key[1]} downgraded to fit its budget: {', '.join(limits.downgrades)}")
+    run.finish("done" if pr_url else "rejected")
+    return pr_url
+
+
+def _run_stages(run: Run, repo: str, issue: Dict[str, Any], fingerprint: str, check_duplicates: bool) -> str | None:
+    number = issue.get("number")
+    title = issue.get("title", "")
+    body = issue.get("body", "") or ""
+    base = run.step("base", lambda: os.getenv("TICKETWATCHER_BASE_BRANCH") or get_default_branch())
+    # Every file is read at this commit and the branch starts from it, so whole-file contents
+    # written later (or on a resume) cannot revert whatever was merged into the base in between.
+    base_sha = run.step("base_sha", lambda: get_head_sha(base))
+
+    frames: List[StackFrame] | None = None
+    duplicate: Dict[str, Any] | None = None
+    if check_duplicates and (run.has("dedupe") or not run.has("patch")):
+        if not run.has("dedupe"):
+            frames = _scan_ticket(body)
+        duplicate = run.step("dedupe", lambda: _check_duplicate(repo, number, title, body, frames))
+
+    proposal = run.get("patch")
+    match = (duplicate or {}).get("match")
+    if proposal is None and match:
+        proposal = run.step("revalidate", lambda: _revalidate_fix(match, base_sha))
+        if proposal is not None and _cfg.DEDUPE == "link" and match.get("pr_url"):
+            return _link_duplicate(run, number, match, fingerprint)
+    if proposal is None:
+        proposal = _propose_patch(run, number, title, body, base_sha, frames)
+        if proposal is None:
+            return None
+    if not run.has("patch"):
+        run.checkpoint("patch", proposal)
+    updated_files = proposal["files"]
+    files_touched, changed_lines = proposal["stats"]
 
     branch = _mk_branch(number)
-    create_branch(branch, base)
+    run.step("branch", lambda: create_branch(branch, base, from_sha=base_sha))
     for path, content in updated_files.items():
-        create_or_update_file(
-            path=path,
-            content_text=content,
-            message=f"agent: {title[:72]}",
-            branch=branch,
+        # One checkpoint per file so a retry does not push the same content twice.
+        if content is None:
+            run.step(f"write:{path}", lambda: delete_file(path=path, message=f"agent: {title[:72]}", branch=branch))
+            continue
+        run.step(
+            f"write:{path}",
+            lambda: create_or_update_file(
+                path=path,
+                content_text=content,
+                message=f"agent: {title[:72]}",
+                branch=branch,
+            ),
         )
 
-    pr_url, pr_number = create_pr(
-        title=f"{PR_TITLE_PREF} #{number}",
-        head=branch,
-        base=base,
-        body=f"Draft PR by TicketWatcher (route=llm)\n\nFiles: {files_touched} • Lines: {changed_lines}",
-        draft=True,
+    pr_url, pr_number = run.step(
+        "pr",
+        lambda: create_pr(
+            title=f"{_cfg.PR_TITLE_PREF} #{number}",
+            head=branch,
+            base=base,
+            body=(
+                f"Draft PR by TicketWatcher (route={proposal.get('route', 'llm')})\n\n"
+                f"Files: {files_touched} • Lines: {changed_lines}"
+            ),
+            draft=True,
+        ),
     )
 
-    notes = result.get("notes", "")
+    notes = proposal.get("notes", "")
     pr_comment = (
         f"✅ Draft PR opened: {pr_url}\n\n"
         f"**Branch:** `{branch}`  •  **Base:** `{base}`\n"
         f"**Files touched:** {files_touched}  •  **Changed lines:** {changed_lines}\n\n"
         f"{('Notes: ' + notes) if notes else ''}"
     )
-    add_issue_comment(pr_number, pr_comment)
+    run.step("pr_comment", lambda: add_issue_comment(pr_number, pr_comment))
+    if duplicate is not None and proposal.get("diff"):
+        _run_store().fixes.record(
+            repo,
+            number,
+            signature=duplicate["signature"],
+            sketch=duplicate["sketch"],
+            buckets=lsh_buckets(duplicate["sketch"]),
+            diff=proposal["diff"],
+            pr_url=pr_url,
+            pr_number=pr_number,
+        )
 
     try:
-        add_issue_comment(number, f"Draft PR opened: {pr_url}")
+        run.step(
+            "issue_comment",
+            lambda: add_issue_comment(number, f"Draft PR opened: {pr_url}\n\n{fingerprint_marker(fingerprint)}"),
+        )
     except Exception as exc:  # pylint: disable=broad-except
         print(f"[warn] could not comment on issue #{number}: {exc}")
 
     return pr_url
 
 
+def _check_duplicate(
+    repo: str, number: int, title: str, body: str, frames: List[StackFrame] | None
+) -> Dict[str, Any]:
+    """Crash signature and text sketch of the ticket, plus the best earlier fix they match."""
+    signature = stack_signature(frames if frames is not None else _scan_ticket(body))
+    sketch = sketch_ticket(title, body)
+    with telemetry.span("dedupe.lookup", signature=bool(signature)) as sp:
+        match = find_duplicate(
+            _run_store().fixes, repo, number, signature=signature, sketch=sketch, threshold=DEDUPE_THRESHOLD
+        )
+        sp.set(match=match["match"] if match else "")
+    if match:
+        print(f"[info] issue #{number} matches #{match['issue']} by {match['match']} ({match['similarity']:.2f})")
+    return {"signature": signature, "sketch": sketch, "match": match}
+
+
+def _revalidate_fix(match: Dict[str, Any], base_ref: str) -> Dict[str, Any] | None:
+    """The earlier fix re-applied (and verified) at ``base_ref``; None once it no longer fits."""
+    patch = parse_patch(match["diff"])
+    files_touched, changed_lines = patch.stats()
+    try:
+        with telemetry.span("patch.apply", files=files_touched, lines=changed_lines):
+            updated_files = apply_unified_diff(base_ref=base_ref, patch=patch, allowed_prefixes=_cfg.ALLOWED_PATHS, strict=True)
+    except BudgetExceeded:
+        raise
+    except Exception as exc:  # pylint: disable=broad-except
+        print(f"[info] fix from #{match['issue']} no longer applies to {base_ref[:12]}: {exc}")
+        return None
+    if _verifies() and not _verify(updated_files).ok:
+        print(f"[info] fix from #{match['issue']} no longer passes verification on {base_ref[:12]}")
+        return None
+    return {
+        "files": updated_files,
+        "stats": [files_touched, changed_lines],
+        "notes": f"Reused the fix from #{match['issue']} (duplicate by {match['match']}).",
+        "diff": match["diff"],
+        "route": "dedupe",
+    }
+
+
+def _link_duplicate(run: Run, number: int, match: Dict[str, Any], fingerprint: str) -> str:
+    """Point the new issue at the open PR of the ticket it duplicates instead of opening another."""
+    pr_url = match["pr_url"]
+    reason = "the same crash signature" if match["match"] == "signature" else f"{match['similarity']:.0%} similar report"
+    run.step(
+        "issue_comment",
+        lambda: add_issue_comment(
+            number,
+            f"🔁 This looks like a duplicate of #{match['issue']} ({reason}). "
+            f"Its fix still applies to the current base and is in draft PR {pr_url}\n\n"
+            f"{fingerprint_marker(fingerprint)}",
+        ),
+    )
+    if match.get("pr_number"):
+        run.step("pr_comment", lambda: add_issue_comment(match["pr_number"], f"Also reported in #{number}."))
+    return pr_url
+
+
+def _verify(updated_files: Dict[str, str | None]) -> VerificationResult:
+    with telemetry.span("patch.verify", files=len(updated_files)) as sp:
+        verification = verify_patch(
+            updated_files,
+            repo_root=_cfg.REPO_ROOT,
+            timeout=budget.timeout(VERIFY_TIMEOUT),
+            test_paths=_cfg.VERIFY_TESTS,
+            impact=_impact_index() if _cfg.VERIFY_IMPACT and not _cfg.VERIFY_TESTS else None,
+            test_workers=VERIFY_WORKERS,
+        )
+        sp.set(ok=verification.ok, issues=len(verification.issues))
+    return verification
+
+
+def _propose_patch(
+    run: Run, number: int, title: str, body: str, base_ref: str, frames: List[StackFrame] | None = None
+) -> Dict[str, Any] | None:
+    """Gather context, ask the agent and verify its patch; None when the run should stop."""
+    seed_snippets = run.step("seeds", lambda: _gather_seed_snippets(body, base_ref, title, frames=frames))
+
+    agent = TicketWatcherAgent(
+        allowed_paths=_cfg.ALLOWED_PATHS,
+        max_files=_cfg.MAX_FILES,
+        max_total_lines=_cfg.MAX_LINES,
+        default_around_lines=_cfg.AROUND_LINES,
+        client=_AGENT_CLIENT,
+    )
+
+    fetch_more = _build_fetch_callback(base_ref)
+
+    def first_round() -> Dict[str, Any]:
+        fetched: List[Dict[str, Any]] = []
+
+        def fetch_callback(needs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            more = fetch_more(needs)
+            fetched.extend(more)
+            return more
+
+        result = agent.run_two_rounds(title, body, seed_snippets, fetch_callback=fetch_callback)
+        return {"result": result, "fetched": fetched}
+
+    first = run.step("llm:0", first_round)
+    result, fetched_snippets = first["result"], first["fetched"]
+
+    feedback_rounds = 0
+    while True:
+        if result.get("action") == "request_context":
+            add_issue_comment(
+                number,
+                "⚠️ I need more context to propose a safe fix. "
+                "Please include a traceback (`File \"src/...\", line N`) or add `Target: <path.py>`.",
+            )
+            return None
+
+        patch = parse_patch(result.get("diff", ""))
+        files_touched, changed_lines = patch.stats()
+        if files_touched > _cfg.MAX_FILES or changed_lines > _cfg.MAX_LINES:
+            add_issue_comment(
+                number,
+                f"⚠️ Proposed change exceeds budgets (files={files_touched}, lines={changed_lines}). "
+                "Escalating to human review or try narrowing the scope.",
+            )
+            return None
+
+        try:
+            with telemetry.span("patch.apply", files=files_touched, lines=changed_lines):
+                updated_files = apply_unified_diff(
+                    base_ref=base_ref,
+                    patch=patch,
+                    allowed_prefixes=_cfg.ALLOWED_PATHS,
+                )
+        except BudgetExceeded:
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            add_issue_comment(number, f"❌ Could not apply patch: {exc}")
+            return None
+
+        if not _verifies():
+            break
+        verification = _verify(updated_files)
+        if verification.ok:
+            break
+        if feedback_rounds >= VERIFY_ROUNDS:
+            add_issue_comment(
+                number,
+                "❌ Proposed patch failed local verification, so no branch was pushed:\n\n"
+                f"```\n{verification.summary()}\n```",
+            )
+            return None
+        feedback_rounds += 1
+        result = run.step(
+            f"llm:{feedback_rounds}",
+            lambda: agent.run(
+                title,
+                body,
+                seed_snippets + fetched_snippets,
+                feedback=verification.summary(),
+            ),
+        )
+
+    return {
+        "files": updated_files,
+        "stats": [files_touched, changed_lines],
+        "notes": result.get("notes", ""),
+        "diff": result.get("diff", ""),
+    }
+
+
+@_repo_scoped
 def handle_issue_comment_event(event: Dict[str, Any]) -> str | None:
-    action = event.get("action")
-    if action != "created":
+    if not (is_agent_command(event) and may_run_command(event, _cfg.TRIGGER_LABELS)):
         return None
 
     issue = event.get("issue") or {}
-    number = issue.get("number")
     comment_body = (event.get("comment") or {}).get("body", "")
 
-    if not comment_body.strip().lower().startswith("/agent fix"):
-        return None
-
+    # An explicit command always runs, even if the ticket has not changed; the
+    # recorded fingerprint stays that of the ticket itself.
     issue_copy = dict(issue)
     issue_copy["body"] = (issue.get("body") or "") + "\n\n" + comment_body
-    synthetic_event = dict(event)
-    synthetic_event["issue"] = issue_copy
-    return handle_issue_event(synthetic_event)
+    # It also asks for a fresh attempt, so duplicate matching is skipped.
+    return _run_pipeline(event, issue_copy, ticket_fingerprint(issue), check_duplicates=False)
+
 
+EVENT_HANDLERS: Dict[str, Callable[[Dict[str, Any]], str | None]] = {
+    "issues": handle_issue_event,
+    "issue_comment": handle_issue_comment_event,
+}
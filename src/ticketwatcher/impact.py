@@ -0,0 +1,262 @@
+"""Test-impact index: which tests import (directly or transitively) a changed module."""
+from __future__ import annotations
+
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, Iterable, List, Sequence, Set, Tuple
+
+_SKIP_DIRS = frozenset({".git", ".venv", "venv", "node_modules", "__pycache__", ".pytest_cache", ".tox", ".ticketwatcher"})
+_TEST_DIRS = frozenset({"test", "tests"})
+_CACHE_VERSION = 1
+
+
+def is_test_file(rel_path: str) -> bool:
+    """pytest-style test modules inside a ``test``/``tests`` directory (not scripts like ``live_test.py``)."""
+    *dirs, name = rel_path.split("/")
+    if not _TEST_DIRS.intersection(dirs):
+        return False
+    return name.endswith(".py") and (name.startswith("test_") or name.endswith("_test.py"))
+
+
+def _module_candidates(rel_path: str, source: str, source_roots: Sequence[str]) -> List[str]:
+    """Absolute dotted names a file may import, including ``pkg.mod.name`` for from-imports.
+
+    Relative imports are anchored at the file's own package, so the result
+    depends only on the file and can be cached by content.
+    """
+    try:
+        tree = ast.parse(source)
+    except (SyntaxError, ValueError):
+        return []
+    package = None
+    for root in source_roots:
+        prefix = f"{root.strip('/')}/" if root.strip("/") else ""
+        if rel_path.startswith(prefix):
+            package = rel_path[len(prefix):].split("/")[:-1]
+            break
+    found: Set[str] = set()
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            found.update(alias.name for alias in node.names)
+        elif isinstance(node, ast.ImportFrom):
+            if node.level:
+                if package is None or node.level - 1 > len(package):
+                    continue
+                anchor = package[: len(package) - (node.level - 1)]
+                base = ".".join([*anchor, node.module] if node.module else anchor)
+            else:
+                base = node.module or ""
+            if base:
+                found.add(base)
+            found.update(f"{base}.{alias.name}" if base else alias.name for alias in node.names if alias.name != "*")
+        elif (
+            # importlib.import_module("pkg.mod") / __import__("pkg.mod") with a literal name
+            isinstance(node, ast.Call)
+            and node.args
+            and isinstance(node.args[0], ast.Constant)
+            and isinstance(node.args[0].value, str)
+            and (
+                (isinstance(node.func, ast.Attribute) and node.func.attr == "import_module")
+                or (isinstance(node.func, ast.Name) and node.func.id in ("import_module", "__import__"))
+            )
+        ):
+            found.add(node.args[0].value)
+    return sorted(found)
+
+
+class TestImpactIndex:
+    """Static import graph of a checkout, mapping modules to the tests that reach them.
+
+    ``refresh()`` walks the tree and re-parses only files whose content hash
+    changed since the cached entry, so rebuilding for a new commit costs one
+    read per file plus a parse per changed file.
+    """
+
+    __test__ = False  # not a pytest test class
+
+    def __init__(self, repo_root: str, *, source_roots: Sequence[str] = ("src", ""), cache_path: str | None = None) -> None:
+        self.repo_root = repo_root
+        self.source_roots = tuple(r.strip("/") for r in source_roots)
+        self.cache_path = cache_path
+        self.commit = ""
+        # rel path -> (content hash, import candidates)
+        self._files: Dict[str, Tuple[str, List[str]]] = {}
+        self._importers: Dict[str, Set[str]] = {}
+        self.parsed = 0
+
+    # -- building --------------------------------------------------------
+
+    def _walk(self) -> Iterable[str]:
+        for dirpath, dirnames, filenames in os.walk(self.repo_root):
+            dirnames[:] = sorted(d for d in dirnames if d not in _SKIP_DIRS)
+            rel_dir = os.path.relpath(dirpath, self.repo_root).replace(os.sep, "/")
+            for name in sorted(filenames):
+                if name.endswith(".py"):
+                    yield name if rel_dir == "." else f"{rel_dir}/{name}"
+
+    def _load_cache(self) -> Dict[str, Tuple[str, List[str]]]:
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return {}
+        try:
+            with open(self.cache_path, "r", encoding="utf-8") as fh:
+                data = json.load(fh)
+        except (OSError, ValueError):
+            return {}
+        if data.get("version") != _CACHE_VERSION or data.get("source_roots") != list(self.source_roots):
+            return {}
+        return {path: (entry[0], entry[1]) for path, entry in data.get("files", {}).items()}
+
+    def _save_cache(self) -> None:
+        if not self.cache_path:
+            return
+        os.makedirs(os.path.dirname(os.path.abspath(self.cache_path)), exist_ok=True)
+        tmp = f"{self.cache_path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as fh:
+            json.dump(
+                {
+                    "version": _CACHE_VERSION,
+                    "commit": self.commit,
+                    "source_roots": list(self.source_roots),
+                    "files": {path: list(entry) for path, entry in self._files.items()},
+                },
+                fh,
+            )
+        os.replace(tmp, self.cache_path)
+
+    def refresh(self) -> "TestImpactIndex":
+        cached = self._files or self._load_cache()
+        files: Dict[str, Tuple[str, List[str]]] = {}
+        self.parsed = 0
+        for rel in self._walk():
+            try:
+                with open(os.path.join(self.repo_root, rel), "rb") as fh:
+                    raw = fh.read()
+            except OSError:
+                continue
+            digest = hashlib.sha1(raw).hexdigest()
+            entry = cached.get(rel)
+            if entry is None or entry[0] != digest:
+                entry = (digest, _module_candidates(rel, raw.decode("utf-8", "replace"), self.source_roots))
+                self.parsed += 1
+            files[rel] = entry
+        changed = self.parsed or set(files) != set(cached)
+        self._files = files
+        self.commit = _head_commit(self.repo_root)
+        self._build_reverse_edges()
+        if changed or not (self.cache_path and os.path.exists(self.cache_path)):
+            self._save_cache()
+        return self
+
+    def _resolve(self, dotted: str) -> str | None:
+        rel = dotted.replace(".", "/")
+        for root in self.source_roots:
+            base = f"{root}/{rel}" if root else rel
+            for candidate in (f"{base}.py", f"{base}/__init__.py"):
+                if candidate in self._files:
+                    return candidate
+        return None
+
+    def _build_reverse_edges(self) -> None:
+        importers: Dict[str, Set[str]] = {}
+        for path, (_, candidates) in self._files.items():
+            for dotted in candidates:
+                target = self._resolve(dotted)
+                if target is None or target == path:
+                    continue
+                importers.setdefault(target, set()).add(path)
+                # Importing pkg.mod executes pkg/__init__.py as well.
+                parts = target.split("/")[:-1]
+                if target.endswith("/__init__.py"):
+                    parts = parts[:-1]
+                while parts:
+                    init = "/".join(parts) + "/__init__.py"
+                    if init in self._files and init != path:
+                        importers.setdefault(init, set()).add(path)
+                    parts = parts[:-1]
+        self._importers = importers
+
+    # -- queries ---------------------------------------------------------
+
+    def dependents(self, paths: Iterable[str]) -> Set[str]:
+        """Every indexed file that imports any of ``paths``, transitively (including them)."""
+        seen: Set[str] = set()
+        stack = [p for p in paths if p in self._files]
+        while stack:
+            path = stack.pop()
+            if path in seen:
+                continue
+            seen.add(path)
+            stack.extend(self._importers.get(path, ()))
+        return seen
+
+    def select(self, changed: Iterable[str]) -> List[str]:
+        """Test files affected by ``changed`` repo-relative paths."""
+        changed = [p.replace(os.sep, "/") for p in changed]
+        affected = self.dependents(changed)
+        tests = {path for path in affected if is_test_file(path)}
+        tests.update(p for p in changed if is_test_file(p) and p in self._files)
+        for path in changed:
+            # A changed conftest.py applies to every test below its directory.
+            if path.rsplit("/", 1)[-1] == "conftest.py":
+                prefix = path.rsplit("/", 1)[0] + "/" if "/" in path else ""
+                tests.update(p for p in self._files if p.startswith(prefix) and is_test_file(p))
+        return sorted(tests)
+
+    @property
+    def tests(self) -> List[str]:
+        return sorted(path for path in self._files if is_test_file(path))
+
+
+def _head_commit(repo_root: str) -> str:
+    try:
+        proc = subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True, text=True, timeout=5
+        )
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+def default_cache_path(repo_root: str) -> str:
+    return os.path.join(repo_root, ".ticketwatcher", "impact.json")
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="ticketwatcher impact", description="Select the tests affected by changed files.")
+    parser.add_argument("paths", nargs="*", help="changed repo-relative paths (default: git diff against --base)")
+    parser.add_argument("--repo-root", default=os.getcwd())
+    parser.add_argument("--base", default="HEAD", help="git revision to diff against when no paths are given")
+    parser.add_argument("--run", action="store_true", help="run the selected tests")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--timeout", type=float, default=120.0)
+    args = parser.parse_args(argv)
+
+    index = TestImpactIndex(args.repo_root, cache_path=default_cache_path(args.repo_root)).refresh()
+    changed = args.paths
+    if not changed:
+        proc = subprocess.run(
+            ["git", "diff", "--name-only", args.base], cwd=args.repo_root, capture_output=True, text=True
+        )
+        changed = [line for line in proc.stdout.splitlines() if line]
+    selected = index.select(changed)
+    print(f"{len(index.tests)} test file(s) indexed ({index.parsed} parsed); {len(selected)} affected:", file=sys.stderr)
+    for path in selected:
+        print(path)
+    if not args.run or not selected:
+        return 0
+
+    from .verify import run_tests_in_snapshot
+
+    issues = run_tests_in_snapshot(args.repo_root, {}, selected, timeout=args.timeout, workers=args.workers)
+    for issue in issues:
+        print(issue.format(), file=sys.stderr)
+    return 1 if issues else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
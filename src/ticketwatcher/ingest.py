@@ -0,0 +1,177 @@
+"""Bounded-memory ingestion of logs attached to (or linked from) an issue."""
+from __future__ import annotations
+
+import codecs
+import os
+import re
+import zlib
+from dataclasses import dataclass, field
+from typing import Dict, Iterator, List, Protocol
+
+from .stackparse import StackScanner
+
+_RE_ARTIFACT_LINK = re.compile(
+    r'https://(?:'
+    r'github\.com/user-attachments/files/\d+/[^\s)\]>"\']+'
+    r'|github\.com/[\w.-]+/[\w.-]+/files/\d+/[^\s)\]>"\']+'
+    r'|gist\.github\.com/(?:[\w-]+/)?[0-9a-f]{8,}(?:#[\w-]+)?'
+    r'|gist\.githubusercontent\.com/[^\s)\]>"\']+'
+    r')'
+)
+_RE_GIST_ID = re.compile(r'^https://gist\.github\.com/(?:[\w-]+/)?([0-9a-f]{8,})')
+_BINARY_SUFFIXES = (".zip", ".png", ".jpg", ".jpeg", ".gif", ".mp4", ".mov", ".pdf")
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+
+
+def find_artifact_links(text: str, limit: int = 5) -> List[str]:
+    """Return distinct attachment / gist URLs referenced in ``text``, in order."""
+    links: Dict[str, None] = {}
+    for match in _RE_ARTIFACT_LINK.finditer(text or ""):
+        url = match.group(0).rstrip(".,;")
+        if url.lower().endswith(_BINARY_SUFFIXES):
+            continue
+        links.setdefault(url, None)
+        if len(links) >= limit:
+            break
+    return list(links)
+
+
+class ArtifactSource(Protocol):
+    """Anything that can stream the text of an artifact URL in chunks."""
+
+    def iter_chunks(self, url: str, chunk_size: int) -> Iterator[str]:
+        ...
+
+
+def _decode_stream(raw_chunks: Iterator[bytes], gzipped: bool) -> Iterator[str]:
+    """Incrementally (optionally gunzip and) UTF-8 decode a byte stream."""
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    inflater = zlib.decompressobj(16 + zlib.MAX_WBITS) if gzipped else None
+    for raw in raw_chunks:
+        if not raw:
+            continue
+        if inflater is not None:
+            raw = inflater.decompress(raw)
+        text = decoder.decode(raw)
+        if text:
+            yield text
+    tail = decoder.decode(inflater.flush() if inflater is not None else b"", final=True)
+    if tail:
+        yield tail
+
+
+class LocalArtifactSource:
+    """Serve artifact URLs from local files; the stand-in used in tests and dry runs."""
+
+    def __init__(self, files: Dict[str, str]):
+        self.files = dict(files)
+
+    def iter_chunks(self, url: str, chunk_size: int) -> Iterator[str]:
+        path = self.files.get(url)
+        if path is None:
+            return iter(())
+        return self._read(path, chunk_size)
+
+    @staticmethod
+    def _read(path: str, chunk_size: int) -> Iterator[str]:
+        with open(path, "rb") as fh:
+            yield from _decode_stream(iter(lambda: fh.read(chunk_size), b""), path.endswith(".gz"))
+
+
+class GitHubArtifactSource:
+    """Stream issue attachments and gists from GitHub without buffering them."""
+
+    def iter_chunks(self, url: str, chunk_size: int) -> Iterator[str]:
+        from . import github_api
+
+        gist = _RE_GIST_ID.match(url)
+        if gist:
+            for raw_url in github_api.get_gist_raw_urls(gist.group(1)):
+                yield from self._stream(github_api, raw_url, chunk_size)
+            return
+        yield from self._stream(github_api, url, chunk_size)
+
+    @staticmethod
+    def _stream(github_api, url: str, chunk_size: int) -> Iterator[str]:
+        with github_api.open_stream(url) as response:
+            encoding = (response.headers.get("Content-Encoding") or "").lower()
+            ctype = (response.headers.get("Content-Type") or "").lower()
+            gzipped = "gzip" in ctype or (url.endswith(".gz") and "gzip" not in encoding)
+            if ctype.startswith(("image/", "video/", "application/zip")):
+                return
+            yield from _decode_stream(response.iter_content(chunk_size=chunk_size), gzipped)
+
+
+@dataclass
+class IngestReport:
+    urls: List[str] = field(default_factory=list)
+    bytes_read: int = 0
+    truncated: bool = False
+    errors: Dict[str, str] = field(default_factory=dict)
+
+
+def ingest_artifacts(
+    urls: List[str],
+    scanner: StackScanner,
+    *,
+    source: ArtifactSource,
+    max_bytes: int,
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+) -> IngestReport:
+    """Feed each artifact through ``scanner`` chunk by chunk.
+
+    Stops as soon as the scanner has enough frames or ``max_bytes`` (counted
+    across all artifacts, as decoded characters) have been read; only one
+    chunk is held in memory at a time.
+    """
+    report = IngestReport()
+    for url in urls:
+        if scanner.done or report.bytes_read >= max_bytes:
+            break
+        report.urls.append(url)
+        chunks = source.iter_chunks(url, chunk_size)
+        try:
+            for chunk in chunks:
+                remaining = max_bytes - report.bytes_read
+                if len(chunk) > remaining:
+                    chunk = chunk[:remaining]
+                    report.truncated = True
+                report.bytes_read += len(chunk)
+                if scanner.feed(chunk) or report.bytes_read >= max_bytes:
+                    break
+            scanner.feed("\n")  # the next artifact starts on a fresh line
+        except Exception as exc:  # pylint: disable=broad-except
+            report.errors[url] = str(exc)
+        finally:
+            close = getattr(chunks, "close", None)
+            if close is not None:
+                close()
+    if report.bytes_read >= max_bytes:
+        report.truncated = True
+    return report
+
+
+def default_source() -> ArtifactSource:
+    """Local files when ``TICKETWATCHER_ARTIFACT_DIR`` is set, GitHub otherwise.
+
+    The local directory maps each URL to a file named after the URL's last
+    path segment, which keeps dry runs and fixtures free of network access.
+    """
+    local_dir = os.getenv("TICKETWATCHER_ARTIFACT_DIR")
+    if local_dir:
+        return _DirectoryArtifactSource(local_dir)
+    return GitHubArtifactSource()
+
+
+class _DirectoryArtifactSource(LocalArtifactSource):
+    def __init__(self, directory: str):
+        super().__init__({})
+        self.directory = directory
+
+    def iter_chunks(self, url: str, chunk_size: int) -> Iterator[str]:
+        name = url.split("#", 1)[0].rstrip("/").rsplit("/", 1)[-1]
+        path = os.path.join(self.directory, name)
+        if not os.path.isfile(path):
+            return iter(())
+        return self._read(path, chunk_size)
@@ -2,19 +2,202 @@
 from __future__ import annotations
 
 import os
-from typing import Iterable, List
+import posixpath
+import re
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional, Pattern, Sequence, Tuple
 
 
-def parse_allowed_paths_env(raw: str | None) -> List[str]:
-    """Parse a comma-separated env string into normalized allowlist prefixes."""
+_GLOB_CHARS = frozenset("*?[")
+_CACHE_LIMIT = 4096
+
+
+def _translate_glob(pattern: str) -> str:
+    """Translate a path glob into a regex body.
+
+    ``*`` and ``?`` stay within one path segment, ``**`` crosses segments and
+    a pattern without a slash matches at any depth (``*.md``). A glob that
+    matches a directory also covers everything beneath it.
+    """
+    out: List[str] = []
+    i, n = 0, len(pattern)
+    while i < n:
+        ch = pattern[i]
+        if pattern.startswith("**/", i):
+            out.append("(?:.*/)?")
+            i += 3
+            continue
+        if pattern.startswith("**", i):
+            out.append(".*")
+            i += 2
+            continue
+        if ch == "*":
+            out.append("[^/]*")
+        elif ch == "?":
+            out.append("[^/]")
+        elif ch == "[":
+            end = pattern.find("]", i + 2 if pattern[i + 1 : i + 2] in ("!", "]") else i + 1)
+            if end < 0:
+                out.append(re.escape(ch))
+            else:
+                body = pattern[i + 1 : end]
+                if body.startswith("!"):
+                    body = "^" + body[1:]
+                out.append("[" + body.replace("\\", "\\\\") + "]")
+                i = end
+        else:
+            out.append(re.escape(ch))
+        i += 1
+    anchor = "" if "/" in pattern.rstrip("/") else "(?:.*/)?"
+    return anchor + "".join(out).rstrip("/") + "(?:/.*)?"
+
+
+class _PrefixTrie:
+    """Path-segment trie; a path matches when any of its leading segments ends a rule."""
+
+    __slots__ = ("root",)
+    _END = ""  # segments are never empty, so this key cannot collide
+
+    def __init__(self) -> None:
+        self.root: Dict[str, dict] = {}
+
+    def add(self, prefix: str) -> None:
+        node = self.root
+        for segment in prefix.strip("/").split("/"):
+            node = node.setdefault(segment, {})
+        node[self._END] = True
+
+    def __bool__(self) -> bool:
+        return bool(self.root)
+
+    def matches(self, path: str) -> bool:
+        node = self.root
+        for segment in path.split("/"):
+            node = node.get(segment)
+            if node is None:
+                return False
+            if self._END in node:
+                return True
+        return False
+
+
+class AllowList(Sequence[str]):
+    """Compiled path allowlist.
+
+    Entries are plain prefixes (``src/``, ``src/app.py``), globs (``*.md``,
+    ``services/*/handlers/``) or negations of either (``!src/vendor/``).
+    A path is allowed when it matches a positive entry (or there are none)
+    and no negative entry. Lookups cost one trie walk plus at most one regex
+    per polarity and are memoized per instance.
+
+    It behaves like the list of normalized entries it was built from, so it
+    can be joined into prompts and compared against plain lists.
+    """
+
+    def __init__(self, entries: Iterable[str] = ()):
+        self._entries: List[str] = list(entries)
+        self._include = _PrefixTrie()
+        self._exclude = _PrefixTrie()
+        include_globs: List[str] = []
+        exclude_globs: List[str] = []
+        self.allows_all = False
+        for entry in self._entries:
+            negated = entry.startswith("!")
+            pattern = entry[1:] if negated else entry
+            if not pattern:
+                if not negated:
+                    self.allows_all = True
+                continue
+            if _GLOB_CHARS.intersection(pattern):
+                (exclude_globs if negated else include_globs).append(_translate_glob(pattern))
+            else:
+                (self._exclude if negated else self._include).add(pattern)
+        self._include_re = _compile_alternation(include_globs)
+        self._exclude_re = _compile_alternation(exclude_globs)
+        self._has_include = bool(self._include) or self._include_re is not None
+        self._has_exclude = bool(self._exclude) or self._exclude_re is not None
+        # Nothing positive configured means "everything not excluded".
+        if not self._has_include:
+            self.allows_all = not self._has_exclude
+        self._cache: Dict[str, bool] = {}
+
+    def allows(self, path: str) -> bool:
+        if not path:
+            return False
+        if self.allows_all:
+            return True
+        cached = self._cache.get(path)
+        if cached is None:
+            cached = self._match(path)
+            if len(self._cache) >= _CACHE_LIMIT:
+                self._cache.clear()
+            self._cache[path] = cached
+        return cached
+
+    __call__ = allows
+
+    def _match(self, path: str) -> bool:
+        if self._has_include and not (
+            self._include.matches(path)
+            or (self._include_re is not None and self._include_re.match(path))
+        ):
+            return False
+        if self._has_exclude and (
+            self._exclude.matches(path)
+            or (self._exclude_re is not None and self._exclude_re.match(path))
+        ):
+            return False
+        return True
+
+    def __getitem__(self, index):
+        return self._entries[index]
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __eq__(self, other: object) -> bool:
+        if isinstance(other, AllowList):
+            return self._entries == other._entries
+        if isinstance(other, (list, tuple)):
+            return self._entries == list(other)
+        return NotImplemented
+
+    __hash__ = None  # type: ignore[assignment]
+
+    def __repr__(self) -> str:
+        return f"AllowList({self._entries!r})"
+
+
+def _compile_alternation(bodies: List[str]) -> Optional[Pattern[str]]:
+    if not bodies:
+        return None
+    return re.compile("(?:" + "|".join(bodies) + r")\Z")
+
+
+@lru_cache(maxsize=32)
+def _compile_cached(entries: Tuple[str, ...]) -> AllowList:
+    return AllowList(entries)
+
+
+def compile_allowlist(prefixes: Iterable[str] | None) -> AllowList:
+    """Return ``prefixes`` as an :class:`AllowList`, compiling plain lists once."""
+    if isinstance(prefixes, AllowList):
+        return prefixes
+    if not prefixes:
+        return _compile_cached(())
+    return _compile_cached(tuple(prefixes))
+
+
+def parse_allowed_paths_env(raw: str | None) -> AllowList:
+    """Parse a comma-separated env string into a compiled allowlist."""
     if raw is None:
         # No configuration provided -> allow all paths so stack traces can be
         # honored without extra setup. Users can still opt-in to restrictions by
         # setting ALLOWED_PATHS explicitly.
-        return [""]
+        return AllowList([""])
 
     if raw.strip() == "":
-        return [""]
+        return AllowList([""])
 
     normalized: List[str] = []
     seen: set[str] = set()
@@ -22,24 +205,29 @@ def parse_allowed_paths_env(raw: str | None) -> List[str]:
         trimmed = (part or "").strip()
         if not trimmed:
             continue
-        prefix = _normalize_prefix(trimmed)
-        if prefix in seen:
+        if trimmed.startswith("!"):
+            prefix = "!" + _normalize_prefix(trimmed[1:].strip())
+        else:
+            prefix = _normalize_prefix(trimmed)
+        if prefix in seen or prefix == "!":
             continue
         seen.add(prefix)
         normalized.append(prefix)
 
     if not normalized:
         # A string that only contained commas or whitespace still means "allow all".
-        return [""]
+        return AllowList([""])
 
-    return normalized
+    return AllowList(normalized)
 
 
 def _normalize_prefix(prefix: str) -> str:
     """Ensure directory-like prefixes end with a slash for cheap prefix checks."""
     if not prefix:
         return ""
-    if prefix.endswith("/"):
+    if prefix.startswith("./"):
+        prefix = prefix[2:]
+    if prefix.endswith("/") or _GLOB_CHARS.intersection(prefix):
         return prefix
     # If the last path component looks like a filename (contains a dot), keep as-is.
     tail = prefix.split("/")[-1]
@@ -48,18 +236,12 @@ def _normalize_prefix(prefix: str) -> str:
 
 def allows_all_paths(prefixes: Iterable[str] | None) -> bool:
     """Return True when the allowlist permits touching any path."""
-    if not prefixes:
-        return True
-    return any(prefix == "" for prefix in prefixes)
+    return compile_allowlist(prefixes).allows_all
 
 
 def is_path_allowed(path: str, prefixes: Iterable[str] | None) -> bool:
-    """Simple prefix-based allowlist check for repo-relative paths."""
-    if not path:
-        return False
-    if allows_all_paths(prefixes):
-        return True
-    return any(path == prefix.rstrip("/") or path.startswith(prefix) for prefix in prefixes or [])
+    """Check a repo-relative path against the (compiled) allowlist."""
+    return compile_allowlist(prefixes).allows(path)
 
 
 def to_repo_relative(path: str, repo_root: str, repo_name: str) -> str:
@@ -68,14 +250,29 @@ def to_repo_relative(path: str, repo_root: str, repo_name: str) -> str:
     if not cleaned:
         return ""
 
+    root = (repo_root or "").replace("\\", "/").rstrip("/")
     repo_token = f"/{repo_name}/" if repo_name else None
-    if repo_token and repo_token in cleaned:
-        cleaned = cleaned.split(repo_token, 1)[1]
+    absolute = cleaned.startswith("/") or cleaned[1:3] == ":/"
+    if root and cleaned.startswith(root + "/"):
+        rel = cleaned[len(root) + 1:]
+    elif absolute and repo_token and repo_token in cleaned:
+        # A checkout somewhere else (e.g. a developer laptop): anchor on the
+        # first occurrence of the repo directory name, since a package inside
+        # the repo often has the same name (requests/src/requests/api.py).
+        rel = cleaned.split(repo_token, 1)[1]
+    elif absolute:
+        try:
+            rel = os.path.relpath(cleaned, repo_root).replace("\\", "/")
+        except Exception:
+            rel = cleaned
+    else:
+        # Already relative: resolve against the repo, not the process cwd.
+        rel = posixpath.normpath(cleaned)
 
-    try:
-        rel = os.path.relpath(cleaned, repo_root).replace("\\", "/")
-    except Exception:
-        rel = cleaned
-
-    return rel.lstrip("./").lstrip("/")
+    # Drop leading ./ and ../ segments but keep dotfiles like .github/.
+    while rel.startswith(("./", "../")):
+        rel = rel.split("/", 1)[1]
+    if rel in (".", ".."):
+        return ""
+    return rel.lstrip("/")
 
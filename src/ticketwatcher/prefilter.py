@@ -0,0 +1,50 @@
+"""Cheap event checks that run before any heavy module is imported."""
+from __future__ import annotations
+
+from typing import Any, Dict, Set, Tuple
+
+AGENT_COMMAND = "/agent fix"
+HANDLED_EVENTS = frozenset({"issues", "issue_comment"})
+# Commenters who may start a run on an issue that has no trigger label yet.
+TRUSTED_ASSOCIATIONS = frozenset({"OWNER", "MEMBER", "COLLABORATOR"})
+
+
+def is_trigger_event(event: Dict[str, Any], trigger_labels: Set[str]) -> bool:
+    """Only opened/reopened issues carrying a trigger label, or adding one, start a run."""
+    action = event.get("action")
+    labels = {label.get("name") for label in (event.get("issue") or {}).get("labels") or []}
+    if action == "labeled":
+        label_name = (event.get("label") or {}).get("name")
+        return label_name in trigger_labels if label_name else bool(labels & trigger_labels)
+    if action in {"opened", "reopened"}:
+        return bool(labels & trigger_labels)
+    return False
+
+
+def is_agent_command(event: Dict[str, Any]) -> bool:
+    if event.get("action") != "created":
+        return False
+    body = (event.get("comment") or {}).get("body") or ""
+    return body.strip().lower().startswith(AGENT_COMMAND)
+
+
+def may_run_command(event: Dict[str, Any], trigger_labels: Set[str]) -> bool:
+    """An agent command runs on issues carrying a trigger label, or when a repo member posts it."""
+    labels = {label.get("name") for label in (event.get("issue") or {}).get("labels") or []}
+    association = (event.get("comment") or {}).get("author_association") or ""
+    return bool(labels & trigger_labels) or association.upper() in TRUSTED_ASSOCIATIONS
+
+
+def needs_work(event_name: str | None, event: Dict[str, Any], trigger_labels: Set[str]) -> Tuple[bool, str]:
+    """Decide from the raw payload whether the pipeline has anything to do."""
+    if event_name not in HANDLED_EVENTS:
+        return False, f"event {event_name} not handled"
+    if event_name == "issue_comment":
+        if not is_agent_command(event):
+            return False, "comment is not an agent command"
+        if may_run_command(event, trigger_labels):
+            return True, "agent command"
+        return False, "agent command from a non-member on an issue without a trigger label"
+    if is_trigger_event(event, trigger_labels):
+        return True, "trigger label"
+    return False, f"issue action {event.get('action')!r} without a trigger label"
@@ -0,0 +1,230 @@
+"""Opt-in CPU and memory profiling of one handler run (``--profile`` / ``TICKETWATCHER_PROFILE``).
+
+:class:`Profiler` wraps the run in ``cProfile`` and ``tracemalloc`` and
+starts a sampler thread that records the process RSS and every thread's
+Python stack every few milliseconds. It also acts as a telemetry exporter,
+so the pipeline's own spans mark where each stage started and ended. On exit
+it writes to its output directory:
+
+* ``profile.pstats``: ``cProfile`` stats of the handler thread
+  (``python -m pstats``, snakeviz, ...);
+* ``stacks.collapsed``: sampled stacks of all threads in the collapsed
+  format read by ``flamegraph.pl`` and speedscope;
+* ``allocations.txt``: the top allocation sites still holding memory, plus
+  the traced peak;
+* ``stages.json``: calls, time and peak RSS per stage;
+* ``summary.txt``: the stage table, the hottest functions and allocation sites.
+"""
+from __future__ import annotations
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from bisect import bisect_left, bisect_right
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional
+
+# Span name -> reported stage.
+STAGES = {
+    "stackparse": "parse",
+    "ingest": "parse",
+    "seeds.fetch": "fetch",
+    "context.fetch": "fetch",
+    "retrieval.search": "fetch",
+    "prompt.build": "prompt",
+    "llm.call": "llm",
+    "patch.apply": "apply",
+    "patch.verify": "verify",
+}
+TOP_N = 25
+_MIB = 1024 * 1024
+
+
+def rss_bytes() -> int:
+    """Resident set size of this process now; the peak so far where the current value is unavailable."""
+    try:
+        with open("/proc/self/statm", "r", encoding="ascii") as fh:
+            return int(fh.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+
+def _frame_name(frame: FrameType) -> str:
+    code = frame.f_code
+    parts = code.co_filename.replace("\\", "/").rsplit("/", 2)
+    where = "/".join(parts[-2:])
+    return f"{code.co_name} ({where}:{code.co_firstlineno})".replace(";", ":")
+
+
+def collapse(frame: Optional[FrameType], root: str = "") -> str:
+    """``root;outermost;...;innermost`` for one thread's stack."""
+    names: List[str] = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    if root:
+        names.append(root)
+    return ";".join(reversed(names))
+
+
+class Sampler(threading.Thread):
+    """Samples RSS and the stacks of all other threads every ``interval`` seconds."""
+
+    def __init__(self, interval: float = 0.005) -> None:
+        super().__init__(name="ticketwatcher-profiler", daemon=True)
+        self.interval = interval
+        self.stacks: Counter = Counter()
+        # Parallel, time-ordered lists of (time.time(), RSS bytes).
+        self.times: List[float] = []
+        self.rss: List[int] = []
+        self._halt = threading.Event()
+
+    def run(self) -> None:
+        while not self._halt.wait(self.interval):
+            self.sample()
+
+    def sample(self) -> None:
+        self.times.append(time.time())
+        self.rss.append(rss_bytes())
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        me = threading.get_ident()
+        for ident, frame in sys._current_frames().items():
+            if ident != me:
+                self.stacks[collapse(frame, f"thread {names.get(ident, ident)}")] += 1
+
+    def peak_between(self, start: float, end: float) -> int:
+        lo, hi = bisect_left(self.times, start), bisect_right(self.times, end)
+        return max(self.rss[lo:hi], default=0)
+
+    def stop(self) -> None:
+        self._halt.set()
+        if self.is_alive():
+            self.join()
+
+
+class Profiler:
+    """Profile everything run inside ``with Profiler(out_dir) as profiler:``.
+
+    Pass ``profiler`` to ``telemetry.configure(exporters=...)`` so stage
+    spans reach it; without them only whole-run results are written.
+    """
+
+    def __init__(self, out_dir: str, *, interval: float = 0.005, top: int = TOP_N) -> None:
+        self.out_dir = out_dir
+        self.top = top
+        self.sampler = Sampler(interval)
+        # stage -> [calls, total ms, peak RSS bytes]
+        self.stages: Dict[str, List[float]] = {}
+        self._cprofile = cProfile.Profile()
+        self._lock = threading.Lock()
+        self._started = 0.0
+        self._owns_tracemalloc = False
+
+    def __call__(self, data: Dict[str, Any]) -> None:
+        stage = STAGES.get(data["name"])
+        if stage is None:
+            return
+        end = data["start"] + data["duration_ms"] / 1000
+        # The span's own end is sampled too, so stages shorter than the interval still get a reading.
+        peak = max(self.sampler.peak_between(data["start"], end), rss_bytes())
+        with self._lock:
+            row = self.stages.setdefault(stage, [0, 0.0, 0])
+            row[0] += 1
+            row[1] += data["duration_ms"]
+            row[2] = max(row[2], peak)
+
+    def __enter__(self) -> "Profiler":
+        os.makedirs(self.out_dir, exist_ok=True)
+        self._owns_tracemalloc = not tracemalloc.is_tracing()
+        if self._owns_tracemalloc:
+            tracemalloc.start()
+        self._started = time.perf_counter()
+        self.sampler.sample()
+        self.sampler.start()
+        self._cprofile.enable()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._cprofile.disable()
+        wall = time.perf_counter() - self._started
+        self.sampler.stop()
+        self.sampler.sample()
+        snapshot = tracemalloc.take_snapshot().filter_traces(
+            (
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, __file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            )
+        )
+        _, traced_peak = tracemalloc.get_traced_memory()
+        if self._owns_tracemalloc:
+            tracemalloc.stop()
+        self.write(wall, snapshot, traced_peak)
+        return False
+
+    def write(self, wall: float, snapshot: tracemalloc.Snapshot, traced_peak: int) -> None:
+        self._cprofile.dump_stats(self._path("profile.pstats"))
+        with open(self._path("stacks.collapsed"), "w", encoding="utf-8") as fh:
+            for stack, count in sorted(self.sampler.stacks.items()):
+                fh.write(f"{stack} {count}\n")
+        allocations = self._allocations(snapshot, traced_peak)
+        with open(self._path("allocations.txt"), "w", encoding="utf-8") as fh:
+            fh.write(allocations)
+        stages = self.stage_report(wall)
+        with open(self._path("stages.json"), "w", encoding="utf-8") as fh:
+            json.dump(stages, fh, indent=2)
+        with open(self._path("summary.txt"), "w", encoding="utf-8") as fh:
+            fh.write(self._summary(stages, allocations))
+
+    def stage_report(self, wall: float) -> Dict[str, Any]:
+        with self._lock:
+            rows = dict(self.stages)
+        return {
+            "wall_s": round(wall, 3),
+            "peak_rss_mb": round(max(self.sampler.rss, default=0) / _MIB, 1),
+            "samples": len(self.sampler.times),
+            "stages": {
+                stage: {"calls": int(calls), "total_ms": round(total, 1), "peak_rss_mb": round(peak / _MIB, 1)}
+                for stage, (calls, total, peak) in rows.items()
+            },
+        }
+
+    def _allocations(self, snapshot: tracemalloc.Snapshot, traced_peak: int) -> str:
+        stats = snapshot.statistics("lineno")
+        lines = [
+            f"traced peak {traced_peak / _MIB:.1f} MiB; still allocated at exit"
+            f" {sum(stat.size for stat in stats) / _MIB:.1f} MiB",
+            "",
+        ]
+        for stat in stats[: self.top]:
+            frame = stat.traceback[0]
+            lines.append(f"{stat.size / 1024:10.1f} KiB {stat.count:8d} blocks  {frame.filename}:{frame.lineno}")
+        return "\n".join(lines) + "\n"
+
+    def _summary(self, stages: Dict[str, Any], allocations: str) -> str:
+        lines = [
+            f"wall {stages['wall_s']:.2f}s, peak RSS {stages['peak_rss_mb']:.1f} MiB, {stages['samples']} stack samples",
+            "",
+            f"{'stage':<8} {'calls':>6} {'total ms':>10} {'peak RSS MiB':>13}",
+        ]
+        for stage, row in sorted(stages["stages"].items(), key=lambda item: -item[1]["total_ms"]):
+            lines.append(f"{stage:<8} {row['calls']:6d} {row['total_ms']:10.1f} {row['peak_rss_mb']:13.1f}")
+        hot = io.StringIO()
+        pstats.Stats(self._cprofile, stream=hot).sort_stats("cumulative").print_stats(self.top)
+        return "\n".join(lines) + "\n\n" + hot.getvalue().strip() + "\n\n" + allocations
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.out_dir, name)
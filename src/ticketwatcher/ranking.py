@@ -0,0 +1,120 @@
+"""Relevance ranking of stack frames for choosing which files to seed."""
+from __future__ import annotations
+
+import math
+import posixpath
+import re
+from collections import defaultdict
+from dataclasses import dataclass, field
+from typing import Dict, List, Sequence, Tuple
+
+from .stackparse import StackFrame
+
+# Weights are deliberately simple and additive so rankings are easy to explain.
+_INNERMOST_WEIGHT = 10.0
+_RAISING_BONUS = 8.0
+_TARGET_BONUS = 12.0
+_TEST_PENALTY = 6.0
+_REPEAT_WEIGHT = 2.0
+# Files scoring below this fraction of the best file are not worth a fetch.
+_MIN_RELATIVE_SCORE = 0.25
+
+_TEST_DIRS = frozenset({"test", "tests", "testing", "__tests__", "spec", "specs"})
+_RE_TEST_FILE = re.compile(
+    r'^(?:test_.+\.py|.+_test\.(?:py|go)|conftest\.py|.+\.(?:test|spec)\.[cm]?[jt]sx?|.+Tests?\.(?:java|kt))$'
+)
+
+
+@dataclass
+class SeedTarget:
+    """One file to fetch, with the line(s) worth centering slices on."""
+
+    path: str
+    lines: List[int] = field(default_factory=list)
+    score: float = 0.0
+
+
+def is_test_path(path: str) -> bool:
+    parts = path.split("/")
+    if any(part in _TEST_DIRS for part in parts[:-1]):
+        return True
+    return bool(_RE_TEST_FILE.match(posixpath.basename(path)))
+
+
+def _block_depths(frames: Sequence[StackFrame]) -> Dict[int, int]:
+    """Map id(frame) -> depth within its trace, where 0 is the innermost frame."""
+    by_block: Dict[int, List[StackFrame]] = defaultdict(list)
+    for frame in frames:
+        if frame.block >= 0:
+            by_block[frame.block].append(frame)
+
+    depths: Dict[int, int] = {}
+    for block_frames in by_block.values():
+        ordered = sorted(block_frames, key=lambda f: f.position)
+        if ordered[0].kind in ("python", "pytest"):
+            ordered.reverse()  # outermost printed first
+        for depth, frame in enumerate(ordered):
+            depths[id(frame)] = depth
+    return depths
+
+
+def score_frame(frame: StackFrame, depth: int | None) -> float:
+    """Score one frame; higher means more likely to be where the bug lives."""
+    score = 0.0
+    if frame.kind == "target":
+        score += _TARGET_BONUS
+    if depth is not None:
+        score += _INNERMOST_WEIGHT / (1 + depth)
+    else:
+        score += _INNERMOST_WEIGHT / 4  # loose path:line mention, no trace context
+    if frame.raising:
+        score += _RAISING_BONUS
+    if is_test_path(frame.path):
+        score -= _TEST_PENALTY
+    if frame.count > 1:
+        score += _REPEAT_WEIGHT * math.log2(frame.count)
+    return score
+
+
+def rank_frames(frames: Sequence[StackFrame]) -> List[Tuple[StackFrame, float]]:
+    """Return ``(frame, score)`` pairs, best first (ties keep text order)."""
+    depths = _block_depths(frames)
+    scored = [(frame, score_frame(frame, depths.get(id(frame)))) for frame in frames]
+    scored.sort(key=lambda item: (-item[1], item[0].order))
+    return scored
+
+
+def select_seed_targets(
+    frames: Sequence[StackFrame],
+    *,
+    max_files: int = 3,
+    max_lines_per_file: int = 2,
+    around_lines: int = 60,
+) -> List[SeedTarget]:
+    """Choose the smallest set of files (and lines) worth fetching as seeds.
+
+    Frames are grouped per file; a file's score is its best frame's score
+    plus a small bonus for every other distinct frame in it. Lines that fall
+    within one ``around_lines`` window of an already chosen line are folded
+    into that slice rather than costing another one.
+    """
+    ranked = rank_frames(frames)
+    targets: Dict[str, SeedTarget] = {}
+    order: List[str] = []
+    for frame, score in ranked:
+        target = targets.get(frame.path)
+        if target is None:
+            target = targets[frame.path] = SeedTarget(path=frame.path, score=score)
+            order.append(frame.path)
+        else:
+            target.score += max(score, 0.0) * 0.1
+        if frame.line is None or len(target.lines) >= max_lines_per_file:
+            continue
+        if all(abs(frame.line - line) > around_lines for line in target.lines):
+            target.lines.append(frame.line)
+
+    chosen = sorted((targets[path] for path in order), key=lambda t: -t.score)
+    if not chosen:
+        return []
+    floor = chosen[0].score * _MIN_RELATIVE_SCORE if chosen[0].score > 0 else float("-inf")
+    return [target for target in chosen[: max(1, max_files)] if target.score >= floor]
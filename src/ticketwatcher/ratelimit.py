@@ -0,0 +1,279 @@
+"""Client-side request and token rate limiting for the LLM provider, shared across threads and processes."""
+from __future__ import annotations
+
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterator, Mapping, Optional, Tuple
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS buckets (
+    name TEXT PRIMARY KEY,
+    capacity REAL NOT NULL,
+    level REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS waiters (
+    ticket INTEGER PRIMARY KEY AUTOINCREMENT,
+    seen REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS blocked (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    until REAL NOT NULL
+);
+"""
+_BUCKETS = ("requests", "tokens")
+_RE_DURATION = re.compile(r"(\d+(?:\.\d+)?)(ms|h|m|s)")
+_UNITS = {"ms": 0.001, "s": 1.0, "m": 60.0, "h": 3600.0}
+
+
+class RateLimitTimeout(TimeoutError):
+    """No capacity became available within the caller's timeout."""
+
+
+@dataclass
+class Grant:
+    """Capacity drawn for one request: ``tokens`` reserved after ``waited`` seconds in the queue."""
+
+    tokens: int
+    waited: float = 0.0
+
+
+def parse_duration(value: Any) -> Optional[float]:
+    """Seconds in a ``Retry-After`` / ``x-ratelimit-reset-*`` value (``"2"``, ``"1.5s"``, ``"6m0s"``, ``"20ms"``)."""
+    if value is None:
+        return None
+    text = str(value).strip()
+    try:
+        return max(0.0, float(text))
+    except ValueError:
+        pass
+    parts = _RE_DURATION.findall(text)
+    if not parts:
+        return None
+    return sum(float(amount) * _UNITS[unit] for amount, unit in parts)
+
+
+def _number(value: Any) -> Optional[float]:
+    try:
+        return float(value) if value is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+class RateLimiter:
+    """Token buckets for requests and tokens per minute, kept in SQLite.
+
+    With ``path`` ``":memory:"`` the buckets are shared by the threads of this
+    process; with a file path, by every process on the host using that file
+    (each draw is one ``BEGIN IMMEDIATE`` transaction). ``rpm``/``tpm`` are
+    the starting limits (0: unknown, not limited); the provider's
+    ``x-ratelimit-limit-*`` headers replace them and ``x-ratelimit-remaining-*``
+    pull the buckets down to what the provider reports, so requests from other
+    hosts are accounted for too. A 429 blocks everyone until its
+    ``Retry-After``.
+
+    Waiters are served first come, first served: a request that cannot draw at
+    once takes a ticket, and only the oldest live ticket may draw. Tickets of
+    crashed processes expire after ``stale`` seconds without a heartbeat.
+    """
+
+    def __init__(
+        self,
+        path: str = ":memory:",
+        *,
+        rpm: float = 0,
+        tpm: float = 0,
+        completion_reserve: int = 1024,
+        poll: float = 0.05,
+        stale: float = 10.0,
+        clock: Callable[[], float] = time.time,
+        sleep: Callable[[float], None] = time.sleep,
+    ) -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.completion_reserve = completion_reserve
+        self.poll = poll
+        self.stale = stale
+        self._clock = clock
+        self._sleep = sleep
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+        # Queue statistics for this process.
+        self.granted = 0
+        self.queued = 0
+        self.wait_seconds = 0.0
+        self.max_wait = 0.0
+        with self._txn() as db:
+            now = self._clock()
+            for name, limit in zip(_BUCKETS, (rpm, tpm)):
+                db.execute(
+                    "INSERT OR IGNORE INTO buckets (name, capacity, level, updated) VALUES (?, ?, ?, ?)",
+                    (name, float(limit), float(limit), now),
+                )
+                if limit:
+                    db.execute("UPDATE buckets SET capacity = ? WHERE name = ?", (float(limit), name))
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    @contextmanager
+    def _txn(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._db
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+
+    def _levels(self, db: sqlite3.Connection, now: float) -> Dict[str, Tuple[float, float]]:
+        """``{bucket: (capacity, level)}`` refilled up to ``now`` and written back."""
+        levels = {}
+        for name, capacity, level, updated in db.execute("SELECT name, capacity, level, updated FROM buckets"):
+            if capacity > 0:
+                level = min(capacity, level + max(0.0, now - updated) * capacity / 60.0)
+            levels[name] = (capacity, level)
+            db.execute("UPDATE buckets SET level = ?, updated = ? WHERE name = ?", (level, now, name))
+        return levels
+
+    def _draw(self, tokens: int, ticket: Optional[int], enqueue: bool) -> Tuple[float, Optional[int]]:
+        """``(0, None)`` once drawn; else ``(seconds to wait, ticket)``."""
+        with self._txn() as db:
+            now = self._clock()
+            db.execute("DELETE FROM waiters WHERE seen < ?", (now - self.stale,))
+            if ticket is not None:
+                db.execute("UPDATE waiters SET seen = ? WHERE ticket = ?", (now, ticket))
+            head = db.execute("SELECT MIN(ticket) FROM waiters").fetchone()[0]
+            wait = 0.0
+            if head is not None and head != ticket:
+                wait = self.poll  # someone queued first
+            else:
+                row = db.execute("SELECT until FROM blocked WHERE id = 1").fetchone()
+                if row and row[0] > now:
+                    wait = row[0] - now
+                levels = self._levels(db, now)
+                for name, need in (("requests", 1.0), ("tokens", float(tokens))):
+                    capacity, level = levels[name]
+                    # A request larger than the whole bucket waits for a full bucket, not forever.
+                    need = min(need, capacity)
+                    if capacity > 0 and level < need:
+                        wait = max(wait, (need - level) * 60.0 / capacity)
+                if not wait:
+                    for name, need in (("requests", 1.0), ("tokens", float(tokens))):
+                        db.execute("UPDATE buckets SET level = level - ? WHERE name = ? AND capacity > 0", (need, name))
+                    if ticket is not None:
+                        db.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+                    return 0.0, None
+            if ticket is None and enqueue:
+                ticket = db.execute("INSERT INTO waiters (seen) VALUES (?)", (now,)).lastrowid
+            return wait, ticket
+
+    def acquire(self, tokens: int, timeout: Optional[float] = None) -> Grant:
+        """Wait for our turn and for one request plus ``tokens`` of capacity.
+
+        Raises :class:`RateLimitTimeout` once ``timeout`` seconds have passed
+        without it (at once for ``timeout`` 0, without queueing).
+        """
+        started = self._clock()
+        wait, ticket = self._draw(tokens, None, enqueue=bool(timeout is None or timeout > 0))
+        try:
+            while wait:
+                waited = self._clock() - started
+                if timeout is not None and waited >= timeout:
+                    raise RateLimitTimeout(f"no LLM rate-limit capacity for {tokens} tokens within {timeout:.1f}s")
+                self._sleep(min(wait, self.poll, timeout - waited) if timeout is not None else min(wait, self.poll))
+                wait, ticket = self._draw(tokens, ticket, enqueue=True)
+        except BaseException:
+            if ticket is not None:
+                with self._txn() as db:
+                    db.execute("DELETE FROM waiters WHERE ticket = ?", (ticket,))
+            raise
+        waited = self._clock() - started
+        with self._lock:
+            self.granted += 1
+            if waited > 0:
+                self.queued += 1
+                self.wait_seconds += waited
+                self.max_wait = max(self.max_wait, waited)
+        return Grant(tokens, waited)
+
+    def try_acquire(self, tokens: int) -> Optional[Grant]:
+        """Draw capacity only if it is available right now, without queueing."""
+        try:
+            return self.acquire(tokens, timeout=0)
+        except RateLimitTimeout:
+            return None
+
+    def settle(self, grant: Grant, used_tokens: Optional[int] = None, headers: Optional[Mapping[str, str]] = None) -> None:
+        """Return the unused part of ``grant`` and apply the response's rate-limit headers."""
+        with self._txn() as db:
+            if used_tokens is not None and used_tokens < grant.tokens:
+                self._refund(db, grant.tokens - used_tokens)
+            if headers:
+                self._observe(db, headers)
+
+    def rejected(self, grant: Grant, headers: Optional[Mapping[str, str]] = None, retry_after: Optional[float] = None) -> float:
+        """Record a 429: refund the grant's tokens and block everyone until the provider's retry time."""
+        headers = headers or {}
+        delay = retry_after
+        if delay is None:
+            delay = parse_duration(headers.get("retry-after-ms"))
+            delay = delay / 1000 if delay is not None else parse_duration(headers.get("retry-after"))
+        if delay is None:
+            resets = [parse_duration(headers.get(f"x-ratelimit-reset-{name}")) for name in _BUCKETS]
+            delay = max((r for r in resets if r is not None), default=1.0)
+        with self._txn() as db:
+            self._refund(db, grant.tokens)
+            self._observe(db, headers)
+            until = self._clock() + delay
+            db.execute(
+                "INSERT INTO blocked (id, until) VALUES (1, ?) ON CONFLICT(id) DO UPDATE SET until = MAX(until, excluded.until)",
+                (until,),
+            )
+        return delay
+
+    def _refund(self, db: sqlite3.Connection, tokens: float) -> None:
+        db.execute(
+            "UPDATE buckets SET level = MIN(capacity, level + ?) WHERE name = 'tokens' AND capacity > 0", (float(tokens),)
+        )
+
+    def _observe(self, db: sqlite3.Connection, headers: Mapping[str, str]) -> None:
+        now = self._clock()
+        levels = self._levels(db, now)
+        for name in _BUCKETS:
+            limit = _number(headers.get(f"x-ratelimit-limit-{name}"))
+            remaining = _number(headers.get(f"x-ratelimit-remaining-{name}"))
+            capacity, level = levels[name]
+            if limit:
+                if not capacity:
+                    level = limit  # first sight of this limit: start from what the provider says is left
+                capacity = limit
+            if remaining is not None and capacity:
+                level = min(level, remaining)
+            db.execute("UPDATE buckets SET capacity = ?, level = ? WHERE name = ?", (capacity, level, name))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Current limits, levels, queue length and this process's wait statistics."""
+        with self._txn() as db:
+            levels = self._levels(db, self._clock())
+            waiting = db.execute("SELECT COUNT(*) FROM waiters").fetchone()[0]
+        return {
+            **{f"{name}_limit": capacity for name, (capacity, _) in levels.items()},
+            **{f"{name}_available": round(level, 1) for name, (_, level) in levels.items()},
+            "waiting": waiting,
+            "granted": self.granted,
+            "queued": self.queued,
+            "wait_seconds": round(self.wait_seconds, 3),
+            "max_wait": round(self.max_wait, 3),
+        }
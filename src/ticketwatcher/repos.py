@@ -0,0 +1,163 @@
+"""Per-repository contexts for serving many repositories from one process."""
+from __future__ import annotations
+
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, fields
+from typing import Any, Dict, Iterator, List, Optional
+
+from .config import TicketWatcherConfig, _dedupe_mode
+from .paths import parse_allowed_paths_env
+
+# Config fields a repository may override; everything else is process-wide.
+REPO_FIELDS = frozenset(
+    {
+        "trigger_labels",
+        "branch_prefix",
+        "pr_title_prefix",
+        "allowed_paths",
+        "max_files",
+        "max_lines",
+        "around_lines",
+        "repo_root",
+        "repo_name",
+        "seed_files",
+        "verify_patches",
+        "verify_tests",
+        "verify_impact",
+        "retrieval_top_k",
+        "dedupe",
+    }
+)
+
+
+@dataclass
+class RepoContext:
+    """Credentials, setting overrides and cache partitions for one repository.
+
+    ``settings`` holds only the :class:`TicketWatcherConfig` fields this
+    repository overrides; anything absent falls back to the process config.
+    ``weight`` is the repository's share of worker time under contention.
+    """
+
+    full_name: str
+    token: str = ""
+    api_url: str = ""
+    settings: Dict[str, Any] = field(default_factory=dict)
+    weight: int = 1
+    content_cache_size: int = 0
+    # Per-repo state owned by github_api / handlers; never shared across repos.
+    # File contents are cached per (path, commit SHA), never per branch name.
+    content_cache: "OrderedDict[tuple[str, str], str]" = field(default_factory=OrderedDict, repr=False)
+    cache_lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+    indexes: Dict[str, Any] = field(default_factory=dict, repr=False)
+
+    @property
+    def owner(self) -> str:
+        return self.full_name.split("/", 1)[0]
+
+    @property
+    def name(self) -> str:
+        return self.full_name.split("/", 1)[-1]
+
+
+_CURRENT: ContextVar[Optional[RepoContext]] = ContextVar("ticketwatcher_repo", default=None)
+
+
+def current_repo() -> Optional[RepoContext]:
+    return _CURRENT.get()
+
+
+@contextmanager
+def use_repo(repo: Optional[RepoContext]) -> Iterator[Optional[RepoContext]]:
+    """Make ``repo`` the target of GitHub calls and setting lookups in this thread/task."""
+    token = _CURRENT.set(repo)
+    try:
+        yield repo
+    finally:
+        _CURRENT.reset(token)
+
+
+def _convert(name: str, value: Any) -> Any:
+    """Coerce a JSON value to the type the config field holds."""
+    if name == "allowed_paths":
+        return parse_allowed_paths_env(",".join(value) if isinstance(value, list) else str(value))
+    if name == "trigger_labels":
+        items = value if isinstance(value, list) else str(value).split(",")
+        return {str(item).strip() for item in items if str(item).strip()}
+    if name == "verify_tests":
+        items = value if isinstance(value, list) else str(value).split(",")
+        return [str(item).strip() for item in items if str(item).strip()]
+    if name in {"max_files", "max_lines", "around_lines", "seed_files", "retrieval_top_k"}:
+        return int(value)
+    if name in {"verify_patches", "verify_impact"}:
+        return value if isinstance(value, bool) else str(value).strip().lower() not in {"0", "false", "no", "off"}
+    if name == "dedupe":
+        return _dedupe_mode("off" if value is False else "link" if value is True else str(value))
+    return str(value)
+
+
+class RepoRegistry:
+    """Repositories this process serves, loaded from ``TICKETWATCHER_REPOS_FILE``.
+
+    The file is JSON::
+
+        {"defaults": {"token_env": "GITHUB_TOKEN", "allowed_paths": "src/"},
+         "repos": {"octo/api": {"max_files": 2, "weight": 3},
+                   "octo/web": {"token_env": "WEB_TOKEN", "trigger_labels": ["autofix"]}}}
+
+    ``token_env`` names the environment variable holding the repository's
+    token (secrets never live in the file); other keys are config fields from
+    ``REPO_FIELDS`` plus ``weight`` and ``content_cache``.
+    """
+
+    def __init__(self, repos: Dict[str, RepoContext]) -> None:
+        self._repos = {name.lower(): repo for name, repo in repos.items()}
+
+    def __len__(self) -> int:
+        return len(self._repos)
+
+    def get(self, full_name: str) -> Optional[RepoContext]:
+        return self._repos.get((full_name or "").lower())
+
+    @property
+    def names(self) -> List[str]:
+        return sorted(repo.full_name for repo in self._repos.values())
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], *, default_token: str = "", api_url: str = "") -> "RepoRegistry":
+        defaults = data.get("defaults") or {}
+        known = {f.name for f in fields(TicketWatcherConfig)}
+        repos: Dict[str, RepoContext] = {}
+        for full_name, options in (data.get("repos") or {}).items():
+            if "/" not in full_name:
+                raise ValueError(f"repository {full_name!r} must be owner/name")
+            merged = {**defaults, **(options or {})}
+            token_env = merged.pop("token_env", "")
+            weight = int(merged.pop("weight", 1))
+            cache_size = int(merged.pop("content_cache", 0))
+            settings: Dict[str, Any] = {}
+            for name, value in merged.items():
+                if name not in REPO_FIELDS:
+                    where = "not per-repository" if name in known else "unknown"
+                    raise ValueError(f"{full_name}: setting {name!r} is {where}")
+                settings[name] = _convert(name, value)
+            settings.setdefault("repo_name", full_name.split("/", 1)[1])
+            repos[full_name] = RepoContext(
+                full_name=full_name,
+                token=(os.getenv(token_env) if token_env else "") or default_token,
+                api_url=api_url,
+                settings=settings,
+                weight=max(1, weight),
+                content_cache_size=max(0, cache_size),
+            )
+        return cls(repos)
+
+    @classmethod
+    def load(cls, path: str, **kwargs: Any) -> "RepoRegistry":
+        with open(path, "r", encoding="utf-8") as fh:
+            return cls.from_dict(json.load(fh), **kwargs)
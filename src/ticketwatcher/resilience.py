@@ -0,0 +1,225 @@
+"""Tail-latency hedging and a circuit breaker for calls to the LLM provider."""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Deque, Optional, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class CircuitOpen(RuntimeError):
+    """Raised instead of calling a provider that is failing; retry after ``retry_after`` seconds."""
+
+    def __init__(self, name: str, retry_after: float) -> None:
+        super().__init__(f"{name} circuit open; retry in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+class LatencyTracker:
+    """Sliding window of recent call latencies (seconds)."""
+
+    def __init__(self, size: int = 200) -> None:
+        self._samples: Deque[float] = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def add(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def quantile(self, q: float) -> Optional[float]:
+        with self._lock:
+            ordered = sorted(self._samples)
+        if not ordered:
+            return None
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+class CircuitBreaker:
+    """Fails fast while a dependency's recent error rate is high.
+
+    Closed: calls go through and their outcomes are kept for ``window``
+    seconds. Once at least ``min_calls`` outcomes are recorded and the share
+    of failures reaches ``failure_rate``, the breaker opens and :meth:`allow`
+    raises :class:`CircuitOpen` for ``cooldown`` seconds. After that a single
+    probe call is let through (half-open): success closes the breaker, failure
+    opens it for another cooldown. A probe that ends without reaching the
+    dependency is handed back with :meth:`release`.
+    """
+
+    def __init__(
+        self,
+        name: str = "llm",
+        *,
+        failure_rate: float = 0.5,
+        min_calls: int = 5,
+        window: float = 60.0,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.name = name
+        self.failure_rate = failure_rate
+        self.min_calls = min_calls
+        self.window = window
+        self.cooldown = cooldown
+        self._clock = clock
+        self._outcomes: Deque[Tuple[float, bool]] = deque()
+        self._opened_at: Optional[float] = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            return "half-open" if self._clock() - self._opened_at >= self.cooldown else "open"
+
+    def allow(self) -> bool:
+        """Raise :class:`CircuitOpen` unless a call may go out now; True when it is the half-open probe."""
+        if self.failure_rate <= 0:
+            return False
+        with self._lock:
+            if self._opened_at is None:
+                return False
+            waited = self._clock() - self._opened_at
+            if waited < self.cooldown or self._probing:
+                raise CircuitOpen(self.name, max(1.0, self.cooldown - waited))
+            self._probing = True
+            return True
+
+    def release(self) -> None:
+        """Give back a probe that never reached the dependency, so the next call probes instead."""
+        with self._lock:
+            self._probing = False
+
+    def record(self, ok: bool) -> None:
+        if self.failure_rate <= 0:
+            return
+        now = self._clock()
+        with self._lock:
+            if self._opened_at is not None:
+                if not self._probing:
+                    return  # a straggler from before the breaker opened
+                self._probing = False
+                self._opened_at = None if ok else now
+                self._outcomes.clear()
+                return
+            self._outcomes.append((now, ok))
+            while self._outcomes and now - self._outcomes[0][0] > self.window:
+                self._outcomes.popleft()
+            failures = sum(1 for _, good in self._outcomes if not good)
+            if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+                self._opened_at = now
+                self._outcomes.clear()
+
+    def call(self, fn: Callable[[], T]) -> T:
+        self.allow()
+        try:
+            result = fn()
+        except Exception:
+            self.record(False)
+            raise
+        self.record(True)
+        return result
+
+
+class Hedger:
+    """Runs a call and, if it is slower than usual, a duplicate; the first success wins.
+
+    The hedge delay is the ``quantile`` of recently observed latencies
+    (clamped to ``[min_delay, max_delay]``), so only the slowest few percent
+    of calls are duplicated. Until ``min_samples`` latencies are known, or
+    with ``quantile`` 0, calls run once on the caller's thread. The losing
+    request cannot be cancelled; it finishes in the background and is
+    reported to ``on_discard``.
+    """
+
+    def __init__(
+        self,
+        *,
+        quantile: float = 0.95,
+        min_samples: int = 20,
+        min_delay: float = 0.05,
+        max_delay: float = 30.0,
+        max_workers: int = 16,
+    ) -> None:
+        self.quantile = quantile
+        self.min_samples = min_samples
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.latency = LatencyTracker()
+        self.hedged = 0
+        self.hedge_wins = 0
+        self._max_workers = max_workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def delay(self) -> Optional[float]:
+        """Seconds to wait before hedging, or ``None`` when calls are not hedged."""
+        if self.quantile <= 0 or len(self.latency) < self.min_samples:
+            return None
+        observed = self.latency.quantile(self.quantile) or 0.0
+        return min(self.max_delay, max(self.min_delay, observed))
+
+    def _pool(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self._max_workers, thread_name_prefix="hedge")
+            return self._executor
+
+    def _timed(self, fn: Callable[[], T]) -> T:
+        started = time.perf_counter()
+        result = fn()
+        self.latency.add(time.perf_counter() - started)
+        return result
+
+    def call(
+        self,
+        fn: Callable[[], T],
+        *,
+        may_hedge: Callable[[], bool] = lambda: True,
+        on_discard: Callable[[T], None] = lambda result: None,
+    ) -> Tuple[T, bool]:
+        """``(result, hedged)``: the first successful result of ``fn`` and whether a duplicate was sent.
+
+        ``may_hedge`` is asked just before the duplicate goes out (e.g. to
+        charge it to a budget); returning False keeps waiting on the first.
+        """
+        delay = self.delay()
+        if delay is None:
+            return self._timed(fn), False
+        pool = self._pool()
+        primary = pool.submit(self._timed, fn)
+        done, _ = wait([primary], timeout=delay)
+        if done or not may_hedge():
+            return primary.result(), False
+        hedge = pool.submit(self._timed, fn)
+        with self._lock:
+            self.hedged += 1
+        pending = {primary, hedge}
+        error: Optional[BaseException] = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    error = error or future.exception()
+                    continue
+                if future is hedge:
+                    with self._lock:
+                        self.hedge_wins += 1
+                for loser in pending:
+                    loser.add_done_callback(lambda f: _discard(f, on_discard))
+                return future.result(), True
+        assert error is not None
+        raise error
+
+
+def _discard(future: Future, on_discard: Callable[[T], None]) -> None:
+    if future.exception() is None:
+        on_discard(future.result())
@@ -0,0 +1,220 @@
+"""BM25 retrieval over the local checkout, for tickets without usable stack frames."""
+from __future__ import annotations
+
+import heapq
+import json
+import math
+import os
+import re
+import struct
+import subprocess
+from array import array
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Sequence, Tuple
+
+from .paths import AllowList, compile_allowlist
+
+CHUNK_LINES = 40
+CHUNK_STEP = 30
+MAX_FILE_BYTES = 512 * 1024
+_K1 = 1.2
+_B = 0.75
+_MAGIC = b"TWBM25\x01"
+_SOURCE_SUFFIXES = frozenset(
+    {".py", ".js", ".jsx", ".ts", ".tsx", ".mjs", ".java", ".kt", ".go", ".rb", ".rs", ".cs", ".php", ".c", ".h", ".cpp", ".hpp", ".swift", ".scala"}
+)
+_SKIP_DIRS = frozenset({".git", ".venv", "venv", "node_modules", "__pycache__", ".pytest_cache", ".tox", ".ticketwatcher", "dist", "build"})
+
+_RE_WORD = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+_RE_CAMEL = re.compile(r"[A-Z]+(?=[A-Z][a-z])|[A-Z]?[a-z]+|[A-Z]+|\d+")
+_STOPWORDS = frozenset(
+    "a an and are as at be but by can def do does else for from get has have if import in is it its not of on or"
+    " return self should that the this to was when with error file line none null true false class function".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    """Identifier-aware terms: ``getUserProfile`` -> ``getuserprofile get user profile``."""
+    terms: List[str] = []
+    for word in _RE_WORD.findall(text):
+        lower = word.lower()
+        parts = [p.lower() for piece in word.split("_") for p in _RE_CAMEL.findall(piece)]
+        if len(parts) > 1 and lower not in _STOPWORDS:
+            terms.append(lower)
+        terms.extend(p for p in parts if len(p) > 1 and p not in _STOPWORDS)
+    return terms
+
+
+@dataclass
+class Hit:
+    path: str
+    start_line: int
+    end_line: int
+    score: float
+
+    @property
+    def center(self) -> int:
+        return (self.start_line + self.end_line) // 2
+
+
+class RetrievalIndex:
+    """Inverted index of overlapping line chunks with array-backed postings.
+
+    Postings for term ``t`` are ``docs[offsets[t]:offsets[t + 1]]`` (chunk ids)
+    and the parallel ``freqs`` slice (term frequencies); chunk lengths live in
+    ``lengths``. Everything but the vocabulary and chunk table is a flat
+    ``array``, so the index is a few bytes per posting in memory and on disk.
+    """
+
+    def __init__(self) -> None:
+        self.terms: Dict[str, int] = {}
+        self.chunks: List[Tuple[str, int, int]] = []
+        self.offsets = array("I", [0])
+        self.docs = array("I")
+        self.freqs = array("H")
+        self.lengths = array("I")
+        self.key = ""
+
+    @property
+    def avg_length(self) -> float:
+        return (sum(self.lengths) / len(self.lengths)) if self.lengths else 0.0
+
+    # -- building --------------------------------------------------------
+
+    @classmethod
+    def build(cls, files: Iterable[Tuple[str, str]], *, chunk_lines: int = CHUNK_LINES, step: int = CHUNK_STEP) -> "RetrievalIndex":
+        index = cls()
+        postings: Dict[str, List[Tuple[int, int]]] = {}
+        for path, text in files:
+            lines = text.splitlines()
+            if not lines:
+                continue
+            path_terms = tokenize(path.replace("/", " "))
+            for start in range(0, max(1, len(lines) - chunk_lines + step), step):
+                end = min(len(lines), start + chunk_lines)
+                chunk_id = len(index.chunks)
+                index.chunks.append((path, start + 1, max(start + 1, end)))
+                counts: Dict[str, int] = {}
+                # The path is part of every chunk so "payments" finds payments.py.
+                for term in path_terms + tokenize("\n".join(lines[start:end])):
+                    counts[term] = counts.get(term, 0) + 1
+                index.lengths.append(sum(counts.values()))
+                for term, count in counts.items():
+                    postings.setdefault(term, []).append((chunk_id, min(count, 0xFFFF)))
+                if end >= len(lines):
+                    break
+        for term in sorted(postings):
+            index.terms[term] = len(index.terms)
+            for chunk_id, count in postings[term]:
+                index.docs.append(chunk_id)
+                index.freqs.append(count)
+            index.offsets.append(len(index.docs))
+        return index
+
+    # -- querying --------------------------------------------------------
+
+    def search(self, text: str, k: int = 5) -> List[Hit]:
+        n = len(self.chunks)
+        if not n:
+            return []
+        avg = self.avg_length or 1.0
+        scores: Dict[int, float] = {}
+        for term in set(tokenize(text)):
+            tid = self.terms.get(term)
+            if tid is None:
+                continue
+            lo, hi = self.offsets[tid], self.offsets[tid + 1]
+            df = hi - lo
+            idf = math.log(1 + (n - df + 0.5) / (df + 0.5))
+            for i in range(lo, hi):
+                doc, tf = self.docs[i], self.freqs[i]
+                norm = tf + _K1 * (1 - _B + _B * self.lengths[doc] / avg)
+                scores[doc] = scores.get(doc, 0.0) + idf * tf * (_K1 + 1) / norm
+        best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+        return [Hit(*self.chunks[doc], score=score) for doc, score in best]
+
+    # -- persistence -----------------------------------------------------
+
+    def save(self, path: str) -> None:
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        vocab = sorted(self.terms, key=self.terms.__getitem__)
+        header = json.dumps({"key": self.key, "terms": vocab, "chunks": self.chunks}, separators=(",", ":")).encode("utf-8")
+        tmp = f"{path}.tmp"
+        with open(tmp, "wb") as fh:
+            fh.write(_MAGIC + struct.pack("<I", len(header)) + header)
+            for arr in (self.offsets, self.docs, self.freqs, self.lengths):
+                fh.write(struct.pack("<I", len(arr)))
+                arr.tofile(fh)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str) -> "RetrievalIndex":
+        index = cls()
+        with open(path, "rb") as fh:
+            if fh.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f"{path} is not a retrieval index")
+            (size,) = struct.unpack("<I", fh.read(4))
+            header = json.loads(fh.read(size))
+            for arr in (index.offsets, index.docs, index.freqs, index.lengths):
+                del arr[:]
+                (count,) = struct.unpack("<I", fh.read(4))
+                arr.fromfile(fh, count)
+        index.key = header["key"]
+        index.terms = {term: i for i, term in enumerate(header["terms"])}
+        index.chunks = [tuple(chunk) for chunk in header["chunks"]]
+        return index
+
+
+def iter_source_files(repo_root: str, allowed: AllowList) -> Iterable[Tuple[str, str]]:
+    """``(relative path, text)`` for allowed source files under ``repo_root``."""
+    for dirpath, dirnames, filenames in os.walk(repo_root):
+        dirnames[:] = sorted(d for d in dirnames if d not in _SKIP_DIRS)
+        rel_dir = os.path.relpath(dirpath, repo_root).replace(os.sep, "/")
+        for name in sorted(filenames):
+            if os.path.splitext(name)[1] not in _SOURCE_SUFFIXES:
+                continue
+            rel = name if rel_dir == "." else f"{rel_dir}/{name}"
+            if not allowed.allows(rel):
+                continue
+            full = os.path.join(dirpath, name)
+            try:
+                if os.path.getsize(full) > MAX_FILE_BYTES:
+                    continue
+                with open(full, "r", encoding="utf-8") as fh:
+                    yield rel, fh.read()
+            except (OSError, UnicodeDecodeError):
+                continue
+
+
+def _head_commit(repo_root: str) -> str:
+    try:
+        proc = subprocess.run(["git", "rev-parse", "HEAD"], cwd=repo_root, capture_output=True, text=True, timeout=5)
+    except (OSError, subprocess.SubprocessError):
+        return ""
+    return proc.stdout.strip() if proc.returncode == 0 else ""
+
+
+def load_or_build(repo_root: str, allowed: Sequence[str] | None, cache_dir: str | None = None) -> RetrievalIndex:
+    """Index for the checkout's current commit, reusing the on-disk copy when it matches.
+
+    Without a commit (not a git checkout) the index is built in memory only.
+    """
+    allow = compile_allowlist(allowed)
+    commit = _head_commit(repo_root)
+    key = f"{commit}:{','.join(allow)}:{CHUNK_LINES}/{CHUNK_STEP}"
+    path = os.path.join(cache_dir or os.path.join(repo_root, ".ticketwatcher"), f"retrieval-{commit[:12]}.idx")
+    if commit and os.path.exists(path):
+        try:
+            index = RetrievalIndex.load(path)
+            if index.key == key:
+                return index
+        except (OSError, ValueError, KeyError, EOFError) as exc:
+            print(f"[warn] ignoring unreadable retrieval index {path}: {exc}")
+    index = RetrievalIndex.build(iter_source_files(repo_root, allow))
+    index.key = key
+    if commit:
+        try:
+            index.save(path)
+        except OSError as exc:
+            print(f"[warn] could not save retrieval index {path}: {exc}")
+    return index
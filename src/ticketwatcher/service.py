@@ -0,0 +1,464 @@
+"""Long-running webhook receiver (``ticketwatcher serve``)."""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, Hashable, Mapping, Optional, Tuple
+
+from . import telemetry
+from .coalesce import Coalescer, FairQueue, issue_key
+from .prefilter import needs_work
+from .resilience import CircuitOpen
+
+MAX_HEADER_BYTES = 64 * 1024
+MAX_BODY_BYTES = 25 * 1024 * 1024  # GitHub caps webhook payloads at 25 MB
+
+_REASONS = {
+    200: "OK",
+    202: "Accepted",
+    400: "Bad Request",
+    401: "Unauthorized",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    413: "Payload Too Large",
+    503: "Service Unavailable",
+}
+
+Handler = Callable[[Dict[str, Any]], Optional[str]]
+# (event name, payload) -> (needs a run, reason); see prefilter.needs_work.
+Prefilter = Callable[[str, Dict[str, Any]], Tuple[bool, str]]
+
+
+def sign_payload(secret: str, body: bytes) -> str:
+    """Return the ``X-Hub-Signature-256`` header value GitHub would send."""
+    return "sha256=" + hmac.new(secret.encode("utf-8"), body, hashlib.sha256).hexdigest()
+
+
+def verify_signature(secret: str, body: bytes, header: str | None) -> bool:
+    if not secret or not header:
+        return False
+    return hmac.compare_digest(sign_payload(secret, body), header.strip())
+
+
+@dataclass
+class Job:
+    event: str
+    delivery: str
+    payload: Dict[str, Any]
+    key: Optional[Hashable] = None
+    received: float = field(default_factory=time.monotonic)
+    # Why the prefilter let the delivery through; empty when none is configured.
+    trigger: str = ""
+
+    @property
+    def repo(self) -> str:
+        return (self.payload.get("repository") or {}).get("full_name") or ""
+
+
+@dataclass
+class ServiceStats:
+    accepted: int = 0
+    rejected: int = 0
+    ignored: int = 0
+    coalesced: int = 0
+    processed: int = 0
+    failed: int = 0
+    deferred: int = 0
+
+    def as_dict(self) -> Dict[str, int]:
+        return dict(self.__dict__)
+
+
+class WebhookService:
+    """Verify and enqueue GitHub webhooks, and drain them with a worker pool.
+
+    The HTTP side only parses, authenticates and enqueues, so GitHub gets its
+    response in milliseconds. A full queue answers ``503`` with
+    ``Retry-After`` instead of buffering without bound. Handlers are blocking
+    (HTTP + LLM calls) and run on a thread pool of ``workers`` threads.
+
+    Deliveries for the same issue are held for ``debounce`` seconds and
+    collapsed into one job, and an issue never has two jobs running at once;
+    different issues still run in parallel. With a ``prefilter``, deliveries
+    that would not start a run are answered ``ignored`` before they reach the
+    queue, so they can never be folded over one that would.
+
+    Jobs are queued per repository and handed to workers in weighted
+    round-robin (``repo_weight``), and one repository may have at most
+    ``repo_queue_size`` jobs waiting or running, so a busy repository cannot
+    starve the others.
+
+    A job that hits an open LLM circuit breaker (:class:`CircuitOpen`) is
+    not failed: it is put back after the breaker's ``retry_after`` and resumes
+    from its checkpoints.
+    """
+
+    def __init__(
+        self,
+        *,
+        secret: str,
+        handlers: Mapping[str, Handler],
+        workers: int = 4,
+        queue_size: int = 64,
+        path: str = "/webhook",
+        allow_unsigned: bool = False,
+        debounce: float = 0.0,
+        repo_queue_size: int = 0,
+        repo_weight: Callable[[str], int] = lambda repo: 1,
+        prefilter: Optional[Prefilter] = None,
+    ) -> None:
+        if not secret and not allow_unsigned:
+            raise ValueError("a webhook secret is required (TICKETWATCHER_WEBHOOK_SECRET)")
+        self.secret = secret
+        self.handlers = dict(handlers)
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.path = path
+        self.allow_unsigned = allow_unsigned
+        self.debounce = debounce
+        self.repo_queue_size = repo_queue_size
+        self.repo_weight = repo_weight
+        self.prefilter = prefilter
+        self.stats = ServiceStats()
+        self.port: int | None = None
+        # Jobs accepted and not yet finished (pending, queued or running), per repository.
+        self.repo_load: Dict[str, int] = {}
+        self._queue: FairQueue[Job] | None = None
+        self._server: asyncio.AbstractServer | None = None
+        self._tasks: list[asyncio.Task] = []
+        self._executor: ThreadPoolExecutor | None = None
+        self._coalescer: Coalescer[Job] | None = None
+        # Jobs waiting out an open circuit breaker before they are queued again.
+        self._deferred: Dict[int, asyncio.TimerHandle] = {}
+
+    # -- lifecycle ---------------------------------------------------------
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8080) -> None:
+        self._queue = FairQueue(weight=self.repo_weight)
+        self._coalescer = Coalescer(self._dispatch, debounce=self.debounce, merge=_merge_jobs)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="ticketwatcher")
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+        self._server = await asyncio.start_server(self._on_connection, host, port, limit=MAX_HEADER_BYTES)
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self, drain_timeout: float = 30.0) -> None:
+        """Stop accepting requests, finish queued jobs (up to a deadline), then exit."""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+        if self._queue is not None:
+            try:
+                await asyncio.wait_for(self.join(), drain_timeout)
+            except asyncio.TimeoutError:
+                dropped = self._queue.qsize() + (self._coalescer.pending if self._coalescer else 0) + len(self._deferred)
+                print(f"[warn] dropping {dropped} queued event(s) on shutdown", flush=True)
+        for handle in self._deferred.values():
+            handle.cancel()
+        self._deferred.clear()
+        if self._coalescer is not None:
+            self._coalescer.cancel()
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    async def join(self) -> None:
+        """Wait until every accepted job (including debounced ones) has been processed."""
+        if self._queue is None:
+            return
+        while True:
+            await self._queue.join()
+            if not (self._coalescer and self._coalescer.pending) and not self._deferred:
+                return
+            await asyncio.sleep(min(self.debounce, 0.05) or 0)
+
+    def _dispatch(self, key: Hashable, job: Job) -> None:
+        assert self._queue is not None
+        # Admission control counts pending jobs, so this never overflows.
+        self._queue.put_nowait(job.repo, job)
+
+    def _defer(self, job: Job, delay: float) -> None:
+        """Queue ``job`` again after ``delay`` seconds, still counted against its repository."""
+        self.stats.deferred += 1
+        self.repo_load[job.repo] = self.repo_load.get(job.repo, 0) + 1
+        print(f"[info] {job.event} delivery {job.delivery}: deferred {delay:.0f}s (LLM circuit open)", flush=True)
+        handle_id = id(job)
+        self._deferred[handle_id] = asyncio.get_running_loop().call_later(delay, self._resubmit, handle_id, job)
+
+    def _resubmit(self, handle_id: int, job: Job) -> None:
+        self._deferred.pop(handle_id, None)
+        if job.key is None or self._coalescer is None:
+            self._dispatch(job.key, job)
+        elif not self._coalescer.submit(job.key, job):
+            self._release(job.repo)  # folded into a delivery for the issue that is already waiting
+
+    # -- workers -----------------------------------------------------------
+
+    async def _worker(self) -> None:
+        assert self._queue is not None
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            try:
+                ok = await loop.run_in_executor(self._executor, self._run_job, job)
+                # Counters are only touched on the event loop thread.
+                if ok:
+                    self.stats.processed += 1
+                else:
+                    self.stats.failed += 1
+            except CircuitOpen as exc:
+                self._defer(job, exc.retry_after)
+            finally:
+                self._queue.task_done()
+                self._release(job.repo)
+                if job.key is not None and self._coalescer is not None:
+                    self._coalescer.done(job.key)
+
+    def _release(self, repo: str) -> None:
+        left = self.repo_load.get(repo, 0) - 1
+        if left > 0:
+            self.repo_load[repo] = left
+        else:
+            self.repo_load.pop(repo, None)
+
+    def _run_job(self, job: Job) -> bool:
+        started = time.monotonic()
+        try:
+            result = self.handlers[job.event](job.payload)
+        except CircuitOpen:
+            raise
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[error] {job.event} delivery {job.delivery}: {exc!r}", flush=True)
+            return False
+        outcome = f"PR_URL={result}" if result else "no action"
+        print(
+            f"[info] {job.event} delivery {job.delivery}: {outcome} "
+            f"(queued {started - job.received:.2f}s, ran {time.monotonic() - started:.2f}s)",
+            flush=True,
+        )
+        return True
+
+    def _metrics_text(self) -> str:
+        assert self._queue is not None
+        lines = [telemetry.METRICS.render().rstrip("\n")]
+        lines.append(f"ticketwatcher_queue_depth {self._queue.qsize()}")
+        for repo, depth in sorted(self._queue.group_sizes().items()):
+            lines.append(f'ticketwatcher_repo_queue_depth{{repo="{repo}"}} {depth}')
+        for name, value in self.stats.as_dict().items():
+            lines.append(f"# TYPE ticketwatcher_events_{name}_total counter")
+            lines.append(f"ticketwatcher_events_{name}_total {value}")
+        return "\n".join(lines) + "\n"
+
+    # -- HTTP --------------------------------------------------------------
+
+    async def _on_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+        try:
+            status, body = await self._handle_request(reader)
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ValueError):
+            status, body = 400, {"error": "malformed request"}
+        headers = {"Retry-After": "5"} if status == 503 else {}
+        try:
+            writer.write(_http_response(status, body, headers))
+            await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def _handle_request(self, reader: asyncio.StreamReader) -> Tuple[int, Dict[str, Any] | str]:
+        head = await reader.readuntil(b"\r\n\r\n")
+        method, target, headers = _parse_head(head)
+        path = target.split("?", 1)[0]
+        if path == "/healthz" and method == "GET":
+            assert self._queue is not None
+            return 200, {"status": "ok", "queued": self._queue.qsize(), **self.stats.as_dict()}
+        if path == "/metrics" and method == "GET":
+            return 200, self._metrics_text()
+        if path != self.path:
+            return 404, {"error": "not found"}
+        if method != "POST":
+            return 405, {"error": "POST only"}
+
+        length = int(headers.get("content-length", "0"))
+        if length > MAX_BODY_BYTES:
+            return 413, {"error": "payload too large"}
+        raw = await reader.readexactly(length)
+
+        if not verify_signature(self.secret, raw, headers.get("x-hub-signature-256")):
+            if not (self.allow_unsigned and not self.secret):
+                self.stats.rejected += 1
+                return 401, {"error": "bad signature"}
+
+        event = headers.get("x-github-event", "")
+        delivery = headers.get("x-github-delivery", "-")
+        if event == "ping":
+            return 200, {"status": "pong"}
+        if event not in self.handlers:
+            self.stats.ignored += 1
+            return 202, {"status": "ignored", "event": event}
+
+        payload = json.loads(raw.decode("utf-8"))
+        trigger = ""
+        if self.prefilter is not None:
+            wanted, trigger = self.prefilter(event, payload)
+            if not wanted:
+                self.stats.ignored += 1
+                return 202, {"status": "ignored", "event": event, "reason": trigger}
+        assert self._queue is not None and self._coalescer is not None
+        job = Job(event=event, delivery=delivery, payload=payload, key=issue_key(payload), trigger=trigger)
+        if job.key is not None and self._coalescer.is_pending(job.key):
+            # Folded into a job that is already counted against the queue.
+            self._coalescer.submit(job.key, job)
+            self.stats.coalesced += 1
+            return 202, {"status": "coalesced", "delivery": delivery}
+        if self._queue.qsize() + self._coalescer.pending >= self.queue_size:
+            self.stats.rejected += 1
+            return 503, {"error": "queue full"}
+        if self.repo_queue_size and self.repo_load.get(job.repo, 0) >= self.repo_queue_size:
+            self.stats.rejected += 1
+            return 503, {"error": "repository queue full", "repository": job.repo}
+        self.repo_load[job.repo] = self.repo_load.get(job.repo, 0) + 1
+        if job.key is None:
+            self._queue.put_nowait(job.repo, job)
+        else:
+            self._coalescer.submit(job.key, job)
+        self.stats.accepted += 1
+        return 202, {"status": "queued", "delivery": delivery}
+
+
+def _merge_jobs(old: Job, new: Job) -> Job:
+    """Latest delivery wins, unless that would drop a ``/agent fix`` comment or a triggering delivery."""
+    if old.event == "issue_comment" and new.event != "issue_comment":
+        return old
+    if old.trigger and not new.trigger:
+        return old
+    return new
+
+
+def _parse_head(head: bytes) -> Tuple[str, str, Dict[str, str]]:
+    lines = head.decode("latin-1").split("\r\n")
+    method, target, _version = lines[0].split(" ", 2)
+    headers: Dict[str, str] = {}
+    for line in lines[1:]:
+        if not line:
+            continue
+        name, _, value = line.partition(":")
+        headers[name.strip().lower()] = value.strip()
+    return method.upper(), target, headers
+
+
+def _http_response(status: int, body: Dict[str, Any] | str, headers: Dict[str, str]) -> bytes:
+    if isinstance(body, str):
+        payload, ctype = body.encode("utf-8"), "text/plain; version=0.0.4"
+    else:
+        payload, ctype = json.dumps(body).encode("utf-8"), "application/json"
+    lines = [
+        f"HTTP/1.1 {status} {_REASONS.get(status, 'Unknown')}",
+        f"Content-Type: {ctype}",
+        f"Content-Length: {len(payload)}",
+        "Connection: close",
+    ]
+    lines.extend(f"{name}: {value}" for name, value in headers.items())
+    return ("\r\n".join(lines) + "\r\n\r\n").encode("latin-1") + payload
+
+
+async def _serve(service: WebhookService, host: str, port: int) -> None:
+    await service.start(host, port)
+    print(f"[info] listening on http://{host}:{service.port}{service.path} with {service.workers} worker(s)", flush=True)
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stopping.set)
+        except (NotImplementedError, RuntimeError):
+            pass  # e.g. Windows; Ctrl+C still raises KeyboardInterrupt
+    await stopping.wait()
+    print("[info] shutting down; draining queue", flush=True)
+    await service.stop()
+
+
+def main(argv=None) -> int:
+    # Config, handlers and (via warm_clients) the OpenAI SDK load once per process.
+    from . import handlers
+
+    config = handlers.CONFIG
+    parser = argparse.ArgumentParser(prog="ticketwatcher serve", description="Run the GitHub webhook receiver.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--path", default="/webhook")
+    parser.add_argument("--workers", type=int, default=config.service_workers)
+    parser.add_argument("--queue-size", type=int, default=config.service_queue_size)
+    parser.add_argument(
+        "--repo-queue-size",
+        type=int,
+        default=config.service_repo_queue_size,
+        help="jobs one repository may have waiting or running (0: no per-repository limit)",
+    )
+    parser.add_argument(
+        "--debounce",
+        type=float,
+        default=config.debounce_seconds,
+        help="seconds to wait for more events on the same issue before running",
+    )
+    parser.add_argument(
+        "--allow-unsigned",
+        action="store_true",
+        help="accept unsigned deliveries when no secret is set (local testing only)",
+    )
+    args = parser.parse_args(argv)
+
+    try:
+        registry = handlers._repo_registry()
+    except (OSError, ValueError) as exc:
+        print(f"invalid TICKETWATCHER_REPOS_FILE: {exc}", file=sys.stderr)
+        return 2
+
+    def repo_weight(full_name: str) -> int:
+        repo = registry.get(full_name) if registry is not None else None
+        return repo.weight if repo is not None else 1
+
+    def prefilter(event_name: str, payload: Dict[str, Any]) -> Tuple[bool, str]:
+        # Same check the edge worker runs, with the repository's own trigger labels.
+        labels = config.trigger_labels
+        if registry is not None:
+            full_name = (payload.get("repository") or {}).get("full_name") or ""
+            repo = registry.get(full_name)
+            if repo is None:
+                return False, f"repository {full_name or '(none)'} is not served"
+            labels = repo.settings.get("trigger_labels", labels)
+        return needs_work(event_name, payload, labels)
+
+    try:
+        service = WebhookService(
+            secret=config.webhook_secret,
+            handlers=handlers.EVENT_HANDLERS,
+            workers=args.workers,
+            queue_size=args.queue_size,
+            path=args.path,
+            allow_unsigned=args.allow_unsigned,
+            debounce=args.debounce,
+            repo_queue_size=args.repo_queue_size,
+            repo_weight=repo_weight,
+            prefilter=prefilter,
+        )
+    except ValueError as exc:
+        print(str(exc), file=sys.stderr)
+        return 2
+
+    telemetry.configure(jsonl_path=config.trace_file, metrics=True)
+    handlers.warm_clients()
+    asyncio.run(_serve(service, args.host, args.port))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
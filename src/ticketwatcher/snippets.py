@@ -8,22 +8,10 @@ from .github_api import file_exists, get_file_text
 from .paths import is_path_allowed
 
 
-def fetch_slice(
-    path: str,
-    *,
-    base_ref: str,
-    center_line: int | None,
-    around_lines: int,
-    allowed_prefixes: Iterable[str] | None,
-) -> Dict[str, Any] | None:
-    if not is_path_allowed(path, allowed_prefixes) or not file_exists(path, base_ref):
-        return None
-
-    content = get_file_text(path, base_ref)
-    lines = content.splitlines()
+def _slice(path: str, lines: List[str], center_line: int | None, around_lines: int) -> Dict[str, Any]:
     total = len(lines)
-
     if center_line is None or center_line < 1 or center_line > total:
+        center_line = None
         start = 1
         end = min(total, 2 * around_lines)
     else:
@@ -35,9 +23,42 @@ def fetch_slice(
         "start_line": start,
         "end_line": end,
         "code": "\n".join(lines[start - 1 : end]),
+        # The line the slice is about; compact encodings keep its surroundings verbatim.
+        "center_line": center_line,
     }
 
 
+def fetch_slice(
+    path: str,
+    *,
+    base_ref: str,
+    center_line: int | None,
+    around_lines: int,
+    allowed_prefixes: Iterable[str] | None,
+) -> Dict[str, Any] | None:
+    if not is_path_allowed(path, allowed_prefixes) or not file_exists(path, base_ref):
+        return None
+
+    content = get_file_text(path, base_ref)
+    return _slice(path, content.splitlines(), center_line, around_lines)
+
+
+def fetch_slices(
+    path: str,
+    *,
+    base_ref: str,
+    center_lines: List[int],
+    around_lines: int,
+    allowed_prefixes: Iterable[str] | None,
+) -> List[Dict[str, Any]]:
+    """Fetch ``path`` once and cut one slice per center line (top of file if none)."""
+    if not is_path_allowed(path, allowed_prefixes) or not file_exists(path, base_ref):
+        return []
+
+    lines = get_file_text(path, base_ref).splitlines()
+    return [_slice(path, lines, center, around_lines) for center in (center_lines or [None])]
+
+
 def fetch_symbol_slice(
     path: str,
     *,
@@ -77,5 +98,6 @@ def fetch_symbol_slice(
         "start_line": start,
         "end_line": end,
         "code": "\n".join(lines[start - 1 : end]),
+        "center_line": target_line,
     }
 
@@ -1,14 +1,66 @@
 """Utilities for extracting useful paths from issue descriptions and traces."""
 from __future__ import annotations
 
+import heapq
 import re
-from typing import Iterable, List, Tuple
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Tuple
 
-from .paths import is_path_allowed, to_repo_relative
+from .paths import compile_allowlist, to_repo_relative
 
-_RE_PY_FILELINE = re.compile(r'File\s+"([^"]+)"\s*,\s*line\s+(\d+)\b')
-_RE_GENERIC_PATHLINE = re.compile(r'([^\s\'",)\]]+):(\d+)\b')
-_RE_TARGET = re.compile(r'^\s*Target:\s*(.+?)\s*$', re.MULTILINE)
+# Python:  File "src/app/auth.py", line 42, in get_user_profile
+_RE_PY_FILELINE = re.compile(r'File\s+"([^"]+)"\s*,\s*line\s+(\d+)\b(?:\s*,\s*in\s+(\S+))?')
+# Node:    at getUser (/srv/app/src/user.js:10:5)   |   at /srv/app/src/user.js:10:5
+_RE_NODE_FRAME = re.compile(r'\bat\s+(?:(?:async\s+)?([^\s(]+)\s+\()?(?:file://)?([^\s()]+?):(\d+):\d+\)?\s*$')
+# Java:    at com.acme.Billing.total(Billing.java:37)
+_RE_JAVA_FRAME = re.compile(r'\bat\s+((?:[\w$]+\.)+)([\w$<>]+)\(([\w$]+\.(?:java|kt|scala|groovy)):(\d+)\)')
+# Go:      \t/home/ci/src/pkg/billing/total.go:37 +0x1d
+_RE_GO_FRAME = re.compile(r'^\s+(\S+\.go):(\d+)(?:\s+\+0x[0-9a-fA-F]+)?\s*$')
+_RE_GO_FUNC = re.compile(r'^((?:[\w.\-]+/)*[\w.\-*()]+)\(.*\)$')
+# pytest:  src/app/auth.py:42: in get_user_profile   |   tests/test_x.py:9: AssertionError
+_RE_PYTEST_FRAME = re.compile(r'^([^\s:]+\.py):(\d+):(?:\s+(?:in\s+(\S+)|(\w[\w.]*)))?\s*$')
+_RE_GENERIC_PATHLINE = re.compile(
+    r'(?<![\w/\\:.-])((?:[A-Za-z]:)?[^\s\'",)\]:]+\.[A-Za-z][A-Za-z0-9]*):(\d+)\b'
+)
+_RE_TARGET = re.compile(r'^\s*Target:\s*(.+?)\s*$')
+# Cheap pre-filters run over whole chunks: only lines containing one of these
+# can hold a frame, so every other line is skipped without a per-line call.
+# Each pattern starts with a literal so the regex engine can scan quickly;
+# a single alternation is several times slower on multi-megabyte logs.
+_HINT_PATTERNS = tuple(
+    re.compile(p)
+    for p in (
+        r'File\s+"',
+        r'Target:',
+        r' at ',
+        r'\tat ',
+        r'\.[A-Za-z][A-Za-z0-9]*:\d',
+        # Traceback boundaries and exception lines, used for frame ranking.
+        r'Traceback \(',
+        r'Error',
+        r'Exception',
+        r'panic: ',
+    )
+)
+# KeyError: 'x'  |  java.lang.NullPointerException  |  E   AssertionError  |  Exception in thread "main" ...
+_RE_EXCEPTION = re.compile(
+    r'^\s*(?:E\s+)?(?:Exception in thread "[^"]*"\s+)?(?:Uncaught\s+)?'
+    r'((?:[A-Za-z_][\w$]*\.)*[A-Za-z_][\w$]*(?:Error|Exception|Exit|Interrupt|Failure|Fault))(?::|\s*$)'
+)
+_RE_GO_PANIC = re.compile(r'^panic: ')
+# Frames further apart than this many lines belong to different traces.
+_BLOCK_GAP = 6
+# Formats that print the outermost frame first (innermost last) and vice versa.
+_OUTER_FIRST = frozenset({"python", "pytest"})
+_INNER_FIRST = frozenset({"node", "java", "go"})
+
+# Large inputs are scanned in windows of this size so an early exit does not
+# pay for pre-filtering the rest of the text.
+_WINDOW = 64 * 1024
+# A partial line that grows past this is scanned as it stands and dropped
+# rather than buffered, so a pathological chunk can't grow the carry-over
+# unbounded; the rest of that line is then scanned as a line of its own.
+_MAX_CARRY = 64 * 1024
 
 
 def _sanitize_path_token(token: str) -> str:
@@ -17,6 +69,351 @@ def _sanitize_path_token(token: str) -> str:
     return re.sub(r'[\'"\s,)\]>]+$', "", token)
 
 
+@dataclass
+class StackFrame:
+    path: str
+    line: int | None
+    func: str | None = None
+    kind: str = "generic"  # python | node | java | go | pytest | target | generic
+    order: int = 0  # index of the first sighting among accepted frames
+    count: int = 1  # how many times the same path/line was seen
+    block: int = -1  # which trace in the text this frame belongs to (-1: none)
+    position: int = 0  # index within its trace, counting disallowed frames too
+    raising: bool = False  # the frame the exception was raised from
+    exception: str | None = None  # exception type of the enclosing trace, if seen
+
+    @property
+    def key(self) -> Tuple[str, int]:
+        return self.path, self.line or 0
+
+
+class StackScanner:
+    """Single-pass, incremental scanner for stack frames in free-form text.
+
+    Text can be fed in arbitrary chunks (see :meth:`feed`); each line is
+    matched once against Python, Node, Java, Go, pytest, ``Target:`` and
+    generic ``path:line`` patterns. Paths are resolved through a memoized
+    :func:`to_repo_relative` and the scan stops as soon as ``limit`` distinct
+    allowed frames have been collected.
+    """
+
+    def __init__(
+        self,
+        *,
+        repo_root: str,
+        repo_name: str,
+        allowed_prefixes: Iterable[str] | None = None,
+        limit: int = 5,
+    ) -> None:
+        self.repo_root = repo_root
+        self.repo_name = repo_name
+        self.allowed = compile_allowlist(allowed_prefixes)
+        self.limit = max(1, limit)
+        self.frames: List[StackFrame] = []
+        self.lines_scanned = 0
+        self._by_key: Dict[Tuple[str, int], StackFrame] = {}
+        self._resolved: Dict[str, str | None] = {}
+        self._carry = ""
+        self._prev_line = ""
+        self._line_no = 0
+        self.exceptions: Dict[int, str] = {}
+        # Trace (block) tracking for depth / raising-frame information.
+        self._block = -1
+        self._block_direction: str | None = None
+        self._block_size = 0
+        self._block_open = False
+        self._block_frames: List[StackFrame] = []
+        self._last_frame_line = -_BLOCK_GAP - 1
+        self._last_frame_allowed: StackFrame | None = None
+        self._pending_exception: str | None = None
+
+    @property
+    def done(self) -> bool:
+        return len(self.frames) >= self.limit
+
+    # ---------- input ----------
+
+    def feed(self, chunk: str) -> bool:
+        """Scan another chunk of text; returns True once ``limit`` is reached."""
+        if len(chunk) > _WINDOW:
+            for start in range(0, len(chunk), _WINDOW):
+                if self._feed_window(chunk[start : start + _WINDOW]):
+                    return True
+            return self.done
+        return self._feed_window(chunk)
+
+    def _feed_window(self, chunk: str) -> bool:
+        if self.done or not chunk:
+            return self.done
+        data = self._carry + chunk if self._carry else chunk
+        cut = data.rfind("\n") + 1
+        if cut == 0:
+            self._carry = data
+            if len(data) > _MAX_CARRY:
+                self._flush_carry()
+            return self.done
+        block, self._carry = data[:cut], data[cut:]
+
+        prev_tail = self._prev_line
+        base_line = self._line_no
+        counted_to = 0
+        resume = 0
+        hits = heapq.merge(*[(m.start() for m in pat.finditer(block)) for pat in _HINT_PATTERNS])
+        for pos in hits:
+            if pos < resume:
+                continue
+            start = block.rfind("\n", 0, pos) + 1
+            end = block.find("\n", pos)
+            if start:
+                prev = block[block.rfind("\n", 0, start - 1) + 1 : start - 1]
+            else:
+                prev = prev_tail
+            self._line_no += block.count("\n", counted_to, start)
+            counted_to = start
+            self._scan_line(block[start:end], prev)
+            resume = end + 1
+            if self.done:
+                self._carry = ""
+                return True
+        self._line_no = base_line + block.count("\n")
+        self._prev_line = block[block.rfind("\n", 0, cut - 1) + 1 : cut - 1]
+        if len(self._carry) > _MAX_CARRY:
+            self._flush_carry()
+        return self.done
+
+    def _flush_carry(self) -> None:
+        """Scan an over-long partial line and drop it."""
+        self._scan_line(self._carry, self._prev_line)
+        self._line_no += 1
+        self._carry = ""
+
+    def feed_lines(self, lines: Iterable[str]) -> bool:
+        for line in lines:
+            if self.done:
+                break
+            line = line.rstrip("\r\n")
+            if any(pat.search(line) for pat in _HINT_PATTERNS):
+                self._scan_line(line, self._prev_line)
+            self._prev_line = line
+            self._line_no += 1
+        return self.done
+
+    def close(self) -> List[StackFrame]:
+        """Flush any trailing partial line and return the collected frames."""
+        if self._carry and not self.done:
+            self._scan_line(self._carry, self._prev_line)
+        self._carry = ""
+        return self.frames
+
+    def results(self) -> List[Tuple[str, int | None]]:
+        return [(frame.path, frame.line) for frame in self.frames]
+
+    # ---------- matching ----------
+
+    def _scan_line(self, line: str, prev: str) -> None:
+        self.lines_scanned += 1
+        if line.endswith("\r"):
+            line = line[:-1]
+
+        if ":" not in line:
+            # Only the Python format carries no colon at all.
+            if "File" in line:
+                match = _RE_PY_FILELINE.search(line)
+                if match:
+                    self._record(match.group(1), int(match.group(2)), match.group(3), "python")
+                    return
+            self._scan_boundary(line)
+            return
+
+        if "File" in line:
+            match = _RE_PY_FILELINE.search(line)
+            if match:
+                self._record(match.group(1), int(match.group(2)), match.group(3), "python")
+                return
+
+        if "Target:" in line:
+            match = _RE_TARGET.match(line)
+            if match:
+                raw_full = _sanitize_path_token(match.group(1))
+                if ":" in raw_full and raw_full.rsplit(":", 1)[-1].isdigit():
+                    raw_path, raw_line = raw_full.rsplit(":", 1)
+                    self._record(raw_path, int(raw_line), None, "target")
+                else:
+                    self._record(raw_full, None, None, "target")
+                return
+
+        if "at " in line:
+            match = _RE_JAVA_FRAME.search(line)
+            if match:
+                package = match.group(1).rstrip(".").split(".")
+                # Drop the class name (and any $Inner suffix) to get the package dir.
+                package_dir = "/".join(package[:-1])
+                raw_path = f"{package_dir}/{match.group(3)}" if package_dir else match.group(3)
+                func = f"{package[-1].split('$')[0]}.{match.group(2)}"
+                self._record(raw_path, int(match.group(4)), func, "java")
+                return
+            match = _RE_NODE_FRAME.search(line)
+            if match:
+                raw_path = match.group(2)
+                if not raw_path.startswith(("node:", "internal/")):
+                    self._record(raw_path, int(match.group(3)), match.group(1), "node")
+                return
+
+        if ".go:" in line:
+            match = _RE_GO_FRAME.match(line)
+            if match:
+                func_match = _RE_GO_FUNC.match(prev.strip())
+                func = func_match.group(1).rsplit("/", 1)[-1] if func_match else None
+                self._record(match.group(1), int(match.group(2)), func, "go")
+                return
+
+        if ".py:" in line:
+            match = _RE_PYTEST_FRAME.match(line)
+            if match:
+                self._record(match.group(1), int(match.group(2)), match.group(3), "pytest")
+                if match.group(4):
+                    # "tests/test_x.py:9: AssertionError" names the raising frame.
+                    self._on_exception(match.group(4))
+                return
+
+        if self._scan_boundary(line):
+            return
+
+        for match in _RE_GENERIC_PATHLINE.finditer(line):
+            self._record(match.group(1), int(match.group(2)), None, "generic")
+            if self.done:
+                return
+
+    def _scan_boundary(self, line: str) -> bool:
+        """Handle traceback headers and exception lines; True if ``line`` was one."""
+        if line.startswith("Traceback ("):
+            self._block_open = False
+            self._pending_exception = None
+            return True
+        if _RE_GO_PANIC.match(line):
+            self._on_exception("panic")
+            return True
+        match = _RE_EXCEPTION.match(line)
+        if match:
+            self._on_exception(match.group(1).rsplit(".", 1)[-1])
+            return True
+        return False
+
+    # ---------- trace structure ----------
+
+    def _on_frame(self, kind: str) -> Tuple[int, int]:
+        """Assign a (block, position) to a frame sighting of ``kind``."""
+        if kind in _OUTER_FIRST:
+            direction = "outer_first"
+        elif kind in _INNER_FIRST:
+            direction = "inner_first"
+        else:
+            return -1, 0
+        gap = self._line_no - self._last_frame_line
+        if not self._block_open or gap > _BLOCK_GAP or direction != self._block_direction:
+            self._block += 1
+            self._block_open = True
+            self._block_direction = direction
+            self._block_size = 0
+            self._block_frames = []
+            if self._pending_exception and direction == "inner_first":
+                self.exceptions[self._block] = self._pending_exception
+            self._pending_exception = None
+        self._last_frame_line = self._line_no
+        position = self._block_size
+        self._block_size += 1
+        return self._block, position
+
+    def _on_exception(self, name: str) -> None:
+        recent = self._line_no - self._last_frame_line <= _BLOCK_GAP
+        if (
+            self._block_open
+            and recent
+            and self._block_direction == "outer_first"
+            and self._block not in self.exceptions
+        ):
+            # Python/pytest print the exception after the innermost frame.
+            self.exceptions[self._block] = name
+            for frame in self._block_frames:
+                frame.exception = name
+            if self._last_frame_allowed is not None and self._last_frame_allowed.block == self._block:
+                self._last_frame_allowed.raising = True
+            self._block_open = False
+            return
+        # Node/Java/Go print the exception first; it applies to the next trace.
+        self._block_open = False
+        self._pending_exception = name
+
+    def _resolve(self, raw_path: str) -> str | None:
+        try:
+            return self._resolved[raw_path]
+        except KeyError:
+            pass
+        path = to_repo_relative(raw_path, self.repo_root, self.repo_name)
+        resolved = path if self.allowed.allows(path) else None
+        self._resolved[raw_path] = resolved
+        return resolved
+
+    def _record(self, raw_path: str, line_no: int | None, func: str | None, kind: str) -> None:
+        block, position = self._on_frame(kind)
+        path = self._resolve(raw_path)
+        if path is None:
+            self._last_frame_allowed = None
+            return
+        key = (path, line_no or 0)
+        frame = self._by_key.get(key)
+        if frame is not None:
+            frame.count += 1
+            if func and not frame.func:
+                frame.func = func
+        else:
+            frame = StackFrame(
+                path=path,
+                line=line_no,
+                func=func,
+                kind=kind,
+                order=len(self.frames),
+                block=block,
+                position=position,
+            )
+            self._by_key[key] = frame
+            self.frames.append(frame)
+        if block < 0:
+            return
+        self._last_frame_allowed = frame
+        if frame.block == block:
+            self._block_frames.append(frame)
+            exception = self.exceptions.get(block)
+            if exception and frame.exception is None:
+                frame.exception = exception
+                # Header-first traces: the first frame is where it was raised.
+                frame.raising = frame.raising or position == 0
+
+
+def scan_stack_frames(
+    chunks: str | Iterable[str],
+    *,
+    repo_root: str,
+    repo_name: str,
+    allowed_prefixes: Iterable[str] | None = None,
+    limit: int = 5,
+) -> List[StackFrame]:
+    """Scan text (or an iterator of text chunks) and return rich frame records."""
+    scanner = StackScanner(
+        repo_root=repo_root,
+        repo_name=repo_name,
+        allowed_prefixes=allowed_prefixes,
+        limit=limit,
+    )
+    if isinstance(chunks, str):
+        scanner.feed(chunks)
+    else:
+        for chunk in chunks:
+            if scanner.feed(chunk):
+                break
+    return scanner.close()
+
+
 def parse_stack_text(
     text: str,
     *,
@@ -26,46 +423,14 @@ def parse_stack_text(
     limit: int = 5,
 ) -> List[Tuple[str, int | None]]:
     """Return repo-relative path/line pairs extracted from stack-like text."""
-    results: List[Tuple[str, int | None]] = []
     if not text:
-        return results
-
-    lines = text.splitlines()
-
-    def _record(raw_path: str, line_no: int | None) -> None:
-        path = to_repo_relative(raw_path, repo_root, repo_name)
-        if path and is_path_allowed(path, allowed_prefixes):
-            results.append((path, line_no))
-
-    for line in lines:
-        match = _RE_PY_FILELINE.search(line)
-        if not match:
-            continue
-        _record(match.group(1), int(match.group(2)))
-
-    for line in lines:
-        for match in _RE_GENERIC_PATHLINE.finditer(line):
-            _record(match.group(1), int(match.group(2)))
-
-    for match in _RE_TARGET.finditer(text):
-        raw_full = _sanitize_path_token(match.group(1))
-        if ":" in raw_full and raw_full.rsplit(":", 1)[-1].isdigit():
-            raw_path, raw_line = raw_full.rsplit(":", 1)
-            line_no = int(raw_line)
-        else:
-            raw_path, line_no = raw_full, None
-        _record(raw_path, line_no)
-
-    deduped: List[Tuple[str, int | None]] = []
-    seen: set[Tuple[str, int]] = set()
-    for path, line_no in results:
-        key = (path, line_no or 0)
-        if key in seen:
-            continue
-        seen.add(key)
-        deduped.append((path, line_no))
-        if len(deduped) >= max(1, limit):
-            break
-
-    return deduped
+        return []
+    frames = scan_stack_frames(
+        text,
+        repo_root=repo_root,
+        repo_name=repo_name,
+        allowed_prefixes=allowed_prefixes,
+        limit=limit,
+    )
+    return [(frame.path, frame.line) for frame in frames]
 
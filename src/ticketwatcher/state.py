@@ -0,0 +1,377 @@
+"""Checkpointed per-issue run state, persisted in SQLite."""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, TypeVar
+
+from . import telemetry
+
+T = TypeVar("T")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id      INTEGER PRIMARY KEY AUTOINCREMENT,
+    repo        TEXT NOT NULL,
+    issue       INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    error       TEXT,
+    attempts    INTEGER NOT NULL DEFAULT 1,
+    started     REAL NOT NULL,
+    finished    REAL
+);
+CREATE INDEX IF NOT EXISTS runs_by_issue ON runs (repo, issue, fingerprint);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id   INTEGER NOT NULL REFERENCES runs (run_id),
+    stage    TEXT NOT NULL,
+    data     TEXT,
+    elapsed  REAL NOT NULL,
+    finished REAL NOT NULL,
+    PRIMARY KEY (run_id, stage)
+);
+CREATE TABLE IF NOT EXISTS backlog (
+    repo              TEXT NOT NULL,
+    issue             INTEGER NOT NULL,
+    fingerprint       TEXT NOT NULL,
+    outcome           TEXT NOT NULL,
+    pr_url            TEXT,
+    elapsed           REAL NOT NULL,
+    prompt_tokens     INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    cost              REAL NOT NULL DEFAULT 0,
+    finished          REAL NOT NULL,
+    PRIMARY KEY (repo, issue, fingerprint)
+);
+CREATE TABLE IF NOT EXISTS http_cache (
+    url  TEXT PRIMARY KEY,
+    etag TEXT NOT NULL,
+    body TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS fixes (
+    repo      TEXT NOT NULL,
+    issue     INTEGER NOT NULL,
+    signature TEXT,
+    sketch    BLOB NOT NULL,
+    diff      TEXT NOT NULL,
+    pr_url    TEXT,
+    pr_number INTEGER,
+    finished  REAL NOT NULL,
+    PRIMARY KEY (repo, issue)
+);
+CREATE INDEX IF NOT EXISTS fixes_by_signature ON fixes (repo, signature);
+CREATE TABLE IF NOT EXISTS fix_buckets (
+    repo   TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    issue  INTEGER NOT NULL,
+    PRIMARY KEY (repo, bucket, issue)
+);
+"""
+
+# Runs in these states are picked up again by the next trigger for the same content;
+# a run stopped by its budget continues from its checkpoints with a fresh one.
+_RESUMABLE = ("running", "failed", "budget", "deferred")
+
+
+@dataclass
+class StageTiming:
+    stage: str
+    count: int
+    total: float
+    mean: float
+    max: float
+
+
+class Run:
+    """One attempt at an issue; completed stages are replayed instead of redone."""
+
+    def __init__(self, store: "RunStore", run_id: int, stages: Dict[str, Any], attempts: int) -> None:
+        self.store = store
+        self.run_id = run_id
+        self.attempts = attempts
+        self._stages = stages
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self._stages)
+
+    def has(self, stage: str) -> bool:
+        return stage in self._stages
+
+    def get(self, stage: str, default: Any = None) -> Any:
+        return self._stages.get(stage, default)
+
+    def step(self, stage: str, fn: Callable[[], T]) -> T:
+        """Return the stored result of ``stage`` or run ``fn`` and checkpoint it."""
+        if stage in self._stages:
+            return self._stages[stage]
+        started = time.perf_counter()
+        with telemetry.span("stage", stage=stage.split(":", 1)[0], detail=stage, run_id=self.run_id):
+            value = fn()
+        self.checkpoint(stage, value, time.perf_counter() - started)
+        return self._stages[stage]
+
+    def checkpoint(self, stage: str, value: Any = None, elapsed: float = 0.0) -> None:
+        # Round-trip through JSON so a live run and a resumed one see identical data.
+        encoded = json.dumps(value)
+        self._stages[stage] = json.loads(encoded)
+        self.store._save_stage(self.run_id, stage, encoded, elapsed)
+
+    def finish(self, status: str, error: str | None = None) -> None:
+        self.store._finish(self.run_id, status, error)
+
+
+class RunStore:
+    """SQLite-backed store of runs and their per-stage checkpoints.
+
+    Safe to share between threads. ``path`` may be ``":memory:"``.
+    """
+
+    def __init__(self, path: str = ":memory:") -> None:
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        if path != ":memory:":
+            self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+    def begin(self, repo: str, issue: int, fingerprint: str) -> Run:
+        """Resume the unfinished run for this exact ticket content, or start a new one."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT run_id, attempts FROM runs WHERE repo = ? AND issue = ? AND fingerprint = ?"
+                f" AND status IN ({','.join('?' * len(_RESUMABLE))}) ORDER BY run_id DESC LIMIT 1",
+                (repo, issue, fingerprint, *_RESUMABLE),
+            ).fetchone()
+            if row is None:
+                cur = self._db.execute(
+                    "INSERT INTO runs (repo, issue, fingerprint, status, started) VALUES (?, ?, ?, 'running', ?)",
+                    (repo, issue, fingerprint, time.time()),
+                )
+                return Run(self, cur.lastrowid, {}, 1)
+            run_id, attempts = row[0], row[1] + 1
+            self._db.execute(
+                "UPDATE runs SET status = 'running', error = NULL, attempts = ? WHERE run_id = ?",
+                (attempts, run_id),
+            )
+            stages = {
+                stage: json.loads(data) if data is not None else None
+                for stage, data in self._db.execute(
+                    "SELECT stage, data FROM stages WHERE run_id = ?", (run_id,)
+                )
+            }
+            return Run(self, run_id, stages, attempts)
+
+    def completed(self, repo: str, issue: int, fingerprint: str) -> bool:
+        with self._lock:
+            row = self._db.execute(
+                "SELECT 1 FROM runs WHERE repo = ? AND issue = ? AND fingerprint = ? AND status = 'done' LIMIT 1",
+                (repo, issue, fingerprint),
+            ).fetchone()
+        return row is not None
+
+    def last_status(self, repo: str, issue: int, fingerprint: str) -> tuple | None:
+        """``(status, error)`` of the latest run for this exact ticket content, if any."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT status, error FROM runs WHERE repo = ? AND issue = ? AND fingerprint = ?"
+                " ORDER BY run_id DESC LIMIT 1",
+                (repo, issue, fingerprint),
+            ).fetchone()
+
+    def stage_timings(self) -> List[StageTiming]:
+        """Per-stage wall time across all recorded runs (replayed stages are not re-counted)."""
+        with self._lock:
+            # "write:src/a.py" and "llm:1" are reported as "write" and "llm".
+            rows = self._db.execute(
+                "SELECT CASE WHEN instr(stage, ':') > 0 THEN substr(stage, 1, instr(stage, ':') - 1)"
+                " ELSE stage END AS kind, COUNT(*), SUM(elapsed), AVG(elapsed), MAX(elapsed)"
+                " FROM stages GROUP BY kind ORDER BY MIN(finished)"
+            ).fetchall()
+        return [StageTiming(*row) for row in rows]
+
+    def recent_runs(self, limit: int = 20) -> List[Dict[str, Any]]:
+        with self._lock:
+            cur = self._db.execute(
+                "SELECT run_id, repo, issue, status, attempts, started, finished, error FROM runs"
+                " ORDER BY run_id DESC LIMIT ?",
+                (limit,),
+            )
+            names = [col[0] for col in cur.description]
+            return [dict(zip(names, row)) for row in cur.fetchall()]
+
+    # -- backlog progress --------------------------------------------------
+
+    def backlog_outcomes(self, repo: str) -> Dict[tuple, str]:
+        """``(issue, fingerprint) -> outcome`` for items a backlog run already finished."""
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT issue, fingerprint, outcome FROM backlog WHERE repo = ?", (repo,)
+            ).fetchall()
+        return {(issue, fingerprint): outcome for issue, fingerprint, outcome in rows}
+
+    def record_backlog_item(
+        self,
+        repo: str,
+        issue: int,
+        fingerprint: str,
+        *,
+        outcome: str,
+        pr_url: str | None,
+        elapsed: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        cost: float = 0.0,
+    ) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO backlog (repo, issue, fingerprint, outcome, pr_url, elapsed,"
+                " prompt_tokens, completion_tokens, cost, finished) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (repo, issue, fingerprint, outcome, pr_url, elapsed, prompt_tokens, completion_tokens, cost, time.time()),
+            )
+
+    @property
+    def http_cache(self) -> "HttpCache":
+        return HttpCache(self)
+
+    @property
+    def fixes(self) -> "FixIndex":
+        return FixIndex(self)
+
+    def _save_stage(self, run_id: int, stage: str, data: str, elapsed: float) -> None:
+        with self._lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO stages (run_id, stage, data, elapsed, finished) VALUES (?, ?, ?, ?, ?)",
+                (run_id, stage, data, elapsed, time.time()),
+            )
+
+    def _finish(self, run_id: int, status: str, error: Optional[str]) -> None:
+        with self._lock:
+            self._db.execute(
+                "UPDATE runs SET status = ?, error = ?, finished = ? WHERE run_id = ?",
+                (status, error, time.time(), run_id),
+            )
+
+
+class HttpCache:
+    """ETag cache for conditional GitHub requests (see ``github_api.list_issues``)."""
+
+    def __init__(self, store: RunStore) -> None:
+        self.store = store
+
+    def get(self, url: str) -> Optional[tuple]:
+        with self.store._lock:
+            return self.store._db.execute("SELECT etag, body FROM http_cache WHERE url = ?", (url,)).fetchone()
+
+    def put(self, url: str, etag: str, body: str) -> None:
+        with self.store._lock:
+            self.store._db.execute(
+                "INSERT OR REPLACE INTO http_cache (url, etag, body) VALUES (?, ?, ?)", (url, etag, body)
+            )
+
+
+class FixIndex:
+    """Diffs of earlier PRs, looked up by crash signature or MinHash bucket (see ``dedupe``)."""
+
+    _COLUMNS = "issue, diff, pr_url, pr_number"
+
+    def __init__(self, store: RunStore) -> None:
+        self.store = store
+
+    def record(
+        self,
+        repo: str,
+        issue: int,
+        *,
+        signature: str | None,
+        sketch: List[int],
+        buckets: List[str],
+        diff: str,
+        pr_url: str | None,
+        pr_number: int | None,
+    ) -> None:
+        with self.store._lock:
+            db = self.store._db
+            db.execute("BEGIN")
+            try:
+                db.execute("DELETE FROM fix_buckets WHERE repo = ? AND issue = ?", (repo, issue))
+                db.execute(
+                    "INSERT OR REPLACE INTO fixes (repo, issue, signature, sketch, diff, pr_url, pr_number, finished)"
+                    " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (repo, issue, signature, array("Q", sketch).tobytes(), diff, pr_url, pr_number, time.time()),
+                )
+                db.executemany(
+                    "INSERT OR IGNORE INTO fix_buckets (repo, bucket, issue) VALUES (?, ?, ?)",
+                    [(repo, bucket, issue) for bucket in buckets],
+                )
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+
+    def by_signature(self, repo: str, signature: str, *, exclude_issue: int = 0) -> Optional[Dict[str, Any]]:
+        """Most recent fix recorded for exactly this crash signature."""
+        with self.store._lock:
+            cur = self.store._db.execute(
+                f"SELECT {self._COLUMNS} FROM fixes WHERE repo = ? AND signature = ? AND issue != ?"
+                " ORDER BY finished DESC LIMIT 1",
+                (repo, signature, exclude_issue),
+            )
+            row = cur.fetchone()
+            return dict(zip([col[0] for col in cur.description], row)) if row else None
+
+    def candidates(self, repo: str, buckets: List[str], *, exclude_issue: int = 0) -> List[Dict[str, Any]]:
+        """Fixes sharing at least one LSH bucket, with their decoded ``sketch``."""
+        if not buckets:
+            return []
+        with self.store._lock:
+            cur = self.store._db.execute(
+                f"SELECT {self._COLUMNS}, sketch FROM fixes WHERE repo = ? AND issue != ? AND issue IN"
+                f" (SELECT issue FROM fix_buckets WHERE repo = ? AND bucket IN ({','.join('?' * len(buckets))}))",
+                (repo, exclude_issue, repo, *buckets),
+            )
+            names = [col[0] for col in cur.description]
+            rows = [dict(zip(names, row)) for row in cur.fetchall()]
+        for row in rows:
+            row["sketch"] = array("Q", row["sketch"]).tolist()
+        return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog="ticketwatcher runs", description="Show recorded runs and stage timings.")
+    parser.add_argument("--db", default=os.getenv("TICKETWATCHER_STATE_DB", ".ticketwatcher/state.db"))
+    parser.add_argument("--limit", type=int, default=20)
+    args = parser.parse_args(argv)
+    if not os.path.exists(args.db):
+        print(f"No state database at {args.db}", file=sys.stderr)
+        return 1
+
+    store = RunStore(args.db)
+    print(f"{'stage':<24} {'count':>6} {'mean s':>9} {'max s':>9} {'total s':>9}")
+    for t in store.stage_timings():
+        print(f"{t.stage:<24} {t.count:6d} {t.mean:9.3f} {t.max:9.3f} {t.total:9.3f}")
+    print()
+    for run in store.recent_runs(args.limit):
+        took = f"{run['finished'] - run['started']:.1f}s" if run["finished"] else "-"
+        error = f"  {run['error']}" if run["error"] else ""
+        print(f"#{run['run_id']:<5} {run['repo']}#{run['issue']:<6} {run['status']:<9} "
+              f"attempts={run['attempts']} {took}{error}")
+    store.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,303 @@
+"""Lightweight spans and metrics for pipeline stages and external calls.
+
+Disabled by default: :func:`span` then returns a shared no-op object, so
+instrumented code costs one global check and a function call. Enable it with
+:func:`configure` and pick exporters:
+
+* JSON lines, one finished span per line, for offline analysis;
+* per-span histograms rendered in the Prometheus text format
+  (``GET /metrics`` in ``ticketwatcher serve``);
+* a Markdown summary table for the GitHub Actions job summary.
+"""
+from __future__ import annotations
+
+import itertools
+import json
+import re
+import threading
+import time
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+Exporter = Callable[[Dict[str, Any]], None]
+
+enabled = False
+_exporters: List[Exporter] = []
+_ids = itertools.count(1)
+_current: ContextVar[Optional["Span"]] = ContextVar("ticketwatcher_span", default=None)
+
+
+class Span:
+    __slots__ = ("name", "attrs", "span_id", "parent_id", "start", "duration", "error", "_t0", "_token")
+
+    def __init__(self, name: str, attrs: Dict[str, Any]) -> None:
+        self.name = name
+        self.attrs = attrs
+        self.span_id = next(_ids)
+        self.parent_id: Optional[int] = None
+        self.start = 0.0
+        self.duration = 0.0
+        self.error: Optional[str] = None
+
+    def set(self, **attrs: Any) -> None:
+        self.attrs.update(attrs)
+
+    def __enter__(self) -> "Span":
+        parent = _current.get()
+        self.parent_id = parent.span_id if parent is not None else None
+        self._token = _current.set(self)
+        self.start = time.time()
+        self._t0 = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.duration = time.perf_counter() - self._t0
+        _current.reset(self._token)
+        if exc is not None:
+            self.error = f"{exc_type.__name__}: {exc}"
+        _emit(self.as_dict())
+        return False
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "start": self.start,
+            "duration_ms": round(self.duration * 1000, 3),
+            "error": self.error,
+            "attrs": self.attrs,
+        }
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def set(self, **attrs: Any) -> None:
+        pass
+
+    def __enter__(self) -> "_NoopSpan":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        return False
+
+
+_NOOP = _NoopSpan()
+
+
+def span(name: str, **attrs: Any):
+    """Context manager timing a block; a no-op unless telemetry is enabled."""
+    if not enabled:
+        return _NOOP
+    return Span(name, attrs)
+
+
+def record(name: str, duration: float, **attrs: Any) -> None:
+    """Emit a span that was timed elsewhere (e.g. ``requests``' ``elapsed``)."""
+    if not enabled:
+        return
+    parent = _current.get()
+    _emit(
+        {
+            "name": name,
+            "span_id": next(_ids),
+            "parent_id": parent.span_id if parent is not None else None,
+            "start": time.time() - duration,
+            "duration_ms": round(duration * 1000, 3),
+            "error": None,
+            "attrs": attrs,
+        }
+    )
+
+
+def _emit(data: Dict[str, Any]) -> None:
+    for exporter in _exporters:
+        try:
+            exporter(data)
+        except Exception as exc:  # pylint: disable=broad-except
+            print(f"[warn] telemetry exporter failed: {exc}")
+
+
+# ---------- HTTP route templates ----------
+
+_ROUTE_RULES: Tuple[Tuple[re.Pattern, str], ...] = (
+    (re.compile(r"^/repos/[^/]+/[^/]+"), "/repos/{owner}/{repo}"),
+    (re.compile(r"/contents/.*$"), "/contents/{path}"),
+    (re.compile(r"/git/ref/heads/.*$"), "/git/ref/heads/{branch}"),
+    (re.compile(r"/(issues|pulls)/\d+"), r"/\1/{number}"),
+    (re.compile(r"^/gists/[^/]+"), "/gists/{id}"),
+)
+
+
+def route_template(url: str) -> str:
+    """Low-cardinality route for a request URL, e.g. ``/repos/{owner}/{repo}/contents/{path}``."""
+    parsed = urlparse(url)
+    path = parsed.path or "/"
+    if parsed.hostname not in ("api.github.com", None) and not path.startswith("/repos/"):
+        return f"{parsed.hostname}/{{path}}"
+    for pattern, replacement in _ROUTE_RULES:
+        path = pattern.sub(replacement, path)
+    return path
+
+
+def record_http(response: Any, *args: Any, **kwargs: Any) -> None:
+    """``requests`` response hook emitting one ``http`` span per call."""
+    if not enabled:
+        return
+    request = response.request
+    length = response.headers.get("Content-Length")
+    record(
+        "http",
+        response.elapsed.total_seconds(),
+        method=request.method,
+        route=route_template(request.url),
+        status=response.status_code,
+        bytes=int(length) if length and length.isdigit() else None,
+    )
+
+
+# ---------- exporters ----------
+
+
+class JsonlExporter:
+    """Append every finished span as one JSON line."""
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, data: Dict[str, Any]) -> None:
+        line = json.dumps(data, default=str) + "\n"
+        with self._lock, open(self.path, "a", encoding="utf-8") as fh:
+            fh.write(line)
+
+
+_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+
+class Metrics:
+    """Aggregate spans into per-(name, route/stage, status) latency histograms."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._series: Dict[Tuple[Tuple[str, str], ...], List[float]] = {}
+
+    def __call__(self, data: Dict[str, Any]) -> None:
+        attrs = data["attrs"]
+        labels = [("span", data["name"])]
+        for key in ("route", "method", "status", "stage", "model"):
+            if attrs.get(key) is not None:
+                labels.append((key, str(attrs[key])))
+        if data.get("error"):
+            labels.append(("error", "true"))
+        seconds = data["duration_ms"] / 1000
+        key = tuple(labels)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # [count, sum, *bucket counts]
+                series = self._series[key] = [0.0, 0.0] + [0.0] * len(_BUCKETS)
+            series[0] += 1
+            series[1] += seconds
+            for i, bound in enumerate(_BUCKETS):
+                if seconds <= bound:
+                    series[2 + i] += 1
+
+    def render(self) -> str:
+        """Prometheus text exposition format."""
+        out = [
+            "# HELP ticketwatcher_span_seconds Duration of instrumented stages and calls.",
+            "# TYPE ticketwatcher_span_seconds histogram",
+        ]
+        with self._lock:
+            items = sorted(self._series.items())
+        for labels, series in items:
+            base = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            for i, bound in enumerate(_BUCKETS):
+                out.append(f'ticketwatcher_span_seconds_bucket{{{base},le="{bound}"}} {series[2 + i]:g}')
+            out.append(f'ticketwatcher_span_seconds_bucket{{{base},le="+Inf"}} {series[0]:g}')
+            out.append(f"ticketwatcher_span_seconds_sum{{{base}}} {series[1]:.6f}")
+            out.append(f"ticketwatcher_span_seconds_count{{{base}}} {series[0]:g}")
+        return "\n".join(out) + "\n"
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+class SummaryCollector:
+    """Collect span totals for a Markdown table (GitHub Actions job summary)."""
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._rows: Dict[str, List[float]] = {}
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def __call__(self, data: Dict[str, Any]) -> None:
+        attrs = data["attrs"]
+        name = data["name"]
+        if name == "http":
+            name = f"http {attrs.get('method')} {attrs.get('route')}"
+        elif attrs.get("stage"):
+            name = f"{name} ({attrs['stage']})"
+        with self._lock:
+            row = self._rows.setdefault(name, [0, 0.0, 0.0, 0])
+            row[0] += 1
+            row[1] += data["duration_ms"]
+            row[2] = max(row[2], data["duration_ms"])
+            row[3] += 1 if data.get("error") else 0
+            self.prompt_tokens += int(attrs.get("prompt_tokens") or 0)
+            self.completion_tokens += int(attrs.get("completion_tokens") or 0)
+
+    def render(self) -> str:
+        with self._lock:
+            rows = sorted(self._rows.items(), key=lambda item: -item[1][1])
+        lines = [
+            "### TicketWatcher timings",
+            "",
+            "| span | count | total ms | max ms | errors |",
+            "| --- | ---: | ---: | ---: | ---: |",
+        ]
+        lines.extend(
+            f"| {name} | {count:g} | {total:.0f} | {longest:.0f} | {errors:g} |"
+            for name, (count, total, longest, errors) in rows
+        )
+        if self.prompt_tokens or self.completion_tokens:
+            lines.extend(["", f"LLM tokens: {self.prompt_tokens:,} prompt / {self.completion_tokens:,} completion"])
+        return "\n".join(lines) + "\n"
+
+
+METRICS = Metrics()
+SUMMARY = SummaryCollector()
+
+
+def configure(
+    *,
+    jsonl_path: str = "",
+    metrics: bool = False,
+    summary: bool = False,
+    exporters: Tuple[Exporter, ...] = (),
+) -> None:
+    """(Re)configure exporters; telemetry is enabled when at least one is active."""
+    global enabled
+    _exporters[:] = list(exporters)
+    if jsonl_path:
+        _exporters.append(JsonlExporter(jsonl_path))
+    if metrics:
+        _exporters.append(METRICS)
+    if summary:
+        _exporters.append(SUMMARY)
+    enabled = bool(_exporters)
+
+
+def write_summary(path: str | None) -> None:
+    """Append the summary table to ``$GITHUB_STEP_SUMMARY`` (or print it)."""
+    text = SUMMARY.render()
+    if path:
+        with open(path, "a", encoding="utf-8") as fh:
+            fh.write(text)
+    else:
+        print(text)
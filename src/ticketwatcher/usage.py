@@ -0,0 +1,90 @@
+"""Token usage and cost accounting for LLM calls."""
+from __future__ import annotations
+
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+# USD per million (prompt, completion) tokens; override with TICKETWATCHER_TOKEN_PRICES.
+DEFAULT_PRICES: Dict[str, Tuple[float, float]] = {
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+}
+
+
+@dataclass
+class Usage:
+    calls: int = 0
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+    by_model: Dict[str, list] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock, repr=False, compare=False)
+
+    @property
+    def total_tokens(self) -> int:
+        return self.prompt_tokens + self.completion_tokens
+
+    def add(self, model: str, prompt_tokens: int, completion_tokens: int) -> None:
+        with self._lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            per_model = self.by_model.setdefault(model, [0, 0])
+            per_model[0] += prompt_tokens
+            per_model[1] += completion_tokens
+
+    def cost(self, prices: Optional[Dict[str, Tuple[float, float]]] = None) -> float:
+        """Estimated USD cost; models without a known price count as free."""
+        table = prices if prices is not None else DEFAULT_PRICES
+        total = 0.0
+        for model, (prompt, completion) in self.by_model.items():
+            price = table.get(model) or _price_by_prefix(table, model)
+            if price:
+                total += (prompt * price[0] + completion * price[1]) / 1_000_000
+        return total
+
+
+def _price_by_prefix(table: Dict[str, Tuple[float, float]], model: str) -> Optional[Tuple[float, float]]:
+    # Dated snapshots ("gpt-4o-mini-2024-07-18") price like their base model.
+    best = max((name for name in table if model.startswith(name + "-")), key=len, default=None)
+    return table[best] if best else None
+
+
+def parse_prices(raw: str | None) -> Dict[str, Tuple[float, float]]:
+    """Parse ``model=prompt/completion,...`` (USD per million tokens) over the defaults."""
+    prices = dict(DEFAULT_PRICES)
+    for part in (raw or "").split(","):
+        name, _, value = part.strip().partition("=")
+        prompt, _, completion = value.partition("/")
+        if name and prompt and completion:
+            prices[name.strip()] = (float(prompt), float(completion))
+    return prices
+
+
+TOTAL = Usage()
+_CURRENT: ContextVar[Optional[Usage]] = ContextVar("ticketwatcher_usage", default=None)
+
+
+def record(model: str, usage: Any) -> None:
+    """Record an API ``usage`` object against the process total and the current scope."""
+    prompt = int(getattr(usage, "prompt_tokens", 0) or 0)
+    completion = int(getattr(usage, "completion_tokens", 0) or 0)
+    TOTAL.add(model, prompt, completion)
+    scoped = _CURRENT.get()
+    if scoped is not None:
+        scoped.add(model, prompt, completion)
+
+
+@contextmanager
+def track() -> Iterator[Usage]:
+    """Collect the usage of every LLM call made inside the block (on this thread/task)."""
+    scoped = Usage()
+    token = _CURRENT.set(scoped)
+    try:
+        yield scoped
+    finally:
+        _CURRENT.reset(token)
@@ -0,0 +1,384 @@
+"""Local verification of candidate patches before anything is pushed to GitHub."""
+from __future__ import annotations
+
+import ast
+import multiprocessing
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Dict, Iterable, List, Mapping, Sequence, Set, Tuple
+
+from .impact import TestImpactIndex, is_test_file
+
+_COPY_IGNORE = shutil.ignore_patterns(
+    ".git", ".venv", "venv", "node_modules", "__pycache__", "*.pyc", ".pytest_cache", ".tox"
+)
+
+# One checker pool for the whole process, started on first use. Its workers are
+# spawned, not forked: the service calls verify_patch from several worker threads.
+_POOL: ProcessPoolExecutor | None = None
+_POOL_LOCK = threading.Lock()
+
+
+def _shared_pool(max_workers: int | None) -> ProcessPoolExecutor:
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is None:
+            _POOL = ProcessPoolExecutor(
+                max_workers=max(1, max_workers or os.cpu_count() or 1),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _POOL
+
+
+def _drop_pool(pool: Executor) -> None:
+    """Forget a broken shared pool so the next call starts a fresh one."""
+    global _POOL
+    with _POOL_LOCK:
+        if _POOL is pool:
+            _POOL = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+@dataclass
+class VerificationIssue:
+    path: str
+    kind: str  # "syntax" | "import" | "test" | "timeout" | "error"
+    message: str
+    line: int | None = None
+
+    def format(self) -> str:
+        where = f"{self.path}:{self.line}" if self.line else self.path
+        return f"[{self.kind}] {where}: {self.message}"
+
+
+@dataclass
+class VerificationResult:
+    issues: List[VerificationIssue] = field(default_factory=list)
+    checked: List[str] = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def ok(self) -> bool:
+        return not self.issues
+
+    def summary(self, limit: int = 10) -> str:
+        lines = [issue.format() for issue in self.issues[:limit]]
+        if len(self.issues) > limit:
+            lines.append(f"... and {len(self.issues) - limit} more")
+        return "\n".join(lines)
+
+
+# ---------- snapshot helpers ----------
+
+
+class _Snapshot:
+    """Repository checkout overlaid with the patched (and deleted) files."""
+
+    def __init__(self, repo_root: str, overlay: Mapping[str, str | None], source_roots: Sequence[str]):
+        self.repo_root = repo_root
+        self.overlay = overlay
+        self.source_roots = [r.strip("/") for r in source_roots]
+        self._ast_cache: Dict[str, ast.Module | None] = {}
+
+    def exists(self, rel: str) -> bool:
+        if rel in self.overlay:
+            return self.overlay[rel] is not None
+        return os.path.isfile(os.path.join(self.repo_root, rel))
+
+    def is_dir(self, rel: str) -> bool:
+        prefix = rel.rstrip("/") + "/"
+        if any(path.startswith(prefix) and text is not None for path, text in self.overlay.items()):
+            return True
+        return os.path.isdir(os.path.join(self.repo_root, rel))
+
+    def read(self, rel: str) -> str | None:
+        if rel in self.overlay:
+            return self.overlay[rel]
+        try:
+            with open(os.path.join(self.repo_root, rel), "r", encoding="utf-8") as fh:
+                return fh.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+    def module_file(self, dotted: str) -> Tuple[str | None, bool]:
+        """Return ``(file, found)`` for a dotted module; file is None for namespace dirs."""
+        rel = dotted.replace(".", "/")
+        for root in self.source_roots:
+            base = f"{root}/{rel}" if root else rel
+            if self.exists(base + ".py"):
+                return base + ".py", True
+            if self.exists(base + "/__init__.py"):
+                return base + "/__init__.py", True
+            if self.is_dir(base):
+                return None, True
+        return None, False
+
+    def top_level_in_repo(self, name: str) -> bool:
+        return self.module_file(name)[1]
+
+    def module_ast(self, rel: str) -> ast.Module | None:
+        if rel not in self._ast_cache:
+            text = self.read(rel)
+            try:
+                self._ast_cache[rel] = ast.parse(text) if text is not None else None
+            except SyntaxError:
+                self._ast_cache[rel] = None
+        return self._ast_cache[rel]
+
+
+def _defined_names(tree: ast.Module) -> Set[str] | None:
+    """Top-level names bound by a module, or None when that can't be known statically."""
+    names: Set[str] = set()
+    for node in tree.body:
+        if isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+            if node.name == "__getattr__":
+                return None
+            names.add(node.name)
+        elif isinstance(node, (ast.Assign, ast.AnnAssign, ast.AugAssign)):
+            targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+            for target in targets:
+                for sub in ast.walk(target):
+                    if isinstance(sub, ast.Name):
+                        names.add(sub.id)
+        elif isinstance(node, ast.Import):
+            for alias in node.names:
+                names.add((alias.asname or alias.name).split(".")[0])
+        elif isinstance(node, ast.ImportFrom):
+            for alias in node.names:
+                if alias.name == "*":
+                    return None
+                names.add(alias.asname or alias.name)
+        elif isinstance(node, (ast.If, ast.Try, ast.With, ast.For, ast.While)):
+            # Conditional definitions: be permissive and collect everything bound inside.
+            for sub in ast.walk(node):
+                if isinstance(sub, (ast.FunctionDef, ast.AsyncFunctionDef, ast.ClassDef)):
+                    names.add(sub.name)
+                elif isinstance(sub, ast.Name) and isinstance(sub.ctx, ast.Store):
+                    names.add(sub.id)
+                elif isinstance(sub, ast.alias):
+                    names.add((sub.asname or sub.name).split(".")[0])
+    return names
+
+
+def _package_of(rel_path: str, source_roots: Sequence[str]) -> str | None:
+    """Dotted package containing ``rel_path`` relative to the first matching source root."""
+    for root in source_roots:
+        root = root.strip("/")
+        prefix = f"{root}/" if root else ""
+        if rel_path.startswith(prefix):
+            parts = rel_path[len(prefix):].split("/")
+            return ".".join(parts[:-1])
+    return None
+
+
+def _iter_imports(tree: ast.Module) -> Iterable[Tuple[ast.stmt, str, int, List[str]]]:
+    """Yield ``(node, module, level, imported_names)`` for each import statement."""
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield node, alias.name, 0, []
+        elif isinstance(node, ast.ImportFrom):
+            yield node, node.module or "", node.level, [a.name for a in node.names]
+
+
+def _check_imports(path: str, tree: ast.Module, snapshot: _Snapshot) -> List[VerificationIssue]:
+    issues: List[VerificationIssue] = []
+    package = _package_of(path, snapshot.source_roots)
+
+    for node, module, level, names in _iter_imports(tree):
+        key = f"{'.' * level}{module}"
+        if level:
+            if package is None:
+                continue
+            parts = package.split(".") if package else []
+            drop = level - 1  # ``from . import x`` is relative to the containing package
+            if drop > len(parts):
+                issues.append(VerificationIssue(path, "import", f"relative import beyond top-level package: {key}", node.lineno))
+                continue
+            anchor = parts[: len(parts) - drop] if drop else parts
+            dotted = ".".join([*anchor, module] if module else anchor)
+        else:
+            dotted = module
+            top = dotted.split(".")[0]
+            if not snapshot.top_level_in_repo(top):
+                # Third-party or stdlib: what the agent has installed says nothing about the target repo.
+                continue
+
+        if not dotted:
+            continue
+        module_file, found = snapshot.module_file(dotted)
+        if not found:
+            issues.append(VerificationIssue(path, "import", f"No module named '{dotted}'", node.lineno))
+            continue
+        if not names or module_file is None:
+            continue
+        module_tree = snapshot.module_ast(module_file)
+        defined = _defined_names(module_tree) if module_tree is not None else None
+        if defined is None:
+            continue
+        for name in names:
+            if name == "*" or name in defined:
+                continue
+            if snapshot.module_file(f"{dotted}.{name}")[1]:
+                continue
+            issues.append(
+                VerificationIssue(path, "import", f"cannot import name '{name}' from '{dotted}'", node.lineno)
+            )
+    return issues
+
+
+def check_python_file(
+    path: str,
+    source: str,
+    repo_root: str,
+    overlay: Mapping[str, str | None],
+    source_roots: Sequence[str],
+) -> List[VerificationIssue]:
+    """Compile one patched file and resolve its imports against the snapshot."""
+    try:
+        compile(source, path, "exec", dont_inherit=True)
+        tree = ast.parse(source, filename=path)
+    except SyntaxError as exc:
+        return [VerificationIssue(path, "syntax", exc.msg or "invalid syntax", exc.lineno)]
+    except ValueError as exc:  # e.g. null bytes
+        return [VerificationIssue(path, "syntax", str(exc))]
+
+    return _check_imports(path, tree, _Snapshot(repo_root, overlay, source_roots))
+
+
+# ---------- targeted tests ----------
+
+
+def _materialize_snapshot(repo_root: str, overlay: Mapping[str, str | None], dest: str) -> None:
+    shutil.copytree(repo_root, dest, ignore=_COPY_IGNORE, dirs_exist_ok=True)
+    for rel, text in overlay.items():
+        target = os.path.join(dest, rel)
+        if text is None:
+            if os.path.exists(target):
+                os.remove(target)
+            continue
+        os.makedirs(os.path.dirname(target) or dest, exist_ok=True)
+        with open(target, "w", encoding="utf-8") as fh:
+            fh.write(text)
+
+
+def _run_pytest(cwd: str, env: Mapping[str, str], test_paths: Sequence[str], timeout: float) -> List[VerificationIssue]:
+    cmd = [sys.executable, "-m", "pytest", "-q", "-x", "-p", "no:cacheprovider", *test_paths]
+    try:
+        proc = subprocess.run(cmd, cwd=cwd, env=env, capture_output=True, text=True, timeout=max(timeout, 0.1))
+    except subprocess.TimeoutExpired:
+        return [VerificationIssue(",".join(test_paths), "timeout", f"tests exceeded {timeout:.1f}s")]
+    if proc.returncode in (0, 5):  # 5 == no tests collected
+        return []
+    tail = "\n".join((proc.stdout or proc.stderr).strip().splitlines()[-15:])
+    return [VerificationIssue(",".join(test_paths), "test", tail or f"pytest exited with {proc.returncode}")]
+
+
+def run_tests_in_snapshot(
+    repo_root: str,
+    overlay: Mapping[str, str | None],
+    test_paths: Sequence[str],
+    *,
+    timeout: float,
+    source_roots: Sequence[str] = ("src", ""),
+    workers: int = 1,
+) -> List[VerificationIssue]:
+    """Run ``pytest`` on ``test_paths`` inside a throwaway copy of the patched tree.
+
+    With ``workers`` > 1 the test files are split round-robin across that many
+    concurrent pytest processes sharing the one snapshot.
+    """
+    if not test_paths:
+        return []
+    with tempfile.TemporaryDirectory(prefix="ticketwatcher-verify-") as tmp:
+        _materialize_snapshot(repo_root, overlay, tmp)
+        env = dict(os.environ)
+        roots = [os.path.join(tmp, r) if r else tmp for r in source_roots]
+        env["PYTHONPATH"] = os.pathsep.join(roots + ([env["PYTHONPATH"]] if env.get("PYTHONPATH") else []))
+        shards = [list(test_paths[i::workers]) for i in range(max(1, min(workers, len(test_paths))))]
+        if len(shards) == 1:
+            return _run_pytest(tmp, env, shards[0], timeout)
+        with ThreadPoolExecutor(max_workers=len(shards)) as pool:
+            results = list(pool.map(lambda shard: _run_pytest(tmp, env, shard, timeout), shards))
+    return [issue for issues in results for issue in issues]
+
+
+# ---------- entry point ----------
+
+
+def verify_patch(
+    updated_files: Mapping[str, str | None],
+    *,
+    repo_root: str,
+    timeout: float = 20.0,
+    test_paths: Sequence[str] | None = None,
+    source_roots: Sequence[str] = ("src", ""),
+    max_workers: int | None = None,
+    executor: Executor | None = None,
+    impact: TestImpactIndex | None = None,
+    test_workers: int = 1,
+) -> VerificationResult:
+    """Verify patched file contents before they are committed anywhere.
+
+    Every changed Python file is compiled and its imports of modules inside
+    the repo are resolved against ``repo_root`` overlaid with ``updated_files``;
+    files are checked in parallel in a shared process pool (``max_workers``
+    sizes it when it is first started) unless an ``executor`` is given. When ``test_paths`` are given they are run with pytest
+    in a temporary copy of the patched tree with whatever time remains.
+    Without explicit ``test_paths``, an ``impact`` index selects the tests
+    that import the changed files, run across ``test_workers`` processes.
+    """
+    started = time.monotonic()
+    result = VerificationResult()
+    overlay = dict(updated_files)
+    if not test_paths and impact is not None:
+        selected = set(impact.select(overlay))
+        selected.update(p for p, text in overlay.items() if text is not None and is_test_file(p))
+        test_paths = sorted(p for p in selected if overlay.get(p, "") is not None)
+    py_files = sorted(p for p, text in overlay.items() if text is not None and p.endswith(".py"))
+    result.checked = list(py_files)
+
+    if py_files:
+        pool = executor or _shared_pool(max_workers)
+        futures: Dict[Future, str] = {}
+        try:
+            for path in py_files:
+                fut = pool.submit(check_python_file, path, overlay[path], repo_root, overlay, tuple(source_roots))
+                futures[fut] = path
+        except BrokenProcessPool as exc:
+            _drop_pool(pool)
+            result.issues.append(VerificationIssue(py_files[len(futures)], "error", repr(exc)))
+        done, pending = wait(futures, timeout=timeout)
+        for fut in pending:
+            fut.cancel()
+            result.issues.append(VerificationIssue(futures[fut], "timeout", f"not verified within {timeout:.1f}s"))
+        for fut in sorted(done, key=lambda f: futures[f]):
+            try:
+                result.issues.extend(fut.result())
+            except BrokenProcessPool as exc:
+                _drop_pool(pool)
+                result.issues.append(VerificationIssue(futures[fut], "error", repr(exc)))
+            except Exception as exc:  # pylint: disable=broad-except
+                result.issues.append(VerificationIssue(futures[fut], "error", repr(exc)))
+
+    if result.ok and test_paths:
+        remaining = timeout - (time.monotonic() - started)
+        if remaining <= 0:
+            result.issues.append(VerificationIssue(",".join(test_paths), "timeout", "no time left for tests"))
+        else:
+            result.issues.extend(
+                run_tests_in_snapshot(
+                    repo_root, overlay, test_paths, timeout=remaining, source_roots=source_roots, workers=test_workers
+                )
+            )
+
+    result.elapsed = time.monotonic() - started
+    return result
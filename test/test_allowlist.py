@@ -0,0 +1,47 @@
+import pathlib
+import random
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.paths import AllowList, compile_allowlist, is_path_allowed, parse_allowed_paths_env
+
+
+def test_globs_and_negations():
+    allow = parse_allowed_paths_env("src/,!src/vendor,*.md,services/*/handlers,!**/secrets/**")
+    assert allow == ["src/", "!src/vendor/", "*.md", "services/*/handlers", "!**/secrets/**"]
+    assert not allow.allows_all
+    for path in ("src/app/auth.py", "src", "README.md", "docs/guide.md", "services/billing/handlers/pay.py"):
+        assert allow.allows(path), path
+    for path in ("src/vendor/lib.py", "src/app/secrets/key.py", "services/billing/model.py", "lib/x.py", ""):
+        assert not allow.allows(path), path
+
+
+def test_only_negations_allow_everything_else():
+    allow = parse_allowed_paths_env("!.github/")
+    assert allow.allows("src/app.py")
+    assert not allow.allows(".github/workflows/ci.yml")
+    assert not allow.allows_all
+
+
+def test_prefix_matching_respects_segment_boundaries():
+    allow = AllowList(["src/", "lib/util.py"])
+    assert allow.allows("lib/util.py")
+    assert not allow.allows("srcs/x.py")
+    assert not allow.allows("lib/util.pyc")
+
+
+def test_plain_lists_are_compiled_once():
+    entries = ["src/", "app/"]
+    assert compile_allowlist(entries) is compile_allowlist(list(entries))
+    assert compile_allowlist(None).allows_all and compile_allowlist([]).allows_all
+    assert is_path_allowed("anything/at/all.py", [""])
+
+
+def test_large_codeowners_style_list_matches_naive_prefix_check():
+    rng = random.Random(3)
+    dirs = [f"team{i}/svc{j}/" for i in range(60) for j in range(50)]
+    allow = AllowList(dirs)
+    for _ in range(2000):
+        path = f"team{rng.randrange(80)}/svc{rng.randrange(70)}/mod_{rng.randrange(9)}.py"
+        assert allow.allows(path) == any(path.startswith(prefix) for prefix in dirs)
@@ -0,0 +1,129 @@
+import pathlib
+import sys
+import threading
+import time
+import types
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher import github_api, usage
+from ticketwatcher.backlog import collect_issues, run_backlog
+from ticketwatcher.coalesce import ticket_fingerprint
+from ticketwatcher.state import RunStore
+
+
+def _issue(number, labels=("agent-fix",), body="boom"):
+    return {"number": number, "title": f"Bug {number}", "body": body, "labels": [{"name": n} for n in labels]}
+
+
+class _Response:
+    def __init__(self, status, items=None, etag=None, next_url=None):
+        self.status_code = status
+        self._items = items
+        self.headers = {"ETag": etag} if etag else {}
+        self.links = {"next": {"url": next_url}} if next_url else {}
+
+    def json(self):
+        return self._items
+
+    def raise_for_status(self):
+        assert self.status_code < 400
+
+
+def test_list_issues_pages_and_revalidates_with_etags(monkeypatch):
+    pages = {}
+    requests_seen = []
+
+    class _Session:
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc):
+            return False
+
+        def get(self, url, headers=None):
+            requests_seen.append((url, dict(headers or {})))
+            if headers and headers.get("If-None-Match") == pages[url][1]:
+                return _Response(304)
+            items, etag, next_url = pages[url]
+            return _Response(200, items, etag, next_url)
+
+    first = f"{github_api.GITHUB_API}/repos/{github_api.OWNER}/{github_api.NAME}/issues?labels=agent-fix&state=open&per_page=100&sort=created&direction=asc"
+    pages[first] = ([_issue(1), dict(_issue(2), pull_request={})], '"e1"', "https://next")
+    pages["https://next"] = ([_issue(3)], '"e2"', None)
+    monkeypatch.setattr(github_api, "_session", _Session)
+    cache = RunStore().http_cache
+
+    assert [i["number"] for i in github_api.list_issues("agent-fix", cache=cache)] == [1, 3]
+    assert [i["number"] for i in github_api.list_issues("agent-fix", cache=cache)] == [1, 3]
+    assert [h.get("If-None-Match") for _, h in requests_seen] == [None, None, '"e1"', '"e2"']
+
+
+def test_collect_issues_unions_labels_in_issue_order():
+    by_label = {"agent-fix": [_issue(5), _issue(2)], "auto-pr": [_issue(2, ("auto-pr",)), _issue(9, ("auto-pr",))]}
+    issues = collect_issues({"agent-fix", "auto-pr"}, list_issues=lambda label, cache: by_label[label], cache=None)
+    assert [i["number"] for i in issues] == [2, 5, 9]
+
+
+def test_backlog_bounds_concurrency_accounts_cost_and_resumes():
+    store = RunStore()
+    lock = threading.Lock()
+    in_flight = {"now": 0, "max": 0}
+    handled = []
+
+    def handler(event):
+        number = event["issue"]["number"]
+        with lock:
+            in_flight["now"] += 1
+            in_flight["max"] = max(in_flight["max"], in_flight["now"])
+        usage.record("gpt-4o-mini", types.SimpleNamespace(prompt_tokens=1_000_000, completion_tokens=0))
+        time.sleep(0.02)
+        with lock:
+            in_flight["now"] -= 1
+            handled.append(number)
+        if number == 3:
+            raise RuntimeError("GitHub 502")
+        return f"https://example.com/pull/{number}" if number % 2 else None
+
+    issues = [_issue(n) for n in range(1, 9)]
+    kwargs = dict(repo="o/r", handler=handler, store=store, trigger_labels={"agent-fix"}, progress=lambda line: None)
+    report = run_backlog(issues, workers=3, **kwargs)
+
+    assert in_flight["max"] <= 3
+    assert (report.count("pr"), report.count("no-pr"), report.count("failed")) == (3, 4, 1)
+    assert abs(sum(item.cost for item in report.items) - 8 * 0.15) < 1e-9
+    assert "issues/min" in report.format() and "$1.20" in report.format()
+
+    # Rerun: only the failed issue and the edited one are processed again.
+    handled.clear()
+    issues[4] = _issue(5, body="boom, with more detail")
+    again = run_backlog(issues, workers=3, **kwargs)
+    assert sorted(handled) == [3, 5] and again.skipped == 6
+
+
+def test_budget_stops_are_retried_when_the_backlog_resumes():
+    store = RunStore()
+    budget_left = {7: False}
+
+    def handler(event):
+        # Stands in for handlers._run_pipeline: a budget stop finishes the run and returns no PR.
+        number = event["issue"]["number"]
+        run = store.begin("o/r", number, ticket_fingerprint(event["issue"]))
+        if budget_left.get(number, True):
+            run.finish("done")
+            return f"https://example.com/pull/{number}"
+        run.finish("budget", error="deadline: 600s elapsed")
+        return None
+
+    issues = [_issue(6), _issue(7)]
+    kwargs = dict(repo="o/r", handler=handler, store=store, trigger_labels={"agent-fix"}, progress=lambda line: None)
+    report = run_backlog(issues, **kwargs)
+    assert [(i.number, i.outcome, i.error) for i in sorted(report.items, key=lambda i: i.number)] == [
+        (6, "pr", None),
+        (7, "budget", "deadline: 600s elapsed"),
+    ]
+    assert "out of budget: 1" in report.format()
+
+    budget_left[7] = True
+    again = run_backlog(issues, **kwargs)
+    assert [(i.number, i.outcome) for i in again.items] == [(7, "pr")] and again.skipped == 1
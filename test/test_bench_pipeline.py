@@ -0,0 +1,31 @@
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+from bench_pipeline import run_bench
+from fake_services import SyntheticRepo
+from ticketwatcher.diff_utils import apply_hunks_to_text, parse_patch
+
+
+def test_synthetic_fix_applies_to_synthetic_module():
+    repo = SyntheticRepo(files=3, lines=40)
+    patch = parse_patch(repo.fix_diff(2))
+    (file_patch,) = patch.files
+    fixed = apply_hunks_to_text(repo.files[repo.path(2)], file_patch.hunks)
+    assert 'return data.get("name", "")' in fixed
+    assert 'return data["name"]' not in fixed
+
+
+def test_offline_bench_opens_one_pr_per_issue():
+    result = run_bench(issues=6, concurrency=3, files=4, lines=40, context_rounds=1)
+    assert result.prs == 6
+    latencies = result.latencies()
+    assert len(latencies["pipeline"]) == 6
+    assert {"stage:seeds", "stage:llm", "stage:branch", "stage:write", "stage:pr"} <= set(latencies)
+    # every ticket asked for context once, then proposed its patch
+    assert result.llm_calls == 12 and result.prompt_tokens > 0
+    assert result.api_routes["POST /repos/{owner}/{repo}/pulls"][0] == 6
+    assert "Processed 6 issue(s), 6 PR(s)" in result.format()
@@ -0,0 +1,75 @@
+import pathlib
+import sys
+import types
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import pytest
+
+from ticketwatcher import budget
+from ticketwatcher.agent_llm import TicketWatcherAgent
+from ticketwatcher.budget import Budget, BudgetExceeded
+
+
+class _RecordingCompletions:
+    def __init__(self):
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        return types.SimpleNamespace(
+            choices=[types.SimpleNamespace(message=types.SimpleNamespace(content='{"action": "request_context"}'))],
+            usage=types.SimpleNamespace(prompt_tokens=1200, completion_tokens=100),
+        )
+
+
+def _agent():
+    completions = _RecordingCompletions()
+    client = types.SimpleNamespace(chat=types.SimpleNamespace(completions=completions))
+    return TicketWatcherAgent(model="gpt-4o", allowed_paths=[], client=client, request_timeout=60), completions
+
+
+def test_timeout_is_capped_by_the_deadline_and_expiry_cancels():
+    limits = Budget(deadline=10.0)
+    assert budget.timeout(30.0) == 30.0  # no run budget in scope
+    with budget.govern(limits):
+        assert 9.0 < budget.timeout(30.0) <= 10.0
+        limits.started -= 11.0
+        with pytest.raises(BudgetExceeded) as exc:
+            budget.timeout(30.0)
+    assert exc.value.reason == "deadline" and limits.exhausted == "deadline"
+
+
+def test_call_budget_refuses_the_call_over_the_limit():
+    limits = Budget(max_calls=2)
+    limits.charge_call()
+    limits.charge_call()
+    with pytest.raises(BudgetExceeded, match="2 of 2 API calls"):
+        limits.charge_call()
+    assert limits.calls == 2 and limits.exhausted == "calls"
+
+
+def test_agent_trims_snippets_and_switches_model_under_pressure():
+    agent, completions = _agent()
+    snippets = [{"path": f"src/m{i}.py", "start_line": 1, "end_line": 200, "code": "x = 1\n" * 400} for i in range(3)]
+    limits = Budget(max_input_tokens=2000, max_output_tokens=1000, fallback_model="gpt-4o-mini", downgrade_at=0.5)
+
+    with budget.govern(limits):
+        agent.run("Bug", "boom", snippets)
+        agent.run("Bug", "boom", snippets[:1])
+
+    first, second = completions.calls
+    assert first["model"] == "gpt-4o" and second["model"] == "gpt-4o-mini"
+    assert first["max_tokens"] == 1000 and second["max_tokens"] == 900
+    assert first["timeout"] == 60
+    # 3 snippets do not fit the 2000-token budget, 2 do; the second call has 800 tokens left.
+    assert [call["messages"][1]["content"].count("--- path: src/") for call in (first, second)] == [2, 0]
+    assert limits.input_tokens == 2400 and limits.downgrades == ["snippets", "model"]
+
+
+def test_prompt_that_cannot_fit_is_not_sent():
+    agent, completions = _agent()
+    with budget.govern(Budget(max_input_tokens=100)):
+        with pytest.raises(BudgetExceeded) as exc:
+            agent.run("Bug", "boom " * 500, [])
+    assert exc.value.reason == "input_tokens" and completions.calls == []
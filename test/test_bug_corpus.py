@@ -0,0 +1,46 @@
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+from bug_corpus import _diff, generate, mutant_files, mutations, run_corpus
+
+APP_TESTS = ["test/test_user_repo_safe_shape.py", "test/test_utils_sanitize.py"]
+
+
+def test_mutants_are_small_edits_that_still_compile():
+    found = list(mutations(str(ROOT), "src/app"))
+    assert {m.operator for m in found} == {"import", "none_guard", "off_by_one", "default"}
+    guard = next(m for m in found if m.description == "guard `if value is None:` removed")
+    assert guard.path == "src/app/utils/stringy.py"
+    assert "if value is None" not in guard.text and "return value.strip()" in guard.text
+    broken = next(m for m in found if m.operator == "import" and m.path == "src/app/auth.py")
+    assert "from .user_repo import load_users\n" in broken.text
+
+
+def test_generated_tickets_are_fixed_by_the_pipeline_and_scored_by_the_tests():
+    records, stats = generate(str(ROOT), "src/app", tests=APP_TESTS, operators=["none_guard"], jobs=4)
+    assert records and sum(stats.kept.values()) == len(records)
+    by_description = {r["description"]: r for r in records}
+    guard = by_description["guard `if value is None:` removed"]
+    assert guard["failing_tests"] == ["test.test_utils_sanitize::test_sanitize_handles_none"]
+    issue = guard["event"]["issue"]
+    assert issue["title"].startswith(f"[{guard['id']}] AssertionError")
+    assert "src/app/utils/stringy.py" not in issue["body"] and "bug-corpus-" not in issue["body"]
+    assert "test/test_utils_sanitize.py" in issue["body"]
+
+    # A "fix" that leaves the bug in place opens a PR but does not count.
+    unfixed = dict(guard, id="m9999")
+    mutant = mutant_files(str(ROOT), guard)[guard["path"]]
+    unfixed["fix"] = _diff(guard["path"], mutant, "# looked at it\n" + mutant)
+    unfixed["event"] = dict(guard["event"], repository={"full_name": "corpus/m9999"})
+    unfixed["event"]["issue"] = dict(issue, title=issue["title"].replace(guard["id"], "m9999"))
+
+    result = run_corpus(records + [unfixed], root=str(ROOT), concurrency=4, jobs=4)
+    assert result.tickets == len(records) + 1 and result.prs == result.tickets
+    assert result.fixed == len(records) and result.unfixed == ["m9999"]
+    assert result.llm_calls == result.tickets and result.tokens_per_fix > 0
+    report = result.format(baseline=dict(result.to_dict(), version="v0", success_rate=1.0))
+    assert "against v0:" in report and "success_rate" in report
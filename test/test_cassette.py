@@ -0,0 +1,59 @@
+import gzip
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+import requests
+
+from cassette import Cassette, RecordingProxy, ReplayServer, redact
+from fake_services import FakeGitHub, SyntheticRepo
+
+TOKEN = "ghp_" + "x" * 36
+
+
+def test_redact_tokens_and_known_secrets():
+    text = f"token {TOKEN} and sk-{'a' * 30} and hunter2"
+    assert redact(text, ("hunter2",)) == "token <redacted> and <redacted> and <redacted>"
+
+
+def test_record_then_replay_without_upstream(tmp_path):
+    repo = SyntheticRepo(files=2, lines=20)
+    path = tmp_path / "run.cassette.gz"
+    with FakeGitHub(repo) as gh:
+        with RecordingProxy({"github": gh.url}, secrets=(TOKEN,)) as proxy:
+            base = proxy.env()["GITHUB_API"]
+            headers = {"Authorization": f"Bearer {TOKEN}"}
+            live = requests.get(f"{base}/repos/o/r/contents/{repo.path(1)}", params={"ref": "main"}, headers=headers)
+            requests.post(f"{base}/repos/o/r/issues/5/comments", json={"body": f"leaked {TOKEN}"}, headers=headers)
+        proxy.cassette.save(str(path))
+
+    raw = gzip.decompress(path.read_bytes()).decode()
+    assert TOKEN not in raw and "Bearer" not in raw
+    cassette = Cassette.load(str(path))
+    assert [i["route"] for i in cassette.interactions] == [
+        "/repos/{owner}/{repo}/contents/{path}",
+        "/repos/{owner}/{repo}/issues/{number}/comments",
+    ]
+
+    # the fake upstream is gone; replay serves the recording
+    with ReplayServer(cassette) as server:
+        base = server.env()["GITHUB_API"]
+        replayed = requests.get(f"{base}/repos/o/r/contents/{repo.path(1)}", params={"ref": "main"})
+        missing = requests.get(f"{base}/repos/o/r/pulls/9")
+    assert replayed.status_code == 200 and replayed.json() == live.json()
+    assert missing.status_code == 404 and server.misses == ["github GET /repos/o/r/pulls/9"]
+    assert server.served.summary()["github GET /repos/{owner}/{repo}/contents/{path}"][0] == 1
+
+
+def test_replay_rewrites_pagination_links():
+    page = {
+        "upstream": "github", "method": "GET", "path": "/repos/o/r/issues?page=1", "route": "/repos/{owner}/{repo}/issues",
+        "status": 200, "headers": {"Link": '<{base}/repos/o/r/issues?page=2>; rel="next"'}, "elapsed": 0.0,
+        "request_bytes": 0, "response_bytes": 2, "body": "[]",
+    }
+    with ReplayServer(Cassette([page])) as server:
+        r = requests.get(f"{server.env()['GITHUB_API']}/repos/o/r/issues?page=1")
+    assert r.links["next"]["url"] == f"{server.url}/github/repos/o/r/issues?page=2"
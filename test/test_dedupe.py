@@ -0,0 +1,60 @@
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.dedupe import find_duplicate, lsh_buckets, similarity, sketch_ticket, stack_signature
+from ticketwatcher.stackparse import scan_stack_frames
+from ticketwatcher.state import RunStore
+
+
+def _frames(text):
+    return scan_stack_frames(text, repo_root="/nonexistent", repo_name="repo", allowed_prefixes=["src/"])
+
+
+def _trace(line, exc="KeyError: 'name'", caller="src/app/views.py"):
+    return (
+        "Traceback (most recent call last):\n"
+        f'  File "{caller}", line 30, in profile\n'
+        f'  File "src/app/auth.py", line {line}, in get_user_profile\n'
+        f"{exc}\n"
+    )
+
+
+REPORT = (
+    "Opening the profile page for a user without a display name crashes with a KeyError. "
+    "Steps: create a user via the admin API, skip the name field, then visit the profile page. "
+    "Expected the page to render with an empty name."
+)
+
+
+def test_signature_ignores_line_numbers_but_not_exception_or_frames():
+    base = stack_signature(_frames(_trace(22)))
+    assert base and base == stack_signature(_frames(_trace(25)))
+    assert base != stack_signature(_frames(_trace(22, exc="TypeError: bad")))
+    assert base != stack_signature(_frames(_trace(22, caller="src/app/api.py")))
+    assert stack_signature(_frames("see src/app/auth.py:22 maybe")) is None
+
+
+def test_near_duplicate_reports_are_similar():
+    a = sketch_ticket("Profile page crashes", REPORT + " Seen at 10:42 on host 0x7ffe12.")
+    b = sketch_ticket("Profile page crashes", REPORT + " Seen at 11:03 on host 0x1a2b3c.")
+    c = sketch_ticket("Tax is wrong", "Checkout totals ignore the regional tax rate for invoices in Canada.")
+    assert similarity(a, b) > 0.9
+    assert similarity(a, c) < 0.2
+    assert set(lsh_buckets(a)) & set(lsh_buckets(b))
+
+
+def test_find_duplicate_prefers_signature_and_skips_the_same_issue():
+    fixes = RunStore(":memory:").fixes
+    sketch = sketch_ticket("Profile page crashes", REPORT)
+    signature = stack_signature(_frames(_trace(22)))
+    fixes.record("o/r", 1, signature=None, sketch=sketch, buckets=lsh_buckets(sketch), diff="d1", pr_url="u1", pr_number=11)
+    fixes.record("o/r", 2, signature=signature, sketch=[0] * len(sketch), buckets=[], diff="d2", pr_url="u2", pr_number=12)
+
+    by_text = find_duplicate(fixes, "o/r", 3, signature=None, sketch=sketch, threshold=0.8)
+    assert (by_text["issue"], by_text["match"], by_text["diff"]) == (1, "text", "d1")
+    by_stack = find_duplicate(fixes, "o/r", 3, signature=signature, sketch=sketch, threshold=0.8)
+    assert (by_stack["issue"], by_stack["match"], by_stack["pr_number"]) == (2, "signature", 12)
+    assert find_duplicate(fixes, "o/r", 1, signature=None, sketch=sketch, threshold=0.8) is None
+    assert find_duplicate(fixes, "other/repo", 3, signature=signature, sketch=sketch, threshold=0.8) is None
@@ -0,0 +1,155 @@
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import pytest
+
+from ticketwatcher import diff_utils
+from ticketwatcher.diff_utils import (
+    apply_file_patch,
+    apply_unified_diff,
+    diff_stats,
+    parse_patch,
+    parse_unified_diff,
+)
+
+
+SIMPLE = (
+    "--- a/src/app/payments.py\n"
+    "+++ b/src/app/payments.py\n"
+    "@@ -1,4 +1,5 @@\n"
+    "+TAX_RATE = 0.08\n"
+    " def calculate_total(subtotal, tax_rate=None):\n"
+    "     if tax_rate is None:\n"
+    "-        return subtotal * (1 + TAX_RATE)\n"
+    "+        return round(subtotal * (1 + TAX_RATE), 2)\n"
+    "     return round(subtotal * (1 + tax_rate), 2)\n"
+)
+
+GIT_EXTENDED = (
+    "diff --git a/src/app/new.py b/src/app/new.py\n"
+    "new file mode 100644\n"
+    "index 0000000..e69de29\n"
+    "--- /dev/null\n"
+    "+++ b/src/app/new.py\n"
+    "@@ -0,0 +1,2 @@\n"
+    "+VALUE = 1\n"
+    "+OTHER = 2\n"
+    "\\ No newline at end of file\n"
+    "diff --git a/src/app/old.py b/src/app/old.py\n"
+    "deleted file mode 100644\n"
+    "--- a/src/app/old.py\n"
+    "+++ /dev/null\n"
+    "@@ -1 +0,0 @@\n"
+    "-gone = True\n"
+    "diff --git a/src/app/a.py b/src/app/b.py\n"
+    "similarity index 100%\n"
+    "rename from src/app/a.py\n"
+    "rename to src/app/b.py\n"
+    "diff --git a/scripts/run.sh b/scripts/run.sh\n"
+    "old mode 100644\n"
+    "new mode 100755\n"
+)
+
+
+def test_parse_patch_counts_and_stats_in_one_pass():
+    patch = parse_patch(SIMPLE)
+    assert [fp.path for fp in patch] == ["src/app/payments.py"]
+    fp = patch.files[0]
+    assert (fp.added, fp.removed) == (2, 1)
+    assert patch.stats() == (1, 3)
+    assert diff_stats(SIMPLE) == diff_stats(patch) == (1, 3)
+
+
+def test_git_extended_headers_are_understood():
+    patch = parse_patch(GIT_EXTENDED)
+    new, deleted, renamed, chmod = patch.files
+
+    assert new.is_new and new.new_path == "src/app/new.py"
+    assert new.hunks[0].new_missing_newline
+
+    assert deleted.is_deleted and deleted.old_path == "src/app/old.py"
+    assert deleted.removed == 1
+
+    assert renamed.is_rename
+    assert (renamed.old_path, renamed.new_path) == ("src/app/a.py", "src/app/b.py")
+
+    assert chmod.mode_changed and not chmod.hunks
+    assert patch.paths == [
+        "src/app/new.py",
+        "src/app/old.py",
+        "src/app/a.py",
+        "src/app/b.py",
+        "scripts/run.sh",
+    ]
+
+
+def test_removed_line_that_looks_like_a_header_stays_in_hunk():
+    diff = (
+        "--- a/notes.md\n"
+        "+++ b/notes.md\n"
+        "@@ -1,2 +1,1 @@\n"
+        "--- a heading rule\n"
+        " keep\n"
+    )
+    patch = parse_patch(diff)
+    assert len(patch) == 1
+    assert patch.files[0].hunks[0].lines == ["--- a heading rule", " keep"]
+    assert apply_file_patch("-- a heading rule\nkeep\n", patch.files[0]) == "keep\n"
+
+
+def test_parse_unified_diff_keeps_legacy_shape():
+    parsed = parse_unified_diff(SIMPLE)
+    hunk = parsed["src/app/payments.py"][0]
+    assert hunk["old_start"] == 1 and hunk["new_len"] == 5
+    assert hunk["lines"][0] == "+TAX_RATE = 0.08"
+
+
+def test_apply_unified_diff_handles_new_deleted_and_renamed_files(monkeypatch):
+    sources = {"src/app/a.py": "x = 1\n", "src/app/old.py": "gone = True\n"}
+    fetched = []
+
+    def _fake_get_file_text(path, ref):
+        fetched.append(path)
+        return sources.get(path, "")
+
+    monkeypatch.setattr(diff_utils, "get_file_text", _fake_get_file_text)
+    updated = apply_unified_diff(
+        base_ref="main",
+        patch=parse_patch(GIT_EXTENDED),
+        allowed_prefixes=[""],
+    )
+
+    assert updated["src/app/new.py"] == "VALUE = 1\nOTHER = 2"
+    assert updated["src/app/old.py"] is None
+    assert updated["src/app/b.py"] == "x = 1\n"
+    assert updated["src/app/a.py"] is None
+    assert "src/app/new.py" not in fetched
+
+
+def test_apply_unified_diff_rejects_before_fetching(monkeypatch):
+    monkeypatch.setattr(
+        diff_utils, "get_file_text", lambda *a, **k: pytest.fail("should not fetch")
+    )
+    with pytest.raises(ValueError, match="Path not allowed: src/app/a.py"):
+        apply_unified_diff(
+            base_ref="main",
+            diff_text=GIT_EXTENDED,
+            allowed_prefixes=["src/app/b.py", "src/app/new.py", "src/app/old.py"],
+        )
+
+
+def test_strict_apply_rejects_moved_context():
+    original = (
+        "def calculate_total(subtotal, tax_rate=None):\n"
+        "    if tax_rate is None:\n"
+        "        return subtotal * (1 + TAX_RATE)\n"
+        "    return round(subtotal * (1 + tax_rate), 2)\n"
+    )
+    (file_patch,) = parse_patch(SIMPLE).files
+    assert apply_file_patch(original, file_patch, strict=True).startswith("TAX_RATE = 0.08\n")
+    with pytest.raises(ValueError, match="does not match line 1"):
+        apply_file_patch("import math\n" + original, file_patch, strict=True)
+    # The default positional mode is unchanged.
+    assert apply_file_patch("import math\n" + original, file_patch)
@@ -0,0 +1,78 @@
+import pathlib
+import sys
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+import pytest
+
+from snippet_tokens import measure, sample_snippets
+from ticketwatcher.agent_llm import TicketWatcherAgent
+from ticketwatcher.encoding import decode, encode_snippet, encode_snippets
+from ticketwatcher.retrieval import iter_source_files
+from ticketwatcher.paths import compile_allowlist
+
+CODE = "\n".join(
+    [
+        "class Profile:",  # 10
+        '    """Loads profiles.',
+        "",
+        "    Cached per user.",
+        '    """',
+        "",
+        "",
+        "",
+        "    # look the user up first",
+        "    def load(self, uid):",
+        "        data = self.repo.get(uid)",  # 20
+        "        return data['name']",
+        "12|not an anchor",
+    ]
+)
+SNIPPET = {"path": "src/app/profile.py", "start_line": 10, "end_line": 22, "code": CODE, "center_line": 21}
+SOURCE = {10 + i: line for i, line in enumerate(CODE.split("\n"))}
+
+
+def test_plain_matches_the_original_prompt_layout():
+    assert encode_snippets([SNIPPET, SNIPPET], "plain") == TicketWatcherAgent._format_snippets_block([SNIPPET] * 2)
+    assert encode_snippet(SNIPPET).startswith("--- path: src/app/profile.py\n--- start_line: 10\n")
+
+
+@pytest.mark.parametrize("mode", ["anchored", "dedent", "elide"])
+def test_compact_modes_keep_exact_line_numbers(mode):
+    text = encode_snippets([SNIPPET, dict(SNIPPET, start_line=40, end_line=41, code="x = 1\ny = 2", center_line=None)], mode)
+    lines = decode(text)["src/app/profile.py"]
+    for number, line in lines.items():
+        assert line.rstrip() == (SOURCE.get(number) if number < 40 else ["x = 1", "y = 2"][number - 40]).rstrip()
+    assert lines[22] == "12|not an anchor"
+    assert len(text) < len(encode_snippets([SNIPPET], "plain")) + 30
+
+
+def test_dedent_collapses_blank_runs_and_elide_drops_comments_outside_focus():
+    dedented = encode_snippet(dict(SNIPPET, code="\n".join("    " + line if line else "" for line in CODE.split("\n"))), "dedent")
+    assert dedented.splitlines()[0] == "## src/app/profile.py L10-22 indent=4"
+    assert "\n\n\n" not in dedented and "18|    # look" in dedented
+
+    elided = decode(encode_snippet(SNIPPET, "elide"))["src/app/profile.py"]
+    assert not {11, 12} & set(elided)  # docstring lines outside 21 +/- FOCUS_MARGIN
+    assert {13, 14, 18, 20, 21, 22} <= set(elided)
+    assert 18 in decode(encode_snippet(dict(SNIPPET, center_line=None), "anchored"))["src/app/profile.py"]
+    assert 18 not in decode(encode_snippet(dict(SNIPPET, center_line=40), "elide"))["src/app/profile.py"]
+
+
+def test_agent_prompt_uses_the_configured_encoding():
+    agent = TicketWatcherAgent(allowed_paths=[], snippet_encoding="elide")
+    prompt = agent._build_user_prompt("Bug", "boom", [SNIPPET])
+    assert "## src/app/profile.py L10-22" in prompt and "--- path:" not in prompt
+    with pytest.raises(ValueError):
+        TicketWatcherAgent(allowed_paths=[], snippet_encoding="zip")
+
+
+def test_measurement_on_this_repo_saves_tokens_without_losing_lines():
+    files = list(iter_source_files(str(ROOT), compile_allowlist(["src/ticketwatcher/"])))
+    snippets = sample_snippets(files, 40, 30)
+    sources = {path: text.splitlines() for path, text in files}
+    stats = {r.mode: r for r in measure(snippets, sources, ["plain", "anchored", "dedent", "elide"], len)}
+    assert all(r.mismatches == 0 for r in stats.values())
+    assert stats["elide"].tokens < stats["dedent"].tokens <= stats["anchored"].tokens < stats["plain"].tokens
@@ -0,0 +1,353 @@
+import os
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+_PROJECT_ROOT = pathlib.Path(__file__).resolve().parents[1]
+os.environ.setdefault("GITHUB_WORKSPACE", str(_PROJECT_ROOT))
+os.environ.setdefault("GITHUB_REPOSITORY", "example/repo")
+
+import pytest
+
+from ticketwatcher import budget, diff_utils, handlers
+from ticketwatcher.state import RunStore
+
+_AUTH = (_PROJECT_ROOT / "src" / "app" / "auth.py").read_text()
+
+GOOD_DIFF = (
+    "--- a/src/app/payments.py\n"
+    "+++ b/src/app/payments.py\n"
+    "@@ -1,1 +1,2 @@\n"
+    "+TAX_RATE = 0.08\n"
+    " \n"
+)
+
+BAD_DIFF = (
+    "--- a/src/app/auth.py\n"
+    "+++ b/src/app/auth.py\n"
+    "@@ -8,1 +8,1 @@\n"
+    "-from .utils.stringy import sanitize_string\n"
+    "+from .utils.stringy import sanitize_strings\n"
+)
+
+
+class _ScriptedAgent:
+    """Stand-in for TicketWatcherAgent that replays canned results."""
+
+    results = []
+    calls = []
+
+    def __init__(self, *args, **kwargs):
+        pass
+
+    def run_two_rounds(self, title, body, seeds, fetch_callback):
+        type(self).calls.append(("run_two_rounds", None))
+        return type(self).results.pop(0)
+
+    def run(self, title, body, snippets, trim_body_chars=3000, feedback=None):
+        type(self).calls.append(("run", feedback))
+        return type(self).results.pop(0)
+
+
+@pytest.fixture
+def github(monkeypatch):
+    calls = {"comments": [], "writes": [], "branches": [], "prs": [], "heads": ["base-1"], "from": []}
+    files = {
+        "src/app/auth.py": _AUTH,
+        "src/app/payments.py": (_PROJECT_ROOT / "src" / "app" / "payments.py").read_text(),
+    }
+    monkeypatch.setattr(handlers, "get_default_branch", lambda: "main")
+    monkeypatch.setattr(handlers, "list_issue_comments", lambda n: [{"body": b} for _, b in calls["comments"]])
+    monkeypatch.setattr(handlers, "_RUN_STORE", RunStore(":memory:"))
+    monkeypatch.setattr(handlers, "add_issue_comment", lambda n, b: calls["comments"].append((n, b)))
+    monkeypatch.setattr(handlers, "get_head_sha", lambda branch: calls["heads"][-1])
+    monkeypatch.setattr(
+        handlers, "create_branch", lambda b, base=None, from_sha=None: calls["branches"].append(b) or calls["from"].append(from_sha)
+    )
+    monkeypatch.setattr(
+        handlers,
+        "create_or_update_file",
+        lambda path, content_text, message, branch: calls["writes"].append((path, content_text)),
+    )
+    monkeypatch.setattr(
+        handlers,
+        "create_pr",
+        lambda **kw: calls["prs"].append(kw) or ("https://example.com/pull/7", 7),
+    )
+    monkeypatch.setattr(handlers, "_gather_seed_snippets", lambda *args, **kwargs: [])
+    monkeypatch.setattr(diff_utils, "get_file_text", lambda path, ref: files.get(path, ""))
+    monkeypatch.setattr(handlers, "TicketWatcherAgent", _ScriptedAgent)
+    monkeypatch.setattr(handlers, "ALLOWED_PATHS", [""])
+    monkeypatch.setattr(handlers, "REPO_ROOT", str(_PROJECT_ROOT))
+    _ScriptedAgent.results = []
+    _ScriptedAgent.calls = []
+    return calls
+
+
+def _event(number=5):
+    return {
+        "action": "labeled",
+        "label": {"name": "agent-fix"},
+        "issue": {"number": number, "title": "Bug", "body": "boom", "labels": [{"name": "agent-fix"}]},
+    }
+
+
+def _patch(diff):
+    return {"action": "propose_patch", "diff": diff, "notes": ""}
+
+
+def test_failed_verification_is_fed_back_before_any_push(github, monkeypatch):
+    monkeypatch.setattr(handlers, "VERIFY_ROUNDS", 1)
+    _ScriptedAgent.results = [_patch(BAD_DIFF), _patch(GOOD_DIFF)]
+
+    pr_url = handlers.handle_issue_event(_event())
+
+    assert pr_url == "https://example.com/pull/7"
+    kind, feedback = _ScriptedAgent.calls[1]
+    assert kind == "run" and "sanitize_strings" in feedback
+    assert [path for path, _ in github["writes"]] == ["src/app/payments.py"]
+
+
+def test_failed_verification_without_rounds_left_pushes_nothing(github, monkeypatch):
+    monkeypatch.setattr(handlers, "VERIFY_ROUNDS", 0)
+    _ScriptedAgent.results = [_patch(BAD_DIFF)]
+
+    assert handlers.handle_issue_event(_event()) is None
+    assert github["branches"] == [] and github["writes"] == []
+    assert "failed local verification" in github["comments"][-1][1]
+
+
+@pytest.mark.parametrize(
+    "action,label,labels,runs",
+    [
+        ("opened", None, ["agent-fix"], True),
+        ("opened", None, ["bug"], False),
+        ("labeled", "agent-fix", ["agent-fix"], True),
+        ("labeled", "bug", ["agent-fix", "bug"], False),
+        ("edited", None, ["agent-fix"], False),
+        ("closed", None, ["agent-fix"], False),
+    ],
+)
+def test_only_trigger_events_start_a_run(action, label, labels, runs):
+    event = {"action": action, "issue": {"number": 1, "labels": [{"name": n} for n in labels]}}
+    if label:
+        event["label"] = {"name": label}
+    assert handlers._is_trigger(event) is runs
+
+
+def test_unchanged_ticket_is_not_rerun_but_comment_command_is(github):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF), _patch(GOOD_DIFF)]
+    opened = dict(_event(), action="opened")
+    assert handlers.handle_issue_event(opened) == "https://example.com/pull/7"
+
+    # The label event that accompanies "opened" finds the fingerprint and stops.
+    assert handlers.handle_issue_event(_event()) is None
+    # So does a fresh process that only sees the marker comment.
+    handlers._RUN_STORE = RunStore(":memory:")
+    assert handlers.handle_issue_event(_event()) is None
+    assert len(github["prs"]) == 1
+
+    comment = {"action": "created", "issue": _event()["issue"], "comment": {"body": "/agent fix please"}}
+    assert handlers.handle_issue_comment_event(comment) == "https://example.com/pull/7"
+    assert len(github["prs"]) == 2
+
+
+def test_resumed_run_branches_from_the_base_commit_its_patch_was_built_on(github, monkeypatch):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    branch = handlers.create_branch
+
+    def create_branch(b, base=None, from_sha=None):
+        monkeypatch.setattr(handlers, "create_branch", branch)
+        raise RuntimeError("502 from GitHub")
+
+    monkeypatch.setattr(handlers, "create_branch", create_branch)
+    with pytest.raises(RuntimeError):
+        handlers.handle_issue_event(_event())
+
+    # Someone merges into the base before the retry; the checkpointed files must not be written over it.
+    github["heads"].append("base-2")
+    assert handlers.handle_issue_event(_event()) == "https://example.com/pull/7"
+    assert github["from"] == ["base-1"] and len(github["writes"]) == 1
+
+
+def test_every_file_is_read_at_the_base_commit_the_branch_starts_from(github, monkeypatch):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    reads = []
+    text = diff_utils.get_file_text
+    monkeypatch.setattr(diff_utils, "get_file_text", lambda path, ref: reads.append(ref) or text(path, ref))
+    monkeypatch.setattr(handlers, "_gather_seed_snippets", lambda body, base_ref, *a, **kw: reads.append(base_ref) or [])
+    assert handlers.handle_issue_event(_event()) == "https://example.com/pull/7"
+    assert reads and set(reads) == {"base-1"} and github["from"] == ["base-1"]
+
+
+def test_agent_command_needs_a_trigger_label_or_a_member(github):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    issue = dict(_event()["issue"], labels=[{"name": "question"}])
+    comment = {"action": "created", "issue": issue, "comment": {"body": "/agent fix", "author_association": "NONE"}}
+    assert handlers.handle_issue_comment_event(comment) is None
+    assert _ScriptedAgent.calls == [] and github["branches"] == []
+
+    comment["comment"]["author_association"] = "MEMBER"
+    assert handlers.handle_issue_comment_event(comment) == "https://example.com/pull/7"
+
+
+def test_failed_pr_call_resumes_without_repeating_llm_or_writes(github, monkeypatch):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    flaky = {"fail": True}
+
+    def create_pr(**kw):
+        if flaky.pop("fail", False):
+            raise RuntimeError("502 from GitHub")
+        github["prs"].append(kw)
+        return "https://example.com/pull/7", 7
+
+    monkeypatch.setattr(handlers, "create_pr", create_pr)
+    with pytest.raises(RuntimeError):
+        handlers.handle_issue_event(_event())
+
+    assert handlers.handle_issue_event(_event()) == "https://example.com/pull/7"
+    assert [kind for kind, _ in _ScriptedAgent.calls] == ["run_two_rounds"]
+    assert len(github["writes"]) == 1 and len(github["branches"]) == 1
+
+    store = handlers._RUN_STORE
+    assert [(r["status"], r["attempts"]) for r in store.recent_runs()] == [("done", 2)]
+    stages = [t.stage for t in store.stage_timings()]
+    assert stages[:6] == ["base", "base_sha", "dedupe", "seeds", "llm", "patch"] and "write" in stages and "pr" in stages
+
+
+def _crash(number, line, who):
+    body = (
+        f"Reported by {who}.\n"
+        "Traceback (most recent call last):\n"
+        f'  File "src/app/payments.py", line {line}, in apply_tax\n'
+        "TypeError: unsupported operand type(s)\n"
+    )
+    return dict(_event(number), issue=dict(_event(number)["issue"], title=f"Crash for {who}", body=body))
+
+
+def test_duplicate_crash_is_linked_to_the_existing_pr(github):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    assert handlers.handle_issue_event(_crash(5, 3, "alice")) == "https://example.com/pull/7"
+
+    # Same exception and frames (a line shifted); no second LLM call, branch or PR.
+    assert handlers.handle_issue_event(_crash(6, 4, "bob")) == "https://example.com/pull/7"
+    assert len(_ScriptedAgent.calls) == 1 and len(github["prs"]) == 1
+    issue_comment, pr_comment = github["comments"][-2:]
+    assert issue_comment[0] == 6 and "duplicate of #5" in issue_comment[1]
+    assert pr_comment == (7, "Also reported in #6.")
+
+
+def test_duplicate_reuses_stored_diff_or_falls_back_when_stale(github, monkeypatch):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF), _patch(GOOD_DIFF)]
+    handlers.handle_issue_event(_crash(5, 3, "alice"))
+
+    monkeypatch.setattr(handlers, "DEDUPE", "reuse")
+    assert handlers.handle_issue_event(_crash(6, 3, "bob")) == "https://example.com/pull/7"
+    assert len(_ScriptedAgent.calls) == 1 and "route=dedupe" in github["prs"][-1]["body"]
+
+    # Once the fix is on the base branch the old diff no longer applies; ask the LLM again.
+    fixed = "TAX_RATE = 0.08\n" + (_PROJECT_ROOT / "src" / "app" / "payments.py").read_text()
+    monkeypatch.setattr(diff_utils, "get_file_text", lambda path, ref: fixed)
+    handlers.handle_issue_event(_crash(7, 3, "carol"))
+    assert len(_ScriptedAgent.calls) == 2 and "route=llm" in github["prs"][-1]["body"]
+
+
+def test_seed_gathering_fetches_ranked_files_once(monkeypatch):
+    from ticketwatcher import snippets
+
+    fetched = []
+    monkeypatch.setattr(snippets, "file_exists", lambda path, ref: True)
+    monkeypatch.setattr(
+        snippets, "get_file_text", lambda path, ref: fetched.append(path) or "x = 1\n" * 200
+    )
+    monkeypatch.setattr(handlers, "ALLOWED_PATHS", ["src/"])
+    monkeypatch.setattr(handlers, "SEED_FILES", 2)
+    body = (
+        "Traceback (most recent call last):\n"
+        '  File "src/app/views.py", line 30, in profile\n'
+        '  File "src/app/views.py", line 35, in render\n'
+        '  File "src/app/auth.py", line 22, in get_user_profile\n'
+        "KeyError: 'name'\n"
+    )
+
+    seeds = handlers._gather_seed_snippets(body, "main")
+
+    assert fetched == ["src/app/auth.py", "src/app/views.py"]
+    assert [(s["path"], s["start_line"]) for s in seeds] == [
+        ("src/app/auth.py", 1),
+        ("src/app/views.py", 1),
+    ]
+
+
+def test_seed_gathering_reads_attached_logs(monkeypatch, tmp_path):
+    from ticketwatcher import snippets
+    from ticketwatcher.ingest import LocalArtifactSource
+
+    url = "https://github.com/user-attachments/files/1/ci.log"
+    log = tmp_path / "ci.log"
+    log.write_text("x\n" * 1000 + 'File "src/app/auth.py", line 3, in f\nKeyError: 1\n')
+    monkeypatch.setattr(handlers, "default_source", lambda: LocalArtifactSource({url: str(log)}))
+    monkeypatch.setattr(handlers, "ALLOWED_PATHS", ["src/"])
+    monkeypatch.setattr(snippets, "file_exists", lambda path, ref: True)
+    monkeypatch.setattr(snippets, "get_file_text", lambda path, ref: "a\nb\nc\n")
+
+    seeds = handlers._gather_seed_snippets(f"CI failed, log attached: {url}", "main")
+
+    assert [s["path"] for s in seeds] == ["src/app/auth.py"]
+
+
+def test_seed_gathering_falls_back_to_retrieval_without_frames(monkeypatch):
+    from ticketwatcher import snippets
+    from ticketwatcher.retrieval import RetrievalIndex
+
+    files = {
+        "src/app/payments.py": "def apply_tax(amount, rate=None):\n    return amount * (1 + rate)\n",
+        "src/app/auth.py": "def get_user_profile(user_id):\n    return {}\n",
+    }
+    monkeypatch.setattr(handlers, "_RETRIEVAL_INDEX", RetrievalIndex.build(files.items()))
+    monkeypatch.setattr(handlers, "ALLOWED_PATHS", ["src/"])
+    monkeypatch.setattr(snippets, "file_exists", lambda path, ref: True)
+    monkeypatch.setattr(snippets, "get_file_text", lambda path, ref: files[path])
+
+    seeds = handlers._gather_seed_snippets("Checkout total is wrong when no tax rate is set", "main", "Payments tax bug")
+
+    assert seeds[0]["path"] == "src/app/payments.py"
+
+
+def test_exhausted_budget_stops_the_run_and_the_next_trigger_resumes(github, monkeypatch):
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    # Each GitHub call the stages make is charged to the run's budget.
+    monkeypatch.setattr(handlers, "_gather_seed_snippets", lambda *args, **kwargs: budget.charge_call() or [])
+    monkeypatch.setattr(handlers, "create_branch", lambda b, base=None, from_sha=None: budget.charge_call() or github["branches"].append(b))
+    monkeypatch.setattr(handlers, "RUN_MAX_API_CALLS", 1)
+
+    assert handlers.handle_issue_event(_event()) is None
+    run = handlers._RUN_STORE.recent_runs()[0]
+    assert run["status"] == "budget" and run["error"].startswith("calls:")
+    assert "Stopped before opening a PR" in github["comments"][-1][1]
+    assert github["branches"] == [] and github["prs"] == []
+
+    # A later trigger gets a fresh budget and continues from the checkpoints.
+    monkeypatch.setattr(handlers, "RUN_MAX_API_CALLS", 0)
+    assert handlers.handle_issue_event(_event()) == "https://example.com/pull/7"
+    assert [kind for kind, _ in _ScriptedAgent.calls] == ["run_two_rounds"]
+
+
+def test_open_llm_circuit_defers_the_run(github, monkeypatch):
+    from ticketwatcher.resilience import CircuitOpen
+
+    class _Down(_ScriptedAgent):
+        def run_two_rounds(self, title, body, seeds, fetch_callback):
+            raise CircuitOpen("llm", 30)
+
+    monkeypatch.setattr(handlers, "TicketWatcherAgent", _Down)
+    with pytest.raises(CircuitOpen):
+        handlers.handle_issue_event(_event())
+    run = handlers._RUN_STORE.recent_runs()[0]
+    assert run["status"] == "deferred" and github["comments"] == []
+
+    monkeypatch.setattr(handlers, "TicketWatcherAgent", _ScriptedAgent)
+    _ScriptedAgent.results = [_patch(GOOD_DIFF)]
+    assert handlers.handle_issue_event(_event()) == "https://example.com/pull/7"
+    assert handlers._RUN_STORE.recent_runs()[0]["attempts"] == 2
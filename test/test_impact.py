@@ -0,0 +1,81 @@
+import pathlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.impact import TestImpactIndex, is_test_file
+from ticketwatcher.verify import verify_patch
+
+
+def _write(root, files):
+    for rel, text in files.items():
+        path = root / rel
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_text(text)
+
+
+def _make_repo(tmp_path):
+    _write(
+        tmp_path,
+        {
+            "src/app/__init__.py": "",
+            "src/app/utils/__init__.py": "from .stringy import clean\n",
+            "src/app/utils/stringy.py": "def clean(v):\n    return (v or '').strip()\n",
+            "src/app/auth.py": "from .utils import clean\n\ndef name(u):\n    return clean(u['name'])\n",
+            "src/app/payments.py": "def total(x):\n    return x * 2\n",
+            "test/conftest.py": "",
+            "test/test_auth.py": "from app.auth import name\n\ndef test_name():\n    assert name({'name': ' a '}) == 'a'\n",
+            "test/test_payments.py": "from app.payments import total\n\ndef test_total():\n    assert total(2) == 4\n",
+            "test/test_dynamic.py": "import importlib\n\ndef test_mod():\n    assert importlib.import_module('app.utils.stringy')\n",
+            "scripts/live_test.py": "from app.auth import name\n",
+        },
+    )
+    return tmp_path
+
+
+def test_selects_transitive_importers_only(tmp_path):
+    index = TestImpactIndex(str(_make_repo(tmp_path))).refresh()
+    assert index.select(["src/app/utils/stringy.py"]) == ["test/test_auth.py", "test/test_dynamic.py"]
+    assert index.select(["src/app/payments.py"]) == ["test/test_payments.py"]
+    assert index.select(["README.md"]) == []
+    assert len(index.select(["test/conftest.py"])) == 3
+    assert not is_test_file("scripts/live_test.py")
+
+
+def test_cache_is_reused_and_updated_incrementally(tmp_path):
+    repo = _make_repo(tmp_path)
+    cache = str(tmp_path / ".ticketwatcher" / "impact.json")
+    first = TestImpactIndex(str(repo), cache_path=cache).refresh()
+    assert first.parsed == 10
+
+    _write(repo, {"src/app/payments.py": "from app.utils import clean\n\ndef total(x):\n    return x * 2\n"})
+    second = TestImpactIndex(str(repo), cache_path=cache).refresh()
+    assert second.parsed == 1
+    assert "test/test_payments.py" in second.select(["src/app/utils/stringy.py"])
+
+
+def test_verify_runs_only_affected_tests(tmp_path):
+    repo = _make_repo(tmp_path)
+    # an unrelated broken test must not be selected
+    _write(repo, {"test/test_broken.py": "def test_broken():\n    assert False\n"})
+    index = TestImpactIndex(str(repo)).refresh()
+    fixed = "def total(x):\n    return x + x\n"
+    result = verify_patch(
+        {"src/app/payments.py": fixed},
+        repo_root=str(repo),
+        impact=index,
+        test_workers=2,
+        executor=ThreadPoolExecutor(max_workers=1),
+    )
+    assert result.ok, result.summary()
+
+    broken = "def total(x):\n    return x * 3\n"
+    result = verify_patch(
+        {"src/app/payments.py": broken, "src/app/auth.py": "from .utils import clean\n\ndef name(u):\n    return u\n"},
+        repo_root=str(repo),
+        impact=index,
+        test_workers=2,
+        executor=ThreadPoolExecutor(max_workers=1),
+    )
+    assert sorted(issue.path for issue in result.issues) == ["test/test_auth.py", "test/test_payments.py"]
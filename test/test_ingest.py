@@ -0,0 +1,82 @@
+import gzip
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.ingest import LocalArtifactSource, find_artifact_links, ingest_artifacts
+from ticketwatcher.stackparse import StackScanner
+
+ATTACHMENT = "https://github.com/user-attachments/files/123456/ci-log.txt"
+GIST = "https://gist.github.com/octocat/0123456789abcdef0123"
+
+TRACE = (
+    "Traceback (most recent call last):\n"
+    '  File "src/app/auth.py", line 22, in get_user_profile\n'
+    "KeyError: 'name'\n"
+)
+
+
+def _scanner(limit=5):
+    return StackScanner(repo_root="/repo", repo_name="repo", allowed_prefixes=["src/"], limit=limit)
+
+
+def test_find_artifact_links_dedupes_and_skips_binaries():
+    body = (
+        f"Full log: {ATTACHMENT}.\n"
+        f"Again ({ATTACHMENT}) and a screenshot "
+        "https://github.com/user-attachments/files/99/shot.png\n"
+        f"gist: {GIST}\n"
+    )
+    assert find_artifact_links(body) == [ATTACHMENT, GIST]
+
+
+class _CountingSource(LocalArtifactSource):
+    def __init__(self, files):
+        super().__init__(files)
+        self.max_chunk = 0
+
+    def iter_chunks(self, url, chunk_size):
+        for chunk in super().iter_chunks(url, chunk_size):
+            self.max_chunk = max(self.max_chunk, len(chunk))
+            yield chunk
+
+
+def test_streams_large_log_in_chunks_and_finds_trailing_frames(tmp_path):
+    log = tmp_path / "ci-log.txt"
+    log.write_text("noise line without frames\n" * 200_000 + TRACE)
+    source = _CountingSource({ATTACHMENT: str(log)})
+    scanner = _scanner()
+
+    report = ingest_artifacts([ATTACHMENT], scanner, source=source, max_bytes=50 * 1024 * 1024, chunk_size=4096)
+
+    assert scanner.results() == [("src/app/auth.py", 22)]
+    assert source.max_chunk <= 4096
+    assert report.bytes_read == log.stat().st_size and not report.truncated
+
+
+def test_byte_cap_stops_reading(tmp_path):
+    log = tmp_path / "ci-log.txt"
+    log.write_text("noise\n" * 100_000 + TRACE)
+    scanner = _scanner()
+
+    report = ingest_artifacts(
+        [ATTACHMENT], scanner, source=LocalArtifactSource({ATTACHMENT: str(log)}), max_bytes=10_000
+    )
+
+    assert report.truncated and report.bytes_read == 10_000
+    assert scanner.close() == []
+
+
+def test_gzipped_gist_and_early_exit_skips_remaining_links(tmp_path):
+    gz = tmp_path / "log.txt.gz"
+    gz.write_bytes(gzip.compress(TRACE.encode()))
+    other = tmp_path / "other.txt"
+    other.write_text(TRACE.replace("auth.py", "payments.py"))
+    source = LocalArtifactSource({GIST: str(gz), ATTACHMENT: str(other)})
+    scanner = _scanner(limit=1)
+
+    report = ingest_artifacts([GIST, ATTACHMENT], scanner, source=source, max_bytes=1_000_000)
+
+    assert scanner.results() == [("src/app/auth.py", 22)]
+    assert report.urls == [GIST]
@@ -0,0 +1,66 @@
+import json
+import os
+import pathlib
+import subprocess
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import pytest
+
+from ticketwatcher.prefilter import needs_work
+
+_SRC = pathlib.Path(__file__).resolve().parents[1] / "src"
+LABELS = {"agent-fix", "auto-pr"}
+
+
+@pytest.mark.parametrize(
+    "name,event,wanted",
+    [
+        (
+            "issue_comment",
+            {"action": "created", "issue": {"labels": [{"name": "agent-fix"}]}, "comment": {"body": "  /Agent fix please"}},
+            True,
+        ),
+        ("issue_comment", {"action": "created", "comment": {"body": "/agent fix", "author_association": "MEMBER"}}, True),
+        ("issue_comment", {"action": "created", "comment": {"body": "/agent fix", "author_association": "NONE"}}, False),
+        ("issue_comment", {"action": "created", "comment": {"body": "any update?"}}, False),
+        ("issue_comment", {"action": "edited", "comment": {"body": "/agent fix"}}, False),
+        ("issues", {"action": "labeled", "label": {"name": "auto-pr"}, "issue": {"labels": []}}, True),
+        ("issues", {"action": "labeled", "label": {"name": "bug"}, "issue": {"labels": [{"name": "agent-fix"}]}}, False),
+        ("issues", {"action": "opened", "issue": {"labels": [{"name": "agent-fix"}]}}, True),
+        ("issues", {"action": "opened", "issue": {"labels": None}}, False),
+        ("push", {}, False),
+        (None, {}, False),
+    ],
+)
+def test_needs_work(name, event, wanted):
+    assert needs_work(name, event, LABELS)[0] is wanted
+
+
+def test_rejected_event_never_loads_handlers_or_openai(tmp_path):
+    event_file = tmp_path / "event.json"
+    event_file.write_text(json.dumps({"action": "created", "issue": {"number": 1}, "comment": {"body": "+1"}}))
+    probe = (
+        "import sys\n"
+        "from ticketwatcher import cli\n"
+        "try:\n"
+        f"    cli.main(['--event-file', {str(event_file)!r}])\n"
+        "except SystemExit:\n"
+        "    pass\n"
+        "print(sorted(m for m in ('openai', 'requests', 'ticketwatcher.handlers') if m in sys.modules))\n"
+    )
+    env = dict(os.environ, PYTHONPATH=str(_SRC), GITHUB_EVENT_NAME="issue_comment")
+    out = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True, check=True).stdout
+    assert "No action taken" in out
+    assert out.strip().splitlines()[-1] == "[]"
+
+
+def test_repository_dispatch_from_worker_is_unwrapped(tmp_path):
+    event_file = tmp_path / "event.json"
+    relayed = {"event_name": "issue_comment", "event": {"action": "created", "issue": {"number": 1}, "comment": {"body": "+1"}}}
+    event_file.write_text(json.dumps({"action": "ticketwatcher", "client_payload": relayed}))
+    probe = f"from ticketwatcher import cli\ncli.main(['--event-file', {str(event_file)!r}])\n"
+    env = dict(os.environ, PYTHONPATH=str(_SRC), GITHUB_EVENT_NAME="repository_dispatch")
+    proc = subprocess.run([sys.executable, "-c", probe], env=env, capture_output=True, text=True)
+    assert "No action taken (comment is not an agent command)" in proc.stdout
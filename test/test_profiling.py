@@ -0,0 +1,90 @@
+import json
+import pathlib
+import pstats
+import sys
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+# Imported up front: under tracemalloc, importing the SDK inside the profiled run takes seconds.
+import openai  # noqa: F401
+from fake_services import FakeGitHub, FakeOpenAI, SyntheticRepo
+from ticketwatcher import cli, github_api, handlers, telemetry
+from ticketwatcher.profiling import Profiler
+from ticketwatcher.state import RunStore
+
+
+def _grow_a_list():
+    return [str(i) * 8 for i in range(50_000)]
+
+
+def test_profiler_writes_stats_stacks_allocations_and_stage_peaks(tmp_path):
+    out = tmp_path / "profile"
+    profiler = Profiler(str(out), interval=0.001)
+    telemetry.configure(exporters=(profiler,))
+    try:
+        with profiler:
+            with telemetry.span("stackparse"):
+                kept = _grow_a_list()
+            with telemetry.span("patch.apply"):
+                time.sleep(0.03)
+            with telemetry.span("unrelated"):
+                pass
+    finally:
+        telemetry.configure()
+
+    assert sorted(p.name for p in out.iterdir()) == [
+        "allocations.txt",
+        "profile.pstats",
+        "stacks.collapsed",
+        "stages.json",
+        "summary.txt",
+    ]
+    stages = json.loads((out / "stages.json").read_text())
+    assert set(stages["stages"]) == {"parse", "apply"}
+    assert stages["stages"]["apply"]["total_ms"] >= 30
+    assert all(row["peak_rss_mb"] > 0 for row in stages["stages"].values())
+    assert any("_grow_a_list" in key[2] for key in pstats.Stats(str(out / "profile.pstats")).stats)
+    stacks = (out / "stacks.collapsed").read_text().splitlines()
+    assert any(line.startswith("thread MainThread;") and "sleep" not in line for line in stacks)
+    assert all(line.rsplit(" ", 1)[1].isdigit() for line in stacks)
+    assert "test_profiling.py" in (out / "allocations.txt").read_text() and len(kept) == 50_000
+
+
+def test_cli_profile_flag_reports_each_pipeline_stage(tmp_path, monkeypatch, capsys):
+    repo = SyntheticRepo(files=2, lines=40)
+    event = {
+        "action": "labeled",
+        "label": {"name": "agent-fix"},
+        "issue": repo.issue(1, 1),
+        "repository": {"full_name": "bench/synthetic"},
+    }
+    event_file = tmp_path / "event.json"
+    event_file.write_text(json.dumps(event))
+    out = tmp_path / "artifact"
+    with FakeGitHub(repo) as gh, FakeOpenAI(repo, context_rounds=1) as llm:
+        monkeypatch.setattr(github_api, "GITHUB_API", gh.url)
+        monkeypatch.setattr(github_api, "TOKEN", "profile-token")
+        monkeypatch.setattr(github_api, "OWNER", "bench")
+        monkeypatch.setattr(github_api, "NAME", "synthetic")
+        monkeypatch.setattr(handlers, "VERIFY_PATCHES", False)
+        monkeypatch.setattr(handlers, "DEDUPE", "off")
+        monkeypatch.setattr(handlers, "_RUN_STORE", RunStore(":memory:"))
+        monkeypatch.setattr(handlers, "_AGENT_CLIENT", None)
+        monkeypatch.setenv("OPENAI_BASE_URL", f"{llm.url}/v1")
+        monkeypatch.setenv("OPENAI_API_KEY", "profile-key")
+        monkeypatch.setenv("TICKETWATCHER_BASE_BRANCH", "")
+        monkeypatch.setenv("GITHUB_EVENT_NAME", "issues")
+        try:
+            cli.main(["--event-file", str(event_file), "--profile", str(out)])
+        finally:
+            telemetry.configure()
+
+    printed = capsys.readouterr().out
+    assert "PR_URL=https://github.test/pull/1000" in printed and f"profile written to {out}" in printed
+    stages = json.loads((out / "stages.json").read_text())["stages"]
+    assert {"parse", "fetch", "prompt", "llm", "apply"} <= set(stages)
+    assert stages["prompt"]["calls"] == 2 and stages["fetch"]["calls"] == 2
+    assert "prompt" in (out / "summary.txt").read_text()
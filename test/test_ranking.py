@@ -0,0 +1,87 @@
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.ranking import is_test_path, rank_frames, select_seed_targets
+from ticketwatcher.stackparse import scan_stack_frames
+
+PY_TRACE = """\
+Traceback (most recent call last):
+  File "/usr/lib/python3.11/site-packages/flask/app.py", line 1500, in dispatch
+    return handler()
+  File "tests/test_views.py", line 12, in test_profile
+    resp = client.get("/profile")
+  File "src/app/views.py", line 30, in profile
+    return render(get_user_profile(uid))
+  File "src/app/views.py", line 88, in render
+    return template.format(**ctx)
+  File "src/app/auth.py", line 22, in get_user_profile
+    name = user["name"]
+KeyError: 'name'
+"""
+
+NODE_TRACE = """\
+TypeError: Cannot read properties of undefined (reading 'id')
+    at getUser (web/src/user.js:10:5)
+    at handler (web/src/routes.js:44:12)
+    at Layer.handle (node_modules/express/lib/router/layer.js:95:5)
+"""
+
+
+def _frames(text, allowed=None):
+    return scan_stack_frames(
+        text, repo_root="/repo", repo_name="repo", allowed_prefixes=allowed or [""], limit=40
+    )
+
+
+def test_python_trace_marks_innermost_raising_frame():
+    frames = {f.path + f":{f.line}": f for f in _frames(PY_TRACE, ["src/", "tests/"])}
+    auth = frames["src/app/auth.py:22"]
+    assert auth.raising and auth.exception == "KeyError"
+    assert not frames["src/app/views.py:30"].raising
+
+
+def test_node_trace_marks_first_frame_after_header():
+    frames = _frames(NODE_TRACE, ["web/"])
+    assert [(f.path, f.raising, f.exception) for f in frames] == [
+        ("web/src/user.js", True, "TypeError"),
+        ("web/src/routes.js", False, "TypeError"),
+    ]
+
+
+def test_ranking_prefers_innermost_user_code_over_tests_and_framework():
+    ranked = [f.path for f, _ in rank_frames(_frames(PY_TRACE))]
+    assert ranked[0] == "src/app/auth.py"
+    assert ranked.index("tests/test_views.py") > ranked.index("src/app/views.py")
+    assert ranked.index("src/app/views.py") < ranked.index("usr/lib/python3.11/site-packages/flask/app.py")
+
+
+def test_repeated_frames_rank_higher():
+    loop = 'File "src/app/loop.py", line 5, in spin\n'
+    text = "Traceback (most recent call last):\n" + loop * 8 + 'File "src/app/other.py", line 9, in x\n'
+    ranked = rank_frames(_frames(text))
+    assert ranked[0][0].count == 8
+
+
+def test_seed_targets_fetch_each_file_once_and_fold_nearby_lines():
+    targets = select_seed_targets(_frames(PY_TRACE, ["src/", "tests/"]), max_files=2, around_lines=40)
+    assert [t.path for t in targets] == ["src/app/auth.py", "src/app/views.py"]
+    # 30 and 88 are further apart than one window; 88 is deeper so it comes first
+    assert targets[1].lines == [88, 30]
+    wide = select_seed_targets(_frames(PY_TRACE, ["src/"]), max_files=2, around_lines=60)
+    assert wide[1].lines == [88]
+
+
+def test_low_value_files_are_not_fetched():
+    text = PY_TRACE + "see also docs/notes.md:3\n"
+    targets = select_seed_targets(_frames(text, ["src/", "docs/"]), max_files=5)
+    assert "docs/notes.md" not in [t.path for t in targets]
+
+
+def test_is_test_path():
+    assert is_test_path("tests/test_x.py")
+    assert is_test_path("src/app/conftest.py")
+    assert is_test_path("web/src/user.spec.ts")
+    assert is_test_path("pkg/billing/total_test.go")
+    assert not is_test_path("src/app/auth.py")
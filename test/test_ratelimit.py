@@ -0,0 +1,141 @@
+import pathlib
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+import pytest
+
+from fake_services import FakeOpenAI, SyntheticRepo
+from ticketwatcher import agent_llm, telemetry
+from ticketwatcher.agent_llm import TicketWatcherAgent
+from ticketwatcher.ratelimit import RateLimiter, parse_duration
+from ticketwatcher.resilience import CircuitBreaker, Hedger
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+def test_token_bucket_queues_refunds_and_learns_from_headers():
+    clock = FakeClock()
+    limiter = RateLimiter(tpm=600, poll=1.0, clock=clock, sleep=clock.sleep)
+    assert limiter.acquire(300).waited == 0
+    # 600 tokens with 300 left at 10 tokens/s: half a minute in the queue.
+    grant = limiter.acquire(600)
+    assert 29.0 <= grant.waited <= 31.0
+    assert limiter.try_acquire(100) is None
+    limiter.settle(grant, used_tokens=150)
+    assert limiter.try_acquire(400) is not None
+
+    limiter.settle(grant, headers={"x-ratelimit-limit-requests": "100", "x-ratelimit-remaining-requests": "5"})
+    snap = limiter.snapshot()
+    assert snap["requests_limit"] == 100 and snap["requests_available"] == 5
+    assert (snap["granted"], snap["queued"]) == (3, 1)
+
+    assert limiter.rejected(grant, {"retry-after": "2"}) == 2
+    assert limiter.try_acquire(1) is None
+    clock.now += 2.1
+    assert limiter.try_acquire(1) is not None
+    assert (parse_duration("6m0s"), parse_duration("20ms"), parse_duration("1.5")) == (360, 0.02, 1.5)
+
+
+def test_waiters_are_served_in_arrival_order():
+    limiter = RateLimiter(rpm=1200, poll=0.01)
+    while limiter.try_acquire(1):
+        pass
+    order = []
+    threads = []
+    for i in range(5):
+        thread = threading.Thread(target=lambda i=i: order.append((limiter.acquire(1), i)[1]))
+        thread.start()
+        threads.append(thread)
+        while limiter.snapshot()["waiting"] < i + 1:
+            time.sleep(0.001)
+    for thread in threads:
+        thread.join()
+    assert order == [0, 1, 2, 3, 4]
+
+
+def test_a_file_database_is_shared_between_processes(tmp_path):
+    path = str(tmp_path / "limits" / "rate.db")
+    limiter = RateLimiter(path, rpm=3)
+    script = (
+        "import sys\n"
+        f"sys.path.insert(0, {str(ROOT / 'src')!r})\n"
+        "from ticketwatcher.ratelimit import RateLimiter\n"
+        f"limiter = RateLimiter({path!r}, rpm=3)\n"
+        "print(sum(limiter.try_acquire(1) is not None for _ in range(3)))\n"
+    )
+    drawn = subprocess.run([sys.executable, "-c", script], capture_output=True, text=True, check=True)
+    assert drawn.stdout.strip() == "3"
+    assert limiter.try_acquire(1) is None
+
+
+def test_provider_429_is_requeued_without_tripping_the_breaker(monkeypatch):
+    limits = {
+        "x-ratelimit-limit-requests": "500",
+        "x-ratelimit-remaining-requests": "499",
+        "x-ratelimit-limit-tokens": "200000",
+        "x-ratelimit-remaining-tokens": "150000",
+    }
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=1)
+    limiter = RateLimiter()
+    spans = []
+    monkeypatch.setattr(agent_llm, "HEDGER", Hedger(quantile=0))
+    monkeypatch.setattr(agent_llm, "BREAKER", breaker)
+    monkeypatch.setattr(agent_llm, "LIMITER", limiter)
+    telemetry.configure(exporters=(spans.append,))
+    try:
+        with FakeOpenAI(
+            SyntheticRepo(files=2, lines=20),
+            fault=lambda n: 429 if n == 0 else 0,
+            headers=lambda n, status: {"retry-after-ms": "200"} if status == 429 else limits,
+        ) as server:
+            from openai import OpenAI
+
+            client = OpenAI(base_url=f"{server.url}/v1", api_key="test", max_retries=0)
+            agent = TicketWatcherAgent(allowed_paths=[], client=client, request_timeout=10)
+            assert agent.run("Bug", "boom", [])["action"] == "request_context"
+            assert server.requests == 2
+    finally:
+        telemetry.configure()
+
+    assert breaker.state == "closed"
+    call = next(s for s in spans if s["name"] == "llm.call")
+    assert call["attrs"]["attempts"] == 2 and call["attrs"]["queue_ms"] >= 150
+    queued = [s for s in spans if s["name"] == "llm.queue"]
+    assert len(queued) == 2 and all(s["parent_id"] == call["span_id"] for s in queued)
+    snap = limiter.snapshot()
+    assert snap["requests_limit"] == 500 and snap["tokens_limit"] == 200000
+
+
+def test_failed_requests_return_their_reserved_tokens(monkeypatch):
+    # A frozen clock: the buckets never refill, so any token not handed back shows.
+    limiter = RateLimiter(rpm=1000, tpm=600_000, clock=FakeClock())
+    monkeypatch.setattr(agent_llm, "HEDGER", Hedger(quantile=0))
+    monkeypatch.setattr(agent_llm, "BREAKER", CircuitBreaker())
+    monkeypatch.setattr(agent_llm, "LIMITER", limiter)
+    with FakeOpenAI(SyntheticRepo(files=2, lines=20), fault=lambda n: 503) as server:
+        from openai import OpenAI
+
+        client = OpenAI(base_url=f"{server.url}/v1", api_key="test", max_retries=0)
+        agent = TicketWatcherAgent(allowed_paths=[], client=client, request_timeout=10)
+        for _ in range(3):
+            with pytest.raises(Exception):
+                agent.run("Bug", "boom", [])
+
+    # Only the requests themselves count; none of the ~1k tokens reserved per call is kept.
+    snap = limiter.snapshot()
+    assert (snap["tokens_available"], snap["requests_available"], snap["granted"]) == (600_000, 997, 3)
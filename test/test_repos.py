@@ -0,0 +1,130 @@
+import base64
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import pytest
+
+from ticketwatcher import github_api, handlers
+from ticketwatcher.repos import RepoContext, RepoRegistry, current_repo, use_repo
+
+REPOS = {
+    "defaults": {"token_env": "TW_TEST_TOKEN", "allowed_paths": "src/"},
+    "repos": {
+        "octo/api": {"max_files": 2, "weight": 3, "content_cache": 64},
+        "octo/web": {"token_env": "TW_WEB_TOKEN", "trigger_labels": ["autofix"], "allowed_paths": ["app/", "!app/vendor/"]},
+    },
+}
+
+
+def test_registry_builds_contexts_from_defaults_and_overrides(monkeypatch):
+    monkeypatch.setenv("TW_TEST_TOKEN", "shared")
+    monkeypatch.setenv("TW_WEB_TOKEN", "web-only")
+    registry = RepoRegistry.from_dict(REPOS)
+
+    api, web = registry.get("Octo/API"), registry.get("octo/web")
+    assert registry.names == ["octo/api", "octo/web"] and registry.get("octo/other") is None
+    assert (api.token, api.weight, api.content_cache_size) == ("shared", 3, 64)
+    assert api.settings["max_files"] == 2 and api.settings["repo_name"] == "api"
+    assert web.token == "web-only" and web.settings["trigger_labels"] == {"autofix"}
+    assert web.settings["allowed_paths"].allows("app/x.py") and not web.settings["allowed_paths"].allows("app/vendor/x.py")
+
+
+@pytest.mark.parametrize(
+    "value, mode", [(False, "off"), ("false", "off"), (True, "link"), ("Reuse", "reuse"), ("bogus", "link")]
+)
+def test_registry_normalizes_the_dedupe_mode(value, mode):
+    registry = RepoRegistry.from_dict({"repos": {"octo/api": {"dedupe": value}}})
+    assert registry.get("octo/api").settings["dedupe"] == mode
+
+
+@pytest.mark.parametrize("options", [{"webhook_secret": "x"}, {"colour": "blue"}])
+def test_registry_rejects_process_wide_or_unknown_settings(options):
+    with pytest.raises(ValueError):
+        RepoRegistry.from_dict({"repos": {"octo/api": options}})
+
+
+def test_github_calls_use_the_active_repository_and_its_cache(monkeypatch):
+    seen = []
+
+    class _Response:
+        status_code = 200
+
+        def json(self):
+            return {"content": base64.b64encode(b"x = 1\n").decode()}
+
+        def raise_for_status(self):
+            pass
+
+    def fake_get(session, url, **kwargs):
+        seen.append((url, session.headers["Authorization"]))
+        return _Response()
+
+    monkeypatch.setattr(github_api.requests.Session, "get", fake_get)
+    monkeypatch.setattr(github_api, "TOKEN", "default-token")
+    api = RepoContext("octo/api", token="api-token", content_cache_size=8)
+    web = RepoContext("octo/web")
+
+    sha = "0123456789abcdef0123456789abcdef01234567"
+    with use_repo(api):
+        assert github_api.get_file_text("src/x.py", sha) == "x = 1\n"
+        github_api.get_file_text("src/x.py", sha)  # served from octo/api's cache
+        github_api.get_file_text("src/x.py", "main")  # a branch moves, so it is never cached
+    with use_repo(web):
+        github_api.get_file_text("src/x.py", sha)
+    assert current_repo() is None
+
+    base = github_api.GITHUB_API
+    assert seen == [
+        (f"{base}/repos/octo/api/contents/src/x.py", "Bearer api-token"),
+        (f"{base}/repos/octo/api/contents/src/x.py", "Bearer api-token"),
+        (f"{base}/repos/octo/web/contents/src/x.py", "Bearer default-token"),
+    ]
+    assert list(api.content_cache) == [("src/x.py", sha)] and not web.content_cache
+
+
+def test_handlers_apply_the_event_repository_settings(monkeypatch):
+    monkeypatch.setenv("TW_TEST_TOKEN", "shared")
+    monkeypatch.setattr(handlers, "_REPOS", RepoRegistry.from_dict(REPOS))
+    monkeypatch.setattr(handlers, "SKIP_UNCHANGED", False)
+    seen = []
+    monkeypatch.setattr(
+        handlers,
+        "_run_pipeline",
+        lambda event, issue, fingerprint: seen.append(
+            (github_api._repo_url(), list(handlers._cfg.ALLOWED_PATHS), handlers._cfg.MAX_FILES)
+        ),
+    )
+
+    def event(repo, label):
+        issue = {"number": 1, "title": "t", "body": "b", "labels": [{"name": label}]}
+        return {"action": "labeled", "label": {"name": label}, "issue": issue, "repository": {"full_name": repo}}
+
+    handlers.handle_issue_event(event("octo/web", "agent-fix"))  # not a trigger label for octo/web
+    handlers.handle_issue_event(event("octo/web", "autofix"))
+    handlers.handle_issue_event(event("octo/api", "agent-fix"))
+    handlers.handle_issue_event(event("octo/unknown", "agent-fix"))
+
+    base = github_api.GITHUB_API
+    assert seen == [
+        (f"{base}/repos/octo/web", ["app/", "!app/vendor/"], handlers.MAX_FILES),
+        (f"{base}/repos/octo/api", ["src/"], 2),
+    ]
+
+
+def test_repos_without_their_own_checkout_skip_local_retrieval_and_verification(monkeypatch, tmp_path):
+    registry = RepoRegistry.from_dict({"repos": {"octo/api": {}, "octo/web": {"repo_root": str(tmp_path)}}})
+    monkeypatch.setattr(handlers, "VERIFY_PATCHES", True)
+    monkeypatch.setattr(handlers, "RETRIEVAL_TOP_K", 3)
+    monkeypatch.setattr(handlers, "_RETRIEVAL_INDEX", None)
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "checkout.py").write_text("def checkout_total(cart):\n    return sum(cart)\n")
+
+    with use_repo(registry.get("octo/api")):
+        assert not handlers._verifies()
+        assert handlers._retrieval_targets("checkout total") == []
+    with use_repo(registry.get("octo/web")):
+        assert handlers._verifies()
+        assert [t.path for t in handlers._retrieval_targets("checkout total")] == ["src/checkout.py"]
+    assert handlers._RETRIEVAL_INDEX is None
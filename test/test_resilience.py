@@ -0,0 +1,122 @@
+import itertools
+import pathlib
+import sys
+import threading
+import time
+
+ROOT = pathlib.Path(__file__).resolve().parents[1]
+sys.path.append(str(ROOT / "src"))
+sys.path.append(str(ROOT / "scripts"))
+
+import pytest
+
+from fake_services import FakeOpenAI, SyntheticRepo
+from ticketwatcher import agent_llm
+from ticketwatcher.agent_llm import TicketWatcherAgent
+from ticketwatcher.ratelimit import RateLimitTimeout
+from ticketwatcher.resilience import CircuitBreaker, CircuitOpen, Hedger
+
+
+def _client(server):
+    from openai import OpenAI
+
+    return OpenAI(base_url=f"{server.url}/v1", api_key="test", max_retries=0)
+
+
+def _agent(server):
+    return TicketWatcherAgent(allowed_paths=[], client=_client(server), request_timeout=10)
+
+
+def test_breaker_opens_on_errors_then_probes_once():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=4, window=60, cooldown=30, clock=lambda: now[0])
+    for ok in (True, False, True, False):
+        breaker.allow()
+        breaker.record(ok)
+    assert breaker.state == "open"
+    with pytest.raises(CircuitOpen) as exc:
+        breaker.allow()
+    assert exc.value.retry_after == 30
+
+    now[0] = 31.0
+    breaker.allow()  # the single half-open probe
+    with pytest.raises(CircuitOpen):
+        breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+
+    now[0] = 62.0
+    breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed"
+
+
+def test_breaker_forgets_failures_outside_its_window():
+    now = [0.0]
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=3, window=10, clock=lambda: now[0])
+    breaker.record(False)
+    breaker.record(False)
+    now[0] = 20.0
+    breaker.record(True)
+    breaker.record(False)
+    assert breaker.state == "closed"
+
+
+def test_probe_stopped_in_the_rate_limit_queue_is_handed_back(monkeypatch):
+    now = [0.0]
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=1, cooldown=30, clock=lambda: now[0])
+    breaker.record(False)
+    now[0] = 31.0
+
+    def no_capacity(limiter, tokens):
+        raise RateLimitTimeout("no capacity")
+
+    monkeypatch.setattr(agent_llm, "BREAKER", breaker)
+    monkeypatch.setattr(agent_llm, "_wait_for_capacity", no_capacity)
+    with FakeOpenAI(SyntheticRepo(files=2, lines=20)) as server:
+        with pytest.raises(RateLimitTimeout):
+            _agent(server).run("Bug", "boom", [])
+        assert server.requests == 0
+    assert breaker.state == "half-open"
+    assert breaker.allow() is True  # the next call may probe
+
+
+def test_slow_request_is_hedged_against_the_fake_endpoint(monkeypatch):
+    seq = itertools.count()
+    lock = threading.Lock()
+
+    def latency():
+        with lock:
+            n = next(seq)
+        return 1.5 if n == 5 else 0.01  # the sixth request hangs in the tail
+
+    hedger = Hedger(quantile=0.9, min_samples=5, min_delay=0.05)
+    monkeypatch.setattr(agent_llm, "HEDGER", hedger)
+    monkeypatch.setattr(agent_llm, "BREAKER", CircuitBreaker())
+    with FakeOpenAI(SyntheticRepo(files=2, lines=20), latency=latency) as server:
+        agent = _agent(server)
+        for _ in range(5):
+            agent.run("Bug", "boom", [])
+        assert hedger.delay() is not None and hedger.hedged == 0
+
+        started = time.perf_counter()
+        assert agent.run("Bug", "boom", [])["action"] == "request_context"
+        took = time.perf_counter() - started
+
+    assert took < 1.0
+    assert (hedger.hedged, hedger.hedge_wins) == (1, 1)
+
+
+def test_failing_provider_trips_the_breaker_and_fails_fast(monkeypatch):
+    breaker = CircuitBreaker(failure_rate=0.5, min_calls=3, cooldown=60)
+    monkeypatch.setattr(agent_llm, "HEDGER", Hedger(quantile=0))
+    monkeypatch.setattr(agent_llm, "BREAKER", breaker)
+    with FakeOpenAI(SyntheticRepo(files=2, lines=20), fault=lambda n: 503) as server:
+        agent = _agent(server)
+        for _ in range(3):
+            with pytest.raises(Exception) as exc:
+                agent.run("Bug", "boom", [])
+            assert not isinstance(exc.value, CircuitOpen)
+        with pytest.raises(CircuitOpen):
+            agent.run("Bug", "boom", [])
+        assert server.requests == 3
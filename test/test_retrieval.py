@@ -0,0 +1,54 @@
+import pathlib
+import subprocess
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.retrieval import RetrievalIndex, load_or_build, tokenize
+
+FILES = {
+    "src/app/auth.py": "def get_user_profile(user_id):\n    user = load_user(user_id)\n    return user['name']\n",
+    "src/app/payments.py": "DEFAULT_TAX = 0.2\n\ndef apply_tax(amount, rate=None):\n    return amount * (1 + rate)\n",
+    "src/app/user_repo.py": "def load_user(user_id):\n    return DB.get(user_id)\n",
+}
+
+
+def test_tokenize_splits_identifiers():
+    assert tokenize("getUserProfile raised") == ["getuserprofile", "user", "profile", "raised"]
+    assert tokenize("DEFAULT_TAX") == ["default_tax", "default", "tax"]
+
+
+def test_search_ranks_relevant_chunks():
+    index = RetrievalIndex.build(FILES.items())
+    assert index.search("tax is not applied to the amount", k=1)[0].path == "src/app/payments.py"
+    hits = index.search("UserProfile shows wrong name", k=2)
+    assert hits[0].path == "src/app/auth.py"
+    assert index.search("kubernetes") == []
+
+
+def test_long_files_are_chunked_with_overlap():
+    text = "\n".join(f"value_{i} = {i}" for i in range(100)) + "\ndef needle_function():\n    pass\n"
+    index = RetrievalIndex.build([("src/big.py", text)])
+    assert [(s, e) for _, s, e in index.chunks] == [(1, 40), (31, 70), (61, 100), (91, 102)]
+    hit = index.search("needle function")[0]
+    assert (hit.start_line, hit.end_line) == (91, 102)
+
+
+def test_index_round_trips_and_is_cached_per_commit(tmp_path):
+    for rel, text in FILES.items():
+        (tmp_path / rel).parent.mkdir(parents=True, exist_ok=True)
+        (tmp_path / rel).write_text(text)
+    (tmp_path / "docs.py").write_text("def apply_tax(): pass\n")  # outside the allowlist
+    git = ["git", "-c", "user.email=t@example.com", "-c", "user.name=t"]
+    subprocess.run(git + ["init", "-q"], cwd=tmp_path, check=True)
+    subprocess.run(git + ["add", "."], cwd=tmp_path, check=True)
+    subprocess.run(git + ["commit", "-qm", "init"], cwd=tmp_path, check=True)
+
+    built = load_or_build(str(tmp_path), ["src/"])
+    cached = list((tmp_path / ".ticketwatcher").glob("retrieval-*.idx"))
+    assert len(cached) == 1
+    loaded = RetrievalIndex.load(str(cached[0]))
+    assert loaded.terms == built.terms and loaded.chunks == built.chunks
+    assert list(loaded.docs) == list(built.docs) and list(loaded.freqs) == list(built.freqs)
+    assert {path for path, _, _ in loaded.chunks} == set(FILES)
+    assert load_or_build(str(tmp_path), ["src/"]).key == built.key
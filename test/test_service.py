@@ -0,0 +1,297 @@
+import asyncio
+import json
+import pathlib
+import sys
+import threading
+import time
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import pytest
+
+from ticketwatcher.coalesce import FairQueue
+from ticketwatcher.prefilter import needs_work
+from ticketwatcher.service import WebhookService, sign_payload
+
+FIXTURE = pathlib.Path(__file__).resolve().parents[1] / "fixtures" / "sample_issue_event.json"
+SECRET = "s3cret"
+
+
+async def _post(port, body, headers, path="/webhook"):
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    head = [f"POST {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(body)}"]
+    head += [f"{k}: {v}" for k, v in headers.items()]
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode() + body)
+    await writer.drain()
+    raw = await reader.read()
+    writer.close()
+    status = int(raw.split(b" ", 2)[1])
+    return status, json.loads(raw.split(b"\r\n\r\n", 1)[1])
+
+
+def _signed(body, event="issues", delivery="d-1"):
+    return {
+        "X-GitHub-Event": event,
+        "X-GitHub-Delivery": delivery,
+        "X-Hub-Signature-256": sign_payload(SECRET, body),
+    }
+
+
+def test_signed_fixture_is_queued_and_handled():
+    body = FIXTURE.read_bytes()
+    seen = []
+
+    async def scenario():
+        service = WebhookService(secret=SECRET, handlers={"issues": lambda e: seen.append(e) or None}, workers=2)
+        await service.start(port=0)
+        try:
+            status, reply = await _post(service.port, body, _signed(body))
+            await service.join()
+        finally:
+            await service.stop()
+        return status, reply, service.stats
+
+    status, reply, stats = asyncio.run(scenario())
+    assert (status, reply["status"]) == (202, "queued")
+    assert seen[0]["issue"]["number"] == 42
+    assert stats.processed == 1 and stats.failed == 0
+
+
+def test_bad_signature_and_unknown_events():
+    body = FIXTURE.read_bytes()
+
+    async def scenario():
+        service = WebhookService(secret=SECRET, handlers={"issues": lambda e: None})
+        await service.start(port=0)
+        try:
+            forged = dict(_signed(body), **{"X-Hub-Signature-256": sign_payload("wrong", body)})
+            return [
+                (await _post(service.port, body, forged))[0],
+                (await _post(service.port, body, _signed(body, event="push")))[1]["status"],
+                (await _post(service.port, b"{}", _signed(b"{}", event="ping")))[0],
+                (await _post(service.port, body, _signed(body), path="/other"))[0],
+            ]
+        finally:
+            await service.stop()
+
+    assert asyncio.run(scenario()) == [401, "ignored", 200, 404]
+
+
+def _issue_body(number):
+    event = json.loads(FIXTURE.read_bytes())
+    event["issue"]["number"] = number
+    return json.dumps(event).encode()
+
+
+def test_full_queue_applies_backpressure():
+    release = threading.Event()
+
+    async def scenario():
+        service = WebhookService(
+            secret=SECRET, handlers={"issues": lambda e: release.wait(5)}, workers=1, queue_size=1
+        )
+        await service.start(port=0)
+        try:
+            statuses = []
+            for n in range(4):
+                body = _issue_body(100 + n)
+                statuses.append((await _post(service.port, body, _signed(body, delivery=str(n))))[0])
+                await asyncio.sleep(0.05)  # let the worker pick up the first job
+            release.set()
+            await service.join()
+        finally:
+            await service.stop()
+        return statuses, service.stats
+
+    statuses, stats = asyncio.run(scenario())
+    # one job running, one waiting in the queue, the rest bounced
+    assert statuses == [202, 202, 503, 503]
+    assert stats.processed == 2 and stats.rejected == 2
+
+
+def test_secret_is_required_unless_explicitly_unsigned():
+    with pytest.raises(ValueError):
+        WebhookService(secret="", handlers={})
+    WebhookService(secret="", handlers={}, allow_unsigned=True)
+
+
+def test_bursts_for_one_issue_are_coalesced_and_serialized():
+    body = FIXTURE.read_bytes()
+    other_body = _issue_body(43)
+    running = {}
+    overlaps = []
+    handled = []
+    lock = threading.Lock()
+
+    def handler(event):
+        number = event["issue"]["number"]
+        with lock:
+            if running.get(number):
+                overlaps.append(number)
+            running[number] = True
+        threading.Event().wait(0.1)
+        with lock:
+            running[number] = False
+            handled.append(number)
+
+    async def scenario():
+        service = WebhookService(secret=SECRET, handlers={"issues": handler}, workers=4, debounce=0.05)
+        await service.start(port=0)
+        try:
+            replies = []
+            for n in range(3):  # e.g. opened + labeled + labeled
+                replies.append((await _post(service.port, body, _signed(body, delivery=str(n))))[1]["status"])
+            replies.append((await _post(service.port, other_body, _signed(other_body)))[1]["status"])
+            await asyncio.sleep(0.08)  # first job for #42 is now running
+            replies.append((await _post(service.port, body, _signed(body, delivery="late")))[1]["status"])
+            await service.join()
+        finally:
+            await service.stop()
+        return replies, service.stats
+
+    replies, stats = asyncio.run(scenario())
+    assert replies == ["queued", "coalesced", "coalesced", "queued", "queued"]
+    assert sorted(handled) == [42, 42, 43]
+    assert overlaps == []
+    assert stats.coalesced == 2
+
+
+def test_a_later_non_trigger_delivery_does_not_replace_the_triggering_one():
+    event = json.loads(FIXTURE.read_bytes())
+    labels = [{"name": "agent-fix"}, {"name": "bug"}]
+    opened = dict(event, action="opened", issue=dict(event["issue"], labels=labels))
+    labeled_fix = dict(opened, action="labeled", label={"name": "agent-fix"})
+    labeled_bug = dict(opened, action="labeled", label={"name": "bug"})
+    handled = []
+
+    async def scenario():
+        service = WebhookService(
+            secret=SECRET,
+            handlers={"issues": lambda e: handled.append(e["action"])},
+            debounce=0.05,
+            prefilter=lambda name, payload: needs_work(name, payload, {"agent-fix"}),
+        )
+        await service.start(port=0)
+        try:
+            replies = []
+            for n, payload in enumerate((opened, labeled_fix, labeled_bug)):
+                body = json.dumps(payload).encode()
+                replies.append((await _post(service.port, body, _signed(body, delivery=str(n))))[1]["status"])
+            await service.join()
+        finally:
+            await service.stop()
+        return replies, service.stats
+
+    replies, stats = asyncio.run(scenario())
+    assert replies == ["queued", "coalesced", "ignored"]
+    assert handled == ["labeled"]
+    assert (stats.ignored, stats.processed) == (1, 1)
+
+
+def test_metrics_endpoint_exposes_event_counters():
+    body = FIXTURE.read_bytes()
+
+    async def scenario():
+        service = WebhookService(secret=SECRET, handlers={"issues": lambda e: None})
+        await service.start(port=0)
+        try:
+            await _post(service.port, body, _signed(body))
+            await service.join()
+            reader, writer = await asyncio.open_connection("127.0.0.1", service.port)
+            writer.write(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+            await writer.drain()
+            raw = await reader.read()
+            writer.close()
+        finally:
+            await service.stop()
+        return raw
+
+    head, _, text = asyncio.run(scenario()).partition(b"\r\n\r\n")
+    assert b"Content-Type: text/plain" in head
+    assert b"ticketwatcher_events_processed_total 1" in text
+    assert b"# TYPE ticketwatcher_span_seconds histogram" in text
+
+
+def test_fair_queue_serves_repositories_round_robin_by_weight():
+    async def scenario():
+        queue = FairQueue(weight=lambda repo: 2 if repo == "big" else 1)
+        for n in range(4):
+            queue.put_nowait("busy", f"busy{n}")
+        queue.put_nowait("big", "big0")
+        queue.put_nowait("big", "big1")
+        queue.put_nowait("big", "big2")
+        queue.put_nowait("quiet", "quiet0")
+        order = [await queue.get() for _ in range(queue.qsize())]
+        waiter = asyncio.ensure_future(queue.get())
+        await asyncio.sleep(0)
+        queue.put_nowait("late", "late0")
+        return order, await waiter
+
+    order, late = asyncio.run(scenario())
+    assert order == ["busy0", "big0", "big1", "quiet0", "busy1", "big2", "busy2", "busy3"]
+    assert late == "late0"
+
+
+def _repo_body(repo, number):
+    event = json.loads(FIXTURE.read_bytes())
+    event["issue"]["number"] = number
+    event["repository"] = {"full_name": repo}
+    return json.dumps(event).encode()
+
+
+def test_busy_repository_is_capped_without_blocking_others():
+    release = threading.Event()
+    handled = []
+
+    def handler(event):
+        release.wait(5)
+        handled.append((event["repository"]["full_name"], event["issue"]["number"]))
+
+    async def scenario():
+        service = WebhookService(
+            secret=SECRET, handlers={"issues": handler}, workers=1, queue_size=10, repo_queue_size=3
+        )
+        await service.start(port=0)
+        try:
+            statuses = []
+            for repo, number in [("o/busy", 1), ("o/busy", 2), ("o/busy", 3), ("o/busy", 4), ("o/quiet", 1)]:
+                body = _repo_body(repo, number)
+                statuses.append((await _post(service.port, body, _signed(body, delivery=f"{repo}{number}")))[0])
+            release.set()
+            await service.join()
+        finally:
+            await service.stop()
+        return statuses
+
+    assert asyncio.run(scenario()) == [202, 202, 202, 503, 202]
+    # The quiet repository's job is not stuck behind the busy repository's backlog.
+    assert handled == [("o/busy", 1), ("o/busy", 2), ("o/quiet", 1), ("o/busy", 3)]
+
+
+def test_job_hitting_an_open_circuit_is_deferred_not_failed():
+    from ticketwatcher.resilience import CircuitOpen
+
+    attempts = []
+
+    def handler(event):
+        attempts.append(time.monotonic())
+        if len(attempts) == 1:
+            raise CircuitOpen("llm", 0.05)
+        return "https://example.com/pull/1"
+
+    async def scenario():
+        service = WebhookService(secret=SECRET, handlers={"issues": handler}, workers=1)
+        await service.start(port=0)
+        try:
+            body = _issue_body(3)
+            status, _ = await _post(service.port, body, _signed(body))
+            await service.join()
+        finally:
+            await service.stop()
+        return status, service
+
+    status, service = asyncio.run(scenario())
+    assert status == 202 and len(attempts) == 2
+    assert attempts[1] - attempts[0] >= 0.05
+    assert (service.stats.deferred, service.stats.processed, service.stats.failed) == (1, 1, 0)
+    assert service.repo_load == {}
@@ -0,0 +1,108 @@
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher import stackparse
+from ticketwatcher.stackparse import StackScanner, parse_stack_text, scan_stack_frames
+
+ROOT = "/home/runner/work/repo/repo"
+
+MIXED_LOG = f"""\
+2024-05-01T10:00:00Z build step 3: running tests
+Traceback (most recent call last):
+  File "{ROOT}/src/app/auth.py", line 22, in get_user_profile
+    name = sanitize_string(user["name"])
+KeyError: 'name'
+TypeError: Cannot read properties of undefined (reading 'id')
+    at getUser ({ROOT}/web/src/user.js:10:5)
+    at node:internal/process/task_queues:95:5
+    at {ROOT}/web/src/index.js:3:1
+Exception in thread "main" java.lang.NullPointerException
+    at com.acme.billing.Invoice$Line.total(Invoice.java:37)
+panic: runtime error: index out of range
+main.handler(0xc000010000)
+\t{ROOT}/cmd/server/main.go:41 +0x1d
+src/app/payments.py:4: in calculate_total
+tests/test_tax.py:9: AssertionError
+see https://example.com:8080/docs and version 1.2:3
+Target: src/app/user_repo.py:7
+"""
+
+
+def _scan(text, **kwargs):
+    kwargs.setdefault("limit", 50)
+    return scan_stack_frames(text, repo_root=ROOT, repo_name="repo", allowed_prefixes=[""], **kwargs)
+
+
+def test_recognizes_all_languages_in_text_order():
+    frames = _scan(MIXED_LOG)
+    assert [(f.kind, f.path, f.line, f.func) for f in frames] == [
+        ("python", "src/app/auth.py", 22, "get_user_profile"),
+        ("node", "web/src/user.js", 10, "getUser"),
+        ("node", "web/src/index.js", 3, None),
+        ("java", "com/acme/billing/Invoice.java", 37, "Invoice.total"),
+        ("go", "cmd/server/main.go", 41, "main.handler"),
+        ("pytest", "src/app/payments.py", 4, "calculate_total"),
+        ("pytest", "tests/test_tax.py", 9, None),
+        ("target", "src/app/user_repo.py", 7, None),
+    ]
+
+
+def test_stops_once_limit_distinct_allowed_frames_found():
+    noisy = "\n".join(f"line {i}: nothing to see" for i in range(1000))
+    text = MIXED_LOG + noisy
+    scanner = StackScanner(repo_root=ROOT, repo_name="repo", allowed_prefixes=["src/"], limit=2)
+    assert scanner.feed(text) is True
+    assert scanner.results() == [("src/app/auth.py", 22), ("src/app/payments.py", 4)]
+    assert scanner.lines_scanned < 20
+
+
+def test_chunked_feed_matches_whole_text_and_counts_repeats():
+    text = MIXED_LOG * 3
+    scanner = StackScanner(repo_root=ROOT, repo_name="repo", allowed_prefixes=[""], limit=50)
+    for start in range(0, len(text), 7):
+        scanner.feed(text[start : start + 7])
+    frames = scanner.close()
+    assert [f.key for f in frames] == [f.key for f in _scan(MIXED_LOG)]
+    assert {f.count for f in frames} == {3}
+
+
+def test_over_long_partial_lines_are_scanned_before_they_are_dropped(monkeypatch):
+    monkeypatch.setattr(stackparse, "_MAX_CARRY", 64)
+    frame = 'File "src/app/auth.py", line 22, in f'
+    scanner = StackScanner(repo_root=ROOT, repo_name="repo", allowed_prefixes=[""], limit=50)
+    # The carried line straddles the cap after a cut ...
+    scanner.feed("intro\n" + "x" * 40 + " " + frame)
+    # ... and here it only crosses the cap when its second half arrives.
+    scanner.feed("\n" + "y" * 40 + ' File "src/app/pay')
+    scanner.feed('ments.py", line 4, in total')
+    scanner.feed("\n")
+    assert [f.key for f in scanner.close()] == [("src/app/auth.py", 22), ("src/app/payments.py", 4)]
+
+
+def test_checkout_elsewhere_anchors_on_the_outermost_repo_directory():
+    path = "/home/alice/requests/src/requests/api.py"
+    assert stackparse.to_repo_relative(path, ROOT, "requests") == "src/requests/api.py"
+
+
+def test_repo_relative_resolution_is_memoized(monkeypatch):
+    calls = []
+    real = stackparse.to_repo_relative
+
+    def _counting(path, root, name):
+        calls.append(path)
+        return real(path, root, name)
+
+    monkeypatch.setattr(stackparse, "to_repo_relative", _counting)
+    frame_line = f'  File "{ROOT}/src/app/auth.py", line 22, in f\n'
+    _scan(frame_line * 100)
+    assert len(calls) == 1
+
+
+def test_parse_stack_text_keeps_tuple_api():
+    text = 'File "src/app/auth.py", line 2, in x\nTarget: src/app/payments.py\n'
+    assert parse_stack_text(text, repo_root=ROOT, repo_name="repo", allowed_prefixes=["src/"]) == [
+        ("src/app/auth.py", 2),
+        ("src/app/payments.py", None),
+    ]
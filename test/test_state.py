@@ -0,0 +1,33 @@
+import pathlib
+import sys
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher.state import RunStore
+
+
+def test_checkpoints_survive_reopening_the_database(tmp_path):
+    db = tmp_path / "state.db"
+    store = RunStore(str(db))
+    run = store.begin("o/r", 7, "abc")
+    assert run.step("seeds", lambda: [{"path": "src/a.py"}]) == [{"path": "src/a.py"}]
+    run.finish("failed", error="boom")
+    store.close()
+
+    calls = []
+    store = RunStore(str(db))
+    again = store.begin("o/r", 7, "abc")
+    assert again.resumed and again.attempts == 2
+    assert again.step("seeds", lambda: calls.append(1)) == [{"path": "src/a.py"}]
+    assert calls == []
+
+
+def test_changed_ticket_or_finished_run_starts_fresh():
+    store = RunStore()
+    first = store.begin("o/r", 7, "abc")
+    first.checkpoint("base", "main")
+    assert not store.begin("o/r", 7, "def").resumed
+
+    first.finish("done")
+    assert store.completed("o/r", 7, "abc")
+    assert not store.begin("o/r", 7, "abc").resumed
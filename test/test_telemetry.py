@@ -0,0 +1,103 @@
+import json
+import pathlib
+import sys
+from datetime import timedelta
+from types import SimpleNamespace
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+import pytest
+
+from ticketwatcher import telemetry
+
+
+@pytest.fixture
+def collected(monkeypatch):
+    spans = []
+    monkeypatch.setattr(telemetry, "_exporters", [spans.append])
+    monkeypatch.setattr(telemetry, "enabled", True)
+    return spans
+
+
+def test_disabled_span_is_shared_noop(monkeypatch):
+    monkeypatch.setattr(telemetry, "enabled", False)
+    with telemetry.span("stage", stage="x") as sp:
+        sp.set(frames=3)
+    assert sp is telemetry._NOOP
+
+
+def test_nested_spans_record_parent_and_error(collected):
+    with pytest.raises(ValueError):
+        with telemetry.span("pipeline", issue=7) as outer:
+            with telemetry.span("stage", stage="llm") as inner:
+                inner.set(tokens=10)
+            raise ValueError("boom")
+    inner_data, outer_data = collected
+    assert inner_data["parent_id"] == outer.span_id
+    assert inner_data["attrs"] == {"stage": "llm", "tokens": 10}
+    assert outer_data["parent_id"] is None
+    assert outer_data["error"] == "ValueError: boom"
+
+
+@pytest.mark.parametrize(
+    "url, route",
+    [
+        ("https://api.github.com/repos/o/r/contents/src/app/a.py?ref=main", "/repos/{owner}/{repo}/contents/{path}"),
+        ("https://api.github.com/repos/o/r/issues/12/comments", "/repos/{owner}/{repo}/issues/{number}/comments"),
+        ("https://api.github.com/repos/o/r/git/ref/heads/feature/x", "/repos/{owner}/{repo}/git/ref/heads/{branch}"),
+        ("https://api.github.com/gists/abc123", "/gists/{id}"),
+        ("https://example.com/logs/run.txt", "example.com/{path}"),
+    ],
+)
+def test_route_template(url, route):
+    assert telemetry.route_template(url) == route
+
+
+def test_record_http_emits_span_under_current(collected):
+    response = SimpleNamespace(
+        request=SimpleNamespace(method="GET", url="https://api.github.com/repos/o/r/pulls/3"),
+        elapsed=timedelta(milliseconds=120),
+        headers={"Content-Length": "42"},
+        status_code=200,
+    )
+    with telemetry.span("stage", stage="pr") as parent:
+        telemetry.record_http(response)
+    http = collected[0]
+    assert http["name"] == "http" and http["parent_id"] == parent.span_id
+    assert http["duration_ms"] == pytest.approx(120)
+    assert http["attrs"] == {"method": "GET", "route": "/repos/{owner}/{repo}/pulls/{number}", "status": 200, "bytes": 42}
+
+
+def test_jsonl_exporter_appends_lines(tmp_path, monkeypatch):
+    path = tmp_path / "trace.jsonl"
+    monkeypatch.setattr(telemetry, "_exporters", [telemetry.JsonlExporter(str(path))])
+    monkeypatch.setattr(telemetry, "enabled", True)
+    with telemetry.span("a"):
+        pass
+    telemetry.record("b", 0.25, model="gpt-4o-mini")
+    lines = [json.loads(line) for line in path.read_text().splitlines()]
+    assert [line["name"] for line in lines] == ["a", "b"]
+    assert lines[1]["duration_ms"] == 250.0
+
+
+def test_metrics_render_prometheus_histogram():
+    metrics = telemetry.Metrics()
+    for ms in (3, 40, 700):
+        metrics({"name": "http", "duration_ms": ms, "error": None, "attrs": {"route": "/x", "method": "GET", "status": 200}})
+    text = metrics.render()
+    base = 'span="http",route="/x",method="GET",status="200"'
+    assert "# TYPE ticketwatcher_span_seconds histogram" in text
+    assert f'ticketwatcher_span_seconds_bucket{{{base},le="0.005"}} 1' in text
+    assert f'ticketwatcher_span_seconds_bucket{{{base},le="0.05"}} 2' in text
+    assert f'ticketwatcher_span_seconds_bucket{{{base},le="+Inf"}} 3' in text
+    assert f"ticketwatcher_span_seconds_count{{{base}}} 3" in text
+
+
+def test_summary_table_groups_stages_and_tokens():
+    summary = telemetry.SummaryCollector()
+    summary({"name": "stage", "duration_ms": 100.0, "error": None, "attrs": {"stage": "llm"}})
+    summary({"name": "stage", "duration_ms": 300.0, "error": "X: y", "attrs": {"stage": "llm"}})
+    summary({"name": "llm.call", "duration_ms": 90.0, "error": None, "attrs": {"prompt_tokens": 1200, "completion_tokens": 80}})
+    text = summary.render()
+    assert "| stage (llm) | 2 | 400 | 300 | 1 |" in text
+    assert "LLM tokens: 1,200 prompt / 80 completion" in text
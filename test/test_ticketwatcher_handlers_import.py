@@ -19,8 +19,11 @@ def test_handlers_import_without_repo_env(monkeypatch):
 
     stub_github_api = ModuleType("ticketwatcher.github_api")
     stub_github_api.get_default_branch = lambda: "main"
+    stub_github_api.get_head_sha = lambda *a, **k: "0" * 40
     stub_github_api.create_branch = lambda *a, **k: None
     stub_github_api.create_or_update_file = lambda *a, **k: None
+    stub_github_api.delete_file = lambda *a, **k: None
+    stub_github_api.list_issue_comments = lambda *a, **k: []
     stub_github_api.create_pr = lambda *a, **k: ("https://example.com", 1)
     stub_github_api.get_file_text = lambda *a, **k: ""
     stub_github_api.file_exists = lambda *a, **k: False
@@ -0,0 +1,82 @@
+import pathlib
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.append(str(pathlib.Path(__file__).resolve().parents[1] / "src"))
+
+from ticketwatcher import verify
+from ticketwatcher.verify import check_python_file, verify_patch
+
+
+def _make_repo(tmp_path):
+    pkg = tmp_path / "src" / "app"
+    (pkg / "utils").mkdir(parents=True)
+    (pkg / "__init__.py").write_text("")
+    (pkg / "utils" / "__init__.py").write_text("from .stringy import sanitize_string\n")
+    (pkg / "utils" / "stringy.py").write_text("def sanitize_string(v):\n    return (v or '').strip()\n")
+    (pkg / "auth.py").write_text("import requests_not_installed\nfrom .utils.stringy import sanitize_string\n")
+    return tmp_path
+
+
+def test_syntax_errors_are_reported_with_line(tmp_path):
+    repo = _make_repo(tmp_path)
+    issues = check_python_file("src/app/auth.py", "def broken(:\n    pass\n", str(repo), {}, ("src", ""))
+    assert [(i.kind, i.line) for i in issues] == [("syntax", 1)]
+
+
+def test_imports_resolve_against_patched_snapshot(tmp_path):
+    repo = _make_repo(tmp_path)
+    patched = (
+        "import requests_not_installed\n"
+        "from .utils.stringy import sanitize_string, missing_helper\n"
+        "from .utils.nothing import x\n"
+        "from app.utils import sanitize_string as s2\n"
+        "import brand_new_dependency_xyz\n"  # third-party: the target repo's environment decides
+        "import pytest\n"
+    )
+    issues = check_python_file("src/app/auth.py", patched, str(repo), {"src/app/auth.py": patched}, ("src", ""))
+    messages = sorted(i.message for i in issues)
+    assert messages == [
+        "No module named 'app.utils.nothing'",
+        "cannot import name 'missing_helper' from 'app.utils.stringy'",
+    ]
+
+
+def test_deleted_module_breaks_importers(tmp_path):
+    repo = _make_repo(tmp_path)
+    auth = "from .utils.stringy import sanitize_string\n"
+    result = verify_patch(
+        {"src/app/auth.py": auth, "src/app/utils/stringy.py": None},
+        repo_root=str(repo),
+        executor=ThreadPoolExecutor(max_workers=2),
+    )
+    assert not result.ok
+    assert result.checked == ["src/app/auth.py"]
+    assert "No module named 'app.utils.stringy'" in result.summary()
+
+
+def test_clean_patch_passes_in_process_pool(tmp_path):
+    repo = _make_repo(tmp_path)
+    new_module = "from app.utils import sanitize_string\n\nVALUE = sanitize_string(' x ')\n"
+    result = verify_patch({"src/app/extra.py": new_module}, repo_root=str(repo), max_workers=1)
+    assert result.ok, result.summary()
+    broken = verify_patch({"src/app/extra.py": "from app.utils import nope\n"}, repo_root=str(repo))
+    assert broken.summary() == "[import] src/app/extra.py:1: cannot import name 'nope' from 'app.utils'"
+    assert verify._POOL is not None and verify._POOL._mp_context.get_start_method() == "spawn"
+
+
+def test_targeted_tests_run_against_patched_copy(tmp_path):
+    repo = _make_repo(tmp_path)
+    (repo / "tests").mkdir()
+    (repo / "tests" / "test_extra.py").write_text(
+        "from app.extra import VALUE\n\ndef test_value():\n    assert VALUE == 2\n"
+    )
+    result = verify_patch(
+        {"src/app/extra.py": "VALUE = 1\n"},
+        repo_root=str(repo),
+        test_paths=["tests/test_extra.py"],
+        executor=ThreadPoolExecutor(max_workers=1),
+        timeout=60,
+    )
+    assert [i.kind for i in result.issues] == ["test"]
+    assert not (repo / "src" / "app" / "extra.py").exists()
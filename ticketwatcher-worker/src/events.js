@@ -0,0 +1,134 @@
+// Edge-side checks mirroring src/ticketwatcher/prefilter.py, so discarded
+// events never reach a runner or the Python service.
+
+export const DEFAULT_TRIGGER_LABELS = 'agent-fix,auto-pr';
+export const DEFAULT_AGENT_COMMAND = '/agent fix';
+const HANDLED_EVENTS = new Set(['issues', 'issue_comment']);
+// Commenters who may start a run on an issue that has no trigger label yet.
+const TRUSTED_ASSOCIATIONS = new Set(['OWNER', 'MEMBER', 'COLLABORATOR']);
+
+const encoder = new TextEncoder();
+
+function toHex(buffer) {
+	return [...new Uint8Array(buffer)].map((b) => b.toString(16).padStart(2, '0')).join('');
+}
+
+/** `X-Hub-Signature-256` value GitHub would send for `body`. */
+export async function signPayload(secret, body) {
+	const key = await crypto.subtle.importKey('raw', encoder.encode(secret), { name: 'HMAC', hash: 'SHA-256' }, false, ['sign']);
+	return `sha256=${toHex(await crypto.subtle.sign('HMAC', key, encoder.encode(body)))}`;
+}
+
+export async function verifySignature(secret, body, header) {
+	if (!secret || !header) return false;
+	const expected = await signPayload(secret, body);
+	const actual = header.trim();
+	if (actual.length !== expected.length) return false;
+	let diff = 0;
+	for (let i = 0; i < expected.length; i++) diff |= expected.charCodeAt(i) ^ actual.charCodeAt(i);
+	return diff === 0;
+}
+
+export function parseList(raw, fallback) {
+	const items = (raw ?? fallback)
+		.split(',')
+		.map((item) => item.trim())
+		.filter(Boolean);
+	return new Set(items.length ? items : fallback.split(','));
+}
+
+function isTriggerEvent(payload, triggerLabels) {
+	const labels = new Set(((payload.issue || {}).labels || []).map((label) => label.name));
+	const hasTrigger = [...labels].some((name) => triggerLabels.has(name));
+	if (payload.action === 'labeled') {
+		const name = (payload.label || {}).name;
+		return name ? triggerLabels.has(name) : hasTrigger;
+	}
+	if (payload.action === 'opened' || payload.action === 'reopened') return hasTrigger;
+	return false;
+}
+
+function isAgentCommand(payload, command) {
+	if (payload.action !== 'created') return false;
+	const body = ((payload.comment || {}).body || '').trim().toLowerCase();
+	return body.startsWith(command.toLowerCase());
+}
+
+/** An agent command runs on issues carrying a trigger label, or when a repo member posts it. */
+function mayRunCommand(payload, triggerLabels) {
+	const labels = ((payload.issue || {}).labels || []).map((label) => label.name);
+	const association = ((payload.comment || {}).author_association || '').toUpperCase();
+	return labels.some((name) => triggerLabels.has(name)) || TRUSTED_ASSOCIATIONS.has(association);
+}
+
+/** `[wanted, reason]`: whether `handle_issue_event` / the comment handler would act on this delivery. */
+export function needsWork(eventName, payload, triggerLabels, command = DEFAULT_AGENT_COMMAND) {
+	if (!HANDLED_EVENTS.has(eventName)) return [false, `event ${eventName} not handled`];
+	if (eventName === 'issue_comment') {
+		if (!isAgentCommand(payload, command)) return [false, 'comment is not an agent command'];
+		if (mayRunCommand(payload, triggerLabels)) return [true, 'agent command'];
+		return [false, 'agent command from a non-member on an issue without a trigger label'];
+	}
+	if (isTriggerEvent(payload, triggerLabels)) return [true, 'trigger label'];
+	return [false, `issue action '${payload.action}' without a trigger label`];
+}
+
+/** Only the fields the pipeline reads; a full webhook payload is mostly repository and user metadata. */
+export function compactEvent(eventName, payload) {
+	const issue = payload.issue || {};
+	const event = {
+		action: payload.action,
+		issue: {
+			number: issue.number,
+			title: issue.title || '',
+			body: issue.body || '',
+			labels: (issue.labels || []).map((label) => ({ name: label.name })),
+		},
+		repository: { full_name: (payload.repository || {}).full_name || '' },
+	};
+	if (payload.label) event.label = { name: payload.label.name };
+	if (eventName === 'issue_comment') {
+		const comment = payload.comment || {};
+		// The handler checks the association again for commands on unlabelled issues.
+		event.comment = { body: comment.body || '', author_association: comment.author_association || 'NONE' };
+	}
+	return event;
+}
+
+export function issueKey(event) {
+	return `${event.repository.full_name}#${event.issue.number}`;
+}
+
+/** Latest delivery wins, except that a `/agent fix` comment is never dropped (as in service.py). */
+export function mergeDeliveries(old, next) {
+	return old.eventName === 'issue_comment' && next.eventName !== 'issue_comment' ? old : next;
+}
+
+/**
+ * Collapses bursts of deliveries per issue within one isolate.
+ *
+ * The first delivery for a key opens a window of `delayMs`; deliveries that
+ * arrive before it closes are folded in with `merge` and `submit` returns
+ * `null` for them. The first caller's promise resolves with the merged item
+ * once the window closes.
+ */
+export class Debouncer {
+	constructor(merge = mergeDeliveries) {
+		this.merge = merge;
+		this.pending = new Map();
+	}
+
+	submit(key, item, delayMs) {
+		const entry = this.pending.get(key);
+		if (entry) {
+			entry.item = this.merge(entry.item, item);
+			return null;
+		}
+		const fresh = { item };
+		this.pending.set(key, fresh);
+		return new Promise((resolve) => setTimeout(resolve, delayMs)).then(() => {
+			this.pending.delete(key);
+			return fresh.item;
+		});
+	}
+}
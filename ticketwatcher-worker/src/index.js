@@ -1,5 +1,83 @@
+import {
+  DEFAULT_AGENT_COMMAND,
+  DEFAULT_TRIGGER_LABELS,
+  Debouncer,
+  compactEvent,
+  issueKey,
+  needsWork,
+  parseList,
+  signPayload,
+  verifySignature,
+} from "./events.js";
+
+// One per isolate: bursts that land on the same isolate are collapsed here;
+// the Python service's debounce and the workflow's concurrency group catch the rest.
+const debouncer = new Debouncer();
+
+function githubHeaders(env) {
+  return {
+    "Authorization": `Bearer ${env.GITHUB_TOKEN}`,
+    "Accept": "application/vnd.github+json",
+    "User-Agent": "wrangler-worker",
+    "Content-Type": "application/json"
+  };
+}
+
+// Sends a compact event to the Python service (re-signed with the webhook
+// secret it shares) or, by default, to the workflow via repository_dispatch.
+async function forward(env, { eventName, deliveryId, event }) {
+  const target = env.FORWARD_TO || (env.PYTHON_BACKEND_URL ? "service" : "dispatch");
+  let resp;
+  if (target === "service") {
+    const body = JSON.stringify(event);
+    resp = await fetch(env.PYTHON_BACKEND_URL, {
+      method: "POST",
+      headers: {
+        "Content-Type": "application/json",
+        "X-GitHub-Event": eventName,
+        "X-GitHub-Delivery": deliveryId,
+        "X-Hub-Signature-256": await signPayload(env.GITHUB_WEBHOOK_SECRET, body)
+      },
+      body
+    });
+  } else {
+    const repoFullName = event.repository.full_name || env.REPO_FULL_NAME;
+    resp = await fetch(`https://api.github.com/repos/${repoFullName}/dispatches`, {
+      method: "POST",
+      headers: githubHeaders(env),
+      body: JSON.stringify({ event_type: "ticketwatcher", client_payload: { event_name: eventName, event } })
+    });
+  }
+  if (!resp.ok) {
+    console.error(`forwarding ${eventName} ${deliveryId} to ${target} failed: HTTP ${resp.status}`);
+  }
+  return resp;
+}
+
+async function relayIssueEvent(request, env, ctx, eventName, payload) {
+  const [wanted, reason] = needsWork(
+    eventName,
+    payload,
+    parseList(env.TRIGGER_LABELS, DEFAULT_TRIGGER_LABELS),
+    env.AGENT_COMMAND || DEFAULT_AGENT_COMMAND
+  );
+  if (!wanted) {
+    return new Response(`Ignored: ${reason}`, { status: 200 });
+  }
+
+  const event = compactEvent(eventName, payload);
+  const delivery = { eventName, deliveryId: request.headers.get("x-github-delivery") || "-", event };
+  const delayMs = Number(env.DEBOUNCE_SECONDS ?? 5) * 1000;
+  const merged = debouncer.submit(issueKey(event), delivery, delayMs);
+  if (merged === null) {
+    return new Response("Coalesced with a pending event ✅", { status: 202 });
+  }
+  ctx.waitUntil(merged.then((item) => forward(env, item)).catch((err) => console.error(`forwarding failed: ${String(err)}`)));
+  return new Response("Queued ✅", { status: 202 });
+}
+
 export default {
-  async fetch(request, env) {
+  async fetch(request, env, ctx) {
     if (request.method === "GET") {
       return new Response("Worker is live ✅", { status: 200 });
     }
@@ -8,9 +86,23 @@ export default {
     }
 
     try {
-      const body = await request.json().catch(() => ({}));
+      const raw = await request.text();
       const eventType = request.headers.get("x-github-event");
 
+      if (env.GITHUB_WEBHOOK_SECRET) {
+        const ok = await verifySignature(env.GITHUB_WEBHOOK_SECRET, raw, request.headers.get("x-hub-signature-256"));
+        if (!ok) {
+          return new Response("Invalid signature", { status: 401 });
+        }
+      }
+
+      let body;
+      try {
+        body = JSON.parse(raw || "{}");
+      } catch {
+        body = {};
+      }
+
       if (eventType === "ping") {
         return new Response("Ping received ✅", { status: 200 });
       }
@@ -29,12 +121,7 @@ export default {
 
         const ghResp = await fetch(`https://api.github.com/repos/${repoFullName}/issues`, {
           method: "POST",
-          headers: {
-            "Authorization": `Bearer ${env.GITHUB_TOKEN}`,
-            "Accept": "application/vnd.github+json",
-            "User-Agent": "wrangler-worker",
-            "Content-Type": "application/json"
-          },
+          headers: githubHeaders(env),
           body: JSON.stringify({ title: issueTitle, body: issueBody })
         });
 
@@ -56,7 +143,10 @@ export default {
         }
       }
 
-      return new Response("Webhook processed ✅", { status: 200 });
+      if (!env.GITHUB_WEBHOOK_SECRET) {
+        return new Response("Missing GITHUB_WEBHOOK_SECRET binding", { status: 500 });
+      }
+      return await relayIssueEvent(request, env, ctx, eventType, body);
     } catch (err) {
       // Cloudflare Workers: Error may not be fully serializable; stringify best effort
       return new Response(`Internal Server Error: ${String(err)}`, { status: 500 });
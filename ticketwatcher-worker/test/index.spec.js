@@ -1,20 +1,143 @@
-import { env, createExecutionContext, waitOnExecutionContext, SELF } from 'cloudflare:test';
-import { describe, it, expect } from 'vitest';
+import { createExecutionContext, waitOnExecutionContext, SELF } from 'cloudflare:test';
+import { afterEach, beforeEach, describe, it, expect, vi } from 'vitest';
 import worker from '../src';
+import { Debouncer, compactEvent, needsWork, parseList, signPayload, verifySignature } from '../src/events.js';
 
-describe('Hello World worker', () => {
-	it('responds with Hello World! (unit style)', async () => {
-		const request = new Request('http://example.com');
-		// Create an empty context to pass to `worker.fetch()`.
-		const ctx = createExecutionContext();
-		const response = await worker.fetch(request, env, ctx);
-		// Wait for all `Promise`s passed to `ctx.waitUntil()` to settle before running test assertions
-		await waitOnExecutionContext(ctx);
-		expect(await response.text()).toMatchInlineSnapshot(`"Hello World!"`);
+const SECRET = 'test-secret';
+const ENV = {
+	GITHUB_WEBHOOK_SECRET: SECRET,
+	GITHUB_TOKEN: 'gh-token',
+	REPO_FULL_NAME: 'octo/repo',
+	DEBOUNCE_SECONDS: '0.02',
+};
+const LABELS = parseList(undefined, 'agent-fix,auto-pr');
+
+function issueEvent(number, overrides = {}) {
+	return {
+		action: 'labeled',
+		label: { name: 'agent-fix' },
+		issue: {
+			number,
+			title: 'KeyError in login',
+			body: 'Traceback ...',
+			labels: [{ name: 'agent-fix' }],
+			user: { login: 'someone', avatar_url: 'https://example.com/a.png' },
+			reactions: { total_count: 0 },
+		},
+		repository: { full_name: 'octo/repo', description: 'x'.repeat(500) },
+		sender: { login: 'someone' },
+		...overrides,
+	};
+}
+
+async function deliver(eventName, payload, env = ENV, { sign = true } = {}) {
+	const body = JSON.stringify(payload);
+	const headers = { 'x-github-event': eventName, 'x-github-delivery': `d-${Math.random()}` };
+	if (sign) headers['x-hub-signature-256'] = await signPayload(SECRET, body);
+	const ctx = createExecutionContext();
+	const response = await worker.fetch(new Request('http://example.com/', { method: 'POST', headers, body }), env, ctx);
+	return { response, ctx };
+}
+
+describe('event filter', () => {
+	it('mirrors the Python pre-filter', () => {
+		expect(needsWork('issues', issueEvent(1), LABELS)[0]).toBe(true);
+		expect(needsWork('issues', issueEvent(1, { label: { name: 'bug' } }), LABELS)).toEqual([false, "issue action 'labeled' without a trigger label"]);
+		expect(needsWork('issues', issueEvent(1, { action: 'edited' }), LABELS)[0]).toBe(false);
+		expect(needsWork('issues', issueEvent(1, { action: 'opened', label: undefined }), LABELS)[0]).toBe(true);
+		const command = (labels, comment) => ({ action: 'created', issue: { labels }, comment });
+		expect(needsWork('issue_comment', command([{ name: 'agent-fix' }], { body: '  /Agent fix please' }), LABELS)[0]).toBe(true);
+		expect(needsWork('issue_comment', command([], { body: '/agent fix', author_association: 'MEMBER' }), LABELS)[0]).toBe(true);
+		expect(needsWork('issue_comment', command([], { body: '/agent fix', author_association: 'NONE' }), LABELS)).toEqual([
+			false,
+			'agent command from a non-member on an issue without a trigger label',
+		]);
+		expect(needsWork('issue_comment', { action: 'created', comment: { body: 'thanks!' } }, LABELS)[0]).toBe(false);
+		expect(needsWork('push', {}, LABELS)).toEqual([false, 'event push not handled']);
+	});
+
+	it('keeps only the fields the pipeline reads', () => {
+		const compact = compactEvent('issues', issueEvent(3));
+		expect(compact).toEqual({
+			action: 'labeled',
+			label: { name: 'agent-fix' },
+			issue: { number: 3, title: 'KeyError in login', body: 'Traceback ...', labels: [{ name: 'agent-fix' }] },
+			repository: { full_name: 'octo/repo' },
+		});
+	});
+
+	it('verifies GitHub signatures', async () => {
+		const header = await signPayload(SECRET, '{"a":1}');
+		expect(await verifySignature(SECRET, '{"a":1}', header)).toBe(true);
+		expect(await verifySignature(SECRET, '{"a":2}', header)).toBe(false);
+		expect(await verifySignature(SECRET, '{"a":1}', null)).toBe(false);
+	});
+
+	it('folds a burst into the first delivery, never dropping an agent command', async () => {
+		const debouncer = new Debouncer();
+		const first = debouncer.submit('k', { eventName: 'issues', n: 1 }, 10);
+		expect(debouncer.submit('k', { eventName: 'issue_comment', n: 2 }, 10)).toBeNull();
+		expect(debouncer.submit('k', { eventName: 'issues', n: 3 }, 10)).toBeNull();
+		expect(await first).toEqual({ eventName: 'issue_comment', n: 2 });
+	});
+});
+
+describe('webhook relay', () => {
+	let fetchSpy;
+
+	beforeEach(() => {
+		fetchSpy = vi.spyOn(globalThis, 'fetch').mockImplementation(async () => new Response(null, { status: 204 }));
 	});
 
-	it('responds with Hello World! (integration style)', async () => {
+	afterEach(() => {
+		fetchSpy.mockRestore();
+	});
+
+	it('responds as live on GET (integration style)', async () => {
 		const response = await SELF.fetch('http://example.com');
-		expect(await response.text()).toMatchInlineSnapshot(`"Hello World!"`);
+		expect(await response.text()).toBe('Worker is live ✅');
+	});
+
+	it('rejects unsigned deliveries', async () => {
+		const { response } = await deliver('issues', issueEvent(1), ENV, { sign: false });
+		expect(response.status).toBe(401);
+		expect(fetchSpy).not.toHaveBeenCalled();
+	});
+
+	it('drops events the pipeline would reject without forwarding', async () => {
+		const { response, ctx } = await deliver('issue_comment', { action: 'created', issue: { number: 1 }, comment: { body: 'lgtm' } });
+		await waitOnExecutionContext(ctx);
+		expect(response.status).toBe(200);
+		expect(await response.text()).toBe('Ignored: comment is not an agent command');
+		expect(fetchSpy).not.toHaveBeenCalled();
+	});
+
+	it('debounces a burst per issue and dispatches one compact event', async () => {
+		const first = await deliver('issues', issueEvent(7, { action: 'opened', label: undefined }));
+		const second = await deliver('issues', issueEvent(7));
+		const other = await deliver('issues', issueEvent(8));
+		expect([first.response.status, second.response.status, other.response.status]).toEqual([202, 202, 202]);
+		expect(await second.response.text()).toBe('Coalesced with a pending event ✅');
+		await Promise.all([first, second, other].map(({ ctx }) => waitOnExecutionContext(ctx)));
+
+		expect(fetchSpy).toHaveBeenCalledTimes(2);
+		const [url, init] = fetchSpy.mock.calls[0];
+		expect(url).toBe('https://api.github.com/repos/octo/repo/dispatches');
+		const { event_type, client_payload } = JSON.parse(init.body);
+		expect(event_type).toBe('ticketwatcher');
+		expect(client_payload.event_name).toBe('issues');
+		expect(client_payload.event).toEqual(compactEvent('issues', issueEvent(7)));
+	});
+
+	it('forwards to the Python service re-signed with the shared secret', async () => {
+		const env = { ...ENV, FORWARD_TO: 'service', PYTHON_BACKEND_URL: 'https://backend.example/webhook' };
+		const { ctx } = await deliver('issue_comment', issueEvent(9, { action: 'created', comment: { body: '/agent fix' } }), env);
+		await waitOnExecutionContext(ctx);
+
+		const [url, init] = fetchSpy.mock.calls[0];
+		expect(url).toBe('https://backend.example/webhook');
+		expect(init.headers['X-GitHub-Event']).toBe('issue_comment');
+		expect(await verifySignature(SECRET, init.body, init.headers['X-Hub-Signature-256'])).toBe(true);
+		expect(JSON.parse(init.body).comment).toEqual({ body: '/agent fix', author_association: 'NONE' });
 	});
 });